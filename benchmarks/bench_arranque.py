@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Benchmark de arranque de los chats de terminal (main.py y main_hybrid.py).
+
+Mide, en procesos nuevos:
+
+1. El costo de importar cada script (`python -X importtime`), con sus importaciones
+   directas más caras: es lo que se paga antes de mostrar cualquier cosa.
+2. El tiempo hasta el primer prompt (`🧑 TÚ:`) ejecutando el script de verdad.
+3. El tiempo hasta la primera respuesta de una pregunta que no necesita la documentación
+   y de una que sí (esta incluye cargar el modelo de embeddings y la base vectorial).
+
+El LLM es el servidor OpenAI falso, así que no hace falta API key ni red.
+
+    python benchmarks/bench_arranque.py
+    python benchmarks/bench_arranque.py --scripts main_hybrid.py --repeticiones 10
+    python benchmarks/bench_arranque.py --frio      # sin base vectorial ni cachés previas
+"""
+
+import argparse
+import os
+import re
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+
+from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+PROMPT = "TÚ:".encode("utf-8")
+FIN_RESPUESTA = ("-" * 70).encode("utf-8")
+ERROR = "❌".encode("utf-8")
+PREGUNTA_SIN_DOCUMENTACION = "Usa tu conocimiento propio: ¿qué es Python?"
+PREGUNTA_CON_DOCUMENTACION = "¿Cómo instalo la librería HenryPy?"
+_LINEA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def medir_importacion(modulo, repeticiones):
+    """
+    Importa `modulo` en procesos nuevos con -X importtime.
+
+    Returns:
+        tuple: (segundos por corrida, {importación directa: segundos} de la última corrida)
+    """
+    totales, directas = [], {}
+    for _ in range(repeticiones):
+        proceso = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+            cwd=RAIZ, capture_output=True, text=True, check=True,
+        )
+        directas = {}
+        for linea in proceso.stderr.splitlines():
+            coincidencia = _LINEA_IMPORTTIME.match(linea)
+            if coincidencia is None:
+                continue
+            _, acumulado, sangria, nombre = coincidencia.groups()
+            if nombre == modulo:
+                totales.append(int(acumulado) / 1e6)
+            elif len(sangria) == 3:  # importado directamente por el script
+                directas[nombre] = int(acumulado) / 1e6
+    return totales, directas
+
+
+class ProcesoChat:
+    """Un script de chat corriendo con stdin/stdout conectados a pipes."""
+
+    def __init__(self, script, entorno, directorio):
+        self.inicio = time.perf_counter()
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-u", os.path.join(RAIZ, script)],
+            cwd=directorio, env=entorno, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self.salida = b""
+
+    def esperar(self, *marcadores, timeout=120):
+        """Lee la salida hasta ver alguno de los marcadores; devuelve (segundos, marcador) o (None, None)."""
+        desde = len(self.salida)
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            for marcador in marcadores:
+                if marcador in self.salida[desde:]:
+                    return time.perf_counter(), marcador
+            listos, _, _ = select.select([self.proceso.stdout], [], [], 0.5)
+            if listos:
+                datos = os.read(self.proceso.stdout.fileno(), 65536)
+                if not datos:
+                    return None, None  # el proceso terminó
+                self.salida += datos
+        return None, None
+
+    def enviar(self, texto):
+        self.proceso.stdin.write(texto.encode("utf-8") + b"\n")
+        self.proceso.stdin.flush()
+        return time.perf_counter()
+
+    def cerrar(self):
+        try:
+            self.enviar("salir")
+            self.proceso.wait(timeout=60)
+        except (BrokenPipeError, subprocess.TimeoutExpired):
+            self.proceso.kill()
+
+
+def medir_chat(script, entorno, directorio, con_documentacion):
+    """Devuelve {etapa: segundos o None} para una corrida del script."""
+    chat = ProcesoChat(script, entorno, directorio)
+    tiempos = {}
+    try:
+        momento, _ = chat.esperar(PROMPT)
+        tiempos["primer prompt"] = momento - chat.inicio if momento else None
+        preguntas = [("sin documentación", PREGUNTA_SIN_DOCUMENTACION)] if script == "main_hybrid.py" else []
+        if con_documentacion:
+            preguntas.append(("con documentación", PREGUNTA_CON_DOCUMENTACION))
+        for etapa, pregunta in preguntas:
+            if momento is None:
+                break
+            enviada = chat.enviar(pregunta)
+            momento, marcador = chat.esperar(FIN_RESPUESTA, ERROR)
+            respondida = marcador == FIN_RESPUESTA
+            tiempos[f"respuesta {etapa}"] = momento - enviada if respondida else None
+            # Cuánto esperó en total quien hizo esta pregunta apenas vio el prompt
+            tiempos[f"arranque → respuesta {etapa}"] = momento - chat.inicio if respondida else None
+            momento, _ = chat.esperar(PROMPT)
+    finally:
+        chat.cerrar()
+    return tiempos
+
+
+def _ms(valores):
+    valores = [v for v in valores if v is not None]
+    if not valores:
+        return f"{'error':>10}{'':>10}"
+    return f"{np.median(valores) * 1e3:>10.0f}{min(valores) * 1e3:>10.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de los chats de terminal")
+    parser.add_argument("--scripts", nargs="+", default=["main.py", "main_hybrid.py"])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--sin-documentacion", action="store_true",
+                        help="No hacer la pregunta que carga el modelo de embeddings (p.ej. sin torch instalado)")
+    parser.add_argument("--frio", action="store_true", help="Correr en un directorio vacío (sin base vectorial ni cachés)")
+    args = parser.parse_args()
+
+    _, base_url = iniciar_servidor(ConfiguracionFalsa(respuesta="Python es un lenguaje de programación. " * 3))
+    corpus = os.pathsep.join([os.path.join(RAIZ, "documentacion_tecnica.md"), os.path.join(RAIZ, "docs")])
+    entorno = {**os.environ, "OPENAI_API_KEY": "sk-falsa", "OPENAI_BASE_URL": base_url,
+               "OPENAI_MODEL": "gpt-4o-mini", "STREAMING": "0", "CORPUS": corpus}
+
+    print(f"\n📊 Arranque de los chats - mediana y mínimo de {args.repeticiones} procesos nuevos\n")
+    print(f"{'':<50}{'mediana':>10}{'mínimo':>10}")
+    print("-" * 70)
+    for script in args.scripts:
+        modulo = os.path.splitext(script)[0]
+        totales, directas = medir_importacion(modulo, args.repeticiones)
+        print(f"{'import ' + modulo + ' (ms)':<50}{_ms(totales)}")
+        for nombre, segundos in sorted(directas.items(), key=lambda par: -par[1])[:4]:
+            print(f"   {nombre:<47}{segundos * 1e3:>10.0f}")
+
+        corridas = []
+        for _ in range(args.repeticiones):
+            directorio = tempfile.mkdtemp(prefix="bench_arranque_") if args.frio else RAIZ
+            try:
+                corridas.append(medir_chat(script, entorno, directorio, not args.sin_documentacion))
+            finally:
+                if args.frio:
+                    shutil.rmtree(directorio, ignore_errors=True)
+        for etapa in corridas[0]:
+            print(f"{'   ' + etapa + ' (ms)':<50}{_ms([c.get(etapa) for c in corridas])}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Benchmark de recuperación híbrida (BM25 + vectores con RRF) con consultas por identificador exacto.
+
+Genera un corpus sintético donde algunos fragmentos mencionan un identificador único
+(`Engine42NotFoundError`, `henrypy.funcion_42`, `HNP-1a2b3c4d-DEV`) y pregunta por cada
+uno. Un acierto es que el fragmento con ese identificador esté entre los primeros k.
+Compara solo vectores, solo BM25 e híbrido (recall@k) y reporta la latencia por etapa.
+
+    python benchmarks/bench_busqueda_hibrida.py --fragmentos 3000 --consultas 200
+    python benchmarks/bench_busqueda_hibrida.py --real
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.ingesta import ingestar_documentos
+from cerebro.lexico import sincronizar_indice_lexico
+from cerebro.recuperacion import ETAPAS, Recuperador
+from falsos import EmbeddingsHash, corpus_sintetico
+
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+VALORES_K = (1, 3, 5, 10)
+
+
+def identificador(i, rng):
+    """Identificador único con la forma de los de la documentación de HenryPy."""
+    tipo = i % 3
+    if tipo == 0:
+        return f"{rng.choice(['Engine', 'Auth', 'Query', 'Cache'])}{i}NotFoundError"
+    if tipo == 1:
+        return f"henrypy.funcion_{i}"
+    return f"HNP-{rng.getrandbits(32):08x}-DEV"
+
+
+def escribir_corpus(directorio, n, consultas, semilla=0):
+    """Escribe el corpus y devuelve los identificadores sembrados."""
+    rng = random.Random(semilla)
+    textos = corpus_sintetico(n, palabras_por_fragmento=60, semilla=semilla)
+    identificadores = []
+    for posicion in rng.sample(range(n), consultas):
+        ident = identificador(len(identificadores), rng)
+        palabras = textos[posicion].split()
+        palabras.insert(rng.randrange(len(palabras)), f"si aparece {ident} revise la configuración")
+        textos[posicion] = " ".join(palabras)
+        identificadores.append(ident)
+    for i in range(0, n, 50):
+        with open(os.path.join(directorio, f"doc_{i // 50:05d}.md"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(textos[i:i + 50]))
+    return identificadores
+
+
+def posicion_acierto(docs, ident):
+    """Posición (1..) del primer fragmento que contiene el identificador, o None."""
+    for posicion, doc in enumerate(docs, start=1):
+        if ident in doc.page_content:
+            return posicion
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda híbrida BM25 + vectores")
+    parser.add_argument("--fragmentos", type=int, default=3000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings (all-MiniLM-L6-v2)")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        embeddings = EmbeddingsHash()
+
+    raiz = tempfile.mkdtemp(prefix="bench_hibrida_")
+    try:
+        corpus = os.path.join(raiz, "corpus")
+        os.makedirs(corpus)
+        identificadores = escribir_corpus(corpus, args.fragmentos, args.consultas)
+        # Un fragmento sintético por párrafo: el splitter no los vuelve a cortar
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+        db = os.path.join(raiz, "chroma")
+        vectorstore, ingesta = ingestar_documentos([corpus], embeddings, db, splitter)
+
+        inicio = time.perf_counter()
+        indice = sincronizar_indice_lexico(vectorstore, db, ingesta.version_corpus)
+        t_indice = time.perf_counter() - inicio
+
+        k_max = max(VALORES_K)
+        densa = Recuperador(vectorstore, k=k_max)
+        hibrida = Recuperador(vectorstore, k=k_max, indice=indice, candidatos=2 * k_max)
+        docs_por_id = dict(zip(*(lambda d: (d["ids"], d["documents"]))(vectorstore._collection.get(include=["documents"]))))
+
+        posiciones = {"Vectores": [], "BM25": [], "Híbrida (RRF)": []}
+        tiempos = {"Vectores": [], "BM25": [], "Híbrida (RRF)": []}
+        etapas = {}
+        for ident in identificadores:
+            pregunta = f"¿Qué significa {ident} y cómo lo soluciono?"
+            vector = densa.embeber(pregunta)
+
+            inicio = time.perf_counter()
+            resultado = densa.recuperar(pregunta, vector)
+            tiempos["Vectores"].append(time.perf_counter() - inicio)
+            posiciones["Vectores"].append(posicion_acierto(resultado.docs, ident))
+
+            inicio = time.perf_counter()
+            ids, _ = indice.buscar(pregunta, k=k_max)
+            tiempos["BM25"].append(time.perf_counter() - inicio)
+            posiciones["BM25"].append(next((i for i, id_ in enumerate(ids, start=1) if ident in docs_por_id[id_]), None))
+
+            inicio = time.perf_counter()
+            resultado = hibrida.recuperar(pregunta, vector)
+            tiempos["Híbrida (RRF)"].append(time.perf_counter() - inicio)
+            posiciones["Híbrida (RRF)"].append(posicion_acierto(resultado.docs, ident))
+            for etapa, segundos in resultado.tiempos.items():
+                etapas.setdefault(etapa, []).append(segundos)
+
+        print(f"\n📊 Búsqueda híbrida - {ingesta.total_fragmentos} fragmentos, {len(identificadores)} consultas por identificador")
+        print(f"   Índice léxico: {len(indice.vocabulario)} términos, {len(indice.postings)} postings, "
+              f"construido en {t_indice * 1e3:.0f} ms\n")
+        encabezado = "".join(f"{'recall@' + str(k):>11}" for k in VALORES_K)
+        print(f"{'método':<16}{encabezado}{'p50 (ms)':>11}{'p95 (ms)':>11}")
+        print("-" * (16 + 11 * len(VALORES_K) + 22))
+        for metodo, lista in posiciones.items():
+            recalls = "".join(f"{np.mean([p is not None and p <= k for p in lista]):>11.1%}" for k in VALORES_K)
+            p50, p95 = np.percentile(tiempos[metodo], [50, 95]) * 1e3
+            print(f"{metodo:<16}{recalls}{p50:>11.2f}{p95:>11.2f}")
+
+        print("\n⏱️  Etapas de la búsqueda híbrida (embedding ya calculado; BM25 corre en paralelo con ANN):")
+        for etapa, valores in etapas.items():
+            p50, p95 = np.percentile(valores, [50, 95]) * 1e3
+            print(f"   {ETAPAS.get(etapa, etapa):<10} p50 {p50:7.2f} ms   p95 {p95:7.2f} ms")
+        print()
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
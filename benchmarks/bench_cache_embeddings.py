@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Benchmark de la caché de embeddings en disco sobre un corpus sintético.
+
+Mide una ingesta en frío (todo se calcula), una en caliente (todo sale de la caché),
+la latencia de lookup por vector y el tamaño en disco.
+
+    python benchmarks/bench_cache_embeddings.py --fragmentos 5000 --costo-ms 2
+    python benchmarks/bench_cache_embeddings.py --real   # usa all-MiniLM-L6-v2
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cerebro.cache_embeddings import EmbeddingsConCache
+from falsos import EmbeddingsHash, corpus_sintetico
+
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def tamano_directorio(ruta):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, archivos in os.walk(ruta) for f in archivos)
+
+
+def ingestar(embeddings, textos, lote):
+    inicio = time.perf_counter()
+    for i in range(0, len(textos), lote):
+        embeddings.embed_documents(textos[i:i + lote])
+    return time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la caché de embeddings")
+    parser.add_argument("--fragmentos", type=int, default=5000)
+    parser.add_argument("--lote", type=int, default=64)
+    parser.add_argument("--costo-ms", type=float, default=1.0, help="Costo simulado por texto del embedder falso")
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings en lugar del embedder falso")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        base = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        base = EmbeddingsHash(costo=args.costo_ms / 1000)
+
+    textos = corpus_sintetico(args.fragmentos)
+    directorio = tempfile.mkdtemp(prefix="bench_cache_emb_")
+    try:
+        fria = EmbeddingsConCache(base, modelo="bench", directorio=directorio)
+        t_frio = ingestar(fria, textos, args.lote)
+
+        # Nueva instancia = nuevo proceso: solo se reabre el memmap y el índice
+        inicio = time.perf_counter()
+        caliente = EmbeddingsConCache(base, modelo="bench", directorio=directorio)
+        t_apertura = time.perf_counter() - inicio
+        t_caliente = ingestar(caliente, textos, args.lote)
+
+        inicio = time.perf_counter()
+        for t in textos[:1000]:
+            caliente.obtener(t)
+        t_lookup = (time.perf_counter() - inicio) / min(1000, len(textos))
+
+        print(f"\n📊 Caché de embeddings - {args.fragmentos} fragmentos (lotes de {args.lote})\n")
+        print(f"   Ingesta en frío:      {t_frio:8.2f} s  ({args.fragmentos / t_frio:,.0f} fragmentos/s)  {fria.resumen()}")
+        print(f"   Apertura de la caché: {t_apertura * 1e3:8.2f} ms")
+        print(f"   Ingesta en caliente:  {t_caliente:8.2f} s  ({args.fragmentos / t_caliente:,.0f} fragmentos/s)  {caliente.resumen()}")
+        print(f"   Lookup (vista memmap): {t_lookup * 1e6:7.2f} µs por vector")
+        print(f"   Aceleración:          {t_frio / t_caliente:8.1f}x")
+        print(f"   Tamaño en disco:      {tamano_directorio(directorio) / 1e6:8.2f} MB\n")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark: costo por pregunta de reconstruir prompt + cadena vs. reutilizarlos.
+
+Usa un chat model falso (sin red ni API key), así que lo que se mide es solo el
+overhead de LangChain alrededor de la llamada al LLM.
+
+    python benchmarks/bench_cadenas.py --preguntas 2000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from cerebro.cadenas import CONOCIMIENTO_PROPIO, DOCUMENTACION, TEMPLATES, construir_cadenas
+
+CONTEXTO = "pip install henrypy\n\nPara habilitar el motor de análisis: pip install henrypy[analysis]" * 3
+
+
+def por_pregunta(llm, estrategia, entrada):
+    """Patrón anterior: crea el prompt y la cadena en cada llamada."""
+    cadena = ChatPromptTemplate.from_template(TEMPLATES[estrategia]) | llm | StrOutputParser()
+    return cadena.invoke(entrada)
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preguntas", type=int, default=1000)
+    args = parser.parse_args()
+
+    llm = FakeListChatModel(responses=["Para instalar HenryPy usa pip install henrypy."])
+    inicio = time.perf_counter()
+    cadenas = construir_cadenas(llm)
+    construccion = time.perf_counter() - inicio
+
+    casos = {
+        DOCUMENTACION: {"context": CONTEXTO, "question": "¿Cómo instalo HenryPy?"},
+        CONOCIMIENTO_PROPIO: {"question": "¿Qué es Python?"},
+    }
+
+    print(f"\n⏱️  Construcción única del registro: {construccion * 1e3:.2f} ms\n")
+    print(f"{'estrategia':<22}{'antes (µs)':>12}{'después (µs)':>14}{'ahorro':>10}")
+    print("-" * 58)
+    for estrategia, entrada in casos.items():
+        # Calentamiento para no medir imports perezosos
+        por_pregunta(llm, estrategia, entrada)
+        cadenas[estrategia].invoke(entrada)
+
+        antes = statistics.median(medir(lambda: por_pregunta(llm, estrategia, entrada), args.preguntas))
+        despues = statistics.median(medir(lambda: cadenas[estrategia].invoke(entrada), args.preguntas))
+        print(f"{estrategia:<22}{antes * 1e6:>12.1f}{despues * 1e6:>14.1f}{(1 - despues / antes) * 100:>9.1f}%")
+    print()
+
+
+if __name__ == "__main__":
+    main()
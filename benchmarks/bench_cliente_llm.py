@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Benchmark de la capa de cliente del LLM (cerebro.cliente_llm) contra un servidor que responde 429.
+
+Levanta el servidor OpenAI falso con un límite de tasa (`--limite-rpm`, aplicado por
+segundo como la API), 429 al azar (`--fallas`, con Retry-After) y latencia, y manda
+`--peticiones` preguntas con ChatOpenAI desde `--concurrencia` usuarios. Una fracción
+(`--repetidas`) repite preguntas de otros usuarios, como en una ola de tráfico. Compara:
+
+- SDK sin reintentos: cada 429 llega al usuario como "❌ Error",
+- SDK por defecto: los 2 reintentos del SDK de OpenAI,
+- cliente_llm: reintentos con jitter y Retry-After, pausa global ante un 429 y
+  coalescencia de preguntas idénticas en vuelo,
+- cliente_llm + LLM_RPM: además, el limitador del cliente con el mismo límite que la API,
+  así casi no llegan 429.
+
+Por cada uno: errores, llamadas que recibió el servidor, 429 recibidos, tiempo total y
+latencia p50/p95 por pregunta. Con `--hilos` las preguntas van con `invoke` desde un pool
+de hilos (el camino síncrono de los chats de terminal) en lugar de `ainvoke`.
+
+    python benchmarks/bench_cliente_llm.py
+    python benchmarks/bench_cliente_llm.py --limite-rpm 300 --fallas 0.1 --repetidas 0.5 --hilos
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(BENCHMARKS), BENCHMARKS]
+
+import httpx
+import numpy as np
+from langchain_openai import ChatOpenAI
+
+from cerebro.cliente_llm import LimitadorTasa, PoliticaLLM, opciones_cliente_llm
+from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+
+def preguntas_con_repetidas(total, repetidas, semilla=0):
+    """`total` preguntas donde una fracción `repetidas` repite alguna de las distintas, mezcladas."""
+    azar = random.Random(semilla)
+    distintas = [f"¿Cómo configuro la opción número {i} de HenryPy?" for i in range(max(1, round(total * (1 - repetidas))))]
+    preguntas = distintas + [azar.choice(distintas) for _ in range(total - len(distintas))]
+    azar.shuffle(preguntas)
+    return preguntas
+
+
+def crear_llm(base_url, modo, limite_rpm, concurrencia):
+    """ChatOpenAI según el modo, y la PoliticaLLM (None en los modos del SDK solo)."""
+    base = {"model": "gpt-4o-mini", "temperature": 0.1, "max_tokens": 200, "base_url": base_url, "api_key": "sk-falsa"}
+    if modo.startswith("SDK"):
+        limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+        clientes = {"http_client": httpx.Client(limits=limites), "http_async_client": httpx.AsyncClient(limits=limites)}
+        return ChatOpenAI(**base, **clientes, max_retries=0 if "sin" in modo else 2), None
+    politica = PoliticaLLM(LimitadorTasa(rpm=limite_rpm if "LLM_RPM" in modo else 0, tpm=0))
+    return ChatOpenAI(**base, **opciones_cliente_llm(politica, concurrencia)), politica
+
+
+def correr_async(llm, preguntas, concurrencia):
+    async def todas():
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def una(pregunta):
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    await llm.ainvoke(pregunta)
+                    return time.perf_counter() - inicio, None
+                except Exception as error:
+                    return time.perf_counter() - inicio, error
+
+        return await asyncio.gather(*(una(p) for p in preguntas))
+
+    return asyncio.run(todas())
+
+
+def correr_hilos(llm, preguntas, concurrencia):
+    def una(pregunta):
+        inicio = time.perf_counter()
+        try:
+            llm.invoke(pregunta)
+            return time.perf_counter() - inicio, None
+        except Exception as error:
+            return time.perf_counter() - inicio, error
+
+    with ThreadPoolExecutor(concurrencia) as ejecutor:
+        return list(ejecutor.map(una, preguntas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capa de cliente del LLM: 429, reintentos y coalescencia")
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--repetidas", type=float, default=0.3, help="Fracción de preguntas repetidas")
+    parser.add_argument("--limite-rpm", type=float, default=1200, help="Límite de tasa del servidor falso")
+    parser.add_argument("--fallas", type=float, default=0.05, help="Fracción de 429 al azar (Retry-After 1 s)")
+    parser.add_argument("--latencia", type=float, default=0.3, help="Latencia del LLM falso (s)")
+    parser.add_argument("--hilos", action="store_true", help="invoke desde un pool de hilos en lugar de ainvoke")
+    args = parser.parse_args()
+
+    preguntas = preguntas_con_repetidas(args.peticiones, args.repetidas)
+    correr = correr_hilos if args.hilos else correr_async
+    print(f"\n📊 Cliente del LLM - {args.peticiones} preguntas ({len(set(preguntas))} distintas), {args.concurrencia} "
+          f"usuarios ({'hilos' if args.hilos else 'asyncio'}); servidor: {args.limite_rpm:.0f} RPM, "
+          f"{args.fallas:.0%} de 429 al azar, latencia {args.latencia * 1e3:.0f} ms\n")
+    print(f"{'cliente':<24}{'errores':>9}{'llamadas':>10}{'429':>6}{'reintentos':>12}{'coalesc.':>10}"
+          f"{'total s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    print("-" * 98)
+    for modo in ("SDK sin reintentos", "SDK por defecto", "cliente_llm", "cliente_llm + LLM_RPM"):
+        config = ConfiguracionFalsa(latencia=args.latencia, limite_rpm=args.limite_rpm, fallas=args.fallas)
+        servidor, base_url = iniciar_servidor(config)
+        llm, politica = crear_llm(base_url, modo, args.limite_rpm, args.concurrencia)
+        inicio = time.perf_counter()
+        resultados = correr(llm, preguntas, args.concurrencia)
+        total = time.perf_counter() - inicio
+        servidor.shutdown()
+        latencias = [t for t, error in resultados if error is None]
+        errores = [error for _, error in resultados if error is not None]
+        metricas = politica.metricas() if politica else {"reintentos": "-", "coalescidas": "-"}
+        p50, p95 = (np.percentile(latencias, [50, 95]) * 1e3) if latencias else (float("nan"),) * 2
+        print(f"{modo:<24}{len(errores):>9}{config.peticiones:>10}{config.rechazadas:>6}{metricas['reintentos']:>12}"
+              f"{metricas['coalescidas']:>10}{total:>9.1f}{p50:>9.0f}{p95:>9.0f}")
+        if errores:
+            print(f"   ❌ {type(errores[0]).__name__}: {str(errores[0])[:80]}")
+    print("\n   llamadas y 429: lo que recibió el servidor; coalesc.: preguntas que compartieron una llamada en vuelo\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+"""
+Benchmark de la memoria de conversación: crecimiento de los tokens del prompt por turno.
+
+Recorre un diálogo guionado de 100 turnos sobre HenryPy (una pregunta nueva y varias
+repreguntas del estilo "¿y el nivel deep?" por tema) contra el servidor OpenAI falso, con
+respuestas largas, y cuenta los tokens de prompt de cada turno en tres modos:
+
+- sin historial: cada pregunta viaja sola (como antes; las repreguntas pierden el tema),
+- historial completo: todos los turnos anteriores como mensajes (crece sin tope),
+- memoria: `Conversacion` de `cerebro.conversacion` (ventana acotada + resumen), sumando
+  también las llamadas de reescritura y de resumen.
+
+Con la memoria se informa además la tasa de reescritura: qué fracción de las preguntas
+nuevas (que nombran su tema y no deberían reformularse) y de las repreguntas pasaron
+por el LLM antes de buscar, con el vocabulario del corpus de `documentacion_tecnica.md`.
+Al final se evalúa la heurística `es_seguimiento` sola con preguntas autocontenidas que
+usan palabras comunes como "lo", "otro" o "mismo" y con repreguntas de otras formas.
+
+Los tokens se cuentan con el tokenizador del modelo de chat (tiktoken, o la aproximación
+de `cerebro.contexto` si no está disponible) sobre el texto de cada petición.
+
+    python benchmarks/bench_conversacion.py
+    python benchmarks/bench_conversacion.py --turnos 200 --ventana 600 --resumen 150
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+from langchain_openai import ChatOpenAI
+
+from cerebro.cadenas import REESCRITURA, RESUMEN, construir_cadenas
+from cerebro.contexto import ContadorTokens
+from cerebro.conversacion import RESUMEN_TOKENS, VENTANA_TOKENS, Conversacion
+from cerebro.lexico import tokenizar
+from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+CORPUS = os.path.join(RAIZ, "documentacion_tecnica.md")
+SISTEMA = "Eres un asistente útil y honesto que responde preguntas sobre la librería HenryPy."
+# (tema, pregunta inicial); las repreguntas no nombran el tema
+TEMAS = [
+    ("la instalación", "¿Cómo instalo la librería HenryPy?"),
+    ("la configuración inicial", "¿Cómo se configura HenryPy la primera vez?"),
+    ("henrypy.analyze", "¿Qué hace la función henrypy.analyze?"),
+    ("henrypy.refactor", "¿Cómo funciona henrypy.refactor?"),
+    ("los errores comunes", "¿Qué errores comunes tiene HenryPy?"),
+    ("la seguridad", "¿Qué notas de seguridad tiene HenryPy?"),
+    ("la API key", "¿Dónde consigo la API key de HenryPy?"),
+    ("el extra de análisis", "¿Para qué sirve el extra analysis de HenryPy?"),
+]
+REPREGUNTAS = [
+    "¿Y el nivel deep?",
+    "¿Eso funciona en Windows?",
+    "¿Qué pasa si falla?",
+    "Dame un ejemplo de eso",
+    "¿Y con Python 3.8?",
+    "¿Hay otra forma?",
+]
+# Autocontenidas con palabras que no son referencias ("otra forma de...", "lo mismo que...")
+AUTOCONTENIDAS = [
+    "¿Cómo instalo HenryPy?",
+    "¿Qué es Python?",
+    "¿Hay otra forma de instalar HenryPy sin pip?",
+    "¿Puedo usar el mismo proyecto en dos máquinas con HenryPy?",
+    "¿Qué es lo primero que configuro en HenryPy?",
+    "¿HenryPy hace lo mismo que pylint?",
+    "¿Qué otros niveles de análisis tiene HenryPy?",
+    "¿Dónde está la API key de HenryPy?",
+    "¿Cómo se configura la API key?",
+    "¿Cómo reporto un error de HenryPy?",
+]
+SEGUIMIENTOS = REPREGUNTAS + [
+    "¿Cómo lo instalo en Windows?",
+    "¿Puedo desactivarlo?",
+    "¿Qué hace esa función?",
+    "Explica lo anterior con un ejemplo",
+    "¿Dónde la configuro?",
+    "¿Cuánto cuesta?",
+]
+POR_TEMA = 5  # una pregunta nueva y cuatro repreguntas
+VENTANAS = [(1, 10), (11, 25), (26, 50), (51, 75), (76, 100)]
+MODOS = ("sin historial", "historial completo", "memoria")
+
+
+def dialogo(turnos):
+    """Preguntas del diálogo guionado: por tema, la pregunta inicial y sus repreguntas."""
+    preguntas = []
+    for i in range(turnos):
+        tema, inicial = TEMAS[(i // POR_TEMA) % len(TEMAS)]
+        preguntas.append(inicial if i % POR_TEMA == 0 else REPREGUNTAS[(i + i // POR_TEMA) % len(REPREGUNTAS)])
+    return preguntas
+
+
+def crear_respuesta(palabras_respuesta):
+    """LLM falso: distingue reescritura, resumen y respuesta por el prompt."""
+    relleno = ("HenryPy analiza y refactoriza código Python con niveles de profundidad configurables, "
+               "se instala con pip y se inicializa con henrypy.init usando la API key del proyecto ").split()
+
+    def texto(palabras):
+        return " ".join(relleno[i % len(relleno)] for i in range(palabras))
+
+    def respuesta(peticion):
+        prompt = " ".join(str(m.get("content", "")) for m in peticion.get("messages", []))
+        if "Reformula la última pregunta" in prompt:
+            ultima = re.search(r"Última pregunta: (.*)", prompt)
+            return f"{ultima.group(1).strip() if ultima else ''} en HenryPy"
+        if "Actualiza el resumen" in prompt:
+            # Un modelo que respeta el límite de palabras pedido
+            limite = re.search(r"Máximo (\d+) palabras", prompt)
+            return texto(int(int(limite.group(1)) * 0.8) if limite else 100)
+        return texto(palabras_respuesta)
+    return respuesta
+
+
+class Registro:
+    """Prompt de cada petición al servidor falso, asignado al turno en curso."""
+
+    def __init__(self, contar):
+        self.contar = contar
+        self.turno = 0
+        self.tokens = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, peticion):
+        prompt = "\n".join(str(m.get("content", "")) for m in peticion.get("messages", []))
+        with self._lock:
+            self.tokens[self.turno] = self.tokens.get(self.turno, 0) + self.contar(prompt)
+
+
+def correr(modo, preguntas, llm, cadenas, contar, registro, args, vocabulario):
+    """Recorre el diálogo en un modo; devuelve los tokens de prompt de cada turno y los turnos reformulados."""
+    registro.tokens = {}
+    conversacion = None
+    if modo == "memoria":
+        conversacion = Conversacion(contar, args.ventana, args.resumen, cadenas[REESCRITURA], cadenas[RESUMEN], vocabulario)
+    historial = []
+    reformulados = set()
+    for turno, pregunta in enumerate(preguntas, 1):
+        registro.turno = turno
+        if modo == "memoria":
+            consulta = conversacion.consulta(pregunta)
+            anteriores = conversacion.mensajes()
+            if consulta != pregunta:
+                reformulados.add(turno)
+        else:
+            consulta = pregunta
+            anteriores = historial if modo == "historial completo" else []
+        mensajes = [{"role": "system", "content": SISTEMA}, *anteriores, {"role": "user", "content": consulta}]
+        respuesta = llm.invoke(mensajes).content
+        if modo == "memoria":
+            conversacion.registrar(pregunta, respuesta, consulta)
+        else:
+            historial += [{"role": "user", "content": pregunta}, {"role": "assistant", "content": respuesta}]
+    if conversacion is not None:
+        # El último resumen en segundo plano se cuenta en el último turno
+        conversacion.mensajes()
+        conversacion.cerrar()
+    return [registro.tokens.get(turno, 0) for turno in range(1, len(preguntas) + 1)], conversacion, reformulados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens de prompt por turno: sin historial, historial completo y memoria")
+    parser.add_argument("--turnos", type=int, default=100)
+    parser.add_argument("--ventana", type=int, default=VENTANA_TOKENS, help="Tokens de la ventana de turnos completos")
+    parser.add_argument("--resumen", type=int, default=RESUMEN_TOKENS, help="Tokens máximos del resumen")
+    parser.add_argument("--palabras-respuesta", type=int, default=120, help="Largo de cada respuesta del LLM falso")
+    parser.add_argument("--modelo", default="gpt-4o-mini", help="Modelo de chat (elige el tokenizador)")
+    args = parser.parse_args()
+
+    contar = ContadorTokens(args.modelo)
+    registro = Registro(contar)
+    responder = crear_respuesta(args.palabras_respuesta)
+
+    def respuesta(peticion):
+        registro(peticion)
+        return responder(peticion)
+
+    _, base_url = iniciar_servidor(ConfiguracionFalsa(respuesta=respuesta))
+    llm = ChatOpenAI(model=args.modelo, base_url=base_url, api_key="sk-falsa", temperature=0.1, max_tokens=500)
+    cadenas = construir_cadenas(llm)
+    with open(CORPUS, encoding="utf-8") as f:
+        vocabulario = set(tokenizar(f.read()))
+    preguntas = dialogo(args.turnos)
+    ventanas = [(desde, min(hasta, args.turnos)) for desde, hasta in VENTANAS if desde <= args.turnos]
+    if ventanas[-1][1] < args.turnos:
+        ventanas.append((ventanas[-1][1] + 1, args.turnos))
+
+    print(f"\n📊 Memoria de conversación - {args.turnos} turnos, respuestas de {args.palabras_respuesta} palabras, "
+          f"ventana {args.ventana} tokens, resumen {args.resumen} tokens")
+    print(f"   Tokens de prompt por turno (respuesta + reescritura + resumen), promedio por tramo; {contar.nombre}\n")
+    print(f"{'modo':<20}" + "".join(f"{f'{desde}-{hasta}':>10}" for desde, hasta in ventanas) + f"{'máximo':>10}{'total':>10}")
+    print("-" * (40 + 10 * len(ventanas)))
+    totales = {}
+    for modo in MODOS:
+        tokens, conversacion, reformulados = correr(modo, preguntas, llm, cadenas, contar, registro, args, vocabulario)
+        totales[modo] = tokens
+        tramos = [np.mean(tokens[desde - 1:hasta]) for desde, hasta in ventanas]
+        print(f"{modo:<20}" + "".join(f"{t:>10.0f}" for t in tramos) + f"{max(tokens):>10,}{sum(tokens):>10,}")
+    print()
+    print(conversacion.resumen_uso())
+    # La primera pregunta no tiene historial: nunca se reformula
+    nuevas = [turno for turno in range(POR_TEMA + 1, args.turnos + 1, POR_TEMA)]
+    repreguntas = [turno for turno in range(2, args.turnos + 1) if (turno - 1) % POR_TEMA]
+    for nombre, turnos in (("preguntas nuevas", nuevas), ("repreguntas", repreguntas)):
+        if turnos:
+            cantidad = sum(turno in reformulados for turno in turnos)
+            print(f"🔁 Reescritura en {nombre}: {cantidad}/{len(turnos)} ({cantidad / len(turnos):.0%})")
+    heuristica = Conversacion(contar, vocabulario=vocabulario)
+    for nombre, preguntas_eval, esperado in (("autocontenidas", AUTOCONTENIDAS, False), ("repreguntas", SEGUIMIENTOS, True)):
+        errores = [p for p in preguntas_eval if heuristica.es_seguimiento(p) != esperado]
+        print(f"🔎 es_seguimiento, {nombre}: {len(preguntas_eval) - len(errores)}/{len(preguntas_eval)} bien clasificadas"
+              + (f" (fallan: {'; '.join(errores)})" if errores else ""))
+    heuristica.cerrar()
+
+    completo, memoria = totales["historial completo"], totales["memoria"]
+    ultimos = slice(-min(10, args.turnos), None)
+    crecimiento = np.polyfit(np.arange(len(memoria))[args.turnos // 2:], memoria[args.turnos // 2:], 1)[0] if args.turnos > 3 else 0.0
+    print(f"\n✅ Turnos {ultimos.start + args.turnos + 1}-{args.turnos}: {np.mean(memoria[ultimos]):,.0f} tokens por turno con memoria "
+          f"vs. {np.mean(completo[ultimos]):,.0f} con el historial completo "
+          f"({np.mean(memoria[ultimos]) / np.mean(completo[ultimos]):.0%}); pendiente en la segunda mitad: "
+          f"{crecimiento:+.1f} tokens por turno (historial completo: "
+          f"{np.polyfit(np.arange(len(completo)), completo, 1)[0]:+.1f})\n")
+
+
+if __name__ == "__main__":
+    main()
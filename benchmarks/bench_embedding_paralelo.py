@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark de ingesta con embedding en paralelo: fragmentos/s según cantidad de workers.
+
+Escribe un corpus sintético de Markdown en un directorio temporal y lo ingesta completo
+en una ChromaDB nueva para cada combinación de workers y tamaño de sub-lote, así que
+se mide el pipeline entero (lectura → embedding → escritura con back-pressure).
+
+    python benchmarks/bench_embedding_paralelo.py --fragmentos 4000 --workers 1 2 4
+    python benchmarks/bench_embedding_paralelo.py --real --lotes 16 32 64
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.embedding_paralelo import EmbeddingParalelo
+from cerebro.ingesta import ingestar_documentos
+from falsos import EmbeddingsHash, corpus_sintetico
+
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def escribir_corpus(directorio, n, por_archivo=50):
+    """Escribe `n` fragmentos sintéticos en archivos Markdown de `por_archivo` fragmentos."""
+    textos = corpus_sintetico(n, palabras_por_fragmento=60)
+    for i in range(0, n, por_archivo):
+        with open(os.path.join(directorio, f"doc_{i // por_archivo:05d}.md"), "w", encoding="utf-8") as f:
+            f.write("\n\n".join(textos[i:i + por_archivo]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de embedding en paralelo")
+    parser.add_argument("--fragmentos", type=int, default=4000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--lotes", type=int, nargs="+", default=[32], help="Tamaños de sub-lote por worker")
+    parser.add_argument("--costo-ms", type=float, default=2.0, help="Costo de CPU simulado por texto")
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings (all-MiniLM-L6-v2)")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        fabrica = partial(HuggingFaceEmbeddings, model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        fabrica = partial(EmbeddingsHash, costo=args.costo_ms / 1000, cpu=True)
+
+    raiz = tempfile.mkdtemp(prefix="bench_paralelo_")
+    corpus = os.path.join(raiz, "corpus")
+    os.makedirs(corpus)
+    escribir_corpus(corpus, args.fragmentos)
+    # Un fragmento sintético por párrafo: el splitter no los vuelve a cortar
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
+
+    print(f"\n📊 Ingesta de ~{args.fragmentos} fragmentos ({os.cpu_count()} núcleos)\n")
+    print(f"{'workers':>8}{'sub-lote':>10}{'arranque (s)':>14}{'ingesta (s)':>13}{'fragmentos/s':>14}{'speedup':>9}")
+    print("-" * 68)
+    base = None
+    try:
+        for lote in args.lotes:
+            for workers in args.workers:
+                embeddings = EmbeddingParalelo(fabrica, workers=workers, lote_worker=lote)
+                # Arranque: levantar los workers y cargar el modelo en cada uno
+                inicio = time.perf_counter()
+                embeddings.embed_documents(corpus_sintetico(lote * workers * 2, semilla=99))
+                arranque = time.perf_counter() - inicio
+
+                db = os.path.join(raiz, f"chroma_{workers}_{lote}")
+                inicio = time.perf_counter()
+                _, resumen = ingestar_documentos(
+                    [corpus], embeddings, db, splitter, lote=lote * workers, en_vuelo=2 * workers if workers > 1 else 0
+                )
+                duracion = time.perf_counter() - inicio
+                embeddings.cerrar()
+
+                velocidad = resumen.total_fragmentos / duracion
+                base = base or velocidad
+                print(f"{workers:>8}{lote:>10}{arranque:>14.2f}{duracion:>13.2f}{velocidad:>14,.0f}{velocidad / base:>8.2f}x")
+    finally:
+        shutil.rmtree(raiz, ignore_errors=True)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+Benchmark del modo especulativo del sistema híbrido: latencia ahorrada vs. tokens extra.
+
+Compara `responder_hibrido` secuencial y especulativo (ESPECULAR=1) sobre el servidor
+OpenAI falso, con latencia por petición y por token configurables, en los tres caminos
+de la estrategia:
+
+- documentación: la compuerta elige la documentación y la primera respuesta alcanza,
+- reintento: la respuesta con documentación es un "no sé" corto y se usa el prompt directo,
+- conocimiento propio: la compuerta descarta la documentación.
+
+La compuerta es fija por escenario (lo que se mide es la orquestación de las llamadas al
+LLM, no la calidad del ruteo). Los tokens son los que "cobra" el servidor falso: el prompt
+de cada petición más los tokens de respuesta enviados antes de que el cliente corte.
+
+    python benchmarks/bench_especulacion.py
+    python benchmarks/bench_especulacion.py --latencia 0.8 --latencia-token 0.02 --async
+    python benchmarks/bench_especulacion.py --mezcla 0.5 0.1 0.4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import httpx
+import numpy as np
+from langchain_openai import ChatOpenAI
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.cadenas import construir_cadenas
+from cerebro.ingesta import ingestar_documentos
+from cerebro.lexico import IndiceInvertido
+from cerebro.recuperacion import Recuperador
+from falsos import EmbeddingsHash
+from main_hybrid import responder_hibrido, responder_hibrido_async
+from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+EVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_relevancia.jsonl")
+RESPUESTA_LARGA = ("HenryPy se instala con pip install henrypy y se inicializa con henrypy.init(api_key=...). "
+                   "El análisis se habilita con el extra [analysis]. ")
+RESPUESTA_INSUFICIENTE = "No tengo información sobre esto."
+
+# (escenario, la compuerta elige la documentación, la primera respuesta es un "no sé")
+ESCENARIOS = [
+    ("documentación", True, False),
+    ("reintento", True, True),
+    ("conocimiento propio", False, False),
+]
+
+
+class CompuertaFija:
+    """Compuerta con la decisión del escenario."""
+
+    def __init__(self):
+        self.relevante = True
+
+    def evaluar(self, resultado):
+        return self.relevante
+
+
+def crear_respuesta(escenario):
+    """Respuesta del LLM falso según el prompt: el de documentación puede ser un "no sé"."""
+    def respuesta(peticion):
+        prompt = " ".join(str(m.get("content", "")) for m in peticion.get("messages", []))
+        if "Contexto de la documentación" in prompt and escenario["insuficiente"]:
+            return RESPUESTA_INSUFICIENTE
+        return RESPUESTA_LARGA
+    return respuesta
+
+
+def medir(preguntas, recuperador, crear_cadenas, compuerta, especular, streaming, asincrono):
+    """Responde cada pregunta; devuelve [(latencia, tiempo hasta el primer fragmento)]."""
+    mediciones = []
+
+    def cronometro():
+        inicio, primer = time.perf_counter(), []
+        al_recibir = (lambda fragmento, fuente: primer or primer.append(time.perf_counter())) if streaming else None
+
+        def fin():
+            ahora = time.perf_counter()
+            mediciones.append((ahora - inicio, (primer[0] if primer else ahora) - inicio))
+        return al_recibir, fin
+
+    if asincrono:
+        async def todas():
+            # Un cliente HTTP por event loop (asyncio.run crea uno nuevo)
+            cadenas = crear_cadenas(httpx.AsyncClient())
+            for pregunta in preguntas:
+                al_recibir, fin = cronometro()
+                await responder_hibrido_async(pregunta, recuperador, cadenas, al_recibir, compuerta=compuerta, especular=especular)
+                fin()
+        asyncio.run(todas())
+    else:
+        cadenas = crear_cadenas(None)
+        for pregunta in preguntas:
+            al_recibir, fin = cronometro()
+            responder_hibrido(pregunta, recuperador, cadenas, al_recibir, compuerta=compuerta, especular=especular)
+            fin()
+    return mediciones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia ahorrada vs. tokens extra del modo especulativo")
+    parser.add_argument("--preguntas", type=int, default=10, help="Preguntas por escenario y modo")
+    parser.add_argument("--latencia", type=float, default=0.4, help="Latencia del LLM falso hasta el primer token (s)")
+    parser.add_argument("--latencia-token", type=float, default=0.01, help="Tiempo de generar cada token (s)")
+    parser.add_argument("--costo-embedding-ms", type=float, default=30.0, help="Costo del embedding de la pregunta")
+    parser.add_argument("--sin-streaming", action="store_true", help="Sin streaming hacia el usuario (el modo secuencial usa invoke)")
+    parser.add_argument("--async", dest="asincrono", action="store_true", help="Medir responder_hibrido_async (servidor y lote)")
+    parser.add_argument("--mezcla", type=float, nargs=3, default=[0.6, 0.15, 0.25],
+                        metavar=("DOC", "REINTENTO", "PROPIO"), help="Proporción de cada escenario para el total")
+    args = parser.parse_args()
+
+    escenario = {"insuficiente": False}
+    config = ConfiguracionFalsa(latencia=args.latencia, respuesta=crear_respuesta(escenario), latencia_token=args.latencia_token)
+    _, base_url = iniciar_servidor(config)
+
+    def crear_cadenas(cliente_async):
+        opciones = {"http_async_client": cliente_async} if cliente_async is not None else {}
+        llm = ChatOpenAI(model="gpt-4o-mini", base_url=base_url, api_key="sk-falsa", temperature=0.1,
+                         max_tokens=500, stream_usage=True, **opciones)
+        return construir_cadenas(llm)
+
+    with open(EVAL, encoding="utf-8") as f:
+        preguntas = [json.loads(linea)["pregunta"] for linea in f if linea.strip()]
+    # Sin pedidos explícitos de "conocimiento propio": esos no pasan por la especulación
+    preguntas = [p for p in preguntas if "propio" not in p.lower() and "fuera" not in p.lower()][:args.preguntas]
+
+    directorio = tempfile.mkdtemp(prefix="bench_especulacion_")
+    try:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+        embeddings = EmbeddingsHash(costo=args.costo_embedding_ms / 1000)
+        vectorstore, _ = ingestar_documentos([os.path.join(RAIZ, "documentacion_tecnica.md")], embeddings, directorio, splitter)
+        recuperador = Recuperador(vectorstore, k=3, indice=IndiceInvertido.desde_vectorstore(vectorstore))
+        compuerta = CompuertaFija()
+
+        print(f"\n📊 Modo especulativo ({'responder_hibrido_async' if args.asincrono else 'responder_hibrido'}"
+              f"{', sin streaming' if args.sin_streaming else ''}) - LLM falso {args.latencia * 1e3:.0f} ms + "
+              f"{args.latencia_token * 1e3:.0f} ms/token, embedding {args.costo_embedding_ms:.0f} ms, "
+              f"{len(preguntas)} preguntas por escenario\n")
+        print(f"{'escenario':<22}{'modo':<14}{'p50 ms':>9}{'p95 ms':>9}{'TTFT ms':>9}{'llamadas':>10}{'tokens':>9}")
+        print("-" * 82)
+
+        totales = {}
+        for (nombre, relevante, insuficiente), peso in zip(ESCENARIOS, args.mezcla):
+            compuerta.relevante = relevante
+            escenario["insuficiente"] = insuficiente
+            filas = {}
+            for modo, especular in (("secuencial", False), ("especulativo", True)):
+                antes = (config.peticiones, config.tokens_prompt + config.tokens_respuesta)
+                mediciones = medir(preguntas, recuperador, crear_cadenas, compuerta, especular,
+                                            not args.sin_streaming, args.asincrono)
+                # Las ramas canceladas terminan de cortar su stream en el servidor
+                time.sleep(args.latencia + 0.2)
+                llamadas = (config.peticiones - antes[0]) / len(preguntas)
+                tokens = (config.tokens_prompt + config.tokens_respuesta - antes[1]) / len(preguntas)
+                latencias = np.array([latencia for latencia, _ in mediciones])
+                ttft = np.median([ttft for _, ttft in mediciones])
+                filas[modo] = (np.median(latencias), tokens)
+                print(f"{nombre if modo == 'secuencial' else '':<22}{modo:<14}{np.median(latencias) * 1e3:>9.0f}"
+                      f"{np.percentile(latencias, 95) * 1e3:>9.0f}{ttft * 1e3:>9.0f}{llamadas:>10.1f}{tokens:>9.0f}")
+            (lat_sec, tok_sec), (lat_esp, tok_esp) = filas["secuencial"], filas["especulativo"]
+            print(f"{'':<22}→ {(lat_sec - lat_esp) * 1e3:+.0f} ms ahorrados ({(lat_sec - lat_esp) / lat_sec:.0%}) "
+                  f"por {tok_esp - tok_sec:+.0f} tokens ({(tok_esp - tok_sec) / tok_sec:+.0%})\n")
+            for modo, (latencia, tokens) in filas.items():
+                acumulado = totales.setdefault(modo, [0.0, 0.0])
+                acumulado[0] += peso * latencia
+                acumulado[1] += peso * tokens
+
+        (lat_sec, tok_sec), (lat_esp, tok_esp) = totales["secuencial"], totales["especulativo"]
+        mezcla = " / ".join(f"{nombre} {peso:.0%}" for (nombre, _, _), peso in zip(ESCENARIOS, args.mezcla))
+        print(f"Mezcla ({mezcla}):")
+        print(f"   latencia p50 {lat_sec * 1e3:.0f} → {lat_esp * 1e3:.0f} ms ({(lat_esp - lat_sec) / lat_sec:+.0%}), "
+              f"tokens {tok_sec:.0f} → {tok_esp:.0f} por pregunta ({(tok_esp - tok_sec) / tok_sec:+.0%})")
+        if tok_esp > tok_sec:
+            print(f"   {(lat_sec - lat_esp) * 1e3 / (tok_esp - tok_sec):.1f} ms ahorrados por token extra\n")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Benchmark de índices vectoriales: ChromaDB vs. índices locales (exacto con mmap, IVF, HNSW,
+cuantizados int8 y binario con reordenamiento exacto).
+
+Para cada tamaño de corpus N genera vectores sintéticos normalizados (agrupados en temas,
+como los embeddings de fragmentos) y mide por índice:
+
+- construcción: segundos para armar el índice a partir de los vectores ya calculados
+  (en ChromaDB, agregarlos a la colección),
+- carga: abrir el índice ya construido en un proceso nuevo,
+- memoria: RSS del proceso que consulta, separando memoria anónima (privada) de páginas de
+  archivos mapeados (mmap: compartibles entre procesos y descartables por el sistema),
+- disco: tamaño de los archivos del índice,
+- latencia p50/p95 de una consulta (como en el chat: una pregunta por vez),
+- recall@k contra la búsqueda exacta.
+
+Cada medición corre en un proceso nuevo para que la memoria de una no contamine la otra.
+El índice HNSW necesita `hnswlib` (si no está instalado se omite). En int8 y binario, el
+disco incluye la matriz float32 (la segunda etapa la lee) y la memoria mmap muestra cuánto
+se lee de cada archivo: los códigos enteros y solo las filas candidatas de la matriz.
+
+    python benchmarks/bench_indices.py
+    python benchmarks/bench_indices.py --tamanos 1000 10000 100000 1000000 --max-chroma 100000
+    python benchmarks/bench_indices.py --indices exacto ivf --sondas 32
+    python benchmarks/bench_indices.py --indices chroma exacto int8 binario --sobremuestreo 8
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+
+from cerebro.indice_vectorial import (ARCHIVO_BINARIO, ARCHIVO_BINARIO_CODIGOS, ARCHIVO_HNSW, ARCHIVO_INT8,
+                                      ARCHIVO_INT8_CODIGOS, ARCHIVO_IVF, ARCHIVO_IVF_VECTORES, ARCHIVO_NORMAS,
+                                      ARCHIVO_VECTORES, BLOQUE, INDICES, IndiceExacto, IndiceHNSW, IndiceIVF,
+                                      hnsw_disponible)
+
+INDICES_BENCH = ("chroma", "exacto", "ivf", "hnsw", "int8", "binario")
+LOTE_CHROMA = 5000
+
+
+def memoria():
+    """(RSS anónimo, RSS de archivos mapeados) del proceso en bytes (Linux; si no, RSS máximo)."""
+    try:
+        valores = {}
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith(("RssAnon:", "RssFile:")):
+                    clave, valor, _ = linea.split()
+                    valores[clave] = int(valor) * 1024
+        return valores["RssAnon:"], valores["RssFile:"]
+    except (OSError, KeyError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, 0
+
+
+def tamano_en_disco(ruta):
+    if os.path.isfile(ruta):
+        return os.path.getsize(ruta)
+    return sum(os.path.getsize(os.path.join(d, a)) for d, _, archivos in os.walk(ruta) for a in archivos)
+
+
+def vectores_sinteticos(n, dim, rng, centros):
+    """Vectores normalizados alrededor de `centros` (temas del corpus)."""
+    tema = rng.integers(len(centros), size=n)
+    vectores = centros[tema] + rng.normal(scale=1.0 / np.sqrt(dim), size=(n, dim)).astype(np.float32)
+    return vectores / np.linalg.norm(vectores, axis=1, keepdims=True)
+
+
+def escribir_corpus(directorio, n, dim, semilla=0):
+    """
+    Escribe `vectores.npy` y `normas.npy` por bloques (1M x 384 no entra dos veces en memoria).
+
+    Returns:
+        np.ndarray: Centros de los temas (para generar consultas de la misma distribución)
+    """
+    rng = np.random.default_rng(semilla)
+    centros = rng.normal(size=(max(10, n // 1000), dim)).astype(np.float32)
+    centros /= np.linalg.norm(centros, axis=1, keepdims=True)
+    os.makedirs(directorio, exist_ok=True)
+    vectores = np.lib.format.open_memmap(os.path.join(directorio, ARCHIVO_VECTORES), mode="w+", dtype=np.float32, shape=(n, dim))
+    normas = np.empty(n, dtype=np.float32)
+    for inicio in range(0, n, BLOQUE):
+        bloque = vectores_sinteticos(min(BLOQUE, n - inicio), dim, rng, centros)
+        vectores[inicio:inicio + len(bloque)] = bloque
+        normas[inicio:inicio + len(bloque)] = np.einsum("ij,ij->i", bloque, bloque)
+    vectores.flush()
+    del vectores
+    np.save(os.path.join(directorio, ARCHIVO_NORMAS), normas)
+    return centros
+
+
+def opciones_indice(nombre, args):
+    if nombre == "ivf":
+        return {"sondas": args.sondas}
+    if nombre == "hnsw":
+        return {"ef": args.ef}
+    if nombre in ("int8", "binario"):
+        return {"sobremuestreo": args.sobremuestreo}
+    return {}
+
+
+# --- mediciones (cada una en un proceso nuevo) ----------------------------------------
+
+
+def construir(nombre, directorio):
+    """Segundos para construir el índice `nombre` sobre los vectores de `directorio`."""
+    inicio = time.perf_counter()
+    if nombre == "chroma":
+        import chromadb
+
+        vectores = np.load(os.path.join(directorio, ARCHIVO_VECTORES), mmap_mode="r")
+        coleccion = chromadb.PersistentClient(path=os.path.join(directorio, "chroma")).get_or_create_collection("bench")
+        for desde in range(0, len(vectores), LOTE_CHROMA):
+            bloque = np.asarray(vectores[desde:desde + LOTE_CHROMA])
+            coleccion.add(ids=[str(i) for i in range(desde, desde + len(bloque))], embeddings=bloque)
+    else:
+        INDICES[nombre].construir(directorio)
+    return time.perf_counter() - inicio
+
+
+def consultar(nombre, directorio, consultas, k, opciones):
+    """Abre el índice en este proceso y responde las consultas de a una."""
+    import gc
+
+    gc.collect()
+    anon_base, archivo_base = memoria()
+    inicio = time.perf_counter()
+    if nombre == "chroma":
+        import chromadb
+
+        anon_base, archivo_base = memoria()  # sin contar el import de chromadb
+        inicio = time.perf_counter()
+        coleccion = chromadb.PersistentClient(path=os.path.join(directorio, "chroma")).get_collection("bench")
+
+        def buscar(consulta):
+            resultado = coleccion.query(query_embeddings=[consulta], n_results=k, include=["distances"])
+            return [int(id_) for id_ in resultado["ids"][0]]
+    else:
+        indice = INDICES[nombre].cargar(directorio, **opciones)
+
+        def buscar(consulta):
+            return indice.buscar(consulta, k)[0][0].tolist()
+    carga = time.perf_counter() - inicio
+
+    filas, latencias = [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        filas.append(buscar(consulta))
+        latencias.append(time.perf_counter() - inicio)
+    anon, archivo = memoria()
+    return {"carga": carga, "latencias": latencias, "filas": filas,
+            "anon": anon - anon_base, "archivo": archivo - archivo_base}
+
+
+def en_proceso_nuevo(funcion, *argumentos):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as proceso:
+        return proceso.submit(funcion, *argumentos).result()
+
+
+def recall(filas, verdad, k):
+    return float(np.mean([len(set(f[:k]) & set(v[:k])) / k for f, v in zip(filas, verdad)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de índices vectoriales: ChromaDB vs. locales")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=384, help="Dimensión (all-MiniLM-L6-v2: 384)")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--indices", nargs="+", default=list(INDICES_BENCH), choices=INDICES_BENCH)
+    parser.add_argument("--max-chroma", type=int, default=100000, help="No medir ChromaDB por encima de este N (la ingesta es lenta)")
+    parser.add_argument("--sondas", type=int, default=IndiceIVF.SONDAS, help="Listas revisadas por consulta en IVF")
+    parser.add_argument("--ef", type=int, default=IndiceHNSW.EF, help="Candidatos explorados por consulta en HNSW")
+    parser.add_argument("--sobremuestreo", type=int, default=None,
+                        help="Candidatas por vecino que int8 y binario reordenan con la distancia exacta (por defecto, 4 y 32)")
+    args = parser.parse_args()
+
+    indices = list(args.indices)
+    if "hnsw" in indices and not hnsw_disponible():
+        print("⚠️  hnswlib no está instalado: se omite HNSW (pip install hnswlib)")
+        indices.remove("hnsw")
+
+    print(f"\n📊 Índices vectoriales - vectores sintéticos de dimensión {args.dim}, {args.consultas} consultas, k={args.k}")
+    print("   RSS anón: memoria privada del proceso que consulta; RSS mmap: páginas de archivos mapeados\n")
+    print(f"{'N':>9}  {'índice':<8}{'constr. s':>11}{'carga ms':>10}{'RSS anón MB':>13}{'RSS mmap MB':>13}"
+          f"{'disco MB':>10}{'p50 ms':>9}{'p95 ms':>9}{'recall@' + str(args.k):>11}")
+    print("-" * 105)
+    for n in args.tamanos:
+        directorio = tempfile.mkdtemp(prefix="bench_indices_")
+        try:
+            rng = np.random.default_rng(1)
+            centros = escribir_corpus(directorio, n, args.dim)
+            consultas = vectores_sinteticos(args.consultas, args.dim, rng, centros)
+            verdad = IndiceExacto.cargar(directorio).buscar(consultas, args.k)[0].tolist()
+            base_disco = tamano_en_disco(directorio)
+
+            for nombre in indices:
+                if nombre == "chroma" and n > args.max_chroma:
+                    print(f"{n:>9,}  {nombre:<8}{'(omitido: N > --max-chroma)':>40}")
+                    continue
+                opciones = opciones_indice(nombre, args)
+                segundos = en_proceso_nuevo(construir, nombre, directorio)
+                medicion = en_proceso_nuevo(consultar, nombre, directorio, consultas, args.k, opciones)
+                if nombre == "chroma":
+                    disco = tamano_en_disco(os.path.join(directorio, "chroma"))
+                else:
+                    # La matriz es compartida por los índices locales; IVF y HNSW suman su archivo
+                    extras = {"ivf": (ARCHIVO_IVF, ARCHIVO_IVF_VECTORES), "hnsw": (ARCHIVO_HNSW,),
+                              "int8": (ARCHIVO_INT8, ARCHIVO_INT8_CODIGOS),
+                              "binario": (ARCHIVO_BINARIO, ARCHIVO_BINARIO_CODIGOS)}.get(nombre, ())
+                    disco = base_disco + sum(tamano_en_disco(os.path.join(directorio, extra)) for extra in extras)
+                p50, p95 = np.percentile(medicion["latencias"], [50, 95]) * 1e3
+                print(f"{n:>9,}  {nombre:<8}{segundos:>11.2f}{medicion['carga'] * 1e3:>10.1f}{medicion['anon'] / 2**20:>13.1f}"
+                      f"{medicion['archivo'] / 2**20:>13.1f}{disco / 2**20:>10.1f}{p50:>9.2f}{p95:>9.2f}"
+                      f"{recall(medicion['filas'], verdad, args.k):>11.1%}")
+                if nombre in ("int8", "binario"):
+                    # El RSS mmap depende de cuánto mapea el kernel por fallo de página; esto es lo que se lee
+                    codigos = tamano_en_disco(os.path.join(directorio, extras[1]))
+                    filas = min(n, args.k * (args.sobremuestreo or INDICES[nombre].SOBREMUESTREO))
+                    print(f"{'':>11}└ por consulta: {codigos / 2**20:.1f} MB de códigos + {filas} filas float32 "
+                          f"({filas * args.dim * 4 / 2**10:.0f} KB) de una matriz de {n * args.dim * 4 / 2**20:.1f} MB")
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
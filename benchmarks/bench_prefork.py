@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Benchmark del servidor pre-fork: memoria por worker y QPS total según la cantidad de workers.
+
+Levanta `servidor.py` en un proceso aparte, primero en un solo proceso y después con
+`--workers N` para cada N, contra el servidor OpenAI falso y con `EmbeddingsPesadas`
+(embeddings hash con `--pesos-mb` MB residentes, como un modelo real cargado, y
+`--costo-embedding-ms` de CPU por texto). Para cada configuración:
+
+- QPS y latencia p50/p95 con `--concurrencia` usuarios (cada pregunta es distinta, así
+  que ninguna sale de una caché),
+- memoria de cada proceso desde /proc: RSS (cuenta las páginas compartidas en cada
+  proceso), PSS (las reparte entre quienes las comparten: la suma es la memoria real) y
+  privada (lo que es solo de ese proceso),
+- memoria total (PSS del padre + workers) contra N procesos independientes (N veces el
+  RSS del servidor de un solo proceso, cada uno con su copia del modelo).
+
+El QPS solo escala con los workers si hay núcleos libres: con un núcleo, el embedding de
+todos los workers se reparte el mismo CPU.
+
+    python benchmarks/bench_prefork.py
+    python benchmarks/bench_prefork.py --workers 2 4 8 --pesos-mb 400 --costo-embedding-ms 5 --hilos-modelo 1
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BENCHMARKS)
+sys.path[:0] = [RAIZ, BENCHMARKS]
+
+import httpx
+import numpy as np
+
+from carga_servidor import nivel_de_carga
+from cerebro.prefork import hijos, memoria_proceso
+from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+EVAL = os.path.join(BENCHMARKS, "eval_relevancia.jsonl")
+LANZADOR = """
+import functools, sys
+sys.path[:0] = {rutas!r}
+import falsos, servidor
+fabrica = functools.partial(falsos.EmbeddingsPesadas, pesos_mb={pesos_mb}, costo={costo}, cpu=True)
+if {workers} > 1:
+    servidor.servir_prefork("127.0.0.1", {puerto}, {workers}, {hilos_modelo}, fabrica_embeddings=fabrica)
+else:
+    servidor.servir_un_proceso("127.0.0.1", {puerto}, fabrica_embeddings=fabrica)
+"""
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def levantar(workers, args, directorio, entorno):
+    """Arranca servidor.py (1 = un solo proceso) y espera a que responda /salud."""
+    puerto = puerto_libre()
+    codigo = LANZADOR.format(rutas=[RAIZ, BENCHMARKS], pesos_mb=args.pesos_mb, costo=args.costo_embedding_ms / 1000,
+                             workers=workers, puerto=puerto, hilos_modelo=args.hilos_modelo)
+    proceso = subprocess.Popen([sys.executable, "-c", codigo], cwd=directorio, env=entorno,
+                               stdout=subprocess.DEVNULL if not args.verbose else None, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + args.espera
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"servidor.py terminó al arrancar (código {proceso.returncode}); ver --verbose")
+        try:
+            if httpx.get(f"{url}/salud", timeout=1).status_code == 200:
+                return proceso, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError("servidor.py no respondió a tiempo")
+
+
+def procesos_servidor(pid):
+    """El proceso principal y sus workers (hijos con la misma línea de comandos, no el resource tracker)."""
+    def comando(p):
+        try:
+            with open(f"/proc/{p}/cmdline", "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+    propio = comando(pid)
+    return pid, [hijo for hijo in hijos(pid) if comando(hijo) == propio]
+
+
+def medir(workers, args, directorio, entorno, preguntas):
+    proceso, url = levantar(workers, args, directorio, entorno)
+    try:
+        # Calentamiento: cada worker carga lo que le falte (cliente del LLM, tokenizador)
+        asyncio.run(nivel_de_carga(url, [f"calentamiento {i}" for i in range(4 * workers)], workers, 4 * workers, False))
+        latencias, _, errores, duracion = asyncio.run(
+            nivel_de_carga(url, preguntas, args.concurrencia, len(preguntas), False))
+        padre, trabajadores = procesos_servidor(proceso.pid)
+        memorias = [memoria_proceso(pid) for pid in trabajadores]
+        return {
+            "qps": len(latencias) / duracion,
+            "p50": float(np.percentile(latencias, 50)) * 1e3 if latencias else float("nan"),
+            "p95": float(np.percentile(latencias, 95)) * 1e3 if latencias else float("nan"),
+            "errores": errores,
+            "padre": memoria_proceso(padre),
+            "workers": memorias,
+        }
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        try:
+            proceso.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor pre-fork: RSS/PSS por worker y QPS según la cantidad de workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--peticiones", type=int, default=300)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--pesos-mb", type=int, default=400, help="Memoria del modelo de embeddings falso")
+    parser.add_argument("--costo-embedding-ms", type=float, default=5.0, help="CPU del embedding falso por texto")
+    parser.add_argument("--hilos-modelo", type=int, default=1, help="Hilos intra-op del modelo por worker")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia del LLM falso por petición (s)")
+    parser.add_argument("--espera", type=float, default=180, help="Segundos máximos para que arranque el servidor")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de servidor.py")
+    args = parser.parse_args()
+
+    _, base_url = iniciar_servidor(ConfiguracionFalsa(latencia=args.latencia, respuesta=(
+        "HenryPy se instala con pip install henrypy y se inicializa con henrypy.init(api_key=...). " * 2)))
+    with open(EVAL, encoding="utf-8") as f:
+        base = [json.loads(linea)["pregunta"] for linea in f if linea.strip()]
+    # Preguntas distintas en cada petición: ni la caché de embeddings ni la semántica las resuelven
+    preguntas = [f"{base[i % len(base)]} (consulta {i})" for i in range(args.peticiones)]
+
+    directorio = tempfile.mkdtemp(prefix="bench_prefork_")
+    shutil.copy(os.path.join(RAIZ, "documentacion_tecnica.md"), directorio)
+    entorno = {**os.environ, "OPENAI_API_KEY": "sk-falsa", "OPENAI_BASE_URL": base_url, "OPENAI_MODEL": "gpt-4o-mini",
+               "CACHE_SEMANTICA": "0", "TRAZAS": "0", "INDICE_VECTORIAL": "exacto", "PYTHONUNBUFFERED": "1"}
+
+    print(f"\n📊 Servidor pre-fork - modelo falso de {args.pesos_mb} MB, embedding {args.costo_embedding_ms:.0f} ms de CPU, "
+          f"LLM {args.latencia * 1e3:.0f} ms, {args.peticiones} peticiones con {args.concurrencia} usuarios, "
+          f"{os.cpu_count()} núcleo(s)\n")
+    print(f"{'modo':<14}{'QPS':>8}{'p50 ms':>9}{'p95 ms':>9}{'RSS/worker':>12}{'PSS/worker':>12}{'priv./worker':>14}"
+          f"{'total MB':>10}{'independientes':>16}")
+    print("-" * 104)
+    un_proceso = None
+    try:
+        for workers in [1, *args.workers]:
+            m = medir(workers, args, directorio, entorno, preguntas)
+            if workers == 1:
+                un_proceso = m["padre"]["rss"]
+                total, rss, pss, privada = m["padre"]["pss"], m["padre"]["rss"], m["padre"]["pss"], m["padre"]["privada"]
+                modo = "1 proceso"
+            else:
+                procesos = [m["padre"], *m["workers"]]
+                total = sum(p["pss"] for p in procesos)
+                rss, pss, privada = (np.mean([w[clave] for w in m["workers"]]) for clave in ("rss", "pss", "privada"))
+                modo = f"pre-fork x{len(m['workers'])}"
+            independientes = workers * un_proceso
+            print(f"{modo:<14}{m['qps']:>8.1f}{m['p50']:>9.0f}{m['p95']:>9.0f}{rss / 2**20:>12.0f}{pss / 2**20:>12.0f}"
+                  f"{privada / 2**20:>14.0f}{total / 2**20:>10.0f}{independientes / 2**20:>16.0f}"
+                  + (f"   ⚠️ {m['errores']} errores" if m["errores"] else ""))
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    print("\n   total: PSS del padre + workers; independientes: N procesos de un solo proceso, cada uno con su modelo\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Prueba de carga del servidor HTTP del sistema híbrido (servidor.py).
+
+Por defecto levanta todo en este proceso sin red ni modelos reales: el servidor OpenAI
+falso (con latencia configurable por petición y por token), embeddings falsos sobre el
+corpus del repo y el servidor HTTP en su propio event loop. Después envía preguntas con
+N usuarios concurrentes y reporta QPS y latencia p50/p95/p99 por nivel de concurrencia.
+
+    python benchmarks/carga_servidor.py --concurrencia 1 8 32 64 --peticiones 200
+    python benchmarks/carga_servidor.py --stream --latencia-token 0.01
+    python benchmarks/carga_servidor.py --url http://127.0.0.1:8000   # servidor.py ya levantado
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import httpx
+import numpy as np
+
+EVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_relevancia.jsonl")
+
+
+def levantar_servidor_local(args, directorio):
+    """Arma el sistema híbrido con componentes falsos y lo sirve en un hilo; devuelve la URL."""
+    from langchain_openai import ChatOpenAI
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    from cerebro.cadenas import construir_cadenas
+    from cerebro.ingesta import ingestar_documentos
+    from cerebro.lexico import sincronizar_indice_lexico
+    from cerebro.recuperacion import Recuperador
+    from cerebro.relevancia import crear_compuerta
+    from cerebro.servidor_http import ServidorHTTP
+    from falsos import EmbeddingsHash
+    from servidor import AplicacionHibrida, crear_cliente_http
+    from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+    respuesta = "HenryPy se instala con pip install henrypy y se inicializa con henrypy.init(api_key=...). " * 2
+    _, base_url = iniciar_servidor(ConfiguracionFalsa(latencia=args.latencia, respuesta=respuesta, latencia_token=args.latencia_token))
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+    corpus = [os.path.join(RAIZ, "documentacion_tecnica.md"), os.path.join(RAIZ, "docs")]
+    vectorstore, ingesta = ingestar_documentos(corpus, EmbeddingsHash(costo=args.costo_embedding_ms / 1000), directorio, splitter)
+    indice = sincronizar_indice_lexico(vectorstore, directorio, ingesta.version_corpus)
+    llm = ChatOpenAI(model="gpt-4o-mini", base_url=base_url, api_key="sk-falsa", temperature=0.1, max_tokens=500,
+                     http_async_client=crear_cliente_http(args.limite_llm))
+    aplicacion = AplicacionHibrida(Recuperador(vectorstore, k=3, indice=indice), construir_cadenas(llm), "gpt-4o-mini",
+                                   compuerta=crear_compuerta(indice), hilos=args.hilos, limite_llm=args.limite_llm)
+
+    listo = threading.Event()
+    direccion = {}
+
+    async def servir():
+        servidor = await ServidorHTTP(aplicacion.rutas()).iniciar("127.0.0.1", 0)
+        direccion["puerto"] = servidor.sockets[0].getsockname()[1]
+        listo.set()
+        await servidor.serve_forever()
+
+    # El servidor corre en su propio event loop para no competir con el generador de carga
+    threading.Thread(target=lambda: asyncio.run(servir()), daemon=True).start()
+    listo.wait()
+    return f"http://127.0.0.1:{direccion['puerto']}"
+
+
+async def una_peticion(cliente, url, pregunta, stream):
+    """Devuelve (latencia, ttft, ok)."""
+    inicio = time.perf_counter()
+    cuerpo = {"pregunta": pregunta, "stream": stream}
+    if not stream:
+        respuesta = await cliente.post(f"{url}/preguntar", json=cuerpo)
+        return time.perf_counter() - inicio, None, respuesta.status_code == 200
+    ttft = None
+    ok = False
+    async with cliente.stream("POST", f"{url}/preguntar", json=cuerpo) as respuesta:
+        async for linea in respuesta.aiter_lines():
+            if not linea:
+                continue
+            evento = json.loads(linea)
+            if ttft is None and "fragmento" in evento:
+                ttft = time.perf_counter() - inicio
+            if evento.get("fin"):
+                ok = respuesta.status_code == 200 and "error" not in evento
+    return time.perf_counter() - inicio, ttft, ok
+
+
+async def nivel_de_carga(url, preguntas, concurrencia, peticiones, stream):
+    """Envía `peticiones` preguntas con `concurrencia` usuarios simultáneos."""
+    latencias, ttfts, errores = [], [], 0
+    siguiente = iter(range(peticiones))
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(limits=limites, timeout=120) as cliente:
+        async def usuario():
+            nonlocal errores
+            for i in siguiente:
+                try:
+                    latencia, ttft, ok = await una_peticion(cliente, url, preguntas[i % len(preguntas)], stream)
+                except httpx.HTTPError:
+                    latencia, ttft, ok = None, None, False
+                if not ok:
+                    errores += 1
+                    continue
+                latencias.append(latencia)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(usuario() for _ in range(concurrencia)))
+        duracion = time.perf_counter() - inicio
+    return latencias, ttfts, errores, duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor HTTP híbrido")
+    parser.add_argument("--url", help="Servidor ya levantado (por defecto se levanta uno local con componentes falsos)")
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--peticiones", type=int, default=200, help="Peticiones por nivel de concurrencia")
+    parser.add_argument("--stream", action="store_true", help="Pedir respuestas en streaming (mide TTFT)")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latencia del LLM falso por petición (s)")
+    parser.add_argument("--latencia-token", type=float, default=0.0, help="Pausa entre tokens del LLM falso (s)")
+    parser.add_argument("--costo-embedding-ms", type=float, default=2.0, help="Costo del embedding falso por texto")
+    parser.add_argument("--hilos", type=int, default=8)
+    parser.add_argument("--limite-llm", type=int, default=32)
+    args = parser.parse_args()
+
+    with open(EVAL, encoding="utf-8") as f:
+        preguntas = [json.loads(linea)["pregunta"] for linea in f if linea.strip()]
+
+    directorio = tempfile.mkdtemp(prefix="carga_servidor_")
+    try:
+        url = args.url or levantar_servidor_local(args, directorio)
+        print(f"\n📊 Carga sobre {url} - {args.peticiones} peticiones por nivel"
+              f"{' (streaming)' if args.stream else ''}, LLM falso {args.latencia * 1e3:.0f} ms\n")
+        print(f"{'usuarios':>9}{'QPS':>9}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}"
+              f"{'TTFT p50':>11}{'errores':>9}")
+        print("-" * 71)
+        for concurrencia in args.concurrencia:
+            latencias, ttfts, errores, duracion = asyncio.run(
+                nivel_de_carga(url, preguntas, concurrencia, args.peticiones, args.stream)
+            )
+            p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1e3 if latencias else (float("nan"),) * 3
+            ttft = f"{np.percentile(ttfts, 50) * 1e3:.0f} ms" if ttfts else "-"
+            print(f"{concurrencia:>9}{len(latencias) / duracion:>9.1f}{p50:>11.0f}{p95:>11.0f}{p99:>11.0f}{ttft:>11}{errores:>9}")
+        print()
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
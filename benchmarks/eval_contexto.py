@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Evaluación offline del contexto empaquetado: tokens del prompt vs. cobertura de la respuesta.
+
+Compara el contexto fijo (los 3 mejores fragmentos unidos tal cual) con el de
+`EmpaquetadorContexto` para varios presupuestos de tokens, sobre `documentacion_tecnica.md`.
+Cada pregunta de `eval_contexto.jsonl` lista los hechos (textos literales de la
+documentación) que necesita una respuesta correcta; como el prompt prohíbe usar
+conocimiento fuera del contexto, la fracción de hechos presentes en el contexto acota la
+calidad de la respuesta sin llamar al LLM.
+
+Los tokens se cuentan con el tokenizador del modelo de chat (tiktoken); si no está
+disponible se usa la aproximación de `cerebro.contexto` y el reporte lo indica.
+
+    python benchmarks/eval_contexto.py
+    python benchmarks/eval_contexto.py --presupuestos 200 300 --candidatos 10 --real
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.cadenas import TEMPLATE_RAG
+from cerebro.contexto import CANDIDATOS, ContadorTokens, EmpaquetadorContexto
+from cerebro.ingesta import ingestar_documentos
+from cerebro.lexico import IndiceInvertido
+from cerebro.recuperacion import Recuperador
+from falsos import EmbeddingsHash
+
+EVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_contexto.jsonl")
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def evaluar(recuperador, preguntas, contar):
+    """Promedios de tokens, cobertura de hechos y bloques para un recuperador."""
+    tokens_contexto, tokens_prompt, cobertura, completas, bloques, tiempos = [], [], [], [], [], []
+    for pregunta, hechos in preguntas:
+        resultado = recuperador.recuperar(pregunta)
+        contexto = resultado.contexto
+        tokens_contexto.append(contar(contexto))
+        tokens_prompt.append(contar(TEMPLATE_RAG.format(context=contexto, question=pregunta)))
+        presentes = [hecho in contexto for hecho in hechos]
+        cobertura.append(np.mean(presentes))
+        completas.append(all(presentes))
+        bloques.append(len(resultado.docs))
+        tiempos.append(resultado.tiempos.get("contexto", 0.0))
+    return {
+        "tokens_contexto": float(np.mean(tokens_contexto)),
+        "tokens_prompt": float(np.mean(tokens_prompt)),
+        "cobertura": float(np.mean(cobertura)),
+        "completas": float(np.mean(completas)),
+        "bloques": float(np.mean(bloques)),
+        "empaquetado_ms": float(np.median(tiempos) * 1e3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Contexto empaquetado vs. k=3 fijo: tokens y cobertura")
+    parser.add_argument("--presupuestos", type=int, nargs="+", default=[150, 200, 250, 300, 400])
+    parser.add_argument("--candidatos", type=int, default=CANDIDATOS, help="Fragmentos que compiten por el presupuesto")
+    parser.add_argument("--modelo", default="gpt-4o-mini", help="Modelo de chat (elige el tokenizador)")
+    parser.add_argument("--solo-vectores", action="store_true", help="Sin BM25 (BUSQUEDA_HIBRIDA=0)")
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings (all-MiniLM-L6-v2)")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        embeddings = EmbeddingsHash()
+    contar = ContadorTokens(args.modelo)
+
+    with open(EVAL, encoding="utf-8") as f:
+        preguntas = [(dato["pregunta"], dato["hechos"]) for dato in map(json.loads, f) if dato]
+
+    directorio = tempfile.mkdtemp(prefix="eval_contexto_")
+    try:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+        vectorstore, ingesta = ingestar_documentos([os.path.join(RAIZ, "documentacion_tecnica.md")], embeddings, directorio, splitter)
+        indice = None if args.solo_vectores else IndiceInvertido.desde_vectorstore(vectorstore)
+
+        configuraciones = [("k=3 fijo", Recuperador(vectorstore, k=3, indice=indice))]
+        for presupuesto in args.presupuestos:
+            empaquetador = EmpaquetadorContexto(presupuesto, args.candidatos, contar)
+            configuraciones.append((f"{presupuesto} tokens", Recuperador(vectorstore, k=args.candidatos, indice=indice, empaquetador=empaquetador)))
+
+        print(f"\n📊 Contexto empaquetado - {len(preguntas)} preguntas, {ingesta.total_fragmentos} fragmentos, "
+              f"{args.candidatos} candidatos, búsqueda {'densa' if indice is None else 'híbrida'}, "
+              f"embeddings {'all-MiniLM-L6-v2' if args.real else 'hash'}")
+        print(f"   Tokens: {contar.nombre}\n")
+        print(f"{'contexto':<14}{'tok. contexto':>15}{'tok. prompt':>13}{'cobertura':>11}{'completas':>11}{'bloques':>9}{'empaq. ms':>11}")
+        print("-" * 84)
+        filas = {}
+        for nombre, recuperador in configuraciones:
+            fila = filas[nombre] = evaluar(recuperador, preguntas, contar)
+            print(f"{nombre:<14}{fila['tokens_contexto']:>15.0f}{fila['tokens_prompt']:>13.0f}{fila['cobertura']:>11.1%}"
+                  f"{fila['completas']:>11.1%}{fila['bloques']:>9.1f}{fila['empaquetado_ms']:>11.2f}")
+
+        base = filas["k=3 fijo"]
+        mejores = [(nombre, fila) for nombre, fila in filas.items()
+                   if nombre != "k=3 fijo" and fila["cobertura"] >= base["cobertura"] and fila["tokens_prompt"] < base["tokens_prompt"]]
+        if mejores:
+            nombre, fila = min(mejores, key=lambda par: par[1]["tokens_prompt"])
+            print(f"\n✅ {nombre}: {fila['tokens_prompt'] - base['tokens_prompt']:+.0f} tokens de prompt por pregunta "
+                  f"({(fila['tokens_prompt'] - base['tokens_prompt']) / base['tokens_prompt']:+.0%}) con cobertura "
+                  f"{fila['cobertura']:.1%} vs. {base['cobertura']:.1%} del k=3 fijo\n")
+        else:
+            print("\n⚠️  Ningún presupuesto iguala la cobertura del k=3 fijo con menos tokens\n")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
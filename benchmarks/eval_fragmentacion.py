@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Evaluación offline de la fragmentación: recall@k por caracteres vs. por estructura de Markdown.
+
+Compara sobre `documentacion_tecnica.md`:
+
+- caracteres: RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50), el de antes,
+- markdown: `DivisorMarkdown` (secciones y bloques, sin partir listas ni código),
+- markdown + secciones: además, cada fragmento encontrado se expande a su sección con
+  `IndiceSecciones` (sin otra consulta a la base vectorial).
+
+Cada pregunta de `eval_contexto.jsonl` lista los hechos (textos literales de la
+documentación) que necesita una respuesta correcta. recall@k es la fracción de hechos que
+aparecen completos dentro de alguno de los documentos recuperados con k resultados de la
+búsqueda: un hecho partido entre dos fragmentos no cuenta. También se informan los tokens
+de contexto, porque expandir a secciones trae más texto por resultado.
+
+    python benchmarks/eval_fragmentacion.py
+    python benchmarks/eval_fragmentacion.py --k 1 2 3 --solo-vectores --real
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.contexto import ContadorTokens
+from cerebro.fragmentacion import DivisorMarkdown, IndiceSecciones
+from cerebro.ingesta import ingestar_documentos
+from cerebro.lexico import IndiceInvertido
+from cerebro.recuperacion import Recuperador
+from falsos import EmbeddingsHash
+
+EVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_contexto.jsonl")
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def evaluar(recuperador, preguntas, contar):
+    """recall, preguntas completas, documentos y tokens de contexto promedio para un recuperador."""
+    recall, completas, documentos, tokens = [], [], [], []
+    for pregunta, hechos in preguntas:
+        resultado = recuperador.recuperar(pregunta)
+        presentes = [any(hecho in doc.page_content for doc in resultado.docs) for hecho in hechos]
+        recall.append(np.mean(presentes))
+        completas.append(all(presentes))
+        documentos.append(len(resultado.docs))
+        tokens.append(contar(resultado.contexto))
+    return {"recall": float(np.mean(recall)), "completas": float(np.mean(completas)),
+            "documentos": float(np.mean(documentos)), "tokens": float(np.mean(tokens))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recall@k: fragmentación por caracteres vs. por estructura de Markdown")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 2, 3, 5])
+    parser.add_argument("--tamano", type=int, default=500, help="Caracteres máximos por fragmento de DivisorMarkdown")
+    parser.add_argument("--solo-vectores", action="store_true", help="Sin BM25 (BUSQUEDA_HIBRIDA=0)")
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings (all-MiniLM-L6-v2)")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        embeddings = EmbeddingsHash()
+    contar = ContadorTokens()
+    with open(EVAL, encoding="utf-8") as f:
+        preguntas = [(dato["pregunta"], dato["hechos"]) for dato in map(json.loads, f) if dato]
+
+    documento = os.path.join(RAIZ, "documentacion_tecnica.md")
+    divisor = DivisorMarkdown(args.tamano)
+    configuraciones = [
+        ("caracteres 500/50", RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len), False),
+        (f"markdown {args.tamano}", divisor, False),
+        (f"markdown {args.tamano} + secciones", divisor, True),
+    ]
+
+    print(f"\n📊 Fragmentación - {len(preguntas)} preguntas, búsqueda {'densa' if args.solo_vectores else 'híbrida'}, "
+          f"embeddings {'all-MiniLM-L6-v2' if args.real else 'hash'}; tokens: {contar.nombre}\n")
+    print(f"{'fragmentación':<28}{'frag.':>7}" + "".join(f"{f'recall@{k}':>11}" for k in args.k)
+          + "".join(f"{f'tok.@{k}':>9}" for k in args.k) + f"{'completas@' + str(args.k[-1]):>15}")
+    print("-" * (50 + 20 * len(args.k)))
+    filas = {}
+    for nombre, splitter, expandir in configuraciones:
+        directorio = tempfile.mkdtemp(prefix="eval_fragmentacion_")
+        try:
+            vectorstore, ingesta = ingestar_documentos([documento], embeddings, directorio, splitter)
+            indice = None if args.solo_vectores else IndiceInvertido.desde_vectorstore(vectorstore)
+            secciones = IndiceSecciones.desde_vectorstore(vectorstore, splitter) if expandir else None
+            fila = filas[nombre] = {
+                k: evaluar(Recuperador(vectorstore, k=k, indice=indice, secciones=secciones), preguntas, contar) for k in args.k
+            }
+        finally:
+            shutil.rmtree(directorio, ignore_errors=True)
+        print(f"{nombre:<28}{ingesta.total_fragmentos:>7}" + "".join(f"{fila[k]['recall']:>11.1%}" for k in args.k)
+              + "".join(f"{fila[k]['tokens']:>9.0f}" for k in args.k) + f"{fila[args.k[-1]]['completas']:>15.1%}")
+
+    base = filas["caracteres 500/50"]
+    referencia = 3 if 3 in args.k else args.k[-1]
+    for nombre in list(filas)[1:]:
+        iguala = [k for k in args.k if filas[nombre][k]["recall"] >= base[referencia]["recall"]]
+        if iguala:
+            k = iguala[0]
+            print(f"\n✅ {nombre}: recall@{k} {filas[nombre][k]['recall']:.1%} con {filas[nombre][k]['tokens']:.0f} tokens "
+                  f"vs. recall@{referencia} {base[referencia]['recall']:.1%} con {base[referencia]['tokens']:.0f} tokens por caracteres")
+        else:
+            print(f"\n⚠️  {nombre}: no alcanza el recall@{referencia} por caracteres ({base[referencia]['recall']:.1%})")
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Evaluación offline de la compuerta de relevancia del chat híbrido.
+
+Ingesta el corpus del repo en una ChromaDB temporal, recupera una vez cada pregunta de
+`eval_relevancia.jsonl` (etiquetada según si se responde con la documentación) y compara
+la heurística anterior de palabras clave con la compuerta por distancia, con y sin
+cobertura léxica: exactitud de ruteo, precisión/recall y latencia por llamada.
+
+    python benchmarks/eval_relevancia.py            # embedder falso (sin descargas)
+    python benchmarks/eval_relevancia.py --real     # all-MiniLM-L6-v2, para calibrar RELEVANCIA_UMBRAL
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from cerebro.ingesta import ingestar_documentos
+from cerebro.lexico import IndiceInvertido
+from cerebro.recuperacion import Recuperador
+from cerebro.relevancia import CompuertaRelevancia, calibrar_umbral
+from falsos import EmbeddingsHash
+
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
+CORPUS = [os.path.join(RAIZ, "documentacion_tecnica.md"), os.path.join(RAIZ, "docs")]
+EVAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval_relevancia.jsonl")
+
+
+def heuristica_anterior(docs, pregunta):
+    """`evaluar_relevancia_documentos` de main_hybrid.py antes de la compuerta (línea base)."""
+    if not docs or len(docs) == 0:
+        return False
+    contenido_texto = " ".join(doc.page_content.lower() for doc in docs)
+    contenido_total = len(contenido_texto)
+    if contenido_total < 50:
+        return False
+    palabras_pregunta = set(pregunta.lower().split())
+    palabras_ignorar = {
+        'qué', 'cómo', 'cuándo', 'dónde', 'por', 'para', 'con', 'de', 'la', 'el', 'un', 'una',
+        'es', 'son', 'está', 'están', 'sobre', 'el', 'la', 'los', 'las', 'un', 'una',
+        'y', 'o', 'pero', 'si', 'no', 'en', 'a', 'de', 'que', 'se', 'le', 'te', 'me', 'nos', 'les',
+        'puedes', 'puede', 'puedo', 'pueden', 'pueda', 'puedan', 'para', 'que', 'sirve', 'sirven',
+        'consultar', 'fuera', 'fuentes', 'tus', 'sus', 'mis', 'nuestros', 'vuestros',
+        'trata', 'se', 'trata', 'como', 'instala', 'instalar'
+    }
+    palabras_clave = palabras_pregunta - palabras_ignorar
+    if contenido_total > 200:
+        palabras_importantes = [p for p in palabras_clave if len(p) > 3]
+        if len(palabras_importantes) == 0:
+            return True
+        if any(palabra in contenido_texto for palabra in palabras_importantes):
+            return True
+    if contenido_total >= 50:
+        if sum(1 for palabra in palabras_clave if len(palabra) > 2 and palabra in contenido_texto) > 0:
+            return True
+    return False
+
+
+def metricas(predicciones, etiquetas):
+    predicciones, etiquetas = np.asarray(predicciones, dtype=bool), np.asarray(etiquetas, dtype=bool)
+    vp = (predicciones & etiquetas).sum()
+    return {
+        "exactitud": float((predicciones == etiquetas).mean()),
+        "precision": float(vp / max(predicciones.sum(), 1)),
+        "recall": float(vp / max(etiquetas.sum(), 1)),
+    }
+
+
+def latencia(funcion, resultados, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for resultado in resultados:
+            funcion(resultado)
+    return (time.perf_counter() - inicio) / (repeticiones * len(resultados))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluación de la compuerta de relevancia")
+    parser.add_argument("--real", action="store_true", help="Usar HuggingFaceEmbeddings (all-MiniLM-L6-v2)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeticiones", type=int, default=200, help="Rondas para medir latencia")
+    args = parser.parse_args()
+
+    if args.real:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name=MODELO_EMBEDDINGS, model_kwargs={"device": "cpu"})
+    else:
+        embeddings = EmbeddingsHash()
+
+    with open(EVAL, encoding="utf-8") as f:
+        casos = [json.loads(linea) for linea in f if linea.strip()]
+    etiquetas = [c["documentacion"] for c in casos]
+
+    directorio = tempfile.mkdtemp(prefix="eval_relevancia_")
+    try:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+        vectorstore, ingesta = ingestar_documentos(CORPUS, embeddings, directorio, splitter)
+        recuperador = Recuperador(vectorstore, k=args.k)
+        resultados = [recuperador.recuperar(c["pregunta"]) for c in casos]
+
+        inicio = time.perf_counter()
+        indice = IndiceInvertido.desde_vectorstore(vectorstore)
+        t_indice = time.perf_counter() - inicio
+
+        distancias = np.array([r.scores for r in resultados])
+        umbral_calibrado, _ = calibrar_umbral(distancias, etiquetas)
+        metodos = {
+            "Heurística anterior": lambda r: heuristica_anterior(r.docs, r.pregunta),
+            "Distancia (umbral por defecto)": CompuertaRelevancia().evaluar,
+            "Distancia + léxico (por defecto)": CompuertaRelevancia(indice=indice).evaluar,
+            f"Distancia (calibrado {umbral_calibrado:.3f})": CompuertaRelevancia(umbral=umbral_calibrado, margen=0).evaluar,
+            f"Distancia + léxico (calibrado)": CompuertaRelevancia(umbral=umbral_calibrado, indice=indice).evaluar,
+        }
+
+        print(f"\n📊 Compuerta de relevancia - {len(casos)} preguntas ({sum(etiquetas)} de la documentación), "
+              f"{ingesta.total_fragmentos} fragmentos, k={args.k}")
+        print(f"   Índice invertido: {len(indice.vocabulario)} términos, construido en {t_indice * 1e3:.1f} ms\n")
+        print(f"{'método':<36}{'exactitud':>10}{'precisión':>11}{'recall':>8}{'µs/llamada':>12}")
+        print("-" * 77)
+        for nombre, funcion in metodos.items():
+            m = metricas([funcion(r) for r in resultados], etiquetas)
+            t = latencia(funcion, resultados, args.repeticiones)
+            print(f"{nombre:<36}{m['exactitud']:>10.1%}{m['precision']:>11.1%}{m['recall']:>8.1%}{t * 1e6:>12.1f}")
+
+        errores = [c["pregunta"] for c, r in zip(casos, resultados)
+                   if CompuertaRelevancia(umbral=umbral_calibrado, indice=indice).evaluar(r) != c["documentacion"]]
+        if errores:
+            print("\n❌ Mal ruteadas (calibrado + léxico):")
+            for pregunta in errores:
+                print(f"   - {pregunta}")
+        print(f"\n💡 Umbral calibrado para este embedder: RELEVANCIA_UMBRAL={umbral_calibrado:.3f} "
+              "(calibrado sobre el mismo conjunto: la exactitud es optimista)\n")
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Componentes falsos y deterministas para correr benchmarks sin red ni modelos reales.
+"""
+
+import hashlib
+import random
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingsHash(Embeddings):
+    """
+    Embeddings deterministas derivados del hash de cada palabra (bolsa de palabras hasheada).
+
+    Textos con palabras en común quedan cerca, así que la búsqueda por similitud tiene
+    sentido. `costo` simula el tiempo por texto (segundos) de un modelo real: con
+    `cpu=True` es cómputo activo (ocupa un núcleo, como un encoder en CPU), si no, espera.
+    """
+
+    def __init__(self, dim=384, costo=0.0, cpu=False):
+        self.dim = dim
+        self.costo = costo
+        self.cpu = cpu
+        self.llamadas = 0
+        self.textos = 0
+
+    def _vector(self, texto):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for palabra in texto.lower().split():
+            h = int.from_bytes(hashlib.blake2b(palabra.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        norma = np.linalg.norm(v)
+        return v / norma if norma else v
+
+    def embed_documents(self, texts):
+        self.llamadas += 1
+        self.textos += len(texts)
+        if self.costo and self.cpu:
+            # Tiempo de CPU del proceso, no de reloj: con más workers que núcleos no escala
+            fin = time.process_time() + self.costo * len(texts)
+            while time.process_time() < fin:
+                pass
+        elif self.costo:
+            time.sleep(self.costo * len(texts))
+        return [self._vector(t).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class EmbeddingsPesadas(EmbeddingsHash):
+    """
+    EmbeddingsHash con `pesos_mb` MB de "pesos" residentes en memoria, como un modelo real
+    ya cargado (sentence-transformers + torch rondan los 400 MB de RSS).
+
+    Sirve para medir memoria entre procesos: los pesos se escriben una vez al crearse y
+    después solo se leen, así que un fork los comparte copy-on-write.
+    """
+
+    def __init__(self, pesos_mb=400, **kwargs):
+        super().__init__(**kwargs)
+        self.pesos = np.random.default_rng(0).standard_normal(pesos_mb * 2**20 // 4, dtype=np.float32)
+
+
+def corpus_sintetico(n, palabras_por_fragmento=80, semilla=0):
+    """Genera `n` fragmentos de texto pseudo-aleatorios (vocabulario de 5000 palabras)."""
+    rng = random.Random(semilla)
+    vocabulario = [f"termino{i}" for i in range(5000)]
+    return [" ".join(rng.choices(vocabulario, k=palabras_por_fragmento)) for _ in range(n)]
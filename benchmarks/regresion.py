@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""
+Benchmark de regresión offline de los tres caminos del proyecto, sin API key ni red.
+
+Cada camino corre en un proceso nuevo y en un directorio temporal (base vectorial y cachés
+en frío). Usa el servidor OpenAI falso como modelo de chat, con respuestas deterministas
+según el prompt, y `EmbeddingsHash` como modelo de embeddings:
+
+- rag: `configurar_rag` de main.py y `responder` para cada pregunta,
+- hibrido: `configurar_sistema_hibrido` de main_hybrid.py y `responder_hibrido`,
+- sin_contexto: `model_without_context.main` con las preguntas como entrada del chat.
+
+Por camino registra la latencia de configuración, la p50 de la respuesta y de cada etapa
+(las trazas de `cerebro.trazas`), las llamadas al LLM y los tokens de prompt (los que
+cobra el servidor falso), las recuperaciones, los embeddings de consultas y el RSS máximo
+del proceso.
+
+Compara contra `regresion_base.json` y termina con código 1 si alguna métrica empeora:
+más llamadas de las de la base (cualquier aumento), más tokens de prompt (con
+`--tolerancia-tokens`), más latencia (con `--tolerancia` relativa y un piso absoluto en
+ms, para absorber el ruido) o más memoria (`--tolerancia-memoria`).
+
+    python benchmarks/regresion.py                 # compara contra la base
+    python benchmarks/regresion.py --actualizar    # guarda la corrida como nueva base
+    python benchmarks/regresion.py --caminos rag hibrido --tolerancia 1.0
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, RAIZ)
+
+EVAL = os.path.join(BENCHMARKS, "eval_relevancia.jsonl")
+BASE = os.path.join(BENCHMARKS, "regresion_base.json")
+CAMINOS = ("rag", "hibrido", "sin_contexto")
+# Configuración fija para que las llamadas sean las mismas en cada corrida
+ENTORNO = {
+    "OPENAI_API_KEY": "sk-falsa",
+    "OPENAI_MODEL": "gpt-4o-mini",
+    "STREAMING": "0",
+    "ESPECULAR": "0",
+    "EMBEDDING_WORKERS": "1",
+    "CACHE_SEMANTICA": "1",
+    "BUSQUEDA_HIBRIDA": "1",
+    "INDICE_VECTORIAL": "chroma",
+    "MEMORIA": "1",
+    "TRAZAS": "0",
+}
+# El chat sin contexto: preguntas nuevas y repreguntas (la memoria resume las viejas)
+CHARLA = [
+    "¿Qué es Python?", "¿Y cuáles son sus ventajas?", "¿Qué es una API REST?", "Dame un ejemplo de eso",
+    "¿Cómo instalo la librería HenryPy?", "¿Qué es un decorador en Python?", "¿Y un generador?",
+    "¿Qué diferencia hay entre ellos?", "¿Qué es Docker?", "¿Y Kubernetes?",
+]
+RESPUESTA_DOCUMENTACION = ("Según la documentación, HenryPy se instala con pip install henrypy y se inicializa con "
+                           "henrypy.init(api_key=...). El análisis avanzado requiere el extra [analysis] y la "
+                           "refactorización profunda se pide con level='deep'. ")
+RESPUESTA_GENERAL = ("Python es un lenguaje de programación interpretado, de tipado dinámico y multiparadigma, "
+                     "muy usado en ciencia de datos, automatización y desarrollo web. ")
+RESPUESTA_SIN_INFORMACION = "No tengo información sobre esto en la documentación."
+# Preguntas que el LLM falso "no encuentra" en la documentación (camino de reintento)
+_SIN_INFORMACION = re.compile(r"licencia|precio|versión 2|roadmap", re.IGNORECASE)
+
+
+def respuesta_falsa(peticion):
+    """LLM determinista: la respuesta depende solo del tipo de prompt y de la pregunta."""
+    prompt = "\n".join(str(m.get("content", "")) for m in peticion.get("messages", []))
+    if "Actualiza el resumen" in prompt:
+        return "El usuario preguntó por Python, APIs y herramientas de desarrollo."
+    if "Reformula la última pregunta" in prompt:
+        ultima = re.search(r"Última pregunta: (.*)", prompt)
+        return ultima.group(1) if ultima else ""
+    if "Contexto de la documentación" in prompt or "Documentación:" in prompt:
+        pregunta = re.search(r"Pregunta(?: del usuario)?: (.*)", prompt)
+        if pregunta and _SIN_INFORMACION.search(pregunta.group(1)):
+            return RESPUESTA_SIN_INFORMACION
+        return RESPUESTA_DOCUMENTACION * 2
+    return RESPUESTA_GENERAL * 2
+
+
+def rss_maximo():
+    """RSS máximo del proceso en bytes."""
+    import resource
+
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximo if sys.platform == "darwin" else maximo * 1024
+
+
+def _preparar(directorio, latencia):
+    """Entorno del proceso del camino: servidor falso, directorio temporal y variables fijas."""
+    from servidor_openai_falso import ConfiguracionFalsa, iniciar_servidor
+
+    config = ConfiguracionFalsa(latencia=latencia, respuesta=respuesta_falsa)
+    _, base_url = iniciar_servidor(config)
+    os.environ.update(ENTORNO, OPENAI_BASE_URL=base_url)
+    os.chdir(directorio)
+    shutil.copy(os.path.join(RAIZ, "documentacion_tecnica.md"), directorio)
+    return config
+
+
+def correr_camino(camino, preguntas, latencia):
+    """
+    Corre un camino completo en este proceso (se llama en un proceso nuevo).
+
+    Returns:
+        dict: Métricas del camino
+    """
+    sys.path.insert(0, BENCHMARKS)
+    from falsos import EmbeddingsHash
+
+    directorio = tempfile.mkdtemp(prefix=f"regresion_{camino}_")
+    try:
+        config = _preparar(directorio, latencia)
+        from cerebro.trazas import AgregadorTrazas, Traza
+
+        agregador = AgregadorTrazas()
+        embeddings = EmbeddingsHash()
+        silencio = io.StringIO()
+        metricas = {"preguntas": len(preguntas)}
+
+        inicio = time.perf_counter()
+        if camino == "rag":
+            import main
+
+            with contextlib.redirect_stdout(silencio):
+                rag_chain, modelo, recuperador, cache, conversacion = main.configurar_rag(
+                    aviso=lambda *_, **__: None, fabrica_embeddings=lambda: embeddings)
+        elif camino == "hibrido":
+            import main_hybrid
+
+            with contextlib.redirect_stdout(silencio):
+                recuperador, cadenas, modelo, _, cache, compuerta = main_hybrid.configurar_sistema_hibrido(
+                    fabrica_embeddings=lambda: embeddings)
+        metricas["configuracion_ms"] = round((time.perf_counter() - inicio) * 1e3, 1)
+        antes = (config.peticiones, config.tokens_prompt, embeddings.llamadas)
+
+        if camino == "sin_contexto":
+            import model_without_context
+
+            # Cada pregunta del chat es una traza con una sola etapa: la respuesta completa
+            entradas = iter(list(preguntas) + ["salir"])
+            en_curso = []
+
+            def entrada(_=""):
+                if en_curso:
+                    traza = en_curso.pop()
+                    traza.agregar("respuesta", time.perf_counter() - traza.inicio)
+                    agregador.registrar(traza.cerrar().como_dict())
+                pregunta = next(entradas)
+                traza = Traza(pregunta)
+                traza.inicio = time.perf_counter()
+                en_curso.append(traza)
+                return pregunta
+
+            input_original, builtins.input = builtins.input, entrada
+            try:
+                with contextlib.redirect_stdout(silencio):
+                    model_without_context.main()
+            finally:
+                builtins.input = input_original
+        else:
+            for pregunta in preguntas:
+                traza = Traza(pregunta)
+                if camino == "rag":
+                    main.responder(pregunta, rag_chain, recuperador, cache, traza=traza)
+                else:
+                    main_hybrid.responder_hibrido(pregunta, recuperador, cadenas, cache=cache, compuerta=compuerta, traza=traza)
+                agregador.registrar(traza.cerrar().como_dict())
+
+        resumen = agregador.como_dict()
+        metricas.update(
+            llamadas_llm=config.peticiones - antes[0],
+            tokens_prompt=config.tokens_prompt - antes[1],
+            embeddings_consultas=embeddings.llamadas - antes[2],
+            recuperaciones=resumen["etapas"].get("busqueda", {}).get("n", 0),
+            total_p50_ms=resumen["total"]["p50_ms"],
+            etapas_p50_ms={etapa: datos["p50_ms"] for etapa, datos in sorted(resumen["etapas"].items())},
+            rss_mb=round(rss_maximo() / 2**20, 1),
+        )
+        return metricas
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def en_proceso_nuevo(funcion, *argumentos):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as proceso:
+        return proceso.submit(funcion, *argumentos).result()
+
+
+def preguntas_de(camino):
+    """Preguntas de cada camino: las de eval_relevancia (con repeticiones para la caché) o la charla."""
+    if camino == "sin_contexto":
+        return CHARLA
+    with open(EVAL, encoding="utf-8") as f:
+        preguntas = [json.loads(linea)["pregunta"] for linea in f if linea.strip()]
+    preguntas += ["¿Qué licencia tiene HenryPy?", "¿Cuál es el precio de HenryPy?"]
+    # Las primeras se repiten al final: la segunda vez deberían salir de la caché semántica
+    return preguntas + preguntas[:5]
+
+
+def comparar(camino, actual, base, args):
+    """Lista de (métrica, base, actual, empeoró)."""
+    filas = []
+    for clave in ("llamadas_llm", "embeddings_consultas", "recuperaciones"):
+        filas.append((clave, base[clave], actual[clave], actual[clave] > base[clave]))
+    filas.append(("tokens_prompt", base["tokens_prompt"], actual["tokens_prompt"],
+                  actual["tokens_prompt"] > base["tokens_prompt"] * (1 + args.tolerancia_tokens)))
+    latencias = [("configuracion_ms", base["configuracion_ms"], actual["configuracion_ms"]),
+                 ("total_p50_ms", base["total_p50_ms"], actual["total_p50_ms"])]
+    latencias += [(f"{etapa} p50 ms", valor, actual["etapas_p50_ms"].get(etapa, 0.0))
+                  for etapa, valor in base["etapas_p50_ms"].items()]
+    for clave, valor_base, valor in latencias:
+        filas.append((clave, valor_base, valor, valor > valor_base * (1 + args.tolerancia) + args.piso_ms))
+    filas.append(("rss_mb", base["rss_mb"], actual["rss_mb"], actual["rss_mb"] > base["rss_mb"] * (1 + args.tolerancia_memoria)))
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regresiones de llamadas, latencia y memoria contra una base guardada")
+    parser.add_argument("--caminos", nargs="+", default=list(CAMINOS), choices=CAMINOS)
+    parser.add_argument("--latencia", type=float, default=0.02, help="Latencia del LLM falso por petición (s)")
+    parser.add_argument("--base", default=BASE, help="Archivo JSON de la base")
+    parser.add_argument("--actualizar", action="store_true", help="Guardar esta corrida como base (sin comparar)")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="Aumento relativo de latencia tolerado")
+    parser.add_argument("--piso-ms", type=float, default=5.0, help="Aumento absoluto de latencia siempre tolerado (ms)")
+    parser.add_argument("--tolerancia-tokens", type=float, default=0.1, help="Aumento relativo de tokens de prompt tolerado")
+    parser.add_argument("--tolerancia-memoria", type=float, default=0.25, help="Aumento relativo de RSS tolerado")
+    args = parser.parse_args()
+
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+
+    print(f"\n📊 Regresión offline - LLM falso ({args.latencia * 1e3:.0f} ms por petición) y embeddings hash\n")
+    print(f"{'camino':<14}{'preguntas':>10}{'config ms':>11}{'p50 ms':>9}{'llamadas LLM':>14}{'tokens':>9}"
+          f"{'recuperac.':>12}{'emb. consultas':>16}{'RSS MB':>9}")
+    print("-" * 104)
+    resultados = {}
+    for camino in args.caminos:
+        m = resultados[camino] = en_proceso_nuevo(correr_camino, camino, preguntas_de(camino), args.latencia)
+        print(f"{camino:<14}{m['preguntas']:>10}{m['configuracion_ms']:>11.0f}{m['total_p50_ms']:>9.1f}{m['llamadas_llm']:>14}"
+              f"{m['tokens_prompt']:>9}{m['recuperaciones']:>12}{m['embeddings_consultas']:>16}{m['rss_mb']:>9.0f}")
+        print("   etapas p50 ms: " + ", ".join(f"{etapa} {ms:.1f}" for etapa, ms in m["etapas_p50_ms"].items()))
+
+    if args.actualizar:
+        base.update(resultados)
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(base, f, indent=1, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"\n💾 Base actualizada: {os.path.relpath(args.base, RAIZ)} ({', '.join(resultados)})\n")
+        return
+
+    regresiones = 0
+    for camino, actual in resultados.items():
+        if camino not in base:
+            print(f"\n⚠️  {camino}: sin base para comparar (python benchmarks/regresion.py --actualizar)")
+            continue
+        empeoradas = [fila for fila in comparar(camino, actual, base[camino], args) if fila[3]]
+        regresiones += len(empeoradas)
+        if not empeoradas:
+            print(f"\n✅ {camino}: sin regresiones")
+        for clave, valor_base, valor, _ in empeoradas:
+            print(f"\n❌ {camino}: {clave} {valor_base:,.1f} → {valor:,.1f}" if isinstance(valor, float)
+                  else f"\n❌ {camino}: {clave} {valor_base:,} → {valor:,}")
+    print()
+    if regresiones:
+        print(f"❌ {regresiones} regresiones contra {os.path.relpath(args.base, RAIZ)}\n")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
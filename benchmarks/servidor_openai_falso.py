@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+"""
+Servidor local que imita la API HTTP de OpenAI (chat completions).
+
+Permite ejecutar los scripts y benchmarks sin API key real ni costo:
+
+    python benchmarks/servidor_openai_falso.py --puerto 8765 --modelos gpt-4o-mini
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=sk-falsa python main.py
+
+También se puede levantar en un hilo desde Python con `iniciar_servidor()`.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPUESTA_POR_DEFECTO = "Respuesta de prueba del servidor falso."
+
+
+class ConfiguracionFalsa:
+    """Comportamiento del servidor falso (modificable mientras corre)."""
+
+    def __init__(self, modelos=None, latencia=0.0, respuesta=RESPUESTA_POR_DEFECTO, latencia_token=0.0,
+                 limite_rpm=None, fallas=0.0, retry_after=1.0, semilla=0):
+        self.modelos = set(modelos) if modelos else None  # None = acepta cualquier modelo
+        self.latencia = latencia  # segundos (float), dict {modelo: segundos} o función(peticion) -> segundos
+        self.respuesta = respuesta  # string o función(peticion) -> string
+        self.latencia_token = latencia_token  # tiempo de generar cada token (con o sin streaming)
+        # Límite de tasa como el de la API: peticiones por minuto aplicadas por segundo (cubeta
+        # de un segundo de capacidad); lo que se pasa recibe 429 con el Retry-After exacto
+        self.limite_rpm = limite_rpm
+        # Fracción de peticiones que reciben 429 al azar (sobrecarga), con `retry_after`
+        # segundos en el encabezado (None = sin Retry-After)
+        self.fallas = fallas
+        self.retry_after = retry_after
+        self.peticiones = 0
+        self.rechazadas = 0  # respuestas 429
+        self._azar = random.Random(semilla)
+        self._saldo = None
+        self._ultimo = time.monotonic()
+        # Tokens "cobrados": el prompt de cada petición y los tokens de respuesta efectivamente
+        # enviados (un stream que el cliente corta deja de sumar)
+        self.tokens_prompt = 0
+        self.tokens_respuesta = 0
+        self._lock = threading.Lock()
+
+    def latencia_para(self, peticion):
+        if callable(self.latencia):
+            return self.latencia(peticion)
+        if isinstance(self.latencia, dict):
+            return self.latencia.get(peticion.get("model", ""), 0.0)
+        return self.latencia
+
+    def facturar(self, prompt=0, respuesta=0):
+        with self._lock:
+            self.tokens_prompt += prompt
+            self.tokens_respuesta += respuesta
+
+    def contar(self):
+        with self._lock:
+            self.peticiones += 1
+
+    def admitir(self):
+        """(admitida, retry_after): si la petición pasa y, si no, los segundos para el encabezado Retry-After."""
+        with self._lock:
+            if self.limite_rpm:
+                tasa = self.limite_rpm / 60
+                ahora = time.monotonic()
+                capacidad = max(1.0, tasa)
+                self._saldo = capacidad if self._saldo is None else min(capacidad, self._saldo + (ahora - self._ultimo) * tasa)
+                self._ultimo = ahora
+                if self._saldo < 1:
+                    self.rechazadas += 1
+                    return False, (1 - self._saldo) / tasa
+                self._saldo -= 1
+            if self.fallas and self._azar.random() < self.fallas:
+                self.rechazadas += 1
+                return False, self.retry_after
+        return True, None
+
+
+class _ManejadorOpenAI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = None  # se asigna por servidor en iniciar_servidor()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, estado, cuerpo, encabezados=None):
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(estado)
+        for clave, valor in (encabezados or {}).items():
+            self.send_header(clave, valor)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _error(self, estado, mensaje, codigo):
+        self._json(estado, {"error": {"message": mensaje, "type": "invalid_request_error", "code": codigo}})
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            modelos = sorted(self.config.modelos or [])
+            self._json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in modelos]})
+        else:
+            self._error(404, f"Ruta desconocida: {self.path}", "not_found")
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        peticion = json.loads(self.rfile.read(largo) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._error(404, f"Ruta desconocida: {self.path}", "not_found")
+            return
+
+        config = self.config
+        config.contar()
+        admitida, espera = config.admitir()
+        if not admitida:
+            # Como la API real: el 429 sale enseguida, sin la latencia del modelo
+            encabezados = {} if espera is None else {"retry-after-ms": str(int(espera * 1000)), "Retry-After": str(math.ceil(espera))}
+            self._json(429, {"error": {"message": "Rate limit reached for requests", "type": "requests",
+                                       "code": "rate_limit_exceeded"}}, encabezados)
+            return
+        modelo = peticion.get("model", "")
+        time.sleep(config.latencia_para(peticion))
+        if config.modelos is not None and modelo not in config.modelos:
+            self._error(404, f"The model `{modelo}` does not exist or you do not have access to it.", "model_not_found")
+            return
+
+        texto = config.respuesta(peticion) if callable(config.respuesta) else config.respuesta
+        # Tokens aproximados como palabras (alcanza para probar la contabilidad de tokens)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in peticion.get("messages", []))
+        completion_tokens = len(texto.split())
+        uso = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        config.facturar(prompt=prompt_tokens)
+        if peticion.get("stream"):
+            incluir_uso = (peticion.get("stream_options") or {}).get("include_usage", False)
+            try:
+                self._stream(modelo, texto, uso if incluir_uso else None)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # el cliente cortó el stream (p.ej. una rama especulativa cancelada)
+            return
+        time.sleep(config.latencia_token * completion_tokens)
+        config.facturar(respuesta=completion_tokens)
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": modelo,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": texto}, "finish_reason": "stop"}],
+            "usage": uso,
+        })
+
+    def _stream(self, modelo, texto, uso=None):
+        """Envía la respuesta como eventos SSE, un token (palabra) por evento; con `uso`, un último evento con los tokens."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        id_ = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        def evento(delta, fin=None, usage=None):
+            chunk = {
+                "id": id_,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": modelo,
+                "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": fin}],
+            }
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        evento({"role": "assistant", "content": ""})
+        for i, palabra in enumerate(texto.split(" ")):
+            time.sleep(self.config.latencia_token)
+            evento({"content": palabra if i == 0 else " " + palabra})
+            self.config.facturar(respuesta=1)
+        evento({}, fin="stop")
+        if uso:
+            # Como la API real con stream_options={"include_usage": true}: choices vacío + usage
+            evento({}, usage=uso)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _ServidorFalso(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cola de conexiones para muchos usuarios simultáneos (la de socketserver es de 5)
+    request_queue_size = 256
+
+
+def iniciar_servidor(config=None, host="127.0.0.1", puerto=0):
+    """
+    Levanta el servidor falso en un hilo daemon.
+
+    Returns:
+        tuple: (servidor, base_url) - base_url termina en /v1; llamar a servidor.shutdown() al terminar
+    """
+    config = config or ConfiguracionFalsa()
+    manejador = type("ManejadorOpenAI", (_ManejadorOpenAI,), {"config": config})
+    servidor = _ServidorFalso((host, puerto), manejador)
+    servidor.config = config
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://{host}:{servidor.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso compatible con la API de OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--modelos", nargs="*", help="Modelos disponibles (por defecto: todos)")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latencia por petición en segundos")
+    parser.add_argument("--latencia-token", type=float, default=0.0, help="Tiempo de generar cada token (con o sin streaming)")
+    parser.add_argument("--respuesta", default=RESPUESTA_POR_DEFECTO)
+    parser.add_argument("--limite-rpm", type=float, default=None, help="Peticiones por minuto antes de responder 429")
+    parser.add_argument("--fallas", type=float, default=0.0, help="Fracción de peticiones que reciben 429 al azar")
+    args = parser.parse_args()
+
+    config = ConfiguracionFalsa(args.modelos, args.latencia, args.respuesta, args.latencia_token, args.limite_rpm, args.fallas)
+    servidor, base_url = iniciar_servidor(config, args.host, args.puerto)
+    print(f"🧪 Servidor OpenAI falso escuchando en {base_url}")
+    print(f"💡 Usa: OPENAI_BASE_URL={base_url} OPENAI_API_KEY=sk-falsa")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""
+Componentes compartidos del Cerebro Corporativo.
+
+Los scripts de la masterclass (`main.py`, `main_hybrid.py`, `model_without_context.py`)
+se apoyan en estos módulos para no duplicar la lógica de ingesta, modelos y recuperación.
+"""
@@ -0,0 +1,74 @@
+"""
+Arranque rápido de los chats de terminal: carga en segundo plano mientras se muestra el prompt.
+
+Importar langchain_openai, sentence-transformers (torch) y ChromaDB, cargar el modelo de
+embeddings y sincronizar la base vectorial lleva varios segundos. Los scripts muestran el
+prompt enseguida y hacen ese trabajo en un hilo mientras el usuario escribe; la primera
+pregunta que lo necesita espera solo lo que falte.
+
+Los mensajes de progreso de la carga se guardan en vez de imprimirse, para no mezclarse con
+lo que el usuario está escribiendo, y se muestran cuando alguien espera el resultado.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CargaEnSegundoPlano:
+    """
+    Ejecuta `funcion(aviso)` en un hilo apenas se crea.
+
+    `aviso(texto)` reemplaza a `print` dentro de la función: guarda el mensaje para
+    mostrarlo después con `esperar()`.
+
+    Args:
+        funcion: Función que recibe `aviso` y devuelve lo cargado
+        descripcion: Qué se está cargando (para el mensaje de espera)
+    """
+
+    def __init__(self, funcion, descripcion):
+        self.descripcion = descripcion
+        self.duracion = None
+        self._funcion = funcion
+        self._futuro = Future()
+        self._mensajes = []
+        self._mostrados = 0
+        self._inicio = time.perf_counter()
+        threading.Thread(target=self._correr, name=f"carga-{descripcion}", daemon=True).start()
+
+    def _aviso(self, *partes, **_):
+        self._mensajes.append(" ".join(str(parte) for parte in partes))
+
+    def _correr(self):
+        try:
+            self._futuro.set_result(self._funcion(self._aviso))
+        except BaseException as e:
+            self._futuro.set_exception(e)
+        finally:
+            self.duracion = time.perf_counter() - self._inicio
+
+    @property
+    def lista(self):
+        """True si la carga terminó sin error (su resultado se obtiene sin esperar)."""
+        return self._futuro.done() and self._futuro.exception() is None
+
+    def resultado(self):
+        """Espera el resultado sin imprimir nada (p.ej. desde otra carga en segundo plano)."""
+        return self._futuro.result()
+
+    def esperar(self):
+        """
+        Devuelve el resultado, esperando si hace falta, y muestra los mensajes pendientes.
+
+        Raises:
+            Exception: La que haya lanzado la función de carga
+        """
+        if not self._futuro.done():
+            print(f"⏳ Terminando de cargar {self.descripcion}...")
+        try:
+            return self._futuro.result()
+        finally:
+            for mensaje in self._mensajes[self._mostrados:]:
+                print(mensaje)
+            self._mostrados = len(self._mensajes)
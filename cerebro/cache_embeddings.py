@@ -0,0 +1,271 @@
+"""
+Caché persistente de embeddings, direccionada por contenido.
+
+Envuelve cualquier `Embeddings` de LangChain (p.ej. `HuggingFaceEmbeddings`) y evita
+recalcular vectores de textos ya vistos: los mismos fragmentos en cada ingesta y las
+mismas preguntas de los usuarios.
+
+Formato en disco (un directorio por modelo):
+
+- `vectores.f32`: matriz float32 (capacidad × dim) abierta con `np.memmap`; crece por
+  duplicación. Las lecturas de una fila son vistas sobre el mapeo, sin copiar.
+- `indice.bin`: log append-only de claves de 16 bytes (BLAKE2b del texto); la clave
+  número i corresponde a la fila i. Se escribe después del vector, así que una
+  interrupción a mitad de escritura nunca deja una clave apuntando a basura.
+- `meta.json`: dimensión de los vectores.
+
+- `escritura.lock`: candado (`fcntl.flock`) que toma quien agrega vectores. Varios
+  procesos pueden escribir la misma caché (main.py, main_hybrid.py, lote.py): con el
+  candado tomado, cada uno lee primero las claves que agregaron los demás y escribe a
+  continuación, así ninguna clave queda apuntando a la fila de otro.
+
+Una misma instancia se comparte entre la ingesta y las consultas. Solo los fragmentos
+van a disco: los vectores de las preguntas viven en memoria (LRU de MAX_CONSULTAS), porque
+cada pregunta distinta agregaría una fila para siempre. Con `solo_lectura=True` (los
+workers de `servidor.py --workers`) la matriz se abre sin permiso de escritura y los
+vectores que faltan se calculan sin guardarse.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado entre procesos
+    fcntl = None
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+RUTA_CACHE_EMBEDDINGS = os.path.join(".cache", "embeddings")
+BYTES_CLAVE = 16
+# Vectores de preguntas que se recuerdan en memoria (no se persisten)
+MAX_CONSULTAS = 4096
+
+
+class EmbeddingsConCache(Embeddings):
+    """
+    Embeddings con caché en disco (memmap float32 + índice de hashes).
+
+    Args:
+        embeddings: Modelo de embeddings real a envolver
+        modelo: Nombre del modelo (cada modelo usa su propio directorio)
+        directorio: Directorio raíz de la caché
+        capacidad_inicial: Filas reservadas al crear la matriz
+        consultas_en_lote: El modelo embebe igual consultas y documentos (p.ej. all-MiniLM-L6-v2),
+            así que varias consultas faltantes se calculan en una sola llamada
+        solo_lectura: Usar lo que ya está en disco sin agregar vectores (otro proceso escribe)
+    """
+
+    def __init__(self, embeddings, modelo="", directorio=RUTA_CACHE_EMBEDDINGS, capacidad_inicial=1024, consultas_en_lote=False,
+                 solo_lectura=False):
+        self.embeddings = embeddings
+        self.consultas_en_lote = consultas_en_lote
+        self.solo_lectura = solo_lectura
+        self.directorio = os.path.join(directorio, hashlib.sha256(modelo.encode("utf-8")).hexdigest()[:12])
+        self.capacidad_inicial = capacidad_inicial
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._indice = {}  # clave -> fila
+        self._dim = None
+        self._matriz = None
+        self._filas = 0
+        self._consultas = OrderedDict()  # clave -> vector, del menos al más usado
+        os.makedirs(self.directorio, exist_ok=True)
+        self._abrir()
+
+    # --- almacenamiento ---------------------------------------------------------------
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    def _abrir(self):
+        """Lee del disco las claves desde la fila `self._filas` (todas al abrir; las de otros procesos después)."""
+        try:
+            with open(self._ruta("meta.json"), encoding="utf-8") as f:
+                dim = json.load(f)["dim"]
+            filas_vectores = os.path.getsize(self._ruta("vectores.f32")) // (4 * dim)
+        except (OSError, ValueError, KeyError):
+            return
+        if filas_vectores == 0:
+            return
+        self._dim = dim
+        with open(self._ruta("indice.bin"), "ab+") as f:
+            f.seek(self._filas * BYTES_CLAVE)
+            datos = f.read()
+        # Ignorar un registro incompleto al final o claves sin vector escrito
+        n = min(len(datos) // BYTES_CLAVE, filas_vectores - self._filas)
+        for i in range(n):
+            self._indice[datos[i * BYTES_CLAVE:(i + 1) * BYTES_CLAVE]] = self._filas + i
+        self._filas += n
+        if self._matriz is None or self._matriz.shape[0] != filas_vectores:
+            self._mapear(filas_vectores)
+
+    @contextmanager
+    def _candado(self):
+        """Exclusión entre procesos para agregar vectores (sin fcntl, solo entre hilos)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._ruta("escritura.lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _mapear(self, capacidad):
+        modo = "r" if self.solo_lectura else "r+"
+        self._matriz = np.memmap(self._ruta("vectores.f32"), dtype=np.float32, mode=modo, shape=(capacidad, self._dim))
+
+    def _asegurar_capacidad(self, filas_necesarias):
+        if self._matriz is None:
+            with open(self._ruta("meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"dim": self._dim}, f)
+            capacidad = max(self.capacidad_inicial, filas_necesarias)
+        elif filas_necesarias > self._matriz.shape[0]:
+            capacidad = max(filas_necesarias, 2 * self._matriz.shape[0])
+            self._matriz.flush()
+        else:
+            return
+        # El archivo solo crece: las vistas entregadas antes siguen siendo válidas
+        with open(self._ruta("vectores.f32"), "ab") as f:
+            f.truncate(capacidad * self._dim * 4)
+        self._mapear(capacidad)
+
+    def _agregar(self, claves, vectores):
+        with self._candado():
+            # Ponerse al día con lo que escribieron otros procesos desde la última vez
+            self._abrir()
+            # Descartar un registro incompleto de una escritura interrumpida: la próxima clave
+            # tiene que quedar en la posición de su fila
+            with open(self._ruta("indice.bin"), "ab") as f:
+                f.truncate(self._filas * BYTES_CLAVE)
+            pendientes = [(c, v) for c, v in zip(claves, vectores) if c not in self._indice]
+            if not pendientes:
+                return
+            claves = [c for c, _ in pendientes]
+            vectores = np.asarray([v for _, v in pendientes], dtype=np.float32)
+            if self._dim is None:
+                self._dim = vectores.shape[1]
+            inicio = self._filas
+            self._asegurar_capacidad(inicio + len(claves))
+            self._matriz[inicio:inicio + len(claves)] = vectores
+            self._matriz.flush()
+            with open(self._ruta("indice.bin"), "ab") as f:
+                f.write(b"".join(claves))
+            for i, clave in enumerate(claves):
+                self._indice[clave] = inicio + i
+            self._filas = inicio + len(claves)
+
+    @staticmethod
+    def _clave(texto, tipo):
+        # Documentos y consultas van en espacios de claves distintos: algunos modelos
+        # embeben distinto una consulta que un documento con el mismo texto
+        return hashlib.blake2b(f"{tipo}\0{texto}".encode("utf-8"), digest_size=BYTES_CLAVE).digest()
+
+    # --- API ----------------------------------------------------------------------------
+
+    def obtener(self, texto, tipo="d"):
+        """Vector cacheado como vista de solo lectura sobre el memmap (las consultas, desde memoria), o None."""
+        if tipo == "q":
+            return self._consultas.get(self._clave(texto, tipo))
+        fila = self._indice.get(self._clave(texto, tipo))
+        if fila is None:
+            return None
+        vista = self._matriz[fila]
+        vista.flags.writeable = False
+        return vista
+
+    def _calcular(self, faltantes, tipo):
+        # El modelo corre fuera del lock: varios lotes pueden embeberse a la vez
+        if tipo == "q" and not self.consultas_en_lote:
+            nuevos = [self.embeddings.embed_query(t) for t in faltantes.values()]
+        else:
+            nuevos = self.embeddings.embed_documents(list(faltantes.values()))
+        return dict(zip(faltantes, np.asarray(nuevos, dtype=np.float32)))
+
+    def vectores(self, textos, tipo="d"):
+        """
+        Devuelve los vectores de `textos` como matriz (n, dim), calculando solo los que faltan.
+
+        Args:
+            textos: Lista de textos
+            tipo: "d" para documentos (en disco), "q" para consultas (en memoria)
+
+        Returns:
+            np.ndarray: Matriz float32 con un vector por texto
+        """
+        if tipo == "q":
+            return self._vectores_consultas(textos)
+        claves = [self._clave(t, tipo) for t in textos]
+        with self._lock:
+            faltantes = {}
+            for clave, texto in zip(claves, textos):
+                if clave not in self._indice:
+                    faltantes.setdefault(clave, texto)
+            self.fallos += len(faltantes)
+            self.aciertos += len(textos) - len(faltantes)
+
+        if faltantes:
+            calculados = self._calcular(faltantes, tipo)
+            if self.solo_lectura:
+                return np.stack([calculados[c] if c in calculados else self._matriz[self._indice[c]] for c in claves])
+            with self._lock:
+                self._agregar(list(calculados), list(calculados.values()))
+
+        with self._lock:
+            if not textos:
+                return np.empty((0, self._dim or 0), dtype=np.float32)
+            return self._matriz[[self._indice[c] for c in claves]]
+
+    def _vectores_consultas(self, textos):
+        claves = [self._clave(t, "q") for t in textos]
+        with self._lock:
+            encontrados = {}
+            faltantes = {}
+            for clave, texto in zip(claves, textos):
+                if clave in self._consultas:
+                    self._consultas.move_to_end(clave)
+                    encontrados[clave] = self._consultas[clave]
+                else:
+                    faltantes.setdefault(clave, texto)
+            self.fallos += len(faltantes)
+            self.aciertos += len(textos) - len(faltantes)
+
+        if faltantes:
+            calculados = self._calcular(faltantes, "q")
+            encontrados.update(calculados)
+            with self._lock:
+                self._consultas.update(calculados)
+                while len(self._consultas) > MAX_CONSULTAS:
+                    self._consultas.popitem(last=False)
+        if not textos:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        return np.stack([encontrados[c] for c in claves])
+
+    def embed_documents(self, texts):
+        return self.vectores(texts, "d").tolist()
+
+    def embed_query(self, text):
+        return self.vectores([text], "q")[0].tolist()
+
+    def metricas(self):
+        """Aciertos, fallos, tasa de aciertos y vectores almacenados."""
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "vectores": len(self._indice),
+        }
+
+    def resumen(self):
+        """Línea de métricas para mostrar en el chat."""
+        m = self.metricas()
+        return f"🧠 Caché de embeddings: {m['aciertos']} aciertos, {m['fallos']} calculados ({m['tasa_aciertos']:.0%}), {m['vectores']} vectores en disco"
@@ -0,0 +1,228 @@
+"""
+Caché semántica de respuestas indexada por el embedding de la pregunta.
+
+Antes de llamar al LLM se compara el vector de la pregunta (el mismo que luego usa la
+búsqueda en ChromaDB, así que no cuesta un embedding extra) con los de preguntas
+anteriores. Si alguna supera el umbral de similitud coseno, se devuelve la respuesta
+guardada junto con su fuente. Eviction LRU + TTL, y la caché completa se invalida cuando
+cambia la versión del corpus ingestado (o el modelo de chat).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+
+UMBRAL_SIMILITUD = 0.92
+MAX_ENTRADAS = 512
+TTL_RESPUESTAS = 24 * 3600  # segundos
+RUTA_CACHE_RESPUESTAS = os.path.join(".cache", "respuestas")
+
+
+@dataclass
+class EntradaCache:
+    """Respuesta guardada para una pregunta."""
+
+    pregunta: str
+    respuesta: str
+    fuente: str
+    docs: list = field(default_factory=list)
+    creada: float = 0.0
+    similitud: float = 1.0  # similitud con la pregunta que produjo el acierto
+
+
+class CacheSemantico:
+    """
+    Caché de respuestas por similitud de embeddings.
+
+    Los vectores se guardan normalizados en una matriz contigua, así que una búsqueda es
+    un único producto matriz-vector con NumPy.
+
+    Args:
+        version: Versión del corpus (y modelo) a la que pertenecen las respuestas
+        umbral: Similitud coseno mínima para considerar dos preguntas equivalentes
+        max_entradas: Capacidad; al llenarse se desaloja la entrada usada hace más tiempo
+        ttl: Segundos de vida de cada respuesta
+        directorio: Dónde se persiste (ver persistir)
+    """
+
+    def __init__(self, version, umbral=UMBRAL_SIMILITUD, max_entradas=MAX_ENTRADAS, ttl=TTL_RESPUESTAS,
+                 directorio=RUTA_CACHE_RESPUESTAS):
+        self.version = version
+        self.directorio = directorio
+        self.umbral = umbral
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+        self._vaciar()
+
+    def _vaciar(self):
+        self._vectores = None  # matriz (max_entradas, dim), se crea con el primer vector
+        self._entradas = [None] * self.max_entradas
+        self._lru = OrderedDict()  # slot -> None, del menos al más usado
+        self._libres = list(range(self.max_entradas - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._lru)
+
+    @staticmethod
+    def _normalizar(vector):
+        v = np.asarray(vector, dtype=np.float32)
+        norma = np.linalg.norm(v)
+        return v / norma if norma else v
+
+    def buscar(self, vector):
+        """
+        Busca una pregunta anterior suficientemente similar.
+
+        Args:
+            vector: Embedding de la pregunta
+
+        Returns:
+            EntradaCache | None: Respuesta guardada o None si no hay acierto
+        """
+        with self._lock:
+            slot, similitud = self._mas_similar(self._normalizar(vector))
+            if slot is None or similitud < self.umbral:
+                self.fallos += 1
+                return None
+            entrada = self._entradas[slot]
+            if time.time() - entrada.creada > self.ttl:
+                self._liberar(slot)
+                self.fallos += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.aciertos += 1
+            return EntradaCache(entrada.pregunta, entrada.respuesta, entrada.fuente, entrada.docs, entrada.creada, similitud)
+
+    def _mas_similar(self, q):
+        if not self._lru:
+            return None, 0.0
+        similitudes = self._vectores @ q  # las filas libres están en cero
+        slot = int(np.argmax(similitudes))
+        return slot, float(similitudes[slot])
+
+    def _liberar(self, slot):
+        self._entradas[slot] = None
+        self._vectores[slot] = 0.0
+        self._lru.pop(slot, None)
+        self._libres.append(slot)
+
+    def guardar(self, pregunta, vector, respuesta, fuente, docs=None, creada=None):
+        """Guarda la respuesta de una pregunta, desalojando la menos usada si está llena."""
+        q = self._normalizar(vector)
+        with self._lock:
+            if self._vectores is None:
+                self._vectores = np.zeros((self.max_entradas, q.shape[0]), dtype=np.float32)
+            if self._libres:
+                slot = self._libres.pop()
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self.desalojos += 1
+            self._vectores[slot] = q
+            self._entradas[slot] = EntradaCache(pregunta, respuesta, fuente, list(docs or []), creada or time.time())
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def metricas(self):
+        """Aciertos, fallos, tasa de aciertos, desalojos y tamaño actual."""
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+            "desalojos": self.desalojos,
+            "entradas": len(self),
+        }
+
+    def resumen(self):
+        """Línea de métricas para mostrar en el chat."""
+        m = self.metricas()
+        consultas = m["aciertos"] + m["fallos"]
+        return f"📊 Caché semántica: {m['aciertos']}/{consultas} aciertos ({m['tasa_aciertos']:.0%}), {m['entradas']} respuestas guardadas"
+
+    def persistir(self, directorio=None):
+        """Guarda la caché en disco (vectores .npy + entradas .json, escritura atómica de ambos) para reusarla al reiniciar."""
+        directorio = directorio or self.directorio
+        with self._lock:
+            slots = list(self._lru)
+            if not slots:
+                return
+            os.makedirs(directorio, exist_ok=True)
+            ruta_vectores = os.path.join(directorio, "vectores.npy")
+            ruta_entradas = os.path.join(directorio, "entradas.json")
+            with open(ruta_vectores + ".tmp", "wb") as f:
+                np.save(f, self._vectores[slots])
+            entradas = [
+                {
+                    "pregunta": e.pregunta,
+                    "respuesta": e.respuesta,
+                    "fuente": e.fuente,
+                    "creada": e.creada,
+                    "docs": [{"contenido": d.page_content, "metadata": d.metadata} for d in e.docs],
+                }
+                for e in (self._entradas[s] for s in slots)
+            ]
+            with open(ruta_entradas + ".tmp", "w", encoding="utf-8") as f:
+                json.dump({"version": self.version, "entradas": entradas}, f, ensure_ascii=False)
+            os.replace(ruta_vectores + ".tmp", ruta_vectores)
+            os.replace(ruta_entradas + ".tmp", ruta_entradas)
+
+    @classmethod
+    def desde_disco(cls, version, directorio=RUTA_CACHE_RESPUESTAS, **kwargs):
+        """
+        Carga una caché persistida; si no existe o es de otra versión del corpus, empieza vacía.
+
+        Returns:
+            CacheSemantico: Caché lista para usar
+        """
+        cache = cls(version, directorio=directorio, **kwargs)
+        try:
+            with open(os.path.join(directorio, "entradas.json"), encoding="utf-8") as f:
+                datos = json.load(f)
+            vectores = np.load(os.path.join(directorio, "vectores.npy"))
+        except (OSError, ValueError):
+            return cache
+        # Distinta cantidad de vectores y entradas: archivos de dos escrituras distintas
+        if datos.get("version") != version or len(vectores) != len(datos["entradas"]):
+            return cache
+
+        ahora = time.time()
+        for vector, e in zip(vectores, datos["entradas"]):
+            if ahora - e["creada"] > cache.ttl:
+                continue
+            docs = [Document(page_content=d["contenido"], metadata=d["metadata"]) for d in e["docs"]]
+            cache.guardar(e["pregunta"], vector, e["respuesta"], e["fuente"], docs, creada=e["creada"])
+        return cache
+
+
+def crear_cache(version_corpus, modelo, espacio):
+    """
+    Crea la caché semántica según el entorno (CACHE_SEMANTICA=0 la desactiva).
+
+    La versión combina el corpus ingestado y el modelo de chat: si cualquiera de los dos
+    cambia, las respuestas persistidas dejan de ser válidas.
+
+    Args:
+        version_corpus: Versión del corpus ingestado
+        modelo: Modelo de chat
+        espacio: Script (y prompt) dueño de las respuestas: "rag" (main.py) o "hibrido"
+            (main_hybrid.py, servidor.py, lote.py). Cada uno persiste en su subdirectorio,
+            así no se pisan ni se sirven las respuestas con el prompt del otro
+
+    Returns:
+        CacheSemantico | None: Caché cargada desde disco o None si está desactivada
+    """
+    if os.getenv("CACHE_SEMANTICA", "1") == "0":
+        return None
+    umbral = float(os.getenv("CACHE_SIMILITUD", UMBRAL_SIMILITUD))
+    directorio = os.path.join(RUTA_CACHE_RESPUESTAS, espacio)
+    return CacheSemantico.desde_disco(f"{espacio}:{version_corpus}:{modelo}", directorio, umbral=umbral)
@@ -0,0 +1,128 @@
+"""
+Registro de cadenas LCEL del sistema híbrido, construidas una sola vez.
+
+Los prompts y las cadenas `prompt | llm | parser` no dependen de la pregunta, así que se
+crean al configurar el sistema y se reutilizan en cada respuesta en vez de reconstruirse
+en cada llamada.
+"""
+
+# Estrategias de respuesta (claves del registro)
+DOCUMENTACION = "documentación"
+DOCUMENTACION_DIRECTA = "documentación directa"
+CONOCIMIENTO_PROPIO = "conocimiento propio"
+
+TEMPLATE_RAG = """Eres un asistente útil que responde preguntas basándote ÚNICAMENTE en la documentación proporcionada.
+
+Contexto de la documentación:
+{context}
+
+Pregunta del usuario: {question}
+
+INSTRUCCIONES CRÍTICAS:
+- DEBES responder usando la información del contexto proporcionado
+- Si el contexto contiene información sobre el tema, úsala para responder de manera completa
+- Extrae TODA la información relevante del contexto y preséntala de forma clara
+- NO uses conocimiento fuera del contexto proporcionado
+- Si el contexto NO contiene información sobre la pregunta, entonces di "No tengo información sobre esto en la documentación"
+- Sé exhaustivo: si hay información en el contexto, úsala toda"""
+
+TEMPLATE_RAG_DIRECTO = """Responde la siguiente pregunta usando la información proporcionada en la documentación.
+
+Documentación:
+{context}
+
+Pregunta: {question}
+
+Responde usando SOLO la información de la documentación. Si hay información relevante, úsala para responder completamente."""
+
+TEMPLATE_CONOCIMIENTO_PROPIO = """Eres un asistente útil y honesto. Responde la pregunta usando tu conocimiento de entrenamiento.
+
+Pregunta: {question}
+
+INSTRUCCIONES:
+- Responde usando tu conocimiento general si lo tienes
+- Si NO sabes la respuesta, di claramente "No sé sobre..." o "No tengo información sobre..."
+- NO inventes información. Sé honesto y directo."""
+
+# Memoria de conversación (ver cerebro.conversacion)
+REESCRITURA = "reescritura"
+RESUMEN = "resumen"
+
+TEMPLATE_REESCRITURA = """Reformula la última pregunta del usuario para que se entienda sin leer la conversación: reemplaza pronombres y referencias ("eso", "el otro", "¿y ...?") por lo que nombran. Si ya se entiende sola, devuélvela igual.
+
+Conversación anterior:
+{historial}
+
+Última pregunta: {question}
+
+Responde SOLO con la pregunta reformulada, sin comillas ni explicaciones."""
+
+TEMPLATE_RESUMEN = """Actualiza el resumen de una conversación entre un usuario y un asistente agregando los turnos nuevos. Conserva temas, nombres, datos concretos y lo que el usuario quiere lograr; descarta saludos y relleno. Máximo {palabras} palabras.
+
+Resumen hasta ahora:
+{resumen}
+
+Turnos nuevos:
+{turnos}
+
+Resumen actualizado:"""
+
+TEMPLATES = {
+    DOCUMENTACION: TEMPLATE_RAG,
+    DOCUMENTACION_DIRECTA: TEMPLATE_RAG_DIRECTO,
+    CONOCIMIENTO_PROPIO: TEMPLATE_CONOCIMIENTO_PROPIO,
+    REESCRITURA: TEMPLATE_REESCRITURA,
+    RESUMEN: TEMPLATE_RESUMEN,
+}
+
+
+def construir_cadenas(llm):
+    """
+    Crea una cadena por estrategia, lista para `.invoke({...})`.
+
+    Las cadenas de documentación reciben {"context", "question"}; la de conocimiento
+    propio solo {"question"}. Las de la memoria de conversación reciben {"historial",
+    "question"} (reescritura) y {"resumen", "turnos", "palabras"} (resumen).
+
+    Args:
+        llm: Modelo de lenguaje compartido por todas las cadenas
+
+    Returns:
+        dict: {estrategia: cadena LCEL}
+    """
+    # langchain_core tarda en importarse: las constantes de este módulo no lo necesitan
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    parser = StrOutputParser()
+    return {
+        estrategia: ChatPromptTemplate.from_template(template) | llm | parser
+        for estrategia, template in TEMPLATES.items()
+    }
+
+
+def stream_cancelable(cadena, entrada, config=None):
+    """
+    Como `cadena.stream(entrada)` para las cadenas de `construir_cadenas`, pero iterando
+    directamente el stream del LLM.
+
+    Al cerrar el generador de `RunnableSequence.stream` (p.ej. al cancelar una rama
+    especulativa), LangChain consume el resto de la respuesta antes de volver; cerrar el
+    del LLM, en cambio, cierra la conexión y el proveedor deja de generar tokens.
+
+    Returns:
+        Generator: Fragmentos de texto de la respuesta
+    """
+    prompt, llm, _ = cadena.steps
+    mensajes = prompt.invoke(entrada, config)
+
+    def fragmentos():
+        stream = llm.stream(mensajes, config)
+        try:
+            for chunk in stream:
+                if chunk.content:
+                    yield chunk.content
+        finally:
+            stream.close()
+
+    return fragmentos()
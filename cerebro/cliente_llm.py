@@ -0,0 +1,472 @@
+"""
+Capa compartida de acceso a la API del LLM: límites de tasa, reintentos y coalescencia.
+
+Va como transporte de httpx debajo del SDK de OpenAI, así que vale igual para las
+cadenas de LangChain (ChatOpenAI), el cliente `openai.OpenAI` y el servidor asíncrono:
+
+- límite de tasa: dos cubetas de tokens, peticiones y tokens por minuto (LLM_RPM y
+  LLM_TPM, 0 = sin límite), que se reservan antes de cada envío. Los tokens se estiman
+  del prompt (caracteres / 4) más `max_tokens` y se corrigen con el `usage` de la respuesta,
+- reintentos: ante 429, 408/409, 5xx o un error de conexión, hasta LLM_REINTENTOS veces
+  con espera exponencial y jitter. Si la API manda `Retry-After` se espera al menos eso, y
+  un 429 pausa a todas las peticiones del proceso, no solo a la que lo recibió,
+- coalescencia: peticiones idénticas (mismo cuerpo, URL y API key) que coinciden en el
+  tiempo comparten una sola llamada (LLM_COALESCER=0 la desactiva). Los streams no se
+  coalescen: si el consumidor de uno lo corta (p.ej. una rama especulativa cancelada),
+  cortaría también a los demás,
+- conexiones: un pool por proceso (keep-alive) que reutilizan todas las cadenas.
+
+El SDK se crea con `max_retries=0` para no reintentar dos veces (ver opciones_cliente_llm).
+"""
+
+import asyncio
+import email.utils
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from functools import partial
+
+import httpx
+
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+REINTENTOS = int(os.getenv("LLM_REINTENTOS", "4"))
+COALESCER = os.getenv("LLM_COALESCER", "1") != "0"
+CONEXIONES = int(os.getenv("LLM_CONCURRENCIA", "16"))
+TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+# Tope del jitter del primer reintento (se duplica en cada uno) y máximo
+ESPERA_BASE = 0.5
+ESPERA_MAXIMA = 30.0
+# Un Retry-After más largo que esto se recorta (mejor fallar que colgar al usuario)
+RETRY_AFTER_MAXIMO = 60.0
+CARACTERES_POR_TOKEN = 4
+
+
+def reintentable(estado):
+    """Códigos HTTP que vale la pena reintentar (los mismos que el SDK de OpenAI)."""
+    return estado in (408, 409, 429) or estado >= 500
+
+
+def retry_after(encabezados):
+    """
+    Segundos que pide esperar la API, o None si no lo dice.
+
+    Lee `retry-after-ms` y `Retry-After` (en segundos o como fecha HTTP).
+    """
+    valor = encabezados.get("retry-after-ms")
+    if valor:
+        try:
+            return float(valor) / 1000
+        except ValueError:
+            pass
+    valor = encabezados.get("retry-after")
+    if not valor:
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        fecha = email.utils.parsedate_tz(valor)
+        return max(0.0, email.utils.mktime_tz(fecha) - time.time()) if fecha else None
+
+
+class CuboTokens:
+    """
+    Cubeta de tokens con reserva: `reservar` descuenta aunque el saldo quede negativo y
+    devuelve cuánto esperar, así las peticiones salen en orden de llegada sin sondear.
+
+    Args:
+        por_minuto: Tasa de recarga
+        rafaga: Segundos de tasa acumulables (la API aplica los límites en ventanas cortas)
+    """
+
+    def __init__(self, por_minuto, rafaga=1.0):
+        self.tasa = por_minuto / 60.0
+        self.capacidad = max(1.0, self.tasa * rafaga)
+        self.saldo = self.capacidad
+        self._ultimo = time.monotonic()
+
+    def _recargar(self, ahora):
+        self.saldo = min(self.capacidad, self.saldo + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def reservar(self, costo, ahora):
+        self._recargar(ahora)
+        self.saldo -= costo
+        return max(0.0, -self.saldo / self.tasa)
+
+    def devolver(self, cantidad, ahora):
+        """Devuelve lo reservado de más (o cobra lo que faltó, con `cantidad` negativa)."""
+        self._recargar(ahora)
+        self.saldo = min(self.capacidad, self.saldo + cantidad)
+
+
+class LimitadorTasa:
+    """
+    Peticiones y tokens por minuto, y la pausa que pide un 429, compartidos por todos los hilos.
+
+    Args:
+        rpm: Peticiones por minuto (0 = sin límite)
+        tpm: Tokens por minuto, prompt + respuesta (0 = sin límite)
+        rafaga: Segundos de tasa que se pueden gastar de golpe
+    """
+
+    def __init__(self, rpm=LLM_RPM, tpm=LLM_TPM, rafaga=1.0):
+        self.peticiones = CuboTokens(rpm, rafaga) if rpm > 0 else None
+        self.tokens = CuboTokens(tpm, rafaga) if tpm > 0 else None
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def reservar(self, tokens):
+        """Reserva una petición y `tokens`; devuelve los segundos a esperar antes de enviarla."""
+        with self._lock:
+            ahora = time.monotonic()
+            espera = max(0.0, self._pausa_hasta - ahora)
+            if self.peticiones is not None:
+                espera = max(espera, self.peticiones.reservar(1, ahora))
+            if self.tokens is not None and tokens:
+                espera = max(espera, self.tokens.reservar(tokens, ahora))
+            return espera
+
+    def ajustar(self, estimados, usados):
+        """Corrige la reserva de tokens con los que informó la respuesta."""
+        if self.tokens is not None:
+            with self._lock:
+                self.tokens.devolver(estimados - usados, time.monotonic())
+
+    def pausar(self, segundos):
+        """Ninguna petición sale durante `segundos` (Retry-After de un 429)."""
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+
+
+class _Completa:
+    """Respuesta leída completa, para entregarla a todos los que coalescieron."""
+
+    def __init__(self, respuesta):
+        self.estado = respuesta.status_code
+        # El contenido ya está decodificado: sin Content-Encoding ni el largo original
+        self.encabezados = [(k, v) for k, v in respuesta.headers.raw
+                            if k.lower() not in (b"content-encoding", b"content-length", b"transfer-encoding")]
+        self.contenido = respuesta.content
+
+    def respuesta(self):
+        return httpx.Response(self.estado, headers=self.encabezados, content=self.contenido)
+
+
+class _Llamada:
+    """Llamada en vuelo que esperan los hilos coalescidos."""
+
+    def __init__(self):
+        self.listo = threading.Event()
+        self.resultado = None
+        self.error = None
+
+    def esperar(self):
+        self.listo.wait()
+        if self.error is not None:
+            raise self.error
+        return self.resultado
+
+
+class PoliticaLLM:
+    """
+    Límites, reintentos y coalescencia; una instancia se comparte entre todos los clientes del proceso.
+
+    Args:
+        limitador: LimitadorTasa (por defecto LLM_RPM / LLM_TPM)
+        reintentos: Reintentos por petición después del primer intento
+        espera_base: Tope del jitter del primer reintento (se duplica en cada uno)
+        espera_maxima: Tope de la espera exponencial
+        coalescer: Compartir una llamada entre peticiones idénticas simultáneas
+    """
+
+    def __init__(self, limitador=None, reintentos=REINTENTOS, espera_base=ESPERA_BASE, espera_maxima=ESPERA_MAXIMA,
+                 coalescer=COALESCER):
+        self.limitador = limitador or LimitadorTasa()
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.coalescer = coalescer
+        self._en_vuelo = {}  # clave -> _Llamada (hilos)
+        self._en_vuelo_async = {}  # (loop, clave) -> [tarea, esperando]
+        self._lock = threading.Lock()
+        self._contadores = {"enviadas": 0, "reintentos": 0, "limitadas": 0, "coalescidas": 0}
+        self._espera_limite = 0.0
+
+    def _contar(self, clave, espera=0.0):
+        with self._lock:
+            self._contadores[clave] += 1
+            self._espera_limite += espera
+
+    def metricas(self):
+        """Intentos enviados, reintentos, 429 recibidos, peticiones coalescidas y segundos esperando al limitador."""
+        with self._lock:
+            return {**self._contadores, "espera_limite": round(self._espera_limite, 3)}
+
+    def planificar(self, peticion):
+        """
+        Qué hacer con una petición.
+
+        Returns:
+            tuple: (clave, tokens, completa) - clave de coalescencia (None = no coalescer),
+                tokens estimados y si la respuesta se lee completa (no es un stream)
+        """
+        try:
+            cuerpo = json.loads(peticion.content)
+        except (httpx.RequestNotRead, ValueError):
+            return None, 0, False
+        if not isinstance(cuerpo, dict):
+            return None, 0, False
+        mensajes = cuerpo.get("messages") or []
+        caracteres = sum(len(str(m.get("content") or "")) for m in mensajes if isinstance(m, dict))
+        tokens = caracteres // CARACTERES_POR_TOKEN + int(cuerpo.get("max_completion_tokens") or cuerpo.get("max_tokens") or 0)
+        completa = peticion.method == "POST" and not cuerpo.get("stream")
+        clave = None
+        if completa and self.coalescer:
+            huella = hashlib.sha256()
+            for parte in (peticion.method, str(peticion.url), peticion.headers.get("authorization", "")):
+                huella.update(parte.encode("utf-8") + b"\0")
+            huella.update(peticion.content)
+            clave = huella.hexdigest()
+        return clave, tokens, completa
+
+    def demora(self, intento, respuesta=None):
+        """
+        Segundos antes del reintento número `intento` (0 = el primero).
+
+        Espera exponencial con jitter completo (los que fallaron juntos no vuelven todos
+        juntos); un Retry-After es el mínimo y esa espera se suma encima.
+        """
+        jitter = random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** intento))
+        pedido = retry_after(respuesta.headers) if respuesta is not None else None
+        if pedido is None:
+            return jitter
+        pedido = min(pedido, RETRY_AFTER_MAXIMO)
+        if respuesta.status_code == 429:
+            self.limitador.pausar(pedido)
+        return pedido + jitter
+
+    def _usage(self, completa, tokens):
+        if completa.estado != 200 or not tokens:
+            return
+        try:
+            usados = json.loads(completa.contenido)["usage"]["total_tokens"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self.limitador.ajustar(tokens, usados)
+
+    # --- hilos ---------------------------------------------------------------------------
+
+    def enviar(self, transporte, peticion, tokens):
+        """Envía respetando el limitador y reintenta lo reintentable; devuelve la última respuesta."""
+        intento = 0
+        while True:
+            espera = self.limitador.reservar(tokens)
+            if espera:
+                time.sleep(espera)
+            self._contar("enviadas", espera)
+            try:
+                respuesta = transporte.handle_request(peticion)
+            except httpx.TransportError:
+                if intento >= self.reintentos:
+                    raise
+                demora = self.demora(intento)
+            else:
+                if not reintentable(respuesta.status_code) or intento >= self.reintentos:
+                    return respuesta
+                if respuesta.status_code == 429:
+                    self._contar("limitadas")
+                demora = self.demora(intento, respuesta)
+                respuesta.close()
+            self._contar("reintentos")
+            time.sleep(demora)
+            intento += 1
+
+    def completa(self, transporte, peticion, tokens):
+        respuesta = self.enviar(transporte, peticion, tokens)
+        try:
+            respuesta.read()
+        finally:
+            respuesta.close()
+        completa = _Completa(respuesta)
+        self._usage(completa, tokens)
+        return completa
+
+    def compartir(self, clave, llamar):
+        """El primer hilo con `clave` hace `llamar()`; los que llegan mientras tanto esperan su resultado."""
+        with self._lock:
+            llamada = self._en_vuelo.get(clave)
+            lider = llamada is None
+            if lider:
+                llamada = self._en_vuelo[clave] = _Llamada()
+            else:
+                self._contadores["coalescidas"] += 1
+        if not lider:
+            return llamada.esperar()
+        try:
+            llamada.resultado = llamar()
+            return llamada.resultado
+        except BaseException as error:
+            llamada.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._en_vuelo[clave]
+            llamada.listo.set()
+
+    # --- asyncio -------------------------------------------------------------------------
+
+    async def enviar_async(self, transporte, peticion, tokens):
+        """Como `enviar`, sin bloquear el event loop."""
+        intento = 0
+        while True:
+            espera = self.limitador.reservar(tokens)
+            if espera:
+                await asyncio.sleep(espera)
+            self._contar("enviadas", espera)
+            try:
+                respuesta = await transporte.handle_async_request(peticion)
+            except httpx.TransportError:
+                if intento >= self.reintentos:
+                    raise
+                demora = self.demora(intento)
+            else:
+                if not reintentable(respuesta.status_code) or intento >= self.reintentos:
+                    return respuesta
+                if respuesta.status_code == 429:
+                    self._contar("limitadas")
+                demora = self.demora(intento, respuesta)
+                await respuesta.aclose()
+            self._contar("reintentos")
+            await asyncio.sleep(demora)
+            intento += 1
+
+    async def completa_async(self, transporte, peticion, tokens):
+        respuesta = await self.enviar_async(transporte, peticion, tokens)
+        try:
+            await respuesta.aread()
+        finally:
+            await respuesta.aclose()
+        completa = _Completa(respuesta)
+        self._usage(completa, tokens)
+        return completa
+
+    async def compartir_async(self, clave, llamar):
+        """
+        Como `compartir` para corutinas: la llamada corre en su propia tarea.
+
+        Si se cancelan todos los que la esperan (p.ej. el cliente HTTP se fue), se cancela
+        también la llamada; si queda alguno, sigue para él.
+        """
+        clave = (asyncio.get_running_loop(), clave)
+        with self._lock:
+            entrada = self._en_vuelo_async.get(clave)
+            if entrada is None:
+                tarea = asyncio.ensure_future(llamar())
+                entrada = self._en_vuelo_async[clave] = [tarea, 0]
+                tarea.add_done_callback(partial(self._terminar_async, clave))
+            else:
+                self._contadores["coalescidas"] += 1
+            entrada[1] += 1
+        try:
+            return await asyncio.shield(entrada[0])
+        except asyncio.CancelledError:
+            entrada[1] -= 1
+            if entrada[1] == 0:
+                entrada[0].cancel()
+            raise
+
+    def _terminar_async(self, clave, tarea):
+        with self._lock:
+            self._en_vuelo_async.pop(clave, None)
+        if not tarea.cancelled():
+            tarea.exception()  # ya la recibieron los que esperaban: que asyncio no avise
+
+
+class TransporteLLM(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Transporte de httpx (síncrono y asíncrono) que aplica una PoliticaLLM sobre un pool de conexiones.
+
+    Args:
+        politica: PoliticaLLM (por defecto la compartida del proceso)
+        limite: Conexiones simultáneas del pool (y keep-alive)
+    """
+
+    def __init__(self, politica=None, limite=CONEXIONES):
+        self.politica = politica or politica_compartida()
+        limites = httpx.Limits(max_connections=limite, max_keepalive_connections=limite)
+        self._http = httpx.HTTPTransport(limits=limites)
+        self._http_async = httpx.AsyncHTTPTransport(limits=limites)
+
+    def handle_request(self, request):
+        clave, tokens, completa = self.politica.planificar(request)
+        if not completa:
+            return self.politica.enviar(self._http, request, tokens)
+        llamar = partial(self.politica.completa, self._http, request, tokens)
+        resultado = self.politica.compartir(clave, llamar) if clave else llamar()
+        return resultado.respuesta()
+
+    async def handle_async_request(self, request):
+        clave, tokens, completa = self.politica.planificar(request)
+        if not completa:
+            return await self.politica.enviar_async(self._http_async, request, tokens)
+        llamar = partial(self.politica.completa_async, self._http_async, request, tokens)
+        resultado = await (self.politica.compartir_async(clave, llamar) if clave else llamar())
+        return resultado.respuesta()
+
+    def close(self):
+        self._http.close()
+
+    async def aclose(self):
+        await self._http_async.aclose()
+
+
+_politicas = {}
+_opciones = {}
+
+
+def politica_compartida():
+    """La PoliticaLLM de este proceso (después de un fork, el hijo crea la suya)."""
+    pid = os.getpid()
+    if pid not in _politicas:
+        _politicas[pid] = PoliticaLLM()
+    return _politicas[pid]
+
+
+def crear_clientes_llm(politica=None, limite=CONEXIONES):
+    """
+    Clientes httpx síncrono y asíncrono sobre un mismo TransporteLLM.
+
+    Returns:
+        tuple: (httpx.Client, httpx.AsyncClient)
+    """
+    transporte = TransporteLLM(politica, limite)
+    return httpx.Client(transport=transporte, timeout=TIMEOUT), httpx.AsyncClient(transport=transporte, timeout=TIMEOUT)
+
+
+def opciones_cliente_llm(politica=None, limite=CONEXIONES):
+    """
+    Parámetros para ChatOpenAI (y, sin `http_async_client`, para openai.OpenAI) con esta capa.
+
+    Sin argumentos devuelve siempre los mismos clientes del proceso, así todas las cadenas
+    comparten el pool de conexiones, el limitador y la coalescencia.
+
+    Args:
+        politica: PoliticaLLM propia (p.ej. con los límites repartidos entre workers)
+        limite: Conexiones simultáneas del pool
+
+    Returns:
+        dict: {"http_client", "http_async_client", "max_retries": 0}
+    """
+    compartidas = politica is None and limite == CONEXIONES
+    pid = os.getpid()
+    if compartidas and pid in _opciones:
+        return dict(_opciones[pid])
+    http_client, http_async_client = crear_clientes_llm(politica, limite)
+    opciones = {"http_client": http_client, "http_async_client": http_async_client, "max_retries": 0}
+    if compartidas:
+        _opciones[pid] = opciones
+    return dict(opciones)
@@ -0,0 +1,193 @@
+"""
+Contexto del prompt con presupuesto de tokens, en vez de unir siempre los 3 mejores fragmentos.
+
+Con `chunk_overlap=50` dos fragmentos vecinos repiten texto, y con `chunk_size=500` fijo un
+fragmento puede traer relleno que no hace falta o cortar justo lo que sí. El empaquetador
+recibe una lista más amplia de candidatos (en orden de relevancia) y:
+
+1. ubica cada fragmento en el texto de su archivo (los fragmentos del splitter son
+   subcadenas exactas del archivo),
+2. une los fragmentos del mismo archivo que se solapan o son contiguos en un solo bloque,
+   sin repetir el solapamiento,
+3. agrega candidatos de más a menos relevante mientras entren en el presupuesto de tokens
+   (contados con el tokenizador del modelo de chat); el más relevante entra siempre.
+
+Los bloques resultantes son `Document` como los fragmentos, así que el resto del pipeline
+(compuerta, prompt, fuentes, caché) no cambia. `benchmarks/eval_contexto.py` compara
+tokens y cobertura de la respuesta contra el contexto fijo de k=3.
+"""
+
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+from langchain_core.documents import Document
+
+from cerebro.ingesta import leer_texto
+
+PRESUPUESTO_TOKENS = 300
+CANDIDATOS = 8
+SEPARADOR = "\n\n"
+_PIEZAS = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def contar_tokens_aproximado(texto):
+    """Aproximación sin tokenizador: ~4 caracteres por token en palabras, 1 por signo."""
+    return sum(math.ceil(len(pieza) / 4) for pieza in _PIEZAS.findall(texto))
+
+
+class ContadorTokens:
+    """
+    Cuenta tokens con el tokenizador del modelo de chat (tiktoken).
+
+    Si tiktoken no está instalado o no puede cargar su vocabulario (la primera vez lo
+    descarga), usa `contar_tokens_aproximado`; `nombre` dice cuál se está usando.
+
+    Args:
+        modelo: Modelo de chat de OpenAI (elige la codificación)
+    """
+
+    def __init__(self, modelo="gpt-4o-mini"):
+        self.modelo = modelo
+        self._codificacion = None
+        try:
+            import tiktoken
+            try:
+                self._codificacion = tiktoken.encoding_for_model(modelo)
+            except KeyError:
+                self._codificacion = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            self._codificacion = None
+        self.nombre = f"tiktoken {self._codificacion.name}" if self._codificacion is not None else "aproximado (~4 caracteres)"
+
+    def __call__(self, texto):
+        if self._codificacion is None:
+            return contar_tokens_aproximado(texto)
+        return len(self._codificacion.encode(texto, disallowed_special=()))
+
+
+@dataclass
+class _Bloque:
+    """Tramo de un archivo (o fragmento sin ubicar) que va al contexto."""
+
+    fuente: str
+    rango: int
+    texto: str
+    tokens: int
+    inicio: int = None
+    fin: int = None
+    miembros: list = field(default_factory=list)
+
+
+class EmpaquetadorContexto:
+    """
+    Arma el contexto con los candidatos que entran en `presupuesto` tokens, sin repetir texto.
+
+    Args:
+        presupuesto: Tokens máximos del contexto (el candidato más relevante entra siempre)
+        candidatos: Fragmentos que se le piden al recuperador para competir por el presupuesto
+        contar: Función texto -> tokens (por defecto, ContadorTokens del modelo por defecto)
+    """
+
+    def __init__(self, presupuesto=PRESUPUESTO_TOKENS, candidatos=CANDIDATOS, contar=None):
+        self.presupuesto = presupuesto
+        self.candidatos = candidatos
+        self.contar = contar or ContadorTokens()
+        self._separador = self.contar(SEPARADOR)
+        self._textos = {}
+        self._lock = threading.Lock()
+
+    def _texto_fuente(self, ruta):
+        """Texto del archivo, releído solo si cambió desde la última vez (None si no existe)."""
+        try:
+            modificado = os.stat(ruta).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            guardado = self._textos.get(ruta)
+        if guardado is not None and guardado[0] == modificado:
+            return guardado[1]
+        texto = leer_texto(ruta)
+        with self._lock:
+            self._textos[ruta] = (modificado, texto)
+        return texto
+
+    def _ubicar(self, doc):
+        """(texto del archivo, inicio, fin) del fragmento, o None si no se encuentra."""
+        ruta = doc.metadata.get("source")
+        texto = self._texto_fuente(ruta) if ruta else None
+        inicio = texto.find(doc.page_content) if texto else -1
+        if inicio < 0:
+            return None
+        return texto, inicio, inicio + len(doc.page_content)
+
+    def empaquetar(self, docs, scores=None):
+        """
+        Elige y une los candidatos que entran en el presupuesto.
+
+        Args:
+            docs: Candidatos ordenados de más a menos relevante
+            scores: Distancias de cada candidato (opcional)
+
+        Returns:
+            tuple: (bloques como Document en orden de relevancia, distancia de cada bloque)
+        """
+        scores = list(scores) if scores else [None] * len(docs)
+        bloques = []
+        usados = 0
+        for rango, (doc, score) in enumerate(zip(docs, scores)):
+            fuente = doc.metadata.get("source", "?")
+            ubicado = self._ubicar(doc)
+            if ubicado is None:
+                nuevo = _Bloque(fuente, rango, doc.page_content, self.contar(doc.page_content), miembros=[(doc, score)])
+                vecinos = []
+            else:
+                texto, inicio, fin = ubicado
+                # Bloques del mismo archivo que se solapan o están separados solo por espacios
+                vecinos = [
+                    b for b in bloques
+                    if b.inicio is not None and b.fuente == fuente
+                    and not texto[min(fin, b.fin):max(inicio, b.inicio)].strip()
+                ]
+                inicio = min([inicio] + [b.inicio for b in vecinos])
+                fin = max([fin] + [b.fin for b in vecinos])
+                unido = texto[inicio:fin].strip()
+                nuevo = _Bloque(fuente, min([rango] + [b.rango for b in vecinos]), unido, self.contar(unido), inicio, fin,
+                                [m for b in vecinos for m in b.miembros] + [(doc, score)])
+            separadores = self._separador * (len(bloques) - len(vecinos))
+            costo = nuevo.tokens - sum(b.tokens for b in vecinos) + separadores
+            if bloques and usados + costo > self.presupuesto:
+                continue
+            usados += costo
+            bloques = [b for b in bloques if b not in vecinos] + [nuevo]
+
+        bloques.sort(key=lambda b: b.rango)
+        distancias = [
+            min((s for _, s in b.miembros if s is not None), default=None) for b in bloques
+        ]
+        return [
+            Document(page_content=b.texto, metadata={**b.miembros[0][0].metadata, "fragmentos": len(b.miembros)})
+            for b in bloques
+        ], distancias
+
+
+def crear_empaquetador(modelo=None):
+    """
+    Crea el empaquetador de contexto según el entorno.
+
+    CONTEXTO_TOKENS fija el presupuesto (0 = desactivado: los 3 mejores fragmentos tal
+    cual) y CONTEXTO_CANDIDATOS cuántos fragmentos compiten por él.
+
+    Args:
+        modelo: Modelo de chat (elige el tokenizador)
+
+    Returns:
+        EmpaquetadorContexto | None: None si está desactivado
+    """
+    presupuesto = int(os.getenv("CONTEXTO_TOKENS", PRESUPUESTO_TOKENS))
+    if presupuesto <= 0:
+        return None
+    contar = ContadorTokens(modelo or os.getenv("OPENAI_MODEL") or "gpt-4o-mini")
+    return EmpaquetadorContexto(presupuesto, int(os.getenv("CONTEXTO_CANDIDATOS", CANDIDATOS)), contar)
@@ -0,0 +1,325 @@
+"""
+Memoria de conversación para los chats: historial acotado en tokens y resumido.
+
+Sin memoria, cada pregunta del `while True` viaja sola: una repregunta como "¿y el nivel
+deep?" se busca tal cual en la documentación y recupera cualquier cosa. `Conversacion`
+guarda el estado del diálogo en tres partes:
+
+1. reescritura: si la pregunta parece una repregunta (conector inicial, pronombre o
+   referencia, o muy pocos términos y ninguno del corpus), el LLM la reformula como
+   consulta autocontenida, que es la que va a la búsqueda y al prompt de respuesta,
+2. ventana: los últimos turnos completos, mientras entren en `ventana_tokens`,
+3. resumen: los turnos que salen de la ventana se comprimen de a poco en un resumen de
+   hasta `resumen_tokens` (el LLM actualiza el resumen anterior con los turnos nuevos, en
+   segundo plano mientras el usuario escribe).
+
+Así el historial que acompaña cada llamada tiene un tope fijo de tokens aunque la sesión
+dure cien turnos (ver `benchmarks/bench_conversacion.py`).
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from cerebro.trazas import SIN_TRAZA
+
+VENTANA_TOKENS = 1000
+RESUMEN_TOKENS = 250
+# Una repregunta empieza con un conector ("¿y ...?", "¿entonces ...?") o nombra algo dicho antes
+_CONECTORES = re.compile(r"^[¿¡\s]*(y|e|o|pero|entonces|además|ademas|también|tambien)\b", re.IGNORECASE)
+_REFERENCIAS = re.compile(
+    r"\b(?:"
+    # Demostrativos neutros: "¿eso funciona en Windows?"
+    r"eso|esto|aquello"
+    # Demostrativo o "dicho" + sustantivo: "esa función", "dicho parámetro" ("esta" suele ser "está" sin tilde)
+    r"|(?:ese|esa|esos|esas|este|estos|estas|aquel|aquella|aquellos|aquellas|dicho|dicha|dichos|dichas)\s+\w+"
+    # "el anterior", "lo mismo" (pero no "lo mismo que ...", que nombra las dos cosas)
+    r"|(?:el|la|los|las|lo)\s+anterior(?:es)?|lo\s+(?:mismo|dicho)(?!\s+que)"
+    # Pronombre átono + verbo: "¿cómo lo instalo?", "¿dónde la configuro?"
+    r"|(?:cómo|dónde|cuándo|qué|se|no|ya)\s+(?:lo|la|los|las|le|les)\s+\w+"
+    # Pronombre pegado al verbo: "¿puedo desactivarlo?", "usándola"
+    r"|\w+(?:ar|er|ir|ando|ándo|iendo|iéndo)(?:se|me|te)?(?:lo|la|los|las)"
+    # "otra/otro" sin complemento al final de la pregunta: "¿hay otra forma?" (no "otra forma de instalar")
+    r"|otr[oa]s?\s+\w+(?=\s*[?.!]*\s*$)"
+    r"|él|ella|ellos|ellas|ahí|ahi|allí|alli"
+    r")\b",
+    re.IGNORECASE,
+)
+# Con dos términos o menos y ninguno del corpus ("¿cuánto cuesta?") falta de qué se habla;
+# "¿Qué es Python?" o "¿Cómo instalo HenryPy?" son cortas pero nombran su tema
+_MAXIMO_TERMINOS_SEGUIMIENTO = 2
+
+
+@dataclass
+class Turno:
+    """Una pregunta del usuario con su respuesta."""
+
+    pregunta: str
+    respuesta: str
+    tokens: int
+
+    def como_texto(self):
+        return f"Usuario: {self.pregunta}\nAsistente: {self.respuesta}"
+
+
+def _limpiar_consulta(texto):
+    """Primera línea de la respuesta del LLM, sin comillas ni prefijos del estilo "Pregunta:"."""
+    linea = next((l for l in texto.strip().splitlines() if l.strip()), "")
+    linea = re.sub(r"^(pregunta( reformulada)?|consulta)\s*:\s*", "", linea.strip(), flags=re.IGNORECASE)
+    return linea.strip().strip("\"'«»“”").strip()
+
+
+class Conversacion:
+    """
+    Estado de una conversación: ventana de turnos recientes más un resumen de los anteriores.
+
+    Args:
+        contar: Función texto -> tokens (por defecto, ContadorTokens del modelo por defecto)
+        ventana_tokens: Tokens máximos de los turnos que se guardan completos
+        resumen_tokens: Tokens máximos del resumen de los turnos anteriores
+        reescribir: Cadena (o función `(entrada, config=None) -> str`) que recibe
+            {"historial", "question"} y devuelve la pregunta autocontenida; None = no reescribir
+        resumir: Cadena (o función) que recibe {"resumen", "turnos", "palabras"} y devuelve el
+            resumen actualizado; None = resumen extractivo con las preguntas anteriores
+        vocabulario: Términos del corpus ya tokenizados (p.ej. `IndiceInvertido.vocabulario`),
+            o función sin argumentos que los devuelve (None mientras no estén cargados);
+            sin vocabulario solo se reformulan las preguntas con conector o referencia
+    """
+
+    def __init__(self, contar=None, ventana_tokens=VENTANA_TOKENS, resumen_tokens=RESUMEN_TOKENS,
+                 reescribir=None, resumir=None, vocabulario=None):
+        if contar is None:
+            # cerebro.contexto importa langchain_core: solo cuando no se pasa un contador
+            from cerebro.contexto import ContadorTokens
+            contar = ContadorTokens()
+        self.contar = contar
+        self.ventana_tokens = ventana_tokens
+        self.resumen_tokens = resumen_tokens
+        self.reescribir = reescribir
+        self.resumir = resumir
+        self.vocabulario = vocabulario
+        self.turnos = []
+        self.resumen = ""
+        self.resumidos = 0
+        self.reescrituras = 0
+        self._ultima_consulta = None
+        self._lock = threading.Lock()
+        # Un solo hilo: los resúmenes se aplican en orden, cada uno sobre el anterior
+        self._resumidor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="resumen")
+        self._pendiente = None
+
+    def __len__(self):
+        return len(self.turnos) + self.resumidos
+
+    # --- reescritura ------------------------------------------------------------------
+
+    def es_seguimiento(self, pregunta):
+        """Si la pregunta parece depender de la conversación (heurística, sin llamar al LLM)."""
+        from cerebro.lexico import tokenizar
+
+        if _CONECTORES.match(pregunta) or _REFERENCIAS.search(pregunta):
+            return True
+        vocabulario = self.vocabulario() if callable(self.vocabulario) else self.vocabulario
+        if vocabulario is None:
+            return False
+        terminos = tokenizar(pregunta)
+        return len(terminos) <= _MAXIMO_TERMINOS_SEGUIMIENTO and not any(t in vocabulario for t in terminos)
+
+    def consulta(self, pregunta, traza=SIN_TRAZA):
+        """
+        Pregunta autocontenida para buscar en la documentación y responder.
+
+        Solo se llama al LLM cuando hay historial y la pregunta parece una repregunta; si
+        la reescritura falla se agrega la consulta anterior a la pregunta.
+
+        Args:
+            pregunta: Pregunta tal como la escribió el usuario
+            traza: Traza donde registrar la llamada al LLM (ver cerebro.trazas)
+
+        Returns:
+            str: La pregunta reformulada, o la original si no hacía falta
+        """
+        self._esperar_resumen()
+        if not self.turnos and not self.resumen or self.reescribir is None or not self.es_seguimiento(pregunta):
+            return pregunta
+        entrada = {"historial": self.historial(), "question": pregunta}
+        try:
+            with traza.llamada_llm("reescritura") as config:
+                consulta = _limpiar_consulta(self.reescribir.invoke(entrada, config=config)
+                                             if hasattr(self.reescribir, "invoke") else self.reescribir(entrada, config=config))
+        except Exception:
+            consulta = ""
+        if not consulta:
+            consulta = f"{self._ultima_consulta} {pregunta}" if self._ultima_consulta else pregunta
+        self.reescrituras += consulta != pregunta
+        return consulta
+
+    # --- historial --------------------------------------------------------------------
+
+    def registrar(self, pregunta, respuesta, consulta=None):
+        """
+        Agrega un turno y saca de la ventana los más viejos que no entran.
+
+        Los turnos que salen se resumen en segundo plano; el último turno queda siempre en
+        la ventana (con la respuesta recortada si sola supera `ventana_tokens`).
+
+        Args:
+            pregunta: Pregunta del usuario
+            respuesta: Respuesta mostrada
+            consulta: Pregunta reformulada (la próxima reescritura fallida la usa de respaldo)
+        """
+        self._ultima_consulta = consulta or pregunta
+        turno = Turno(pregunta, respuesta, self.contar(Turno(pregunta, respuesta, 0).como_texto()))
+        if turno.tokens > self.ventana_tokens:
+            disponible = max(0, self.ventana_tokens - self.contar(Turno(pregunta, "", 0).como_texto()))
+            turno.respuesta = self._recortar(respuesta, disponible)
+            turno.tokens = self.contar(turno.como_texto())
+        with self._lock:
+            self.turnos.append(turno)
+            salientes = []
+            while len(self.turnos) > 1 and sum(t.tokens for t in self.turnos) > self.ventana_tokens:
+                salientes.append(self.turnos.pop(0))
+        if salientes:
+            self._pendiente = self._resumidor.submit(self._resumir, salientes)
+
+    def _resumir(self, salientes):
+        """Incorpora los turnos que salieron de la ventana al resumen (en el hilo del resumidor)."""
+        turnos = "\n\n".join(t.como_texto() for t in salientes)
+        resumen = ""
+        if self.resumir is not None:
+            # ~0.75 palabras por token en español
+            entrada = {"resumen": self.resumen or "(vacío)", "turnos": turnos, "palabras": int(self.resumen_tokens * 0.75)}
+            try:
+                resumen = (self.resumir.invoke(entrada) if hasattr(self.resumir, "invoke") else self.resumir(entrada)).strip()
+            except Exception:
+                resumen = ""
+        if not resumen:
+            # Sin LLM (o si falló): quedan las preguntas, que son las que nombran los temas
+            anteriores = "\n".join(f"- El usuario preguntó: {t.pregunta}" for t in salientes)
+            resumen = f"{self.resumen}\n{anteriores}".strip()
+        with self._lock:
+            self.resumen = self._recortar(resumen, self.resumen_tokens, final=True)
+            self.resumidos += len(salientes)
+
+    def _esperar_resumen(self):
+        pendiente = self._pendiente
+        if pendiente is not None:
+            pendiente.result()
+
+    def _recortar(self, texto, tokens, final=False):
+        """Recorta `texto` a `tokens` por palabras: conserva el comienzo, o el final si `final`."""
+        if self.contar(texto) <= tokens:
+            return texto
+        palabras = texto.split(" ")
+        # Búsqueda binaria de cuántas palabras entran
+        bajo, alto = 0, len(palabras)
+        while bajo < alto:
+            medio = (bajo + alto + 1) // 2
+            parte = palabras[-medio:] if final else palabras[:medio]
+            if self.contar("… " + " ".join(parte)) <= tokens:
+                bajo = medio
+            else:
+                alto = medio - 1
+        if not bajo:
+            return ""
+        return "… " + " ".join(palabras[-bajo:]) if final else " ".join(palabras[:bajo]) + " …"
+
+    def mensajes(self):
+        """
+        Historial en formato de mensajes de chat (OpenAI): resumen como mensaje de sistema
+        y los turnos de la ventana como pares usuario/asistente.
+        """
+        self._esperar_resumen()
+        with self._lock:
+            mensajes = [{"role": "system", "content": f"Resumen de la conversación anterior:\n{self.resumen}"}] if self.resumen else []
+            for turno in self.turnos:
+                mensajes.append({"role": "user", "content": turno.pregunta})
+                mensajes.append({"role": "assistant", "content": turno.respuesta})
+        return mensajes
+
+    def historial(self):
+        """Resumen y turnos de la ventana como texto, para el prompt de reescritura."""
+        with self._lock:
+            partes = [f"(Resumen) {self.resumen}"] if self.resumen else []
+            partes += [turno.como_texto() for turno in self.turnos]
+        return "\n\n".join(partes)
+
+    def tokens(self):
+        """Tokens del historial que acompaña cada llamada (ventana + resumen)."""
+        with self._lock:
+            return sum(t.tokens for t in self.turnos) + (self.contar(self.resumen) if self.resumen else 0)
+
+    def resumen_uso(self):
+        """Resumen de la memoria para mostrar al salir."""
+        self._esperar_resumen()
+        return (f"🧵 Memoria: {len(self)} turnos ({len(self.turnos)} en la ventana, {self.resumidos} resumidos), "
+                f"{self.tokens()} tokens de historial, {self.reescrituras} preguntas reformuladas")
+
+    def cerrar(self):
+        self._resumidor.shutdown(wait=True)
+
+
+class _ConversacionNula:
+    """Sin memoria (MEMORIA=0): cada pregunta viaja sola, como antes."""
+
+    turnos = ()
+    resumen = ""
+
+    def __len__(self):
+        return 0
+
+    def consulta(self, pregunta, traza=SIN_TRAZA):
+        return pregunta
+
+    def registrar(self, pregunta, respuesta, consulta=None):
+        pass
+
+    def mensajes(self):
+        return []
+
+    def historial(self):
+        return ""
+
+    def tokens(self):
+        return 0
+
+    def resumen_uso(self):
+        return ""
+
+    def cerrar(self):
+        pass
+
+
+SIN_MEMORIA = _ConversacionNula()
+
+
+def crear_conversacion(cadenas=None, contar=None, reescribir=None, resumir=None, vocabulario=None):
+    """
+    Crea la memoria de conversación según el entorno.
+
+    MEMORIA=0 la desactiva; MEMORIA_TOKENS fija la ventana de turnos completos y
+    MEMORIA_RESUMEN_TOKENS el largo máximo del resumen.
+
+    Args:
+        cadenas: Registro de construir_cadenas (usa sus cadenas de reescritura y resumen)
+        contar: Función texto -> tokens (por defecto, ContadorTokens de OPENAI_MODEL)
+        reescribir: Reescritura a usar si no hay `cadenas`
+        resumir: Resumen a usar si no hay `cadenas`
+        vocabulario: Términos del corpus para reconocer las preguntas cortas que nombran su
+            tema (ver Conversacion)
+
+    Returns:
+        Conversacion | _ConversacionNula: SIN_MEMORIA si está desactivada
+    """
+    if os.getenv("MEMORIA", "1") == "0":
+        return SIN_MEMORIA
+    if cadenas is not None:
+        from cerebro.cadenas import REESCRITURA, RESUMEN
+        reescribir, resumir = cadenas[REESCRITURA], cadenas[RESUMEN]
+    if contar is None:
+        from cerebro.contexto import ContadorTokens
+        contar = ContadorTokens(os.getenv("OPENAI_MODEL") or "gpt-4o-mini")
+    return Conversacion(contar, int(os.getenv("MEMORIA_TOKENS", VENTANA_TOKENS)),
+                        int(os.getenv("MEMORIA_RESUMEN_TOKENS", RESUMEN_TOKENS)), reescribir, resumir, vocabulario)
@@ -0,0 +1,114 @@
+"""
+Embedding en paralelo sobre varios núcleos de CPU para la ingesta.
+
+`EmbeddingParalelo` reparte los lotes grandes de `embed_documents` entre procesos
+worker, cada uno con su propia copia del modelo, y reensambla los vectores en el orden
+original. Las consultas (`embed_query`) y los lotes pequeños se resuelven en el proceso
+principal para no pagar la comunicación entre procesos.
+
+Los workers se crean con el contexto "spawn" (no fork): el modelo de sentence-transformers
+y los tokenizers no son seguros tras un fork con hilos activos.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Modelo cargado en cada proceso worker (ver _inicializar_worker)
+_modelo_worker = None
+
+
+def limitar_hilos(hilos):
+    """
+    Fija los hilos intra-op del modelo en este proceso (OpenMP y torch).
+
+    Evita la sobre-suscripción cuando varios procesos comparten los núcleos: cada uno
+    usa solo su parte. También lo usan los workers de `servidor.py --workers`.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(hilos)
+    try:
+        import torch
+        torch.set_num_threads(hilos)
+    except ImportError:
+        pass
+
+
+def _inicializar_worker(fabrica, hilos):
+    global _modelo_worker
+    if hilos:
+        limitar_hilos(hilos)
+    _modelo_worker = fabrica()
+
+
+def _embeber_en_worker(textos):
+    return np.asarray(_modelo_worker.embed_documents(textos), dtype=np.float32)
+
+
+def workers_configurados():
+    """Cantidad de procesos de embedding según EMBEDDING_WORKERS (1 = sin paralelismo)."""
+    valor = os.getenv("EMBEDDING_WORKERS", "1")
+    if valor == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(valor))
+
+
+class EmbeddingParalelo(Embeddings):
+    """
+    Embeddings que reparte los lotes grandes entre un pool de procesos.
+
+    Args:
+        fabrica: Callable serializable (p.ej. `functools.partial(HuggingFaceEmbeddings, ...)`)
+            que crea el modelo dentro de cada worker
+        workers: Cantidad de procesos (por defecto, uno por núcleo)
+        lote_worker: Textos por sub-lote enviado a un worker
+        hilos_por_worker: Hilos intra-op de cada worker (por defecto núcleos / workers)
+        local: Modelo ya cargado en este proceso para consultas y lotes pequeños
+            (si no se pasa, se crea con `fabrica` la primera vez que hace falta)
+
+    Después de `cerrar()` todo se resuelve con el modelo local: un lote grande de
+    consultas tras la ingesta no vuelve a levantar el pool.
+    """
+
+    def __init__(self, fabrica, workers=None, lote_worker=32, hilos_por_worker=None, local=None):
+        self.fabrica = fabrica
+        self.workers = workers or os.cpu_count() or 1
+        self.lote_worker = lote_worker
+        self.hilos_por_worker = hilos_por_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._local = local
+        self._pool = None
+        self._cerrado = False
+
+    def _modelo_local(self):
+        if self._local is None:
+            self._local = self.fabrica()
+        return self._local
+
+    def _pool_procesos(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_worker,
+                initargs=(self.fabrica, self.hilos_por_worker),
+            )
+        return self._pool
+
+    def embed_documents(self, texts):
+        if self.workers <= 1 or len(texts) <= self.lote_worker or self._cerrado:
+            return self._modelo_local().embed_documents(texts)
+        sublotes = [texts[i:i + self.lote_worker] for i in range(0, len(texts), self.lote_worker)]
+        # executor.map devuelve los resultados en el orden de envío
+        return np.concatenate(list(self._pool_procesos().map(_embeber_en_worker, sublotes))).tolist()
+
+    def embed_query(self, text):
+        return self._modelo_local().embed_query(text)
+
+    def cerrar(self):
+        """Termina los procesos worker (p.ej. al terminar la ingesta); lo que siga usa el modelo local."""
+        self._cerrado = True
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,165 @@
+"""
+Ramas especulativas: generaciones del LLM que arrancan antes de saber si hacen falta.
+
+En el peor caso el sistema híbrido encadena búsqueda → respuesta con documentación →
+reintento con prompt directo (o búsqueda → conocimiento propio). En modo especulativo
+las respuestas candidatas corren en paralelo y se descartan las que no se usan:
+
+- la de conocimiento propio arranca junto con la búsqueda y se cancela si la
+  compuerta de relevancia elige la documentación,
+- la respuesta con documentación y su reintento corren a la vez; apenas la primera
+  supera el largo mínimo (ya no puede ser un "no sé") se cancela el reintento.
+
+Cada rama genera en streaming y guarda lo recibido sin mostrarlo hasta que alguien
+decide usarla (`seguir`). Cancelar corta el stream, con lo que el proveedor deja de
+generar (y de cobrar) tokens; lo ya generado y el prompt se pagan igual, ese es el
+costo de la especulación (ver benchmarks/bench_especulacion.py).
+
+`RamaEspeculativa` corre en un hilo (chats de terminal) y `RamaEspeculativaAsync` en
+una tarea del event loop (servidor y modo lote).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_EJECUTOR = None
+_EJECUTOR_LOCK = threading.Lock()
+
+
+class RamaCancelada(Exception):
+    """Se lanza dentro de una rama en hilo para cortar su stream al cancelarla."""
+
+
+def _ejecutor():
+    global _EJECUTOR
+    with _EJECUTOR_LOCK:
+        if _EJECUTOR is None:
+            _EJECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="especulacion")
+        return _EJECUTOR
+
+
+class _Rama:
+    """
+    Estado común: lo recibido hasta ahora, a quién reenviarlo y si ya superó el umbral.
+
+    Args:
+        umbral: Caracteres a partir de los cuales la rama se considera suficiente
+    """
+
+    def __init__(self, umbral=0):
+        self.umbral = umbral
+        self.partes = []
+        self.largo = 0
+        self.suficiente = None  # True: superó `umbral`; False: terminó antes
+        self.cancelada = False
+        self._destino = None
+        self._lock = threading.Lock()
+
+    def _recibir(self, fragmento):
+        if self.cancelada:
+            raise RamaCancelada()
+        with self._lock:
+            self.partes.append(fragmento)
+            self.largo += len(fragmento)
+            if self._destino is not None:
+                self._destino(fragmento)
+        if self.suficiente is None and self.largo >= self.umbral:
+            self._decidir(True)
+
+    def _decidir(self, suficiente):
+        self.suficiente = suficiente
+
+    def seguir(self, destino):
+        """Reenvía a `destino` lo recibido hasta ahora y, desde ahí, cada fragmento nuevo."""
+        if destino is None:
+            return
+        with self._lock:
+            if self.partes:
+                destino("".join(self.partes))
+            self._destino = destino
+
+
+class RamaEspeculativa(_Rama):
+    """
+    Generación que corre en un hilo apenas se crea.
+
+    Args:
+        generar: Función que recibe `al_recibir` y genera en streaming (p.ej. `_generar`)
+        umbral: Caracteres a partir de los cuales la rama se considera suficiente
+    """
+
+    def __init__(self, generar, umbral=0):
+        super().__init__(umbral)
+        self._decidida = threading.Event()
+        self._futuro = _ejecutor().submit(self._correr, generar)
+
+    def _correr(self, generar):
+        try:
+            return generar(self._recibir)
+        finally:
+            if self.suficiente is None:
+                self._decidir(False)
+
+    def _decidir(self, suficiente):
+        super()._decidir(suficiente)
+        self._decidida.set()
+
+    def esperar(self):
+        """Espera a que supere el umbral (True) o termine antes (False)."""
+        self._decidida.wait()
+        return self.suficiente
+
+    def resultado(self):
+        """Respuesta completa (espera a que termine)."""
+        return self._futuro.result()
+
+    def cancelar(self):
+        """
+        Descarta la rama: no arranca si todavía no lo hizo, o corta su stream al llegar
+        el próximo fragmento (un hilo no se puede interrumpir mientras espera la red).
+        """
+        self.cancelada = True
+        self._futuro.cancel()
+
+
+class RamaEspeculativaAsync(_Rama):
+    """
+    Generación que corre como tarea del event loop apenas se crea.
+
+    Args:
+        generar: Función que recibe `al_recibir` y devuelve la corrutina que genera en streaming
+        umbral: Caracteres a partir de los cuales la rama se considera suficiente
+    """
+
+    def __init__(self, generar, umbral=0):
+        super().__init__(umbral)
+        self._decidida = asyncio.Event()
+        self._tarea = asyncio.create_task(self._correr(generar))
+        # Una rama descartada que falló no debe avisar "Task exception was never retrieved"
+        self._tarea.add_done_callback(lambda tarea: tarea.cancelled() or tarea.exception())
+
+    async def _correr(self, generar):
+        try:
+            return await generar(self._recibir)
+        finally:
+            if self.suficiente is None:
+                self._decidir(False)
+
+    def _decidir(self, suficiente):
+        super()._decidir(suficiente)
+        self._decidida.set()
+
+    async def esperar(self):
+        """Espera a que supere el umbral (True) o termine antes (False)."""
+        await self._decidida.wait()
+        return self.suficiente
+
+    async def resultado(self):
+        """Respuesta completa (espera a que termine)."""
+        return await self._tarea
+
+    def cancelar(self):
+        """Descarta la rama: cancela la tarea y con ella la petición HTTP en curso."""
+        self.cancelada = True
+        self._tarea.cancel()
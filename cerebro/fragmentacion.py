@@ -0,0 +1,458 @@
+"""
+Fragmentación por estructura de Markdown e índice de secciones de cada fragmento.
+
+`RecursiveCharacterTextSplitter` corta por cantidad de caracteres: un fragmento puede
+empezar en la mitad de `## **1. Instalación**` o partir la firma y la lista de
+parámetros de `henrypy.refactor`, y la respuesta termina repartida entre dos fragmentos.
+`DivisorMarkdown` corta primero por secciones (encabezados `#`) y dentro de cada sección
+por bloques (párrafos, listas, bloques de código), que nunca parte salvo que un solo
+bloque supere el tamaño máximo: las listas se cortan entre ítems de primer nivel y los
+párrafos entre oraciones. Un encabezado sin cuerpo (p.ej. `## 3. Funciones Principales`
+seguido de `### henrypy.analyze`) va con el primer bloque de su subsección.
+
+Los fragmentos son subcadenas exactas del texto del archivo, como los del splitter.
+
+`IndiceSecciones` guarda junto a ChromaDB, por fragmento, su sección y su posición
+(offsets en bytes UTF-8 del texto de `leer_texto`; en Markdown y texto plano, los del
+archivo), y por sección su ruta de encabezados, su rango y su sección padre. Con eso el
+recuperador expande un fragmento encontrado a la sección completa que lo contiene
+leyendo el archivo, sin otra consulta a la base vectorial.
+
+En disco son `indice_secciones.npz` (arreglos) e `indice_secciones.json` (versión del
+corpus, IDs, fuentes y rutas de encabezados); se reconstruyen cuando cambia la versión
+del corpus. `benchmarks/eval_fragmentacion.py` mide recall@k contra el splitter por caracteres.
+"""
+
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.documents import Document
+
+from cerebro.ingesta import id_fragmento, leer_texto
+
+TAMANO_FRAGMENTO = 500
+# Secciones más largas que esto no se expanden: el fragmento va solo
+MAXIMO_SECCION = 1500
+ARCHIVO_ARREGLOS = "indice_secciones.npz"
+ARCHIVO_META = "indice_secciones.json"
+SEPARADOR_RUTA = " > "
+
+_ENCABEZADO = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$")
+_VALLA = re.compile(r"^\s*(```|~~~)")
+_ITEM_PRIMER_NIVEL = re.compile(r"^(?:[*+-]|\d+[.)])[ \t]+")
+_FIN_ORACION = re.compile(r"(?<=[.!?:])\s+")
+
+
+def titulo_encabezado(texto):
+    """Título legible de un encabezado: sin `#`, negritas ni escapes de Markdown."""
+    texto = re.sub(r"\*\*|__|`", "", texto)
+    return re.sub(r"\\(.)", r"\1", texto).strip()
+
+
+@dataclass
+class Seccion:
+    """Rango de una sección del texto: desde su encabezado hasta el siguiente de igual o mayor nivel."""
+
+    ruta: tuple
+    nivel: int
+    inicio: int
+    fin: int
+    padre: int = -1
+
+
+@dataclass
+class Fragmento:
+    """Fragmento del texto con su sección (índice en la lista de secciones) y su rango en caracteres."""
+
+    texto: str
+    inicio: int
+    fin: int
+    seccion: int
+
+
+class DivisorMarkdown:
+    """
+    Divide textos Markdown por secciones y bloques, hasta `chunk_size` caracteres por fragmento.
+
+    Tiene la interfaz de los text splitters que usa la ingesta (`split_text`) y los
+    atributos que forman parte de la huella de la colección (`_chunk_size`, `_chunk_overlap`).
+
+    Args:
+        chunk_size: Caracteres máximos de un fragmento (un bloque indivisible puede superarlo)
+    """
+
+    def __init__(self, chunk_size=TAMANO_FRAGMENTO):
+        self._chunk_size = chunk_size
+        # Los cortes caen entre bloques: no hace falta repetir texto entre fragmentos vecinos
+        self._chunk_overlap = 0
+
+    def split_text(self, texto):
+        return [fragmento.texto for fragmento in self.dividir(texto)[1]]
+
+    def dividir(self, texto):
+        """
+        Divide `texto` en fragmentos.
+
+        Returns:
+            tuple: (lista de Seccion, lista de Fragmento en orden de aparición)
+        """
+        secciones, bloques = self._analizar(texto)
+        fragmentos = []
+        actual = []  # bloques (inicio, fin, sección, es_encabezado) del fragmento en curso
+
+        def cerrar():
+            if actual:
+                contenido = [b for b in actual if not b[3]]
+                # La sección del fragmento es la de su primer bloque de contenido
+                seccion = contenido[0][2] if contenido else actual[-1][2]
+                inicio, fin = actual[0][0], actual[-1][1]
+                fragmentos.append(Fragmento(texto[inicio:fin], inicio, fin, seccion))
+                actual.clear()
+
+        for inicio, fin, seccion, es_encabezado in bloques:
+            # Un bloque más grande que el máximo se parte (listas por ítems, párrafos por oraciones)
+            partes = [(inicio, fin)] if es_encabezado or fin - inicio <= self._chunk_size else self._partir(texto, inicio, fin)
+            for parte_inicio, parte_fin in partes:
+                # Un encabezado empieza fragmento, salvo que el fragmento en curso sea solo encabezados
+                if any(not b[3] for b in actual) and (es_encabezado or parte_fin - actual[0][0] > self._chunk_size):
+                    cerrar()
+                actual.append((parte_inicio, parte_fin, seccion, es_encabezado))
+        cerrar()
+        return secciones, fragmentos
+
+    def _analizar(self, texto):
+        """Secciones del texto y sus bloques (inicio, fin, sección, es_encabezado) en caracteres."""
+        secciones = [Seccion((), 0, 0, len(texto))]
+        abiertas = [0]  # pila de secciones que contienen la posición actual
+        bloques = []
+        posicion = 0
+        bloque_inicio = bloque_fin = None
+        en_codigo = False
+
+        def cerrar_bloque():
+            nonlocal bloque_inicio
+            if bloque_inicio is not None:
+                bloques.append((bloque_inicio, bloque_fin, abiertas[-1], False))
+                bloque_inicio = None
+
+        for linea in texto.splitlines(keepends=True):
+            inicio, fin = posicion, posicion + len(linea.rstrip("\r\n"))
+            posicion += len(linea)
+            contenido = linea.strip()
+            if _VALLA.match(linea):
+                if bloque_inicio is None:
+                    bloque_inicio = inicio
+                bloque_fin = fin
+                en_codigo = not en_codigo
+                continue
+            if en_codigo:
+                bloque_fin = fin
+                continue
+            encabezado = _ENCABEZADO.match(linea.rstrip("\r\n"))
+            if encabezado:
+                cerrar_bloque()
+                nivel = len(encabezado.group(1))
+                while len(abiertas) > 1 and secciones[abiertas[-1]].nivel >= nivel:
+                    secciones[abiertas.pop()].fin = inicio
+                padre = abiertas[-1]
+                secciones.append(Seccion(secciones[padre].ruta + (titulo_encabezado(encabezado.group(2)),), nivel, inicio, len(texto), padre))
+                abiertas.append(len(secciones) - 1)
+                bloques.append((inicio, fin, abiertas[-1], True))
+                continue
+            if not contenido:
+                cerrar_bloque()
+                continue
+            if bloque_inicio is None:
+                bloque_inicio = inicio + (len(linea) - len(linea.lstrip()))
+            bloque_fin = inicio + len(linea.rstrip())
+        cerrar_bloque()
+        # Las secciones terminan donde termina su último contenido, no en los espacios siguientes
+        for seccion in secciones:
+            while seccion.fin > seccion.inicio and texto[seccion.fin - 1].isspace():
+                seccion.fin -= 1
+        return secciones, bloques
+
+    def _partir(self, texto, inicio, fin):
+        """Rangos de un bloque grande: entre ítems de primer nivel si es una lista, si no entre oraciones."""
+        cortes = []
+        desplazamiento = inicio
+        for linea in texto[inicio:fin].splitlines(keepends=True):
+            if desplazamiento > inicio and _ITEM_PRIMER_NIVEL.match(linea):
+                cortes.append(desplazamiento)
+            desplazamiento += len(linea)
+        if not cortes:
+            cortes = [m.end() for m in _FIN_ORACION.finditer(texto, inicio, fin)]
+        limites = [inicio] + cortes + [fin]
+        rangos = []
+        for desde, hasta in zip(limites, limites[1:]):
+            tramo = texto[desde:hasta]
+            desde, hasta = desde + len(tramo) - len(tramo.lstrip()), desde + len(tramo.rstrip())
+            if hasta > desde:
+                rangos.append((desde, hasta))
+        return rangos
+
+
+def _offsets_bytes(texto, posiciones):
+    """Offsets en bytes UTF-8 de posiciones en caracteres (en una sola pasada por el texto)."""
+    orden = np.argsort(posiciones, kind="stable")
+    resultado = np.empty(len(posiciones), dtype=np.int64)
+    anterior, acumulado = 0, 0
+    for i in orden:
+        posicion = int(posiciones[i])
+        acumulado += len(texto[anterior:posicion].encode("utf-8"))
+        anterior = posicion
+        resultado[i] = acumulado
+    return resultado
+
+
+class IndiceSecciones:
+    """
+    Sección y posición de cada fragmento de la colección, para expandir resultados a su sección.
+
+    Se arma con `construir` (o `desde_vectorstore`) y se persiste con `guardar`/`cargar`.
+
+    Args:
+        ids: ID de cada fragmento (fila del índice)
+        fuentes: Archivos del corpus
+        rutas: Ruta de encabezados de cada sección
+        arreglos: Arreglos por fragmento (sección, inicio, fin) y por sección (fuente,
+            inicio, fin, padre), con offsets en bytes
+    """
+
+    def __init__(self, ids, fuentes, rutas, arreglos):
+        self.ids = list(ids)
+        self.fuentes = list(fuentes)
+        self.rutas = list(rutas)
+        self.fragmento_seccion = arreglos["fragmento_seccion"]
+        self.fragmento_inicio = arreglos["fragmento_inicio"]
+        self.fragmento_fin = arreglos["fragmento_fin"]
+        self.seccion_fuente = arreglos["seccion_fuente"]
+        self.seccion_inicio = arreglos["seccion_inicio"]
+        self.seccion_fin = arreglos["seccion_fin"]
+        self.seccion_padre = arreglos["seccion_padre"]
+        self._fila = {id_: fila for fila, id_ in enumerate(self.ids)}
+        self._textos = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def construir(cls, rutas_fuente, divisor):
+        """
+        Re-divide los archivos (sin embeber nada) y registra sección y posición de cada fragmento.
+
+        Args:
+            rutas_fuente: Archivos del corpus tal como figuran en `metadata["source"]`
+            divisor: DivisorMarkdown usado en la ingesta (los IDs tienen que coincidir)
+        """
+        ids, fuentes, rutas = [], [], []
+        columnas = {nombre: [] for nombre in ("fragmento_seccion", "fragmento_inicio", "fragmento_fin",
+                                             "seccion_fuente", "seccion_inicio", "seccion_fin", "seccion_padre")}
+        for ruta in rutas_fuente:
+            texto = leer_texto(ruta)
+            secciones, fragmentos = divisor.dividir(texto)
+            base = len(rutas)
+            fuentes.append(ruta)
+            posiciones = [s.inicio for s in secciones] + [s.fin for s in secciones] \
+                + [f.inicio for f in fragmentos] + [f.fin for f in fragmentos]
+            en_bytes = _offsets_bytes(texto, posiciones)
+            n, m = len(secciones), len(fragmentos)
+            for i, seccion in enumerate(secciones):
+                rutas.append(SEPARADOR_RUTA.join(seccion.ruta))
+                columnas["seccion_fuente"].append(len(fuentes) - 1)
+                columnas["seccion_inicio"].append(en_bytes[i])
+                columnas["seccion_fin"].append(en_bytes[n + i])
+                columnas["seccion_padre"].append(base + seccion.padre if seccion.padre >= 0 else -1)
+            vistos = set()
+            for j, fragmento in enumerate(fragmentos):
+                id_ = id_fragmento(ruta, fragmento.texto)
+                if id_ in vistos:
+                    continue
+                vistos.add(id_)
+                ids.append(id_)
+                columnas["fragmento_seccion"].append(base + fragmento.seccion)
+                columnas["fragmento_inicio"].append(en_bytes[2 * n + j])
+                columnas["fragmento_fin"].append(en_bytes[2 * n + m + j])
+        tipos = {"fragmento_seccion": np.int32, "seccion_fuente": np.int32, "seccion_padre": np.int32}
+        arreglos = {nombre: np.asarray(valores, dtype=tipos.get(nombre, np.int64)) for nombre, valores in columnas.items()}
+        return cls(ids, fuentes, rutas, arreglos)
+
+    @classmethod
+    def desde_vectorstore(cls, vectorstore, divisor):
+        """Construye el índice para los archivos de la colección de ChromaDB."""
+        datos = vectorstore._collection.get(include=["metadatas"])
+        fuentes = dict.fromkeys((metadata or {}).get("source") for metadata in datos["metadatas"])
+        return cls.construir(sorted(f for f in fuentes if f and os.path.exists(f)), divisor)
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- persistencia -------------------------------------------------------------------
+
+    def guardar(self, directorio, version):
+        """Guarda el índice en `directorio` (escritura atómica de ambos archivos)."""
+        ruta_arreglos = os.path.join(directorio, ARCHIVO_ARREGLOS)
+        ruta_meta = os.path.join(directorio, ARCHIVO_META)
+        with open(ruta_arreglos + ".tmp", "wb") as f:
+            np.savez(f, fragmento_seccion=self.fragmento_seccion, fragmento_inicio=self.fragmento_inicio,
+                     fragmento_fin=self.fragmento_fin, seccion_fuente=self.seccion_fuente,
+                     seccion_inicio=self.seccion_inicio, seccion_fin=self.seccion_fin, seccion_padre=self.seccion_padre)
+        meta = {"version": version, "ids": self.ids, "fuentes": self.fuentes, "rutas": self.rutas}
+        with open(ruta_meta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(ruta_arreglos + ".tmp", ruta_arreglos)
+        os.replace(ruta_meta + ".tmp", ruta_meta)
+
+    @classmethod
+    def cargar(cls, directorio, version=None):
+        """
+        Carga el índice guardado en `directorio`.
+
+        Args:
+            directorio: Directorio de la base vectorial
+            version: Versión del corpus esperada (None = cualquiera)
+
+        Returns:
+            IndiceSecciones | None: None si no existe, está dañado o es de otra versión
+        """
+        try:
+            with open(os.path.join(directorio, ARCHIVO_META), encoding="utf-8") as f:
+                meta = json.load(f)
+            if version is not None and meta["version"] != version:
+                return None
+            with np.load(os.path.join(directorio, ARCHIVO_ARREGLOS)) as arreglos:
+                datos = {nombre: arreglos[nombre] for nombre in arreglos.files}
+            return cls(meta["ids"], meta["fuentes"], meta["rutas"], datos)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # --- consultas ----------------------------------------------------------------------
+
+    def fila(self, doc):
+        """Fila del índice de un Document recuperado, o None si no está indexado."""
+        return self._fila.get(id_fragmento(doc.metadata.get("source", ""), doc.page_content))
+
+    def seccion(self, doc):
+        """Ruta de encabezados del fragmento ("1. Instalación", "3. Funciones > henrypy.analyze"), o None."""
+        fila = self.fila(doc)
+        return None if fila is None else self.rutas[self.fragmento_seccion[fila]]
+
+    def _bytes_fuente(self, fuente):
+        """Texto del archivo en UTF-8, releído solo si cambió (None si no existe)."""
+        ruta = self.fuentes[fuente]
+        try:
+            modificado = os.stat(ruta).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            guardado = self._textos.get(fuente)
+        if guardado is not None and guardado[0] == modificado:
+            return guardado[1]
+        datos = leer_texto(ruta).encode("utf-8")
+        with self._lock:
+            self._textos[fuente] = (modificado, datos)
+        return datos
+
+    def texto_seccion(self, seccion, fila=None):
+        """
+        Texto completo de una sección (con sus subsecciones), o None si el archivo ya no está.
+
+        Con `fila`, el rango se extiende para cubrir también ese fragmento (p.ej. uno que
+        empieza en el encabezado sin cuerpo de la sección padre).
+        """
+        datos = self._bytes_fuente(int(self.seccion_fuente[seccion]))
+        if datos is None:
+            return None
+        inicio, fin = self.seccion_inicio[seccion], self.seccion_fin[seccion]
+        if fila is not None:
+            inicio, fin = min(inicio, self.fragmento_inicio[fila]), max(fin, self.fragmento_fin[fila])
+        return datos[inicio:fin].decode("utf-8", errors="replace")
+
+    def expandir(self, docs, scores=None, maximo=MAXIMO_SECCION):
+        """
+        Reemplaza cada fragmento por la sección que lo contiene, sin repetir secciones.
+
+        Una sección más larga que `maximo` caracteres (o la raíz del archivo) no se expande;
+        los fragmentos sin indexar quedan como están.
+
+        Args:
+            docs: Fragmentos ordenados de más a menos relevante
+            scores: Distancia de cada fragmento (opcional)
+            maximo: Largo máximo de una sección expandida, en caracteres
+
+        Returns:
+            tuple: (documentos en orden de relevancia, distancia de cada uno)
+        """
+        scores = list(scores) if scores else [None] * len(docs)
+        resultado, distancias, incluidas = [], [], {}
+        for doc, score in zip(docs, scores):
+            fila = self.fila(doc)
+            seccion = int(self.fragmento_seccion[fila]) if fila is not None else -1
+            texto = None
+            if seccion >= 0 and self.seccion_padre[seccion] >= 0 and self.seccion_fin[seccion] - self.seccion_inicio[seccion] <= 4 * maximo:
+                texto = self.texto_seccion(seccion, fila)
+            if texto is None or len(texto) > maximo:
+                resultado.append(doc)
+                distancias.append(score)
+                continue
+            # Una sección ya incluida (o una que la contiene) no se repite
+            ancestro = seccion
+            while ancestro >= 0 and ancestro not in incluidas:
+                ancestro = int(self.seccion_padre[ancestro])
+            if ancestro >= 0:
+                posicion = incluidas[ancestro]
+                resultado[posicion].metadata["fragmentos"] += 1
+                if score is not None and (distancias[posicion] is None or score < distancias[posicion]):
+                    distancias[posicion] = score
+                continue
+            incluidas[seccion] = len(resultado)
+            resultado.append(Document(page_content=texto, metadata={**doc.metadata, "seccion": self.rutas[seccion], "fragmentos": 1}))
+            distancias.append(score)
+        return resultado, distancias
+
+
+def crear_divisor():
+    """
+    Crea el divisor de la ingesta según el entorno.
+
+    FRAGMENTACION=markdown (por defecto) corta por secciones y bloques; "caracteres" usa el
+    RecursiveCharacterTextSplitter de antes (500 caracteres con 50 de solapamiento).
+    Cambiar de divisor reconstruye la colección en el próximo arranque.
+
+    Returns:
+        DivisorMarkdown | RecursiveCharacterTextSplitter
+    """
+    modo = os.getenv("FRAGMENTACION", "markdown").lower()
+    if modo == "markdown":
+        return DivisorMarkdown(int(os.getenv("FRAGMENTO_CARACTERES", TAMANO_FRAGMENTO)))
+    if modo == "caracteres":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len)
+    raise ValueError(f"FRAGMENTACION desconocida: {modo} (opciones: markdown, caracteres)")
+
+
+def sincronizar_indice_secciones(vectorstore, persist_directory, version, divisor):
+    """
+    Devuelve el índice de secciones de la versión actual del corpus, reconstruyéndolo si hace falta.
+
+    Se llama justo después de `ingestar_documentos`, como `sincronizar_indice_lexico`.
+    EXPANDIR_SECCIONES=0 desactiva la expansión.
+
+    Args:
+        vectorstore: Base vectorial ya sincronizada
+        persist_directory: Directorio de ChromaDB
+        version: Versión del corpus (ResumenIngesta.version_corpus)
+        divisor: Divisor usado en la ingesta
+
+    Returns:
+        IndiceSecciones | None: None si el divisor no es DivisorMarkdown o la expansión está desactivada
+    """
+    if not isinstance(divisor, DivisorMarkdown) or os.getenv("EXPANDIR_SECCIONES", "1") == "0":
+        return None
+    indice = IndiceSecciones.cargar(persist_directory, version)
+    if indice is None:
+        indice = IndiceSecciones.desde_vectorstore(vectorstore, divisor)
+        indice.guardar(persist_directory, version)
+    return indice
@@ -0,0 +1,678 @@
+"""
+Índices vectoriales locales (en proceso) como alternativa a la consulta ANN de ChromaDB.
+
+ChromaDB sigue siendo la fuente de verdad de la ingesta (incremental, persistida en
+SQLite). Estos índices son una réplica de solo lectura de sus vectores, guardada junto a
+ChromaDB y reconstruida cuando cambia la versión del corpus (como el índice léxico):
+
+- exacto: producto matricial NumPy contra la matriz float32 abierta con mmap (el sistema
+  operativo carga las páginas a demanda y las comparte entre procesos). Recall 100%; la
+  latencia crece lineal con N, así que sirve para corpus chicos.
+- ivf: k-means en √N listas; cada consulta revisa solo las `sondas` listas con el
+  centroide más cercano. Sin dependencias extra.
+- hnsw: grafo HNSW de `hnswlib` (dependencia opcional). Latencia casi constante con N.
+- int8 / binario: códigos compactos de cada vector (un byte por dimensión, o un bit: el
+  signo respecto de la media) en un arreglo contiguo. Una primera pasada recorre solo los
+  códigos (productos contra int8 o distancia de Hamming) y se queda con `sobremuestreo * k`
+  candidatos; la segunda los reordena con la distancia exacta leyendo sus filas float32
+  del mmap. Lo que se recorre entero ocupa 4 (int8) o 32 (binario) veces menos que la
+  matriz, así que se pueden mantener en RAM corpus más grandes.
+
+Todos devuelven distancias L2 al cuadrado, la misma métrica de la colección de ChromaDB,
+así que la compuerta de relevancia y sus umbrales no cambian.
+`benchmarks/bench_indices.py` compara construcción, memoria, latencia y recall@k.
+
+En disco, dentro de `<persist_directory>/indice_vectorial/`:
+
+- `vectores.npy` y `normas.npy`: matriz (N, d) float32 y normas al cuadrado de cada fila,
+- `indice_vectorial.json`: versión del corpus, IDs, textos y metadatos de los fragmentos,
+- `ivf.npz` + `ivf_vectores.npy` / `hnsw.bin`: estructuras de cada índice aproximado,
+- `int8.npz` + `int8_codigos.npy` / `binario.npz` + `binario_codigos.npy`: parámetros y
+  códigos de los índices cuantizados.
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+DIRECTORIO = "indice_vectorial"
+ARCHIVO_VECTORES = "vectores.npy"
+ARCHIVO_NORMAS = "normas.npy"
+ARCHIVO_META = "indice_vectorial.json"
+ARCHIVO_IVF = "ivf.npz"
+ARCHIVO_IVF_VECTORES = "ivf_vectores.npy"
+ARCHIVO_HNSW = "hnsw.bin"
+ARCHIVO_INT8 = "int8.npz"
+ARCHIVO_INT8_CODIGOS = "int8_codigos.npy"
+ARCHIVO_BINARIO = "binario.npz"
+ARCHIVO_BINARIO_CODIGOS = "binario_codigos.npy"
+# Con más fragmentos, "auto" deja el índice exacto por uno aproximado
+LIMITE_EXACTO = 100_000
+# Filas por bloque al recorrer la matriz completa (acota la memoria temporal)
+BLOQUE = 65_536
+# Filas de códigos int8 que se pasan a float32 por vez en la primera etapa: el bloque
+# (768 KB con d=384) queda en la caché del procesador para el producto
+BLOQUE_INT8 = 512
+
+
+def _reemplazar(ruta, escribir, modo="wb"):
+    """Escribe `ruta` con `escribir(f)` en un temporal y lo reemplaza de forma atómica."""
+    with open(ruta + ".tmp", modo) as f:
+        escribir(f)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def guardar_vectores(directorio, vectores):
+    """Guarda la matriz de vectores (float32) y sus normas al cuadrado en `directorio`."""
+    os.makedirs(directorio, exist_ok=True)
+    vectores = np.asarray(vectores, dtype=np.float32)
+    _reemplazar(os.path.join(directorio, ARCHIVO_VECTORES), lambda f: np.save(f, vectores))
+    _reemplazar(os.path.join(directorio, ARCHIVO_NORMAS), lambda f: np.save(f, np.einsum("ij,ij->i", vectores, vectores)))
+
+
+def cargar_vectores(directorio):
+    """Matriz de vectores abierta con mmap (solo lectura) y sus normas al cuadrado."""
+    return (np.load(os.path.join(directorio, ARCHIVO_VECTORES), mmap_mode="r"),
+            np.load(os.path.join(directorio, ARCHIVO_NORMAS)))
+
+
+def _distancias(consultas, vectores, normas):
+    """Distancias L2 al cuadrado (Q, N): |v|² - 2 q·v + |q|²."""
+    consultas = np.asarray(consultas, dtype=np.float32)
+    distancias = normas[None, :] - 2.0 * (consultas @ vectores.T)
+    distancias += np.einsum("ij,ij->i", consultas, consultas)[:, None]
+    return np.maximum(distancias, 0.0, out=distancias)
+
+
+def _mejores(distancias, k):
+    """Posiciones y distancias de los k menores por fila, ordenadas de menor a mayor."""
+    k = min(k, distancias.shape[1])
+    posiciones = np.argpartition(distancias, k - 1, axis=1)[:, :k]
+    elegidas = np.take_along_axis(distancias, posiciones, axis=1)
+    orden = np.argsort(elegidas, axis=1, kind="stable")
+    return np.take_along_axis(posiciones, orden, axis=1), np.take_along_axis(elegidas, orden, axis=1)
+
+
+class IndiceExacto:
+    """
+    Búsqueda exacta: distancias a todas las filas con un producto matricial por bloques.
+
+    Args:
+        vectores: Matriz (N, d) float32 (normalmente un mmap de `vectores.npy`)
+        normas: Normas al cuadrado de cada fila
+    """
+
+    nombre = "exacto"
+
+    def __init__(self, vectores, normas):
+        self.vectores = vectores
+        self.normas = normas
+
+    @classmethod
+    def construir(cls, directorio):
+        """No hay estructura extra: alcanza con la matriz guardada."""
+        return cls(*cargar_vectores(directorio))
+
+    cargar = construir
+
+    def buscar(self, consultas, k):
+        """
+        Los `k` vecinos más cercanos de cada consulta.
+
+        Args:
+            consultas: Matriz (Q, d) o un solo vector
+            k: Vecinos por consulta
+
+        Returns:
+            tuple: (filas, distancias), arreglos (Q, k) ordenados de más a menos cercano
+        """
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        n = len(self.vectores)
+        if n <= BLOQUE:
+            return _mejores(_distancias(consultas, self.vectores, self.normas), k)
+        # Por bloques: se queda con los k mejores de cada bloque y después con los k globales
+        filas, distancias = [], []
+        for inicio in range(0, n, BLOQUE):
+            parcial_filas, parcial = _mejores(_distancias(consultas, self.vectores[inicio:inicio + BLOQUE], self.normas[inicio:inicio + BLOQUE]), k)
+            filas.append(parcial_filas + inicio)
+            distancias.append(parcial)
+        filas, distancias = np.hstack(filas), np.hstack(distancias)
+        posiciones, distancias = _mejores(distancias, k)
+        return np.take_along_axis(filas, posiciones, axis=1), distancias
+
+
+def _kmeans(muestra, listas, iteraciones, rng):
+    """Centroides de k-means (Lloyd) sobre `muestra`; un cluster vacío conserva su centroide."""
+    centroides = muestra[rng.choice(len(muestra), listas, replace=False)].copy()
+    for _ in range(iteraciones):
+        asignacion = np.argmin(_distancias(muestra, centroides, np.einsum("ij,ij->i", centroides, centroides)), axis=1)
+        orden = np.argsort(asignacion, kind="stable")
+        conteos = np.bincount(asignacion, minlength=listas)
+        presentes = np.flatnonzero(conteos)
+        inicios = np.concatenate(([0], np.cumsum(conteos)[:-1]))[presentes]
+        centroides[presentes] = np.add.reduceat(muestra[orden], inicios, axis=0) / conteos[presentes, None]
+    return centroides
+
+
+class IndiceIVF:
+    """
+    Índice de archivo invertido (IVF): las filas se agrupan por su centroide más cercano y
+    cada consulta calcula distancias exactas solo contra las listas de las `sondas`
+    centroides más cercanos.
+
+    Las listas se guardan como `orden` (filas agrupadas por lista) y `offsets`: las filas de
+    la lista i son `orden[offsets[i]:offsets[i + 1]]`, como los postings del índice léxico.
+    `ivf_vectores.npy` guarda una copia de la matriz en ese orden, así cada lista es un
+    tramo contiguo del mmap en vez de filas salteadas (ocupa el doble de disco).
+
+    Args:
+        vectores: Matriz (N, d) float32 en el orden de la colección
+        centroides: Matriz (listas, d) de centroides
+        orden: Filas agrupadas por lista
+        offsets: Comienzo de cada lista en `orden` (listas + 1 valores)
+        vectores_listas: `vectores[orden]` (normalmente un mmap de `ivf_vectores.npy`)
+        normas_listas: Normas al cuadrado de `vectores_listas`
+        sondas: Listas que se revisan por consulta (más = mejor recall y más latencia)
+    """
+
+    nombre = "ivf"
+    SONDAS = 16
+
+    def __init__(self, vectores, centroides, orden, offsets, vectores_listas, normas_listas, sondas=SONDAS):
+        self.vectores = vectores
+        self.centroides = centroides
+        self.normas_centroides = np.einsum("ij,ij->i", centroides, centroides)
+        self.orden = orden
+        self.offsets = offsets
+        self.vectores_listas = vectores_listas
+        self.normas_listas = normas_listas
+        self.sondas = sondas
+
+    @classmethod
+    def construir(cls, directorio, listas=None, sondas=SONDAS, iteraciones=10, semilla=0):
+        """
+        Entrena los centroides sobre una muestra, asigna todas las filas y guarda el índice.
+
+        Args:
+            directorio: Directorio con `vectores.npy`
+            listas: Cantidad de listas (por defecto √N)
+            sondas: Listas que se revisan por consulta
+            iteraciones: Iteraciones de k-means
+            semilla: Semilla de la muestra y de los centroides iniciales
+        """
+        vectores, normas = cargar_vectores(directorio)
+        n = len(vectores)
+        listas = min(n, listas or max(1, round(math.sqrt(n))))
+        rng = np.random.default_rng(semilla)
+        # 64 puntos por centroide alcanzan para entrenar (como la muestra de FAISS)
+        muestra = np.asarray(vectores[np.sort(rng.choice(n, min(n, 64 * listas), replace=False))])
+        centroides = _kmeans(muestra, listas, iteraciones, rng)
+
+        normas_centroides = np.einsum("ij,ij->i", centroides, centroides)
+        asignacion = np.concatenate([
+            np.argmin(_distancias(vectores[inicio:inicio + BLOQUE], centroides, normas_centroides), axis=1)
+            for inicio in range(0, n, BLOQUE)
+        ])
+        orden = np.argsort(asignacion, kind="stable").astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(asignacion, minlength=listas)))).astype(np.int64)
+
+        ruta = os.path.join(directorio, ARCHIVO_IVF_VECTORES)
+        copia = np.lib.format.open_memmap(ruta + ".tmp", mode="w+", dtype=np.float32, shape=vectores.shape)
+        for inicio in range(0, n, BLOQUE):
+            copia[inicio:inicio + BLOQUE] = vectores[orden[inicio:inicio + BLOQUE]]
+        copia.flush()
+        del copia
+        os.replace(ruta + ".tmp", ruta)
+        _reemplazar(os.path.join(directorio, ARCHIVO_IVF), lambda f: np.savez(
+            f, centroides=centroides, orden=orden, offsets=offsets, normas_listas=normas[orden]))
+        return cls.cargar(directorio, sondas)
+
+    @classmethod
+    def cargar(cls, directorio, sondas=SONDAS):
+        """Carga el índice guardado, o None si no existe."""
+        try:
+            with np.load(os.path.join(directorio, ARCHIVO_IVF)) as datos:
+                arreglos = [datos[nombre] for nombre in ("centroides", "orden", "offsets")]
+                normas_listas = datos["normas_listas"]
+            vectores_listas = np.load(os.path.join(directorio, ARCHIVO_IVF_VECTORES), mmap_mode="r")
+        except (OSError, KeyError, ValueError):
+            return None
+        vectores, _ = cargar_vectores(directorio)
+        return cls(vectores, *arreglos, vectores_listas, normas_listas, sondas)
+
+    def buscar(self, consultas, k):
+        """Los `k` vecinos más cercanos (aproximados) de cada consulta; ver IndiceExacto.buscar."""
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        sondas = min(self.sondas, len(self.centroides))
+        cercanas = _mejores(_distancias(consultas, self.centroides, self.normas_centroides), sondas)[0]
+        filas = np.full((len(consultas), k), -1, dtype=np.int64)
+        distancias = np.full((len(consultas), k), np.inf, dtype=np.float32)
+        for i, (consulta, listas) in enumerate(zip(consultas, cercanas)):
+            # Las listas en orden de disco: lecturas secuenciales del mmap
+            tramos = [(self.offsets[l], self.offsets[l + 1]) for l in np.sort(listas) if self.offsets[l + 1] > self.offsets[l]]
+            if not tramos:
+                continue
+            parciales = np.concatenate([
+                _distancias(consulta[None, :], self.vectores_listas[a:b], self.normas_listas[a:b])[0] for a, b in tramos
+            ])
+            posiciones, parcial = _mejores(parciales[None, :], k)
+            posiciones_listas = np.concatenate([np.arange(a, b) for a, b in tramos])[posiciones[0]]
+            filas[i, :len(posiciones_listas)] = self.orden[posiciones_listas]
+            distancias[i, :parcial.shape[1]] = parcial[0]
+        return filas, distancias
+
+
+def _hnswlib():
+    try:
+        import hnswlib
+    except ImportError as e:
+        raise ImportError("El índice HNSW necesita hnswlib: pip install hnswlib") from e
+    return hnswlib
+
+
+class IndiceHNSW:
+    """
+    Grafo HNSW de hnswlib sobre los mismos vectores (espacio "l2": distancia al cuadrado).
+
+    Args:
+        vectores: Matriz (N, d) float32 (para `traer` y para el recall exacto de los benchmarks)
+        grafo: hnswlib.Index ya construido o cargado
+        ef: Candidatos explorados por consulta (más = mejor recall y más latencia)
+    """
+
+    nombre = "hnsw"
+    M = 16
+    EF_CONSTRUCCION = 200
+    EF = 64
+
+    def __init__(self, vectores, grafo, ef=EF):
+        self.vectores = vectores
+        self.grafo = grafo
+        self.ef = ef
+        grafo.set_ef(ef)
+
+    @classmethod
+    def construir(cls, directorio, M=M, ef_construccion=EF_CONSTRUCCION, ef=EF, hilos=-1):
+        """
+        Inserta todas las filas en el grafo (en paralelo) y guarda `hnsw.bin`.
+
+        Args:
+            directorio: Directorio con `vectores.npy`
+            M: Vecinos por nodo del grafo
+            ef_construccion: Candidatos explorados al insertar
+            ef: Candidatos explorados por consulta
+            hilos: Hilos para insertar (-1 = todos los núcleos)
+        """
+        hnswlib = _hnswlib()
+        vectores, _ = cargar_vectores(directorio)
+        grafo = hnswlib.Index(space="l2", dim=vectores.shape[1])
+        grafo.init_index(max_elements=max(1, len(vectores)), ef_construction=ef_construccion, M=M)
+        for inicio in range(0, len(vectores), BLOQUE):
+            bloque = np.asarray(vectores[inicio:inicio + BLOQUE])
+            grafo.add_items(bloque, np.arange(inicio, inicio + len(bloque)), num_threads=hilos)
+        ruta = os.path.join(directorio, ARCHIVO_HNSW)
+        grafo.save_index(ruta + ".tmp")
+        os.replace(ruta + ".tmp", ruta)
+        return cls(vectores, grafo, ef)
+
+    @classmethod
+    def cargar(cls, directorio, ef=EF):
+        """Carga el grafo guardado, o None si no existe."""
+        hnswlib = _hnswlib()
+        ruta = os.path.join(directorio, ARCHIVO_HNSW)
+        if not os.path.exists(ruta):
+            return None
+        vectores, _ = cargar_vectores(directorio)
+        grafo = hnswlib.Index(space="l2", dim=vectores.shape[1])
+        grafo.load_index(ruta, max_elements=max(1, len(vectores)))
+        return cls(vectores, grafo, ef)
+
+    def buscar(self, consultas, k):
+        """Los `k` vecinos más cercanos (aproximados) de cada consulta; ver IndiceExacto.buscar."""
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        k = min(k, self.grafo.get_current_count())
+        # hnswlib exige ef >= k
+        if k > self.grafo.ef:
+            self.grafo.set_ef(k)
+        filas, distancias = self.grafo.knn_query(consultas, k=k)
+        return filas.astype(np.int64), distancias
+
+
+def _popcount_tabla():
+    """Bits en 1 de cada byte posible (para NumPy < 2.0, sin np.bitwise_count)."""
+    return np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+class _IndiceCuantizado:
+    """
+    Búsqueda en dos etapas: recorrido de códigos compactos y reordenamiento exacto.
+
+    La primera etapa puntúa todas las filas mirando solo `codigos` y se queda con
+    `sobremuestreo * k` candidatas; la segunda calcula su distancia L2 exacta con las filas
+    float32 del mmap (leídas en orden de disco) y devuelve las `k` mejores. Las subclases
+    definen el formato de los códigos (`_entrenar`, `_codificar`, `_puntajes`).
+
+    Args:
+        vectores: Matriz (N, d) float32 (normalmente un mmap de `vectores.npy`)
+        normas: Normas al cuadrado de cada fila
+        codigos: Códigos de cada fila (normalmente un mmap)
+        parametros: Diccionario de arreglos de la cuantización (escala, centro, media...)
+        sobremuestreo: Candidatas por vecino pedido que pasan a la segunda etapa
+    """
+
+    SOBREMUESTREO = 4
+    # Filas por bloque de la primera etapa
+    BLOQUE_CODIGOS = 8192
+
+    def __init__(self, vectores, normas, codigos, parametros, sobremuestreo=None):
+        self.vectores = vectores
+        self.normas = normas
+        self.codigos = codigos
+        self.parametros = parametros
+        self.sobremuestreo = sobremuestreo or self.SOBREMUESTREO
+
+    @classmethod
+    def construir(cls, directorio, sobremuestreo=None):
+        """
+        Ajusta la cuantización a la matriz, codifica todas las filas por bloques y guarda el índice.
+
+        Args:
+            directorio: Directorio con `vectores.npy`
+            sobremuestreo: Candidatas por vecino pedido que pasan a la segunda etapa
+        """
+        vectores, _ = cargar_vectores(directorio)
+        n = len(vectores)
+        parametros = cls._entrenar(vectores)
+        ruta = os.path.join(directorio, cls.ARCHIVO_CODIGOS)
+        primero = cls._codificar(np.asarray(vectores[:1]), parametros)
+        codigos = np.lib.format.open_memmap(ruta + ".tmp", mode="w+", dtype=primero.dtype, shape=(n, primero.shape[1]))
+        for inicio in range(0, n, BLOQUE):
+            codigos[inicio:inicio + BLOQUE] = cls._codificar(np.asarray(vectores[inicio:inicio + BLOQUE]), parametros)
+        codigos.flush()
+        del codigos
+        os.replace(ruta + ".tmp", ruta)
+        _reemplazar(os.path.join(directorio, cls.ARCHIVO), lambda f: np.savez(f, **parametros))
+        return cls.cargar(directorio, sobremuestreo)
+
+    @classmethod
+    def cargar(cls, directorio, sobremuestreo=None):
+        """Carga el índice guardado, o None si no existe."""
+        try:
+            with np.load(os.path.join(directorio, cls.ARCHIVO)) as datos:
+                parametros = {nombre: datos[nombre] for nombre in datos.files}
+            codigos = np.load(os.path.join(directorio, cls.ARCHIVO_CODIGOS), mmap_mode="r")
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(*cargar_vectores(directorio), codigos, parametros, sobremuestreo)
+
+    def buscar(self, consultas, k):
+        """Los `k` vecinos más cercanos (aproximados) de cada consulta; ver IndiceExacto.buscar."""
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float32))
+        n = len(self.codigos)
+        k = min(k, n)
+        # 1. Primera etapa: solo los códigos (menor puntaje = más cercano)
+        puntajes = np.hstack([self._puntajes(consultas, inicio, min(n, inicio + self.BLOQUE_CODIGOS))
+                              for inicio in range(0, n, self.BLOQUE_CODIGOS)])
+        candidatas = _mejores(puntajes, min(n, k * self.sobremuestreo))[0]
+        # 2. Segunda etapa: distancia exacta de las candidatas, leídas del mmap en orden de disco
+        filas = np.empty((len(consultas), k), dtype=np.int64)
+        distancias = np.empty((len(consultas), k), dtype=np.float32)
+        for i, (consulta, elegidas) in enumerate(zip(consultas, candidatas)):
+            elegidas = np.sort(elegidas)
+            exactas = _distancias(consulta[None, :], self.vectores[elegidas], self.normas[elegidas])
+            posiciones, distancias[i] = _mejores(exactas, k)
+            filas[i] = elegidas[posiciones[0]]
+        return filas, distancias
+
+
+class IndiceInt8(_IndiceCuantizado):
+    """
+    Cuantización escalar a int8: cada dimensión se lleva de su rango [mínimo, máximo] en el
+    corpus a [-127, 127] (un byte por dimensión, 4 veces menos que float32).
+
+    La primera etapa aproxima la distancia L2 con el vector reconstruido
+    x ≈ centro + escala * código: |x|² - 2 q·x, donde q·x = q·centro + (q * escala)·código y
+    q·centro no cambia el orden, así que alcanza con un producto contra los códigos.
+    """
+
+    nombre = "int8"
+    ARCHIVO = ARCHIVO_INT8
+    ARCHIVO_CODIGOS = ARCHIVO_INT8_CODIGOS
+    SOBREMUESTREO = 4
+    BLOQUE_CODIGOS = BLOQUE_INT8
+
+    @staticmethod
+    def _entrenar(vectores):
+        minimo = np.full(vectores.shape[1], np.inf, dtype=np.float32)
+        maximo = np.full(vectores.shape[1], -np.inf, dtype=np.float32)
+        for inicio in range(0, len(vectores), BLOQUE):
+            bloque = np.asarray(vectores[inicio:inicio + BLOQUE])
+            minimo = np.minimum(minimo, bloque.min(axis=0))
+            maximo = np.maximum(maximo, bloque.max(axis=0))
+        escala = np.maximum(maximo - minimo, 1e-12) / 254.0
+        return {"centro": (maximo + minimo) / 2.0, "escala": escala.astype(np.float32)}
+
+    @staticmethod
+    def _codificar(vectores, parametros):
+        codigos = np.rint((vectores - parametros["centro"]) / parametros["escala"])
+        return np.clip(codigos, -127, 127).astype(np.int8)
+
+    def _puntajes(self, consultas, inicio, fin):
+        producto = (consultas * self.parametros["escala"]) @ self.codigos[inicio:fin].astype(np.float32).T
+        return self.normas[None, inicio:fin] - 2.0 * producto
+
+
+class IndiceBinario(_IndiceCuantizado):
+    """
+    Códigos binarios: un bit por dimensión, si el valor supera la media del corpus en esa
+    dimensión (32 veces menos que float32; 48 bytes por vector con d=384).
+
+    La primera etapa ordena por distancia de Hamming entre el código de la consulta y el de
+    cada fila (XOR y conteo de bits). Es mucho más gruesa que int8, así que pasa más
+    candidatas a la segunda etapa.
+    """
+
+    nombre = "binario"
+    ARCHIVO = ARCHIVO_BINARIO
+    ARCHIVO_CODIGOS = ARCHIVO_BINARIO_CODIGOS
+    SOBREMUESTREO = 32
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Con np.bitwise_count (NumPy >= 2.0) el XOR y el conteo van por palabras de 64 bits
+        if hasattr(np, "bitwise_count"):
+            self._popcount = np.bitwise_count
+            self._palabra = np.uint64 if self.codigos.shape[1] % 8 == 0 else np.uint8
+        else:
+            self._popcount = _popcount_tabla().__getitem__
+            self._palabra = np.uint8
+
+    @staticmethod
+    def _entrenar(vectores):
+        suma = np.zeros(vectores.shape[1], dtype=np.float64)
+        for inicio in range(0, len(vectores), BLOQUE):
+            suma += np.asarray(vectores[inicio:inicio + BLOQUE]).sum(axis=0)
+        return {"media": (suma / max(1, len(vectores))).astype(np.float32)}
+
+    @staticmethod
+    def _codificar(vectores, parametros):
+        return np.packbits(vectores > parametros["media"], axis=1)
+
+    def _puntajes(self, consultas, inicio, fin):
+        codigos_consultas = self._codificar(consultas, self.parametros).view(self._palabra)
+        codigos = self.codigos[inicio:fin].view(self._palabra)
+        return np.stack([self._popcount(codigos ^ codigo).sum(axis=1, dtype=np.int32) for codigo in codigos_consultas])
+
+
+INDICES = {indice.nombre: indice for indice in (IndiceExacto, IndiceIVF, IndiceHNSW, IndiceInt8, IndiceBinario)}
+
+
+def hnsw_disponible():
+    """True si hnswlib está instalado."""
+    try:
+        _hnswlib()
+    except ImportError:
+        return False
+    return True
+
+
+class VectorstoreLocal:
+    """
+    Réplica de la colección de ChromaDB que busca en un índice local.
+
+    Implementa lo que `Recuperador` usa de un vectorstore de LangChain (`embeddings` y
+    `similarity_search_by_vector_with_relevance_scores`) más `traer`, para los fragmentos
+    que solo encontró BM25.
+
+    Args:
+        indice: IndiceExacto, IndiceIVF, IndiceHNSW, IndiceInt8 o IndiceBinario
+        embeddings: Modelo de embeddings de las consultas (el de la colección)
+        ids: ID de fragmento de cada fila
+        textos: Contenido de cada fila
+        metadatas: Metadatos de cada fila
+    """
+
+    def __init__(self, indice, embeddings, ids, textos, metadatas):
+        self.indice = indice
+        self.embeddings = embeddings
+        self.ids = ids
+        self.textos = textos
+        self.metadatas = metadatas
+        self._fila = {id_: fila for fila, id_ in enumerate(ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _documento(self, fila):
+        return Document(page_content=self.textos[fila], metadata=self.metadatas[fila] or {})
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4):
+        """Los `k` fragmentos más cercanos al vector, como [(Document, distancia)]."""
+        if not self.ids:
+            return []
+        filas, distancias = self.indice.buscar(embedding, k)
+        return [(self._documento(fila), float(distancia)) for fila, distancia in zip(filas[0], distancias[0]) if fila >= 0]
+
+    def traer(self, ids, vector):
+        """Fragmentos por ID con su distancia exacta al vector: {id: (Document, distancia)}."""
+        filas = np.array([self._fila[id_] for id_ in ids if id_ in self._fila], dtype=np.int64)
+        if not len(filas):
+            return {}
+        orden = np.argsort(filas)
+        vectores = np.asarray(self.indice.vectores[filas[orden]])
+        distancias = np.empty(len(filas), dtype=np.float32)
+        distancias[orden] = np.sum((vectores - np.asarray(vector, dtype=np.float32)) ** 2, axis=1)
+        return {self.ids[fila]: (self._documento(fila), float(distancia)) for fila, distancia in zip(filas, distancias)}
+
+
+def elegir_indice(nombre, n):
+    """Resuelve "auto": exacto hasta LIMITE_EXACTO fragmentos; después HNSW (o IVF sin hnswlib)."""
+    if nombre != "auto":
+        return nombre
+    if n <= LIMITE_EXACTO:
+        return "exacto"
+    return "hnsw" if hnsw_disponible() else "ivf"
+
+
+def _leer_meta(directorio, version):
+    """Metadatos de la réplica guardada, o None si no existe o es de otra versión del corpus."""
+    try:
+        with open(os.path.join(directorio, ARCHIVO_META), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != version or not os.path.exists(os.path.join(directorio, ARCHIVO_NORMAS)):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta
+
+
+def sincronizar_indice_vectorial(vectorstore, persist_directory, version, nombre="exacto"):
+    """
+    Devuelve un VectorstoreLocal al día con la colección, reconstruyendo lo que haga falta.
+
+    Se llama justo después de `ingestar_documentos`, como `sincronizar_indice_lexico`: si
+    el corpus no cambió se cargan la réplica y el índice del disco; si cambió, se copian los
+    vectores de la colección (no se vuelve a embeber nada) y se reconstruye el índice.
+
+    Args:
+        vectorstore: Base vectorial (ChromaDB) ya sincronizada
+        persist_directory: Directorio de ChromaDB
+        version: Versión del corpus (ResumenIngesta.version_corpus)
+        nombre: "exacto", "ivf", "hnsw", "int8", "binario" o "auto"
+
+    Returns:
+        VectorstoreLocal: Réplica con el índice pedido
+    """
+    directorio = os.path.join(persist_directory, DIRECTORIO)
+    ruta_meta = os.path.join(directorio, ARCHIVO_META)
+    meta = _leer_meta(directorio, version)
+    if meta is None:
+        datos = vectorstore._collection.get(include=["embeddings", "documents", "metadatas"])
+        dimension = len(datos["embeddings"][0]) if len(datos["ids"]) else 1
+        guardar_vectores(directorio, np.asarray(datos["embeddings"], dtype=np.float32).reshape(len(datos["ids"]), dimension))
+        meta = {"version": version, "ids": datos["ids"], "textos": datos["documents"], "metadatas": datos["metadatas"]}
+        # Los índices de la versión anterior ya no corresponden a la matriz nueva
+        for archivo in (ARCHIVO_IVF, ARCHIVO_IVF_VECTORES, ARCHIVO_HNSW, ARCHIVO_INT8, ARCHIVO_INT8_CODIGOS,
+                        ARCHIVO_BINARIO, ARCHIVO_BINARIO_CODIGOS):
+            if os.path.exists(os.path.join(directorio, archivo)):
+                os.remove(os.path.join(directorio, archivo))
+        _reemplazar(ruta_meta, lambda f: json.dump(meta, f, ensure_ascii=False), modo="w")
+
+    clase = INDICES[elegir_indice(nombre, len(meta["ids"]))]
+    indice = clase.cargar(directorio) if meta["ids"] else None
+    if indice is None:
+        indice = clase.construir(directorio) if meta["ids"] else IndiceExacto(*cargar_vectores(directorio))
+    return VectorstoreLocal(indice, vectorstore.embeddings, meta["ids"], meta["textos"], meta["metadatas"])
+
+
+def cargar_indice_vectorial(persist_directory, version, embeddings, nombre="exacto"):
+    """
+    Abre la réplica ya sincronizada sin tocar ChromaDB ni escribir nada.
+
+    Es lo que usan los procesos que solo consultan (los workers de `servidor.py --workers`)
+    mientras otro proceso se encarga de la ingesta y de `sincronizar_indice_vectorial`.
+
+    Args:
+        persist_directory: Directorio de ChromaDB
+        version: Versión del corpus esperada
+        embeddings: Modelo de embeddings de las consultas
+        nombre: "exacto", "ivf", "hnsw", "int8", "binario" o "auto"
+
+    Returns:
+        VectorstoreLocal | None: None si la réplica o su índice faltan o son de otra versión
+    """
+    directorio = os.path.join(persist_directory, DIRECTORIO)
+    meta = _leer_meta(directorio, version)
+    if meta is None or not meta["ids"]:
+        return None
+    indice = INDICES[elegir_indice(nombre, len(meta["ids"]))].cargar(directorio)
+    if indice is None:
+        return None
+    return VectorstoreLocal(indice, embeddings, meta["ids"], meta["textos"], meta["metadatas"])
+
+
+def indice_local_configurado():
+    """Índice local según INDICE_VECTORIAL, para procesos que no consultan ChromaDB ("chroma" pasa a "auto")."""
+    nombre = os.getenv("INDICE_VECTORIAL", "chroma")
+    return "auto" if nombre == "chroma" else nombre
+
+
+def crear_vectorstore_busqueda(vectorstore, persist_directory, version):
+    """
+    Vectorstore para las consultas según INDICE_VECTORIAL.
+
+    "chroma" (por defecto) consulta la colección de ChromaDB; "exacto", "ivf", "hnsw",
+    "int8", "binario" o "auto" usan una réplica local (ver sincronizar_indice_vectorial).
+
+    Returns:
+        Chroma | VectorstoreLocal: Lo que recibe `Recuperador`
+    """
+    nombre = os.getenv("INDICE_VECTORIAL", "chroma")
+    if nombre == "chroma":
+        return vectorstore
+    if nombre != "auto" and nombre not in INDICES:
+        raise ValueError(f"INDICE_VECTORIAL desconocido: {nombre} (chroma, exacto, ivf, hnsw, int8, binario o auto)")
+    return sincronizar_indice_vectorial(vectorstore, persist_directory, version, nombre)
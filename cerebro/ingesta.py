@@ -0,0 +1,366 @@
+"""
+Ingesta incremental de documentos en ChromaDB.
+
+En vez de re-crear los embeddings de todo el corpus en cada arranque, se guarda un
+manifiesto junto a la base vectorial con el hash de cada archivo fuente y de cada
+fragmento. Al reabrir la colección solo se embeben los fragmentos nuevos o modificados;
+los que desaparecen se eliminan de la colección y quedan registrados como "lápidas"
+(tombstones) en el manifiesto. Las lápidas describen solo la última sincronización: la
+siguiente las descarta, porque su borrado ya se aplicó a la colección antes de guardar el
+manifiesto, así que la lista no crece con cada reingesta. Un arranque en caliente no
+embebe nada.
+
+El corpus puede ser una lista de archivos y/o directorios (Markdown, HTML, texto): se
+recorre con generadores, un archivo a la vez, y los fragmentos nuevos se embeben y
+escriben en ChromaDB en lotes de tamaño fijo, así que la memoria no crece con el corpus.
+"""
+
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+
+from langchain_core.documents import Document
+
+MANIFIESTO = "manifiesto_ingesta.json"
+VERSION_MANIFIESTO = 1
+EXTENSIONES_CORPUS = (".md", ".markdown", ".txt", ".html", ".htm")
+TAMANO_LOTE = 64
+
+
+@dataclass
+class ResumenIngesta:
+    """Resultado de una sincronización entre los archivos fuente y la colección."""
+
+    version_corpus: str
+    total_fragmentos: int
+    nuevos: int = 0
+    eliminados: int = 0
+    sin_cambios: int = 0
+    archivos_modificados: list = field(default_factory=list)
+    reconstruida: bool = False
+
+    @property
+    def en_caliente(self):
+        """True si no hubo que embeber ni eliminar ningún fragmento."""
+        return self.nuevos == 0 and self.eliminados == 0
+
+
+def hash_texto(texto):
+    """Devuelve el SHA-256 (hex) de un texto."""
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def hash_archivo(ruta, bloque=1 << 20):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for parte in iter(lambda: f.read(bloque), b""):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def id_fragmento(fuente, contenido):
+    """ID estable de un fragmento: hash de su fuente y su contenido."""
+    return hash_texto(f"{fuente}\0{contenido}")
+
+
+def huella_parametros(splitter, modelo_embeddings):
+    """Huella de la configuración que afecta a los fragmentos y sus vectores."""
+    parametros = {
+        "splitter": type(splitter).__name__,
+        "chunk_size": getattr(splitter, "_chunk_size", None),
+        "chunk_overlap": getattr(splitter, "_chunk_overlap", None),
+        "modelo_embeddings": modelo_embeddings,
+    }
+    return hash_texto(json.dumps(parametros, sort_keys=True))
+
+
+def version_corpus(fuentes):
+    """Versión del corpus: hash de todos los IDs de fragmentos vigentes."""
+    ids = sorted(i for info in fuentes.values() for i in info["fragmentos"])
+    return hash_texto("\n".join(ids))[:16]
+
+
+def cargar_manifiesto(persist_directory):
+    """Lee el manifiesto de ingesta; devuelve None si no existe o está corrupto."""
+    ruta = os.path.join(persist_directory, MANIFIESTO)
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifiesto.get("version") != VERSION_MANIFIESTO:
+        return None
+    return manifiesto
+
+
+def guardar_manifiesto(persist_directory, manifiesto):
+    """Escribe el manifiesto de forma atómica (archivo temporal + rename)."""
+    os.makedirs(persist_directory, exist_ok=True)
+    ruta = os.path.join(persist_directory, MANIFIESTO)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+
+
+class _ExtractorTextoHTML(HTMLParser):
+    """Extrae el texto visible de un HTML (sin scripts ni estilos)."""
+
+    _IGNORAR = {"script", "style", "head"}
+    _BLOQUES = {"p", "div", "li", "tr", "br", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "section", "article"}
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+        self._ignorando = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._IGNORAR:
+            self._ignorando += 1
+        elif tag in self._BLOQUES:
+            self.partes.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self._IGNORAR and self._ignorando:
+            self._ignorando -= 1
+
+    def handle_data(self, data):
+        if not self._ignorando:
+            self.partes.append(data)
+
+
+def leer_texto(ruta):
+    """Lee un archivo del corpus como texto plano (los HTML se convierten a texto)."""
+    with open(ruta, encoding="utf-8", errors="replace") as f:
+        contenido = f.read()
+    if ruta.lower().endswith((".html", ".htm")):
+        extractor = _ExtractorTextoHTML()
+        extractor.feed(contenido)
+        contenido = re.sub(r"\n\s*\n\s*", "\n\n", "".join(extractor.partes)).strip()
+    return contenido
+
+
+def recorrer_corpus(rutas, extensiones=EXTENSIONES_CORPUS):
+    """
+    Recorre archivos y directorios del corpus de forma perezosa.
+
+    Los directorios se recorren recursivamente en orden estable, devolviendo solo los
+    archivos con alguna de las `extensiones`; los archivos se devuelven tal cual.
+
+    Yields:
+        str: Ruta normalizada de cada archivo
+    """
+    for ruta in rutas:
+        if not os.path.isdir(ruta):
+            yield os.path.normpath(ruta)
+            continue
+        for directorio, subdirectorios, archivos in os.walk(ruta):
+            subdirectorios[:] = sorted(d for d in subdirectorios if not d.startswith("."))
+            for nombre in sorted(archivos):
+                if nombre.lower().endswith(extensiones):
+                    yield os.path.normpath(os.path.join(directorio, nombre))
+
+
+def fragmentos_de_archivo(ruta, splitter):
+    """
+    Divide un archivo en fragmentos con IDs por contenido, uno por vez.
+
+    Los fragmentos con contenido idéntico dentro del mismo archivo comparten ID, así
+    que se devuelven una sola vez. Cada fragmento lleva su archivo en `metadata["source"]`.
+
+    Yields:
+        tuple: (id_fragmento, Document)
+    """
+    vistos = set()
+    for texto in splitter.split_text(leer_texto(ruta)):
+        id_ = id_fragmento(ruta, texto)
+        if id_ not in vistos:
+            vistos.add(id_)
+            yield id_, Document(page_content=texto, metadata={"source": ruta})
+
+
+class _EscritorPorLotes:
+    """
+    Acumula fragmentos y los embebe + escribe en ChromaDB en lotes de tamaño fijo.
+
+    Con `en_vuelo > 0` el embedding corre en hilos en segundo plano (solapado con la
+    lectura de archivos y con la escritura) y los lotes se escriben en el orden en que se
+    enviaron. Como mucho hay `en_vuelo` lotes pendientes: al llegar a ese límite el
+    productor espera a que se escriba el más antiguo (back-pressure), así la memoria no
+    crece aunque el embedding sea más lento que la lectura.
+    """
+
+    def __init__(self, vectorstore, lote, en_vuelo=0):
+        self.vectorstore = vectorstore
+        self.lote = lote
+        self.en_vuelo = en_vuelo
+        self._ids = []
+        self._docs = []
+        self._pendientes = deque()
+        self._hilos = ThreadPoolExecutor(max_workers=en_vuelo, thread_name_prefix="ingesta") if en_vuelo else None
+
+    def agregar(self, id_, doc):
+        self._ids.append(id_)
+        self._docs.append(doc)
+        if len(self._ids) >= self.lote:
+            self.vaciar()
+
+    def vaciar(self):
+        if not self._ids:
+            return
+        ids, docs = self._ids, self._docs
+        self._ids, self._docs = [], []
+        if self._hilos is None:
+            self.vectorstore.add_documents(docs, ids=ids)
+            return
+        futuro = self._hilos.submit(self.vectorstore.embeddings.embed_documents, [d.page_content for d in docs])
+        self._pendientes.append((ids, docs, futuro))
+        while len(self._pendientes) > self.en_vuelo:
+            self._escribir_mas_antiguo()
+
+    def _escribir_mas_antiguo(self):
+        ids, docs, futuro = self._pendientes.popleft()
+        # Upsert directo en la colección con los vectores ya calculados
+        self.vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=futuro.result(),
+            documents=[d.page_content for d in docs],
+            metadatas=[d.metadata for d in docs],
+        )
+
+    def cerrar(self):
+        """Escribe el lote parcial y todos los pendientes."""
+        self.vaciar()
+        while self._pendientes:
+            self._escribir_mas_antiguo()
+        if self._hilos is not None:
+            self._hilos.shutdown()
+
+
+def ingestar_documentos(rutas, embeddings, persist_directory, splitter, modelo_embeddings="", lote=TAMANO_LOTE, en_vuelo=0):
+    """
+    Sincroniza los archivos fuente con la colección persistida de ChromaDB.
+
+    Pasos: Recorre archivos y directorios de forma perezosa → Compara tamaño/mtime y hash
+    de cada archivo con el manifiesto → Re-divide solo los archivos modificados → Embebe
+    los fragmentos nuevos en lotes de `lote` y los escribe en bloque → Elimina los
+    obsoletos (registrándolos como lápidas, que reemplazan a las de la sincronización
+    anterior) → Guarda el manifiesto.
+
+    En memoria solo hay un archivo y unos pocos lotes de fragmentos a la vez, sin importar
+    el tamaño del corpus. Como los IDs dependen del contenido, si el proceso se interrumpe
+    la siguiente ejecución retoma sin duplicar nada.
+
+    Si no hay manifiesto (base creada por una versión anterior, con duplicados) o cambió
+    el splitter o el modelo de embeddings, la colección se reconstruye desde cero.
+
+    Args:
+        rutas: Archivos y/o directorios a ingestar
+        embeddings: Modelo de embeddings de LangChain
+        persist_directory: Directorio de ChromaDB
+        splitter: Text splitter usado para dividir los documentos
+        modelo_embeddings: Nombre del modelo de embeddings (forma parte de la huella)
+        lote: Fragmentos por lote de embedding/escritura
+        en_vuelo: Lotes que pueden estar embebiéndose en paralelo (0 = secuencial); útil con
+            EmbeddingParalelo para mantener ocupados a todos los workers
+
+    Returns:
+        tuple: (vectorstore, ResumenIngesta)
+    """
+    # ChromaDB tarda en importarse; los demás usos de este módulo (id_fragmento) no lo necesitan
+    from langchain_community.vectorstores import Chroma
+
+    huella = huella_parametros(splitter, modelo_embeddings)
+    manifiesto = cargar_manifiesto(persist_directory)
+    vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory)
+
+    reconstruida = manifiesto is None or manifiesto.get("parametros") != huella
+    if reconstruida:
+        # Base heredada o parámetros distintos: los vectores existentes no son reutilizables
+        vectorstore.delete_collection()
+        vectorstore = Chroma(embedding_function=embeddings, persist_directory=persist_directory)
+        manifiesto = {"version": VERSION_MANIFIESTO, "parametros": huella, "fuentes": {}, "lapidas": {}}
+
+    fuentes = manifiesto["fuentes"]
+    # Las lápidas guardadas ya se aplicaron a la colección (se borra antes de guardar el
+    # manifiesto): se descartan y quedan solo las de esta sincronización
+    podadas = bool(manifiesto.get("lapidas"))
+    lapidas = manifiesto["lapidas"] = {}
+    ahora = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    escritor = _EscritorPorLotes(vectorstore, lote, en_vuelo)
+    nuevos, eliminados, modificados = 0, 0, []
+    tocados = False
+    vistas = set()
+
+    for ruta in recorrer_corpus(rutas):
+        vistas.add(ruta)
+        estado = os.stat(ruta)
+        previo = fuentes.get(ruta)
+        # Camino rápido: tamaño y mtime idénticos → no hace falta ni leer el archivo
+        if previo and previo["tamano"] == estado.st_size and previo["mtime_ns"] == estado.st_mtime_ns:
+            continue
+
+        sha = hash_archivo(ruta)
+        if previo and previo["sha256"] == sha:
+            # Solo cambió el mtime (p.ej. `touch`): se actualiza el manifiesto sin re-embeber
+            previo.update(tamano=estado.st_size, mtime_ns=estado.st_mtime_ns)
+            tocados = True
+            continue
+
+        anteriores = set(previo["fragmentos"]) if previo else set()
+        ids = []
+        for id_, doc in fragmentos_de_archivo(ruta, splitter):
+            ids.append(id_)
+            if id_ not in anteriores:
+                escritor.agregar(id_, doc)
+                lapidas.pop(id_, None)
+                nuevos += 1
+
+        a_eliminar = sorted(anteriores.difference(ids))
+        if a_eliminar:
+            vectorstore.delete(ids=a_eliminar)
+        for id_ in a_eliminar:
+            lapidas[id_] = {"fuente": ruta, "eliminado": ahora}
+
+        fuentes[ruta] = {
+            "tamano": estado.st_size,
+            "mtime_ns": estado.st_mtime_ns,
+            "sha256": sha,
+            "fragmentos": ids,
+        }
+        eliminados += len(a_eliminar)
+        modificados.append(ruta)
+    escritor.cerrar()
+
+    # Archivos que ya no forman parte del corpus: todos sus fragmentos pasan a lápida
+    for ruta in [r for r in fuentes if r not in vistas]:
+        obsoletos = fuentes.pop(ruta)["fragmentos"]
+        if obsoletos:
+            vectorstore.delete(ids=obsoletos)
+        for id_ in obsoletos:
+            lapidas[id_] = {"fuente": ruta, "eliminado": ahora}
+        eliminados += len(obsoletos)
+        modificados.append(ruta)
+
+    total = sum(len(info["fragmentos"]) for info in fuentes.values())
+    manifiesto["corpus"] = version_corpus(fuentes)
+    if reconstruida or modificados or tocados or podadas:
+        guardar_manifiesto(persist_directory, manifiesto)
+
+    resumen = ResumenIngesta(
+        version_corpus=manifiesto["corpus"],
+        total_fragmentos=total,
+        nuevos=nuevos,
+        eliminados=eliminados,
+        sin_cambios=total - nuevos,
+        archivos_modificados=modificados,
+        reconstruida=reconstruida,
+    )
+    return vectorstore, resumen
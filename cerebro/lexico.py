@@ -0,0 +1,278 @@
+"""
+Índice léxico (BM25) del corpus, construido en la ingesta y guardado junto a ChromaDB.
+
+Complementa la búsqueda densa: los identificadores exactos de la documentación
+(`EngineNotFoundError`, `henrypy.refactor`, `HNP-xxxxxxxx-DEV`) se recuperan mal con
+vectores de MiniLM pero son términos rarísimos (IDF alto) para BM25.
+
+Formato de las listas de fragmentos (postings), todo en arreglos NumPy contiguos:
+
+- `postings`: filas de fragmentos de todos los términos concatenadas, ordenadas por
+  fila dentro de cada término; las del término i ocupan `postings[offsets[i]:offsets[i + 1]]`.
+- `frecuencias`: frecuencia del término en cada posting (mismo orden que `postings`).
+- `largos`: cantidad de términos de cada fragmento.
+
+En disco son `indice_lexico.npz` (arreglos) e `indice_lexico.json` (versión del corpus,
+vocabulario e IDs de fragmento); se reconstruyen cuando cambia la versión del corpus.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+from cerebro.ingesta import id_fragmento
+
+ARCHIVO_ARREGLOS = "indice_lexico.npz"
+ARCHIVO_META = "indice_lexico.json"
+# Parámetros estándar de BM25 (Okapi)
+K1 = 1.5
+B = 0.75
+# Raíz simple para español: "instalo", "instalar" e "instalación" comparten "instal"
+LARGO_RAIZ = 6
+
+STOPWORDS = frozenset({
+    "que", "como", "cuando", "donde", "cual", "cuales", "quien", "por", "para", "con", "sin",
+    "sobre", "entre", "desde", "hasta", "los", "las", "una", "unos", "unas", "del", "al",
+    "este", "esta", "estos", "estas", "ese", "esa", "eso", "esto", "son", "estan",
+    "ser", "hay", "tiene", "tienen", "pero", "mas", "muy", "tambien", "les", "nos", "sus",
+    "tus", "mis", "puedo", "puede", "puedes", "pueden", "hace", "hacer",
+    "sirve", "sirven", "trata", "explica", "dime", "cuenta", "the", "and", "what", "how",
+})
+
+# Palabras e identificadores con puntos o guiones internos (henrypy.refactor, HNP-xxx-DEV)
+_PATRON_TOKEN = re.compile(r"\w(?:[\w.\-]*\w)?")
+_PATRON_PALABRA = re.compile(r"[^\W_]+")
+# Puntos, guiones, guiones bajos, dígitos o una mayúscula después de la primera letra
+_PATRON_IDENTIFICADOR = re.compile(r"[._\-\d]|.[A-Z]")
+_SIN_ACENTOS = str.maketrans("áéíóúüàèìòù", "aeiouuaeiou")
+
+
+def tokenizar(texto):
+    """
+    Términos de un texto para el índice léxico.
+
+    Las palabras se pasan a minúsculas, sin acentos ni stopwords, truncadas a su raíz. Los
+    identificadores (con puntos, guiones, guiones bajos, dígitos o CamelCase) se indexan
+    además completos, así una búsqueda exacta de `EngineNotFoundError` no se diluye en "engine".
+
+    Args:
+        texto: Texto a tokenizar
+
+    Returns:
+        list: Términos en orden de aparición (con repeticiones)
+    """
+    terminos = []
+    # Los escapes de Markdown (code\_string, henrypy\[analysis\]) no separan palabras
+    for token in _PATRON_TOKEN.findall(texto.replace("\\", "")):
+        minuscula = token.lower()
+        if not minuscula.isascii():
+            # str.translate es lento: solo se aplica a los tokens que no son ASCII
+            minuscula = minuscula.translate(_SIN_ACENTOS)
+        if len(minuscula) > LARGO_RAIZ and _PATRON_IDENTIFICADOR.search(token):
+            terminos.append(minuscula)
+            partes = _PATRON_PALABRA.findall(minuscula)
+        else:
+            partes = (minuscula,)
+        for palabra in partes:
+            if len(palabra) > 2 and palabra not in STOPWORDS:
+                terminos.append(palabra[:LARGO_RAIZ])
+    return terminos
+
+
+class IndiceInvertido:
+    """
+    Índice invertido término → fragmentos con puntajes BM25.
+
+    Args:
+        ids: ID de cada fragmento (los mismos de la colección de ChromaDB)
+        textos: Contenido de cada fragmento
+        k1: Saturación de la frecuencia de término
+        b: Normalización por largo del fragmento
+    """
+
+    def __init__(self, ids, textos, k1=K1, b=B):
+        vocabulario = {}
+        por_fragmento = []
+        for texto in textos:
+            terminos, frecuencias = np.unique(
+                np.fromiter((vocabulario.setdefault(t, len(vocabulario)) for t in tokenizar(texto)), dtype=np.int32),
+                return_counts=True,
+            )
+            por_fragmento.append((terminos, frecuencias))
+
+        terminos = np.concatenate([t for t, _ in por_fragmento]) if por_fragmento else np.empty(0, dtype=np.int32)
+        frecuencias = np.concatenate([f for _, f in por_fragmento]) if por_fragmento else np.empty(0, dtype=np.int64)
+        filas = np.repeat(np.arange(len(por_fragmento), dtype=np.int32), [len(t) for t, _ in por_fragmento])
+        orden = np.argsort(terminos, kind="stable")
+        df = np.bincount(terminos, minlength=len(vocabulario))
+        self._inicializar(
+            ids,
+            vocabulario,
+            postings=filas[orden],
+            frecuencias=frecuencias[orden].astype(np.float32),
+            offsets=np.concatenate(([0], np.cumsum(df))).astype(np.int64),
+            largos=np.array([f.sum() for _, f in por_fragmento], dtype=np.float32),
+            k1=k1,
+            b=b,
+        )
+
+    def _inicializar(self, ids, vocabulario, postings, frecuencias, offsets, largos, k1, b):
+        self.ids = list(ids)
+        self._fila = {id_: i for i, id_ in enumerate(self.ids)}
+        self.vocabulario = vocabulario
+        self.postings = postings
+        self.frecuencias = frecuencias
+        self.offsets = offsets
+        self.largos = largos
+        self.k1 = k1
+        self.b = b
+        n = len(self.ids)
+        df = np.diff(offsets)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # Un término que no aparece en el corpus pesa como el más raro posible
+        self.idf_desconocido = float(np.log1p((n + 0.5) / 0.5))
+        # Denominador de BM25 que depende solo del fragmento, precalculado
+        promedio = largos.mean() if n else 1.0
+        self._normalizacion = (k1 * (1 - b + b * largos / max(promedio, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def desde_vectorstore(cls, vectorstore):
+        """Construye el índice con todos los fragmentos de la colección de ChromaDB."""
+        datos = vectorstore._collection.get(include=["documents"])
+        return cls(datos["ids"], datos["documents"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- persistencia -------------------------------------------------------------------
+
+    def guardar(self, directorio, version):
+        """Guarda el índice en `directorio` (escritura atómica de ambos archivos)."""
+        ruta_arreglos = os.path.join(directorio, ARCHIVO_ARREGLOS)
+        ruta_meta = os.path.join(directorio, ARCHIVO_META)
+        with open(ruta_arreglos + ".tmp", "wb") as f:
+            np.savez(f, postings=self.postings, frecuencias=self.frecuencias, offsets=self.offsets, largos=self.largos)
+        meta = {"version": version, "k1": self.k1, "b": self.b, "ids": self.ids, "terminos": list(self.vocabulario)}
+        with open(ruta_meta + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(ruta_arreglos + ".tmp", ruta_arreglos)
+        os.replace(ruta_meta + ".tmp", ruta_meta)
+
+    @classmethod
+    def cargar(cls, directorio, version=None):
+        """
+        Carga el índice guardado en `directorio`.
+
+        Args:
+            directorio: Directorio de la base vectorial
+            version: Versión del corpus esperada (None = cualquiera)
+
+        Returns:
+            IndiceInvertido | None: None si no existe, está dañado o es de otra versión
+        """
+        try:
+            with open(os.path.join(directorio, ARCHIVO_META), encoding="utf-8") as f:
+                meta = json.load(f)
+            if version is not None and meta["version"] != version:
+                return None
+            with np.load(os.path.join(directorio, ARCHIVO_ARREGLOS)) as arreglos:
+                datos = {nombre: arreglos[nombre] for nombre in ("postings", "frecuencias", "offsets", "largos")}
+        except (OSError, ValueError, KeyError):
+            return None
+        indice = cls.__new__(cls)
+        vocabulario = {termino: i for i, termino in enumerate(meta["terminos"])}
+        indice._inicializar(meta["ids"], vocabulario, k1=meta["k1"], b=meta["b"], **datos)
+        return indice
+
+    # --- consultas ----------------------------------------------------------------------
+
+    def fila(self, doc):
+        """Fila del índice de un Document recuperado, o None si no está indexado."""
+        return self._fila.get(id_fragmento(doc.metadata.get("source", ""), doc.page_content))
+
+    def buscar(self, consulta, k=10):
+        """
+        Los `k` fragmentos con mayor puntaje BM25 para la consulta.
+
+        Args:
+            consulta: Texto de la consulta
+            k: Cantidad máxima de resultados
+
+        Returns:
+            tuple: (ids, puntajes) ordenados de mayor a menor puntaje (solo puntajes > 0)
+        """
+        puntajes = np.zeros(len(self.ids), dtype=np.float32)
+        for termino in set(tokenizar(consulta)):
+            i = self.vocabulario.get(termino)
+            if i is None:
+                continue
+            tramo = slice(self.offsets[i], self.offsets[i + 1])
+            filas, tf = self.postings[tramo], self.frecuencias[tramo]
+            puntajes[filas] += self.idf[i] * tf * (self.k1 + 1) / (tf + self._normalizacion[filas])
+        candidatas = np.flatnonzero(puntajes)
+        if len(candidatas) > k:
+            candidatas = candidatas[np.argpartition(-puntajes[candidatas], k - 1)[:k]]
+        candidatas = candidatas[np.argsort(-puntajes[candidatas], kind="stable")]
+        return [self.ids[f] for f in candidatas], puntajes[candidatas].tolist()
+
+    def cobertura(self, pregunta, docs):
+        """
+        Fracción (ponderada por IDF) de los términos de la pregunta presentes en `docs`.
+
+        Args:
+            pregunta: Pregunta del usuario
+            docs: Documentos recuperados
+
+        Returns:
+            float | None: Entre 0 y 1, o None si la pregunta no tiene términos informativos
+        """
+        terminos = set(tokenizar(pregunta))
+        if not terminos:
+            return None
+        filas = [self.fila(doc) for doc in docs]
+        indexadas = np.array([f for f in filas if f is not None], dtype=np.int32)
+        # Documentos fuera del índice (p.ej. de una ingesta posterior): se tokenizan al vuelo
+        sueltos = set()
+        for doc, f in zip(docs, filas):
+            if f is None:
+                sueltos.update(tokenizar(doc.page_content))
+
+        pesos = np.empty(len(terminos))
+        cubiertos = np.zeros(len(terminos), dtype=bool)
+        for j, termino in enumerate(terminos):
+            i = self.vocabulario.get(termino)
+            if i is None:
+                pesos[j] = self.idf_desconocido
+                cubiertos[j] = termino in sueltos
+                continue
+            pesos[j] = self.idf[i]
+            postings = self.postings[self.offsets[i]:self.offsets[i + 1]]
+            # Postings ordenados: búsqueda binaria de las k filas recuperadas
+            posiciones = np.searchsorted(postings, indexadas)
+            cubiertos[j] = termino in sueltos or bool((postings[np.minimum(posiciones, len(postings) - 1)] == indexadas).any())
+        return float(pesos[cubiertos].sum() / pesos.sum())
+
+
+def sincronizar_indice_lexico(vectorstore, persist_directory, version):
+    """
+    Devuelve el índice léxico de la versión actual del corpus, reconstruyéndolo si hace falta.
+
+    Se llama justo después de `ingestar_documentos`: si el corpus no cambió se carga del
+    disco; si cambió, se reconstruye desde la colección (tokenizar es mucho más barato
+    que embeber) y se guarda junto a ChromaDB.
+
+    Args:
+        vectorstore: Base vectorial ya sincronizada
+        persist_directory: Directorio de ChromaDB
+        version: Versión del corpus (ResumenIngesta.version_corpus)
+
+    Returns:
+        IndiceInvertido: Índice al día con la colección
+    """
+    indice = IndiceInvertido.cargar(persist_directory, version)
+    if indice is None:
+        indice = IndiceInvertido.desde_vectorstore(vectorstore)
+        indice.guardar(persist_directory, version)
+    return indice
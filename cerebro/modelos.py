@@ -0,0 +1,129 @@
+"""
+Selección del modelo de chat de OpenAI al arrancar.
+
+Reemplaza el sondeo secuencial de `detectar_modelo()` por tres mecanismos:
+
+1. Override explícito: si `OPENAI_MODEL` está definido se usa sin sondear nada.
+2. Caché persistida con TTL, indexada por la huella de la API key (nunca la key en sí).
+3. Sondeo concurrente de los candidatos: se devuelve el primer modelo disponible en
+   orden de preferencia sin esperar a los candidatos menos preferidos.
+
+Funciona contra cualquier servidor compatible con la API de OpenAI (`OPENAI_BASE_URL`),
+por ejemplo `benchmarks/servidor_openai_falso.py`.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import openai
+
+MODELOS_CANDIDATOS = ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo"]
+RUTA_CACHE_MODELOS = os.path.join(".cache", "modelos.json")
+TTL_CACHE_MODELOS = 24 * 3600  # segundos
+TIMEOUT_SONDEO = 10  # segundos por sondeo
+
+
+def huella_api_key(api_key, base_url=None):
+    """Huella corta de la API key (y del endpoint) para indexar la caché sin guardar la key."""
+    return hashlib.sha256(f"{base_url or ''}\0{api_key or ''}".encode("utf-8")).hexdigest()[:16]
+
+
+def _leer_cache(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_cache(ruta, cache):
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(temporal, ruta)
+
+
+def sondear_modelo(client, modelo):
+    """
+    Hace una petición mínima (1 token) para comprobar si el modelo está disponible.
+
+    Returns:
+        bool: True si el modelo respondió, False si la API lo rechazó
+    """
+    try:
+        client.chat.completions.create(model=modelo, messages=[{"role": "user", "content": "test"}], max_tokens=1)
+        return True
+    except openai.APIError:
+        return False
+
+
+def sondear_modelos(client, candidatos):
+    """
+    Sondea todos los candidatos en paralelo.
+
+    Devuelve en cuanto el candidato más preferido que sigue en juego responde con
+    éxito: si `gpt-4o-mini` responde antes que `gpt-4o`, se espera solo a `gpt-4o`.
+
+    Returns:
+        str | None: Modelo elegido o None si ninguno está disponible
+    """
+    if not candidatos:
+        return None
+    disponibles = {}
+    executor = ThreadPoolExecutor(max_workers=len(candidatos), thread_name_prefix="sondeo-modelo")
+    try:
+        pendientes = {executor.submit(sondear_modelo, client, m): m for m in candidatos}
+        while pendientes:
+            terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                disponibles[pendientes.pop(futuro)] = futuro.result()
+            for modelo in candidatos:
+                if modelo not in disponibles:
+                    break  # un candidato más preferido sigue pendiente
+                if disponibles[modelo]:
+                    return modelo
+        return None
+    finally:
+        # No esperar a los sondeos lentos de modelos que ya no pueden ganar
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def resolver_modelo(client=None, candidatos=None, ruta_cache=RUTA_CACHE_MODELOS, ttl=None):
+    """
+    Resuelve qué modelo de chat usar: override de entorno → caché → sondeo concurrente.
+
+    Args:
+        client: Cliente `openai.OpenAI` (se crea uno si no se pasa)
+        candidatos: Modelos en orden de preferencia (por defecto MODELOS_CANDIDATOS)
+        ruta_cache: Archivo JSON donde se persiste la caché
+        ttl: Vigencia de la caché en segundos (por defecto `OPENAI_MODEL_CACHE_TTL` o 24h)
+
+    Returns:
+        tuple: (modelo, origen) con origen "entorno", "caché" o "sondeo"; modelo es None si no hay ninguno
+    """
+    override = os.getenv("OPENAI_MODEL")
+    if override:
+        return override, "entorno"
+
+    candidatos = candidatos or MODELOS_CANDIDATOS
+    if ttl is None:
+        ttl = float(os.getenv("OPENAI_MODEL_CACHE_TTL", TTL_CACHE_MODELOS))
+    client = client or openai.OpenAI()
+    clave = huella_api_key(client.api_key, str(client.base_url))
+
+    cache = _leer_cache(ruta_cache)
+    entrada = cache.get(clave)
+    if entrada and entrada.get("modelo") in candidatos and time.time() - entrada.get("resuelto", 0) < ttl:
+        return entrada["modelo"], "caché"
+
+    modelo = sondear_modelos(client.with_options(timeout=TIMEOUT_SONDEO, max_retries=0), candidatos)
+    if modelo:
+        cache[clave] = {"modelo": modelo, "resuelto": time.time()}
+        _escribir_cache(ruta_cache, cache)
+    return modelo, "sondeo"
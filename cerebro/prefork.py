@@ -0,0 +1,224 @@
+"""
+Pool de procesos pre-fork para servir con varios núcleos sin duplicar el modelo.
+
+El proceso padre carga una vez el estado de solo lectura (modelo de embeddings, réplica
+de los vectores con mmap, índices) y después crea los workers con `fork()`: cada uno
+hereda ese estado copy-on-write, así que las páginas de los pesos del modelo y de los
+índices son las mismas en todos mientras nadie las escriba. Todos aceptan conexiones del
+mismo socket, que abre el padre.
+
+Para que el fork sea seguro, el padre no debe haber arrancado hilos ni usado el modelo
+(el pool de OpenMP de torch no sobrevive a un fork): la ingesta corre en un proceso
+escritor aparte (spawn) y cada worker fija sus hilos intra-op al arrancar.
+
+El padre solo supervisa:
+
+- un worker que muere se reemplaza,
+- SIGHUP llama a `al_recargar` (p.ej. reingestar en el escritor y reabrir los índices) y,
+  si devuelve True, reemplaza los workers de a uno por generación nueva sin cortar las
+  preguntas en curso (los viejos reciben SIGTERM y terminan lo que están atendiendo);
+  si la recarga falla, se avisa y siguen los workers actuales,
+- SIGINT / SIGTERM terminan todo.
+"""
+
+import gc
+import os
+import signal
+import sys
+import time
+import traceback
+
+# Segundos que se espera a que los workers terminen sus preguntas antes de SIGKILL
+ESPERA_TERMINAR = 30.0
+# Un worker que muere antes de esto se reemplaza con una pausa (evita un bucle de forks)
+VIDA_MINIMA = 1.0
+
+
+def memoria_proceso(pid="self"):
+    """
+    Memoria de un proceso en bytes, desde /proc (Linux).
+
+    - rss: páginas residentes, contando las compartidas con otros procesos,
+    - pss: las compartidas divididas entre los procesos que las usan (sumar PSS da el total real),
+    - privada: páginas solo de este proceso (lo que libera al terminar).
+
+    Returns:
+        dict: {"rss", "pss", "privada"} (None si no hay /proc/<pid>/smaps_rollup)
+    """
+    try:
+        valores = {}
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linea in f:
+                partes = linea.split()
+                if len(partes) >= 2 and partes[0].endswith(":") and partes[1].isdigit():
+                    valores[partes[0][:-1]] = int(partes[1]) * 1024
+        return {"rss": valores["Rss"], "pss": valores["Pss"],
+                "privada": valores["Private_Clean"] + valores["Private_Dirty"]}
+    except (OSError, KeyError):
+        return None
+
+
+def hijos(pid):
+    """PIDs de los procesos hijos de `pid` (recorre /proc)."""
+    encontrados = []
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                # El nombre del comando va entre paréntesis y puede tener espacios
+                campos = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(campos[1]) == pid:
+            encontrados.append(int(entrada))
+    return sorted(encontrados)
+
+
+class PoolPrefork:
+    """
+    Crea `workers` procesos con fork y los mantiene vivos.
+
+    Args:
+        workers: Cantidad de procesos worker
+        atender: `atender(socket, numero)`, corre en cada worker hasta que termina de servir
+            (al recibir SIGTERM debe dejar de aceptar, terminar lo que tiene y volver)
+        al_recargar: Función sin argumentos que corre en el padre con SIGHUP; si devuelve
+            True, los workers se reemplazan para que hereden el estado nuevo (si lanza una
+            excepción, se mantienen los actuales)
+        aviso: Función para los mensajes del supervisor
+    """
+
+    def __init__(self, workers, atender, al_recargar=None, aviso=print):
+        self.workers = workers
+        self.atender = atender
+        self.al_recargar = al_recargar
+        self.aviso = aviso
+        self.activos = {}  # pid -> (numero, inicio)
+        self.retirados = set()
+        self._senal = None
+
+    def _lanzar(self, sock, numero):
+        pid = os.fork()
+        if pid:
+            self.activos[pid] = (numero, time.monotonic())
+            return pid
+        # --- worker ---
+        codigo = 0
+        try:
+            # Ctrl+C llega a todo el grupo: lo maneja el padre, que avisa con SIGTERM
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            for senal in (signal.SIGTERM, signal.SIGHUP, signal.SIGCHLD):
+                signal.signal(senal, signal.SIG_DFL)
+            self.atender(sock, numero)
+        except BaseException:
+            traceback.print_exc()
+            codigo = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(codigo)
+
+    def _recoger(self):
+        """Procesa los hijos que terminaron; devuelve los números de worker a reemplazar."""
+        caidos = []
+        while True:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.retirados:
+                self.retirados.discard(pid)
+                continue
+            if pid in self.activos:
+                numero, inicio = self.activos.pop(pid)
+                self.aviso(f"⚠️  Worker {numero} (pid {pid}) terminó con código {os.waitstatus_to_exitcode(estado)}: se reemplaza")
+                caidos.append((numero, time.monotonic() - inicio))
+        return caidos
+
+    def _reemplazar_todos(self, sock):
+        """Generación nueva de workers; los anteriores terminan sus preguntas y salen."""
+        viejos = list(self.activos.items())
+        for pid, (numero, _) in viejos:
+            self._lanzar(sock, numero)
+            del self.activos[pid]
+            self.retirados.add(pid)
+            os.kill(pid, signal.SIGTERM)
+
+    def _terminar(self, espera=ESPERA_TERMINAR):
+        pids = set(self.activos) | self.retirados
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        limite = time.monotonic() + espera
+        while pids and time.monotonic() < limite:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                pids.discard(pid)
+            else:
+                time.sleep(0.05)
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+        self.activos.clear()
+        self.retirados.clear()
+
+    def correr(self, sock):
+        """
+        Crea los workers y los supervisa hasta SIGINT/SIGTERM.
+
+        Args:
+            sock: Socket de escucha ya abierto (lo heredan todos los workers)
+        """
+        anteriores = {senal: signal.signal(senal, self._anotar) for senal in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)}
+        try:
+            # Los objetos cargados pasan a la generación permanente: el GC de los workers no
+            # los recorre, así que no escribe en sus páginas y siguen compartidas
+            gc.collect()
+            gc.freeze()
+            for numero in range(self.workers):
+                self._lanzar(sock, numero)
+            self.aviso(f"👷 {self.workers} workers: {', '.join(str(pid) for pid in self.activos)} (padre {os.getpid()})")
+            while True:
+                senal, self._senal = self._senal, None
+                if senal in (signal.SIGINT, signal.SIGTERM):
+                    break
+                if senal == signal.SIGHUP and self.al_recargar is not None:
+                    self.aviso("🔄 Recargando...")
+                    try:
+                        recargado = self.al_recargar()
+                    except Exception as error:
+                        # Una recarga fallida (ingesta, índices) no tira el servidor: siguen los workers actuales
+                        traceback.print_exc()
+                        self.aviso(f"   ❌ Error al recargar, se mantienen los workers: {error}")
+                    else:
+                        if recargado:
+                            gc.collect()
+                            gc.freeze()
+                            self._reemplazar_todos(sock)
+                            self.aviso(f"   ✅ Workers nuevos: {', '.join(str(pid) for pid in self.activos)}")
+                        else:
+                            self.aviso("   ✅ Sin cambios: se mantienen los workers")
+                for numero, vida in self._recoger():
+                    if vida < VIDA_MINIMA:
+                        time.sleep(VIDA_MINIMA)
+                    self._lanzar(sock, numero)
+                time.sleep(0.1)
+        finally:
+            self._terminar()
+            gc.unfreeze()
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
+
+    def _anotar(self, senal, _marco):
+        self._senal = senal
@@ -0,0 +1,221 @@
+"""
+Recuperación de documentos con una sola búsqueda por pregunta.
+
+`Recuperador.recuperar()` embebe la pregunta una única vez, hace una única consulta ANN
+a la base vectorial y devuelve un `ResultadoRecuperacion` con los documentos, sus
+distancias y los tiempos de cada etapa. Ese objeto viaja por todo el pipeline
+(evaluación de relevancia, prompt, fallback y fuentes mostradas) para no volver a
+consultar la base vectorial.
+
+Con un índice léxico (`cerebro.lexico`), la búsqueda es híbrida: BM25 corre en un hilo
+en paralelo con el embedding y la consulta ANN, y ambas listas se combinan con
+Reciprocal Rank Fusion (RRF). Desde un hilo de trabajo (servidor.py, lote.py --hilos)
+BM25 corre en el mismo hilo: la concurrencia ya la dan los llamadores, y un hilo de
+BM25 compartido pondría en fila las preguntas de todos.
+
+Con un índice de secciones (`cerebro.fragmentacion`), cada fragmento encontrado se
+expande a la sección de la documentación que lo contiene, leída del archivo sin otra
+consulta a la base vectorial.
+
+Con un empaquetador de contexto (`cerebro.contexto`), los `k` resultados son candidatos:
+se unen los fragmentos solapados o contiguos y se quedan los que entran en el presupuesto
+de tokens, así que `docs` pasa a ser lo que realmente va al prompt.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+
+from cerebro.ingesta import id_fragmento
+
+# Constante de RRF (Cormack et al.): amortigua el peso de las primeras posiciones
+K_RRF = 60
+ETAPAS = {"embedding": "embedding", "busqueda": "ANN", "bm25": "BM25", "fusion": "fusión", "secciones": "secciones",
+          "contexto": "contexto"}
+
+
+def format_docs(docs):
+    """Une el contenido de los documentos recuperados en un solo contexto."""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+
+@dataclass
+class ResultadoRecuperacion:
+    """Documentos recuperados para una pregunta, con sus distancias y tiempos."""
+
+    pregunta: str
+    docs: list
+    scores: list = field(default_factory=list)
+    tiempos: dict = field(default_factory=dict)
+    desde_cache: bool = False
+    fusion: list = field(default_factory=list)
+
+    @property
+    def contexto(self):
+        """Contexto listo para insertar en el prompt."""
+        return format_docs(self.docs)
+
+    @property
+    def fuentes(self):
+        """Archivos de origen de los documentos, sin repetir y en orden de relevancia."""
+        return list(dict.fromkeys(doc.metadata.get("source", "?") for doc in self.docs))
+
+    def resumen_tiempos(self):
+        """Línea con la latencia de cada etapa de la recuperación, en milisegundos."""
+        etapas = " | ".join(f"{ETAPAS.get(etapa, etapa)} {segundos * 1e3:.1f} ms" for etapa, segundos in self.tiempos.items())
+        return f"⏱️  Recuperación: {etapas}"
+
+    def __len__(self):
+        return len(self.docs)
+
+
+def fusionar_rrf(*rankings, k=K_RRF):
+    """
+    Combina rankings con Reciprocal Rank Fusion: puntaje = Σ 1 / (k + posición).
+
+    Args:
+        *rankings: Listas de IDs, cada una ordenada de más a menos relevante
+        k: Constante de RRF
+
+    Returns:
+        list: Tuplas (id, puntaje) de mayor a menor puntaje
+    """
+    puntajes = {}
+    for ranking in rankings:
+        for posicion, id_ in enumerate(ranking, start=1):
+            puntajes[id_] = puntajes.get(id_, 0.0) + 1.0 / (k + posicion)
+    return sorted(puntajes.items(), key=lambda par: par[1], reverse=True)
+
+
+class Recuperador:
+    """
+    Busca los `k` fragmentos más similares a una pregunta en la base vectorial.
+
+    Los scores son distancias devueltas por la base vectorial (menor = más similar). La base
+    puede ser la colección de ChromaDB o una réplica local (`cerebro.indice_vectorial`).
+
+    Args:
+        vectorstore: Base vectorial (ChromaDB)
+        k: Cantidad de fragmentos a devolver
+        indice: IndiceInvertido del corpus para la búsqueda híbrida (None = solo densa)
+        candidatos: Fragmentos que aporta cada búsqueda a la fusión en modo híbrido
+        empaquetador: EmpaquetadorContexto que elige entre los `k` candidatos (None = los `k` tal cual)
+        secciones: IndiceSecciones para expandir cada fragmento a su sección (None = sin expandir)
+    """
+
+    def __init__(self, vectorstore, k=3, indice=None, candidatos=10, empaquetador=None, secciones=None):
+        self.vectorstore = vectorstore
+        self.k = k
+        self.indice = indice
+        self.candidatos = max(candidatos, k)
+        self.empaquetador = empaquetador
+        self.secciones = secciones
+        self._hilo_lexico = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25") if indice is not None else None
+
+    def embeber(self, pregunta):
+        """Embebe la pregunta con el mismo modelo de la base vectorial."""
+        return self.vectorstore.embeddings.embed_query(pregunta)
+
+    def embeber_lote(self, preguntas):
+        """Embebe varias preguntas; con la caché de embeddings, en una sola llamada al modelo."""
+        embeddings = self.vectorstore.embeddings
+        if hasattr(embeddings, "vectores"):
+            return embeddings.vectores(preguntas, "q").tolist()
+        return [embeddings.embed_query(pregunta) for pregunta in preguntas]
+
+    def recuperar(self, pregunta, vector=None):
+        """
+        Embebe la pregunta y consulta la base vectorial una sola vez.
+
+        Args:
+            pregunta: Pregunta del usuario
+            vector: Embedding de la pregunta si ya se calculó (p.ej. para la caché semántica)
+
+        Returns:
+            ResultadoRecuperacion: Documentos, distancias y tiempos (segundos)
+        """
+        # BM25 arranca primero para solaparse con el embedding y la consulta ANN; desde un hilo
+        # de trabajo corre después en el mismo hilo (el único hilo de BM25 serializaría a todos)
+        futuro_lexico = None
+        if self.indice is not None and threading.current_thread() is threading.main_thread():
+            futuro_lexico = self._hilo_lexico.submit(self._buscar_lexico, pregunta)
+
+        tiempos = {}
+        inicio = time.perf_counter()
+        if vector is None:
+            vector = self.embeber(pregunta)
+            tiempos["embedding"] = time.perf_counter() - inicio
+        inicio_busqueda = time.perf_counter()
+        resultados = self.vectorstore.similarity_search_by_vector_with_relevance_scores(
+            vector, k=self.candidatos if self.indice is not None else self.k
+        )
+        tiempos["busqueda"] = time.perf_counter() - inicio_busqueda
+
+        if self.indice is None:
+            return self._empaquetar(ResultadoRecuperacion(
+                pregunta=pregunta,
+                docs=[doc for doc, _ in resultados],
+                scores=[float(score) for _, score in resultados],
+                tiempos=tiempos,
+            ))
+
+        ids_lexicos, tiempos["bm25"] = futuro_lexico.result() if futuro_lexico else self._buscar_lexico(pregunta)
+        inicio_fusion = time.perf_counter()
+        densos = {id_fragmento(doc.metadata.get("source", ""), doc.page_content): (doc, float(score)) for doc, score in resultados}
+        fusion = fusionar_rrf(list(densos), ids_lexicos)[:self.k]
+        faltantes = [id_ for id_, _ in fusion if id_ not in densos]
+        if faltantes:
+            densos.update(self._traer(faltantes, vector))
+        tiempos["fusion"] = time.perf_counter() - inicio_fusion
+
+        return self._empaquetar(ResultadoRecuperacion(
+            pregunta=pregunta,
+            docs=[densos[id_][0] for id_, _ in fusion],
+            scores=[densos[id_][1] for id_, _ in fusion],
+            tiempos=tiempos,
+            fusion=[puntaje for _, puntaje in fusion],
+        ))
+
+    def _expandir(self, resultado):
+        """Reemplaza cada fragmento por su sección (sin repetir secciones)."""
+        inicio = time.perf_counter()
+        resultado.docs, resultado.scores = self.secciones.expandir(resultado.docs, resultado.scores)
+        # El puntaje de fusión es por fragmento: ya no corresponde a las secciones
+        resultado.fusion = []
+        resultado.tiempos["secciones"] = time.perf_counter() - inicio
+        return resultado
+
+    def _empaquetar(self, resultado):
+        """Expande los fragmentos a su sección y deja los bloques que entran en el presupuesto de tokens."""
+        if self.secciones is not None and resultado.docs:
+            resultado = self._expandir(resultado)
+        if self.empaquetador is None or not resultado.docs:
+            return resultado
+        inicio = time.perf_counter()
+        resultado.docs, resultado.scores = self.empaquetador.empaquetar(resultado.docs, resultado.scores)
+        # El puntaje de fusión es por fragmento: ya no corresponde a los bloques
+        resultado.fusion = []
+        resultado.tiempos["contexto"] = time.perf_counter() - inicio
+        return resultado
+
+    def _buscar_lexico(self, pregunta):
+        inicio = time.perf_counter()
+        ids, _ = self.indice.buscar(pregunta, k=self.candidatos)
+        return ids, time.perf_counter() - inicio
+
+    def _traer(self, ids, vector):
+        """Documentos que solo encontró BM25, con su distancia real al vector de la pregunta."""
+        if hasattr(self.vectorstore, "traer"):
+            # Réplica local (cerebro.indice_vectorial): sin pasar por ChromaDB
+            return self.vectorstore.traer(ids, vector)
+        datos = self.vectorstore._collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+        # Misma métrica que la colección de ChromaDB ("l2": distancia euclídea al cuadrado)
+        distancias = np.sum((np.asarray(datos["embeddings"], dtype=np.float32) - np.asarray(vector, dtype=np.float32)) ** 2, axis=1)
+        return {
+            id_: (Document(page_content=texto, metadata=metadata or {}), float(distancia))
+            for id_, texto, metadata, distancia in zip(datos["ids"], datos["documents"], datos["metadatas"], distancias)
+        }
@@ -0,0 +1,129 @@
+"""
+Compuerta de relevancia: decide si los documentos recuperados alcanzan para responder con RAG.
+
+La decisión usa primero las distancias que la base vectorial ya calculó al recuperar
+(sin trabajo extra) y solo en una zona gris alrededor del umbral consulta un puntaje
+léxico: qué fracción de los términos de la pregunta (ponderados por IDF) aparece en los
+fragmentos recuperados. Ese puntaje sale del índice invertido de `cerebro.lexico`
+(el mismo de la búsqueda BM25), con coincidencias por token completo (no por subcadena).
+
+Los umbrales por defecto son para distancias L2 al cuadrado de vectores normalizados
+(all-MiniLM-L6-v2 en ChromaDB); `benchmarks/eval_relevancia.py` los calibra sobre un
+conjunto de preguntas etiquetadas.
+"""
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from cerebro.lexico import IndiceInvertido
+
+UMBRAL_DISTANCIA = 1.0
+MARGEN_DISTANCIA = 0.4
+UMBRAL_LEXICO = 0.5
+
+
+@dataclass
+class CompuertaRelevancia:
+    """
+    Decide entre RAG y conocimiento propio a partir de las distancias de la recuperación.
+
+    - distancia mínima <= `umbral`: relevante.
+    - distancia mínima > `umbral + margen`: no relevante.
+    - En la zona gris decide la cobertura léxica del índice (si no hay índice, no es relevante).
+    """
+
+    umbral: float = UMBRAL_DISTANCIA
+    margen: float = MARGEN_DISTANCIA
+    umbral_lexico: float = UMBRAL_LEXICO
+    indice: IndiceInvertido = None
+
+    def evaluar_lote(self, distancias):
+        """
+        Decisión por distancia para un lote de recuperaciones, sin mirar el texto.
+
+        Args:
+            distancias: Matriz (preguntas, k) de distancias (menor = más similar)
+
+        Returns:
+            np.ndarray: Arreglo de int8 por pregunta: 1 relevante, 0 no relevante, -1 zona gris
+        """
+        mejor = np.min(np.atleast_2d(np.asarray(distancias, dtype=np.float32)), axis=1)
+        decision = np.full(mejor.shape, -1, dtype=np.int8)
+        decision[mejor <= self.umbral] = 1
+        decision[mejor > self.umbral + self.margen] = 0
+        return decision
+
+    def evaluar(self, resultado):
+        """
+        Evalúa si los documentos recuperados son relevantes para la pregunta.
+
+        Args:
+            resultado: ResultadoRecuperacion con documentos y distancias
+
+        Returns:
+            bool: True si hay información relevante, False si no
+        """
+        if not resultado.docs or not resultado.scores:
+            return False
+        # Con k chico, min() sobre la lista es más rápido que crear un arreglo
+        mejor = min(resultado.scores)
+        if mejor <= self.umbral:
+            return True
+        if mejor > self.umbral + self.margen:
+            return False
+        if self.indice is None:
+            return False
+        cobertura = self.indice.cobertura(resultado.pregunta, resultado.docs)
+        # Sin términos informativos en la pregunta, confiar en el recuperador
+        return cobertura is None or cobertura >= self.umbral_lexico
+
+
+def calibrar_umbral(distancias, etiquetas):
+    """
+    Umbral de distancia que maximiza la exactitud del ruteo sobre preguntas etiquetadas.
+
+    Args:
+        distancias: Matriz (preguntas, k) de distancias de cada recuperación
+        etiquetas: True si la pregunta se responde con la documentación
+
+    Returns:
+        tuple: (umbral, exactitud)
+    """
+    mejor = np.min(np.atleast_2d(np.asarray(distancias, dtype=np.float64)), axis=1)
+    etiquetas = np.asarray(etiquetas, dtype=bool)
+    orden = np.argsort(mejor)
+    mejor, etiquetas = mejor[orden], etiquetas[orden]
+    # Con el umbral en la posición i se aceptan las preguntas 0..i: aciertos = positivos
+    # aceptados + negativos rechazados, para todos los cortes a la vez
+    positivos = np.cumsum(etiquetas)
+    negativos_rechazados = (~etiquetas).sum() - np.cumsum(~etiquetas)
+    aciertos = np.concatenate(([(~etiquetas).sum()], positivos + negativos_rechazados))
+    corte = int(np.argmax(aciertos))
+    if corte == 0:
+        umbral = mejor[0] - 1e-6
+    elif corte == len(mejor):
+        umbral = mejor[-1]
+    else:
+        # Punto medio entre la última aceptada y la primera rechazada
+        umbral = (mejor[corte - 1] + mejor[corte]) / 2
+    return float(umbral), float(aciertos[corte] / len(mejor))
+
+
+def crear_compuerta(indice=None):
+    """
+    Crea la compuerta de relevancia según el entorno.
+
+    RELEVANCIA_UMBRAL ajusta la distancia máxima; RELEVANCIA_LEXICA=0 desactiva la
+    cobertura léxica (la zona gris se resuelve como no relevante).
+
+    Args:
+        indice: IndiceInvertido del corpus (ver sincronizar_indice_lexico)
+
+    Returns:
+        CompuertaRelevancia: Compuerta lista para usar
+    """
+    if os.getenv("RELEVANCIA_LEXICA", "1") == "0":
+        indice = None
+    return CompuertaRelevancia(umbral=float(os.getenv("RELEVANCIA_UMBRAL", UMBRAL_DISTANCIA)), indice=indice)
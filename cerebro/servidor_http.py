@@ -0,0 +1,175 @@
+"""
+Servidor HTTP/1.1 mínimo sobre asyncio (solo biblioteca estándar).
+
+Alcanza para exponer el asistente como API JSON: peticiones con cuerpo JSON, conexiones
+keep-alive y respuestas en streaming como NDJSON con `Transfer-Encoding: chunked`.
+No pretende reemplazar a un servidor de producción (sin TLS ni HTTP/2).
+
+Un manejador es `async def manejador(peticion)` y devuelve:
+
+- un dict (respuesta JSON 200) o una tupla `(estado, dict)`,
+- o un iterador asíncrono de dicts, que se envía como una línea JSON por evento.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+
+MAX_ENCABEZADOS = 64 * 1024
+MAX_CUERPO = 1 << 20
+RAZONES = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ErrorHTTP(Exception):
+    """Error que se responde al cliente con su código de estado."""
+
+    def __init__(self, estado, mensaje, encabezados=None):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+        self.encabezados = encabezados or {}
+
+
+@dataclass
+class PeticionHTTP:
+    metodo: str
+    ruta: str
+    encabezados: dict = field(default_factory=dict)
+    cuerpo: bytes = b""
+
+    def json(self):
+        """Cuerpo decodificado como JSON (ErrorHTTP 400 si no es válido)."""
+        try:
+            return json.loads(self.cuerpo or b"{}")
+        except ValueError:
+            raise ErrorHTTP(400, "El cuerpo no es JSON válido")
+
+
+def _encabezado_respuesta(estado, encabezados):
+    lineas = [f"HTTP/1.1 {estado} {RAZONES.get(estado, '')}"]
+    lineas += [f"{nombre}: {valor}" for nombre, valor in encabezados.items()]
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("latin-1")
+
+
+class ServidorHTTP:
+    """
+    Enruta peticiones HTTP a manejadores asíncronos.
+
+    Args:
+        rutas: Diccionario {(método, ruta): manejador}
+    """
+
+    def __init__(self, rutas):
+        self.rutas = rutas
+
+    async def iniciar(self, host="127.0.0.1", puerto=8000, sock=None):
+        """
+        Empieza a escuchar; devuelve el `asyncio.Server` (su puerto real está en `sockets`).
+
+        Con `sock` acepta conexiones de un socket ya abierto (p.ej. uno heredado por los
+        workers de un pool pre-fork) en lugar de abrir `host:puerto`.
+        """
+        if sock is not None:
+            return await asyncio.start_server(self._atender, sock=sock, limit=MAX_ENCABEZADOS)
+        return await asyncio.start_server(self._atender, host, puerto, limit=MAX_ENCABEZADOS)
+
+    async def _leer_peticion(self, lector):
+        try:
+            crudo = await lector.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None  # El cliente cerró la conexión
+        except asyncio.LimitOverrunError:
+            raise ErrorHTTP(400, "Encabezados demasiado grandes")
+        linea, *lineas = crudo.decode("latin-1").split("\r\n")
+        try:
+            metodo, objetivo, _ = linea.split(" ", 2)
+        except ValueError:
+            raise ErrorHTTP(400, "Línea de petición inválida")
+        encabezados = {}
+        for cabecera in lineas:
+            if ":" in cabecera:
+                nombre, valor = cabecera.split(":", 1)
+                encabezados[nombre.strip().lower()] = valor.strip()
+        try:
+            largo = int(encabezados.get("content-length", 0) or 0)
+        except ValueError:
+            raise ErrorHTTP(400, "Content-Length inválido")
+        if largo < 0:
+            raise ErrorHTTP(400, "Content-Length inválido")
+        if largo > MAX_CUERPO:
+            raise ErrorHTTP(413, "Cuerpo demasiado grande")
+        cuerpo = await lector.readexactly(largo) if largo else b""
+        return PeticionHTTP(metodo.upper(), objetivo.split("?", 1)[0], encabezados, cuerpo)
+
+    async def _atender(self, lector, escritor):
+        try:
+            while True:
+                try:
+                    peticion = await self._leer_peticion(lector)
+                except ErrorHTTP as e:
+                    await self._enviar_json(escritor, e.estado, {"error": e.mensaje}, mantener=False)
+                    break
+                if peticion is None:
+                    break
+                mantener = peticion.encabezados.get("connection", "").lower() != "close"
+                if not await self._despachar(peticion, escritor, mantener) or not mantener:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def _despachar(self, peticion, escritor, mantener):
+        """Ejecuta el manejador y envía su respuesta; devuelve si la conexión sigue abierta."""
+        manejador = self.rutas.get((peticion.metodo, peticion.ruta))
+        if manejador is None:
+            estado = 405 if any(ruta == peticion.ruta for _, ruta in self.rutas) else 404
+            await self._enviar_json(escritor, estado, {"error": f"{peticion.metodo} {peticion.ruta} no existe"}, mantener)
+            return True
+        try:
+            respuesta = await manejador(peticion)
+        except ErrorHTTP as e:
+            await self._enviar_json(escritor, e.estado, {"error": e.mensaje}, mantener, e.encabezados)
+            return True
+        except Exception as e:
+            await self._enviar_json(escritor, 500, {"error": str(e)}, mantener)
+            return True
+
+        if hasattr(respuesta, "__aiter__"):
+            await self._enviar_stream(escritor, respuesta, mantener)
+            return True
+        estado, cuerpo = respuesta if isinstance(respuesta, tuple) else (200, respuesta)
+        await self._enviar_json(escritor, estado, cuerpo, mantener)
+        return True
+
+    async def _enviar_json(self, escritor, estado, cuerpo, mantener, extra=None):
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        encabezados = {
+            "Content-Type": "application/json; charset=utf-8",
+            "Content-Length": str(len(datos)),
+            "Connection": "keep-alive" if mantener else "close",
+            **(extra or {}),
+        }
+        escritor.write(_encabezado_respuesta(estado, encabezados) + datos)
+        await escritor.drain()
+
+    async def _enviar_stream(self, escritor, eventos, mantener):
+        encabezados = {
+            "Content-Type": "application/x-ndjson; charset=utf-8",
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive" if mantener else "close",
+        }
+        escritor.write(_encabezado_respuesta(200, encabezados))
+        try:
+            async for evento in eventos:
+                linea = json.dumps(evento, ensure_ascii=False).encode("utf-8") + b"\n"
+                escritor.write(f"{len(linea):x}\r\n".encode("ascii") + linea + b"\r\n")
+                # drain aplica back-pressure: un cliente lento frena al generador
+                await escritor.drain()
+        finally:
+            # Si el cliente se desconectó, cerrar el generador cancela el trabajo pendiente
+            if hasattr(eventos, "aclose"):
+                await eventos.aclose()
+        escritor.write(b"0\r\n\r\n")
+        await escritor.drain()
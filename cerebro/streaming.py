@@ -0,0 +1,153 @@
+"""
+Salida en streaming para los chats de terminal.
+
+`ImpresorStream` imprime los fragmentos de texto a medida que llegan del LLM y mide por
+separado el tiempo hasta el primer token (TTFT) y la latencia total. `consumir_stream`
+permite retener el comienzo de la respuesta cuando hay que inspeccionarla antes de
+mostrarla (p.ej. el chequeo de "información insuficiente" del sistema híbrido);
+`consumir_stream_async` hace lo mismo sobre `astream` para el servidor HTTP.
+
+El TTFT se mide cuando llega el primer fragmento del LLM, no cuando se muestra: si
+`al_recibir` tiene un método `al_llegar`, se lo llama en ese momento aunque el fragmento
+quede retenido, y la demora de la retención se informa aparte.
+"""
+
+import os
+import time
+
+
+def streaming_activado():
+    """El streaming está activado por defecto; se desactiva con STREAMING=0."""
+    return os.getenv("STREAMING", "1") != "0"
+
+
+class _Retencion:
+    """Acumula la respuesta y empieza a emitir cuando supera `retener` caracteres."""
+
+    def __init__(self, al_recibir, retener):
+        self.al_recibir = al_recibir
+        self.retener = retener
+        self.partes = []
+        self.largo = 0
+        self.emitiendo = False
+
+    def agregar(self, fragmento):
+        if not fragmento:
+            return
+        if not self.partes and hasattr(self.al_recibir, "al_llegar"):
+            # Primer token del LLM, aunque se retenga: es el momento que mide el TTFT
+            self.al_recibir.al_llegar()
+        self.partes.append(fragmento)
+        if self.emitiendo:
+            self.al_recibir(fragmento)
+            return
+        self.largo += len(fragmento)
+        if self.largo >= self.retener:
+            self.emitiendo = True
+            self.al_recibir("".join(self.partes))
+
+    @property
+    def texto(self):
+        return "".join(self.partes)
+
+
+def consumir_stream(fragmentos, al_recibir, retener=0):
+    """
+    Consume un stream de texto y lo va pasando a `al_recibir`.
+
+    Los primeros `retener` caracteres se acumulan sin emitir: si la respuesta completa es
+    más corta que eso no se emite nada y el llamador decide qué hacer con ella. Así, una
+    respuesta se emite si y solo si `len(respuesta) >= retener`.
+
+    Args:
+        fragmentos: Iterable de strings (p.ej. `cadena.stream(...)`)
+        al_recibir: Función llamada con cada fragmento emitido
+        retener: Cantidad de caracteres a retener antes de empezar a emitir
+
+    Returns:
+        str: Respuesta completa
+    """
+    retencion = _Retencion(al_recibir, retener)
+    try:
+        for fragmento in fragmentos:
+            retencion.agregar(fragmento)
+    finally:
+        # Si `al_recibir` corta el stream con una excepción (p.ej. una rama especulativa
+        # cancelada), cerrar el generador cierra también la conexión con el LLM
+        if hasattr(fragmentos, "close"):
+            fragmentos.close()
+    return retencion.texto
+
+
+async def consumir_stream_async(fragmentos, al_recibir, retener=0):
+    """Igual que `consumir_stream` para un iterable asíncrono (p.ej. `cadena.astream(...)`)."""
+    retencion = _Retencion(al_recibir, retener)
+    try:
+        async for fragmento in fragmentos:
+            retencion.agregar(fragmento)
+    finally:
+        if hasattr(fragmentos, "aclose"):
+            await fragmentos.aclose()
+    return retencion.texto
+
+
+def fragmentos_openai(stream):
+    """Extrae el texto de un stream de `client.chat.completions.create(stream=True)`."""
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class ImpresorStream:
+    """
+    Imprime fragmentos a medida que llegan, precedidos por un encabezado.
+
+    El encabezado puede ser un string o una función que recibe la fuente de la respuesta
+    (útil en el sistema híbrido, donde la fuente se decide después de la pregunta).
+    `consumir_stream` llama a `al_llegar` con el primer token del LLM, antes de retenerlo.
+    """
+
+    def __init__(self, encabezado):
+        self.encabezado = encabezado
+        self.inicio = time.perf_counter()
+        self.llegada = None
+        self.primer_token = None
+        self.fin = None
+
+    def al_llegar(self):
+        if self.llegada is None:
+            self.llegada = time.perf_counter()
+
+    def __call__(self, fragmento, fuente=None):
+        if self.primer_token is None:
+            self.primer_token = time.perf_counter()
+            encabezado = self.encabezado(fuente) if callable(self.encabezado) else self.encabezado
+            print(encabezado, end="", flush=True)
+        print(fragmento, end="", flush=True)
+
+    def terminar(self):
+        """Cierra la línea de respuesta y fija la latencia total."""
+        self.fin = time.perf_counter()
+        print("\n")
+
+    @property
+    def ttft(self):
+        """Segundos hasta que llegó el primer token del LLM (None si no llegó ninguno)."""
+        llegada = self.llegada or self.primer_token
+        return None if llegada is None else llegada - self.inicio
+
+    @property
+    def retencion(self):
+        """Segundos entre que llegó el primer token y se mostró (0 sin retención)."""
+        if self.llegada is None or self.primer_token is None:
+            return 0.0
+        return max(0.0, self.primer_token - self.llegada)
+
+    @property
+    def total(self):
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    def resumen(self):
+        ttft = "-" if self.ttft is None else f"{self.ttft:.2f}s"
+        retencion = f" | Retenido: {self.retencion:.2f}s" if self.retencion >= 0.005 else ""
+        return f"⚡ Primer token: {ttft}{retencion} | Total: {self.total:.2f}s"
@@ -0,0 +1,375 @@
+"""
+Trazas por etapa del pipeline: cuánto tardó cada paso de una respuesta y cuántos tokens usó.
+
+Cada pregunta tiene una `Traza` con spans por etapa:
+
+- embedding, cache, busqueda, bm25, fusion: recuperación (los tiempos de Recuperador),
+- compuerta: decisión de relevancia (con la distancia mínima),
+- prompt: armado del contexto (caracteres y fragmentos),
+- llm / reintento: llamadas al modelo con tokens de prompt y de respuesta y, en streaming,
+  el tiempo hasta el primer token.
+
+Al cerrarse, la traza va a un sumidero intercambiable: un archivo JSONL (una traza por
+línea, para analizar después con `reporte_trazas.py`) y/o un agregador en memoria con
+histogramas por etapa que los chats muestran al salir. Se configura con `TRAZAS`
+(ver `crear_sumidero`).
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Histogramas: cubetas geométricas de 10 µs a ~5 min, cuatro por cada duplicación (±9%)
+MINIMO_HISTOGRAMA = 1e-5
+CUBETAS_POR_OCTAVA = 4
+CANTIDAD_CUBETAS = 25 * CUBETAS_POR_OCTAVA
+
+ETAPAS_LLM = ("llm", "reintento")
+
+
+@dataclass
+class Span:
+    nombre: str
+    inicio: float  # segundos desde el inicio de la traza
+    duracion: float = 0.0
+    atributos: dict = field(default_factory=dict)
+
+    def como_dict(self):
+        return {"etapa": self.nombre, "inicio": round(self.inicio, 6), "duracion": round(self.duracion, 6), **self.atributos}
+
+
+class Traza:
+    """
+    Spans de una pregunta.
+
+    Args:
+        pregunta: Pregunta del usuario
+        **atributos: Datos de la traza (p.ej. el script que la generó)
+    """
+
+    def __init__(self, pregunta, **atributos):
+        self.id = uuid.uuid4().hex[:16]
+        self.pregunta = pregunta
+        self.atributos = atributos
+        self.spans = []
+        self.fecha = time.time()
+        self._inicio = time.perf_counter()
+        self.duracion = None
+
+    @contextmanager
+    def etapa(self, nombre, **atributos):
+        """Mide el bloque como un span; los atributos se pueden completar dentro (`span.atributos`)."""
+        span = Span(nombre, time.perf_counter() - self._inicio, atributos=atributos)
+        try:
+            yield span
+        except BaseException as e:
+            span.atributos["error"] = type(e).__name__
+            raise
+        finally:
+            span.duracion = time.perf_counter() - self._inicio - span.inicio
+            self.spans.append(span)
+
+    def agregar(self, nombre, duracion, **atributos):
+        """Agrega un span ya medido en otro lado (p.ej. los tiempos de ResultadoRecuperacion)."""
+        span = Span(nombre, max(time.perf_counter() - self._inicio - duracion, 0.0), duracion, atributos)
+        self.spans.append(span)
+        return span
+
+    def agregar_tiempos(self, tiempos):
+        """Agrega un span por cada etapa de `ResultadoRecuperacion.tiempos` (consecutivas, terminando ahora)."""
+        inicio = max(time.perf_counter() - self._inicio - sum(tiempos.values()), 0.0)
+        for nombre, duracion in tiempos.items():
+            self.spans.append(Span(nombre, inicio, duracion))
+            inicio += duracion
+
+    @contextmanager
+    def llamada_llm(self, etapa="llm", **atributos):
+        """
+        Span de una llamada al LLM.
+
+        Devuelve el `config` de LangChain cuyos callbacks anotan en el span los tokens
+        de prompt y de respuesta y, en streaming, el tiempo hasta el primer token.
+        """
+        with self.etapa(etapa, **atributos) as span:
+            yield {"callbacks": [_crear_manejador(span)]}
+
+    def cerrar(self, sumidero=None, **atributos):
+        """Termina la traza y la envía al sumidero (si hay)."""
+        self.duracion = time.perf_counter() - self._inicio
+        self.atributos.update(atributos)
+        if sumidero is not None:
+            sumidero.registrar(self.como_dict())
+        return self
+
+    def como_dict(self):
+        return {
+            "id": self.id,
+            "fecha": round(self.fecha, 3),
+            "pregunta": self.pregunta,
+            "duracion": round(self.duracion if self.duracion is not None else time.perf_counter() - self._inicio, 6),
+            **self.atributos,
+            "spans": [span.como_dict() for span in self.spans],
+        }
+
+
+class _TrazaNula:
+    """Traza que no registra nada: valor por defecto de las funciones que aceptan `traza`."""
+
+    @contextmanager
+    def etapa(self, nombre, **atributos):
+        yield Span(nombre, 0.0, atributos=atributos)
+
+    @contextmanager
+    def llamada_llm(self, etapa="llm", **atributos):
+        yield None
+
+    def agregar(self, nombre, duracion, **atributos):
+        return Span(nombre, 0.0, duracion, atributos)
+
+    def agregar_tiempos(self, tiempos):
+        pass
+
+
+SIN_TRAZA = _TrazaNula()
+
+_MANEJADOR = None
+
+
+def _crear_manejador(span):
+    """Crea el callback handler (la clase se define al primer uso para no importar langchain_core al arrancar)."""
+    global _MANEJADOR
+    if _MANEJADOR is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class ManejadorLLM(BaseCallbackHandler):
+            """Anota en un span los tokens de la llamada y el tiempo hasta el primer token."""
+
+            # También en ainvoke/astream: se ejecuta en el momento y no en un hilo aparte
+            run_inline = True
+
+            def __init__(self, span):
+                self.span = span
+                self._inicio = None
+
+            def on_chat_model_start(self, serialized, messages, **kwargs):
+                self._inicio = time.perf_counter()
+
+            def on_llm_new_token(self, token, **kwargs):
+                if self._inicio is not None and "ttft" not in self.span.atributos:
+                    self.span.atributos["ttft"] = round(time.perf_counter() - self._inicio, 6)
+
+            def on_llm_end(self, response, **kwargs):
+                prompt, respuesta = tokens_de_respuesta(response)
+                if prompt is not None:
+                    self.span.atributos["tokens_prompt"] = prompt
+                    self.span.atributos["tokens_respuesta"] = respuesta
+
+        _MANEJADOR = ManejadorLLM
+    return _MANEJADOR(span)
+
+
+def tokens_de_respuesta(response):
+    """
+    Tokens de prompt y de respuesta de un LLMResult, según los informa la API.
+
+    Returns:
+        tuple: (tokens_prompt, tokens_respuesta) o (None, None) si la API no los informó
+    """
+    for generaciones in response.generations:
+        for generacion in generaciones:
+            uso = getattr(getattr(generacion, "message", None), "usage_metadata", None)
+            if uso:
+                return uso.get("input_tokens", 0), uso.get("output_tokens", 0)
+    uso = (response.llm_output or {}).get("token_usage") or {}
+    if uso:
+        return uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0)
+    return None, None
+
+
+class Histograma:
+    """Histograma de duraciones en cubetas geométricas: memoria constante, percentiles con ±9% de error."""
+
+    def __init__(self):
+        self.cubetas = [0] * CANTIDAD_CUBETAS
+        self.cantidad = 0
+        self.suma = 0.0
+        self.minimo = math.inf
+        self.maximo = 0.0
+
+    @staticmethod
+    def cubeta(segundos):
+        if segundos <= MINIMO_HISTOGRAMA:
+            return 0
+        return min(int(math.log2(segundos / MINIMO_HISTOGRAMA) * CUBETAS_POR_OCTAVA) + 1, CANTIDAD_CUBETAS - 1)
+
+    @staticmethod
+    def limite(cubeta):
+        """Límite superior (segundos) de una cubeta."""
+        return MINIMO_HISTOGRAMA * 2 ** (cubeta / CUBETAS_POR_OCTAVA)
+
+    def agregar(self, segundos):
+        self.cubetas[self.cubeta(segundos)] += 1
+        self.cantidad += 1
+        self.suma += segundos
+        self.minimo = min(self.minimo, segundos)
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Percentil `p` (0-100) aproximado por el límite superior de su cubeta."""
+        if not self.cantidad:
+            return None
+        objetivo = p / 100 * self.cantidad
+        acumulado = 0
+        for cubeta, cuenta in enumerate(self.cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo and cuenta:
+                return min(self.limite(cubeta), self.maximo)
+        return self.maximo
+
+    def barras(self, ancho=40):
+        """Líneas de texto con una barra por cubeta no vacía."""
+        maximo = max(self.cubetas) or 1
+        return [
+            f"   ≤ {self.limite(cubeta) * 1e3:9.2f} ms {'█' * max(1, round(cuenta / maximo * ancho))} {cuenta}"
+            for cubeta, cuenta in enumerate(self.cubetas) if cuenta
+        ]
+
+
+class AgregadorTrazas:
+    """Sumidero en memoria: histograma de duración y totales de tokens y contexto por etapa."""
+
+    def __init__(self):
+        self.trazas = 0
+        self.errores = 0
+        self.total = Histograma()  # solo las preguntas respondidas
+        self.etapas = {}
+        self.contadores = {}  # etapa -> {atributo numérico: suma}
+        self._lock = threading.Lock()
+
+    def registrar(self, traza):
+        with self._lock:
+            self.trazas += 1
+            if "error" in traza:
+                self.errores += 1
+            else:
+                self.total.agregar(traza["duracion"])
+            for span in traza["spans"]:
+                etapa = span["etapa"]
+                self.etapas.setdefault(etapa, Histograma()).agregar(span["duracion"])
+                contadores = self.contadores.setdefault(etapa, {})
+                for clave in ("tokens_prompt", "tokens_respuesta", "caracteres_contexto", "ttft"):
+                    if span.get(clave) is not None:
+                        suma, n = contadores.get(clave, (0, 0))
+                        contadores[clave] = (suma + span[clave], n + 1)
+
+    def media(self, etapa, clave):
+        suma, n = self.contadores.get(etapa, {}).get(clave, (0, 0))
+        return suma / n if n else None
+
+    def como_dict(self):
+        """Percentiles (ms) y medias por etapa, para exponerlos como JSON (GET /trazas del servidor)."""
+        with self._lock:
+            etapas = {}
+            for etapa, histograma in self.etapas.items():
+                etapas[etapa] = {
+                    "n": histograma.cantidad,
+                    **{f"p{p}_ms": round(histograma.percentil(p) * 1e3, 3) for p in (50, 95, 99)},
+                    "max_ms": round(histograma.maximo * 1e3, 3),
+                    **{clave: round(suma / n, 3) for clave, (suma, n) in self.contadores.get(etapa, {}).items() if n},
+                }
+            return {
+                "trazas": self.trazas,
+                "errores": self.errores,
+                # Sin preguntas respondidas (todas con error) no hay percentiles del total
+                "total": {f"p{p}_ms": round(self.total.percentil(p) * 1e3, 3) if self.total.cantidad else None
+                          for p in (50, 95, 99)},
+                "etapas": etapas,
+            }
+
+    def resumen(self, histogramas=False):
+        """Tabla de latencias por etapa (p50/p95/p99/máx) con tokens y contexto promedio."""
+        if not self.trazas:
+            return "📈 Trazas: sin preguntas registradas"
+        if self.total.cantidad:
+            total = f"p50 {self.total.percentil(50) * 1e3:.0f} ms | p95 {self.total.percentil(95) * 1e3:.0f} ms"
+        else:
+            total = "p50 - | p95 -"
+        lineas = [
+            f"📈 Trazas: {self.trazas} preguntas{f' ({self.errores} con error)' if self.errores else ''}, total {total}",
+            f"   {'etapa':<12}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}   detalle (media)",
+        ]
+        for etapa, histograma in sorted(self.etapas.items(), key=lambda par: -par[1].suma):
+            detalle = []
+            if (tokens := self.media(etapa, "tokens_prompt")) is not None:
+                detalle.append(f"{tokens:.0f} tokens prompt + {self.media(etapa, 'tokens_respuesta'):.0f} respuesta")
+            if (ttft := self.media(etapa, "ttft")) is not None:
+                detalle.append(f"primer token {ttft * 1e3:.0f} ms")
+            if (contexto := self.media(etapa, "caracteres_contexto")) is not None:
+                detalle.append(f"contexto {contexto:.0f} caracteres")
+            lineas.append(
+                f"   {etapa:<12}{histograma.cantidad:>6}{histograma.percentil(50) * 1e3:>10.2f}"
+                f"{histograma.percentil(95) * 1e3:>10.2f}{histograma.percentil(99) * 1e3:>10.2f}"
+                f"{histograma.maximo * 1e3:>10.2f}   {', '.join(detalle)}"
+            )
+            if histogramas:
+                lineas.extend(histograma.barras())
+        return "\n".join(lineas)
+
+
+class SumideroJSONL:
+    """Agrega cada traza como una línea JSON a `ruta` (seguro entre hilos)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def registrar(self, traza):
+        linea = json.dumps(traza, ensure_ascii=False) + "\n"
+        with self._lock, open(self.ruta, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+
+class SumideroMultiple:
+    """Reenvía cada traza a varios sumideros."""
+
+    def __init__(self, *sumideros):
+        self.sumideros = sumideros
+
+    def registrar(self, traza):
+        for sumidero in self.sumideros:
+            sumidero.registrar(traza)
+
+
+def crear_sumidero():
+    """
+    Sumidero según `TRAZAS`: "0" desactiva las trazas, una ruta agrega un archivo JSONL
+    y siempre hay un agregador en memoria para el resumen al salir.
+
+    Returns:
+        tuple: (sumidero, agregador) - (None, None) si las trazas están desactivadas
+    """
+    destino = os.getenv("TRAZAS", "")
+    if destino == "0":
+        return None, None
+    agregador = AgregadorTrazas()
+    if not destino:
+        return agregador, agregador
+    return SumideroMultiple(agregador, SumideroJSONL(destino)), agregador
+
+
+def leer_trazas(ruta):
+    """Genera las trazas de un archivo JSONL (ignora una última línea incompleta)."""
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                yield json.loads(linea)
+            except ValueError:
+                continue
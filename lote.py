@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+Modo lote del sistema híbrido: responde un archivo JSONL de preguntas sin intervención.
+
+Cada línea de entrada es un objeto JSON con la pregunta en `pregunta` (o `question`,
+o `title` + `body` como en requests.jsonl) y, opcionalmente, un identificador en `id`
+(o `request_id`); sin identificador se usa el número de línea.
+
+Las preguntas pasan por la misma estrategia que `responder_hibrido`, pero:
+- se embeben de a `--lote` preguntas en una sola llamada al modelo,
+- las llamadas al LLM corren en paralelo, con a lo sumo `--concurrencia` simultáneas,
+- cada respuesta se agrega a la salida apenas termina (una línea JSON con la fuente y la latencia),
+- al volver a correr con la misma salida se saltean las preguntas ya respondidas, así que un
+  lote interrumpido (Ctrl+C, caída) continúa donde quedó. Las que fallaron se reintentan.
+
+    python lote.py benchmarks/eval_relevancia.jsonl --salida respuestas.jsonl
+    python lote.py preguntas.jsonl --lote 64 --concurrencia 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from cerebro.trazas import Traza, crear_sumidero
+from main_hybrid import configurar_sistema_hibrido, responder_hibrido_async
+from servidor import crear_cliente_http
+
+LOTE = 32
+CONCURRENCIA = int(os.getenv("LLM_CONCURRENCIA", "16"))
+
+
+def leer_preguntas(ruta):
+    """
+    Genera (id, pregunta) de cada línea del JSONL de entrada, sin cargarlo entero en memoria.
+
+    Args:
+        ruta: Archivo JSONL de entrada
+
+    Yields:
+        tuple: (identificador, pregunta) - el identificador siempre es str
+    """
+    with open(ruta, encoding="utf-8") as f:
+        for numero, linea in enumerate(f, start=1):
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            pregunta = registro.get("pregunta") or registro.get("question")
+            if pregunta is None:
+                pregunta = "\n\n".join(filter(None, (registro.get("title"), registro.get("body"))))
+            identificador = registro.get("id", registro.get("request_id", numero))
+            yield str(identificador), pregunta.strip()
+
+
+def preparar_salida(ruta):
+    """
+    Lee las respuestas ya escritas y deja el archivo listo para seguir agregando.
+
+    Si el proceso murió a mitad de una línea, esa línea incompleta se descarta
+    (se trunca el archivo hasta el último salto de línea) y su pregunta se vuelve a responder.
+
+    Args:
+        ruta: Archivo JSONL de salida (puede no existir)
+
+    Returns:
+        set: Identificadores ya respondidos
+    """
+    if not os.path.exists(ruta):
+        return set()
+    with open(ruta, "rb") as f:
+        contenido = f.read()
+    completo = contenido[:contenido.rfind(b"\n") + 1]
+    if len(completo) != len(contenido):
+        with open(ruta, "r+b") as f:
+            f.truncate(len(completo))
+    respondidas = set()
+    for linea in completo.splitlines():
+        if linea.strip():
+            respondidas.add(str(json.loads(linea)["id"]))
+    return respondidas
+
+
+def _registro(identificador, pregunta, respuesta, fuente, resultado, latencia):
+    return {
+        "id": identificador,
+        "pregunta": pregunta,
+        "respuesta": respuesta,
+        "fuente": fuente,
+        "fuentes": resultado.fuentes if resultado is not None else [],
+        "desde_cache": bool(resultado is not None and resultado.desde_cache),
+        "latencia": round(latencia, 4),
+        "tiempos": {etapa: round(s, 6) for etapa, s in resultado.tiempos.items()} if resultado is not None else {},
+    }
+
+
+async def procesar_lote(entrada, salida, recuperador, cadenas, cache=None, compuerta=None,
+                        lote=LOTE, concurrencia=CONCURRENCIA, hilos=4, sumidero=None):
+    """
+    Responde las preguntas pendientes de `entrada` y las agrega a `salida`.
+
+    Mientras el LLM responde un lote, ya se embebe y busca el siguiente; a lo sumo hay
+    `2 * lote` preguntas en curso, así que la memoria no crece con el tamaño de la entrada.
+
+    Args:
+        entrada: Archivo JSONL de preguntas
+        salida: Archivo JSONL de respuestas (se agrega; las ya respondidas se saltean)
+        recuperador: Recuperador de documentos
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        cache: CacheSemantico opcional
+        compuerta: CompuertaRelevancia opcional
+        lote: Preguntas por llamada de embedding
+        concurrencia: Llamadas simultáneas al LLM
+        hilos: Hilos para embedding y búsqueda
+        sumidero: Destino de la traza de cada pregunta (ver cerebro.trazas.crear_sumidero)
+
+    Returns:
+        dict: respondidas, salteadas, errores, latencias (s) y duración (s)
+    """
+    loop = asyncio.get_running_loop()
+    limite_llm = asyncio.Semaphore(concurrencia)
+    respondidas = preparar_salida(salida)
+    metricas = {"respondidas": 0, "salteadas": 0, "errores": 0, "latencias": []}
+    en_curso = set()
+
+    async def responder(identificador, pregunta, vector, tiempo_embedding, archivo):
+        inicio = time.perf_counter()
+        traza = Traza(pregunta, script="lote", id_pregunta=identificador)
+        traza.agregar("embedding", tiempo_embedding, lote=True)
+        try:
+            respuesta, fuente, resultado = await responder_hibrido_async(
+                pregunta, recuperador, cadenas, cache=cache, compuerta=compuerta,
+                ejecutor=ejecutor, limite_llm=limite_llm, vector=vector, traza=traza,
+            )
+        except Exception as e:
+            # No se escribe: la pregunta queda pendiente para la próxima corrida
+            traza.cerrar(sumidero, error=type(e).__name__)
+            metricas["errores"] += 1
+            print(f"   ❌ {identificador}: {e}")
+            return
+        if resultado is not None:
+            resultado.tiempos["embedding"] = tiempo_embedding
+        latencia = tiempo_embedding + time.perf_counter() - inicio
+        traza.cerrar(sumidero, fuente=fuente, desde_cache=bool(resultado is not None and resultado.desde_cache))
+        archivo.write(json.dumps(_registro(identificador, pregunta, respuesta, fuente, resultado, latencia), ensure_ascii=False) + "\n")
+        archivo.flush()
+        metricas["respondidas"] += 1
+        metricas["latencias"].append(latencia)
+        if metricas["respondidas"] % lote == 0:
+            print(f"   ✅ {metricas['respondidas']} respondidas ({metricas['respondidas'] / (time.perf_counter() - comienzo):.1f}/s)")
+
+    async def lanzar(pendientes, archivo):
+        inicio = time.perf_counter()
+        vectores = await loop.run_in_executor(ejecutor, recuperador.embeber_lote, [p for _, p in pendientes])
+        # El costo del embedding en lote se reparte entre sus preguntas
+        tiempo_embedding = (time.perf_counter() - inicio) / len(pendientes)
+        for (identificador, pregunta), vector in zip(pendientes, vectores):
+            en_curso.add(asyncio.create_task(responder(identificador, pregunta, vector, tiempo_embedding, archivo)))
+        # Back-pressure: no embeber más hasta que baje la cantidad de preguntas en curso
+        while len(en_curso) > lote:
+            hechas, _ = await asyncio.wait(en_curso, return_when=asyncio.FIRST_COMPLETED)
+            en_curso.difference_update(hechas)
+
+    comienzo = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="lote") as ejecutor, \
+            open(salida, "a", encoding="utf-8") as archivo:
+        try:
+            pendientes = []
+            vistas = set()
+            for identificador, pregunta in leer_preguntas(entrada):
+                if identificador in respondidas or identificador in vistas:
+                    metricas["salteadas"] += 1
+                    continue
+                vistas.add(identificador)
+                pendientes.append((identificador, pregunta))
+                if len(pendientes) == lote:
+                    await lanzar(pendientes, archivo)
+                    pendientes = []
+            if pendientes:
+                await lanzar(pendientes, archivo)
+            if en_curso:
+                await asyncio.wait(en_curso)
+        finally:
+            for tarea in en_curso:
+                tarea.cancel()
+    metricas["duracion"] = time.perf_counter() - comienzo
+    return metricas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Responde en lote un JSONL de preguntas con el sistema híbrido")
+    parser.add_argument("entrada", help="JSONL de preguntas")
+    parser.add_argument("--salida", help="JSONL de respuestas (por defecto <entrada>.respuestas.jsonl)")
+    parser.add_argument("--lote", type=int, default=LOTE, help="Preguntas por llamada de embedding")
+    parser.add_argument("--concurrencia", type=int, default=CONCURRENCIA, help="Llamadas simultáneas al LLM")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos para embedding y búsqueda")
+    args = parser.parse_args()
+    salida = args.salida or os.path.splitext(args.entrada)[0] + ".respuestas.jsonl"
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("❌ Error: Configura OPENAI_API_KEY en el archivo .env")
+        return
+
+    recuperador, cadenas, modelo, _, cache, compuerta = configurar_sistema_hibrido(http_async_client=crear_cliente_http(args.concurrencia))
+    sumidero, agregador = crear_sumidero()
+    print(f"📦 Respondiendo {args.entrada} → {salida} (lotes de {args.lote}, {args.concurrencia} llamadas simultáneas a {modelo})\n")
+    try:
+        metricas = asyncio.run(procesar_lote(
+            args.entrada, salida, recuperador, cadenas, cache, compuerta,
+            lote=args.lote, concurrencia=args.concurrencia, hilos=args.hilos, sumidero=sumidero,
+        ))
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Interrumpido: volver a correr el mismo comando continúa desde {salida}\n")
+        return
+    finally:
+        if cache is not None:
+            cache.persistir()
+
+    print(f"\n📊 {metricas['respondidas']} respondidas, {metricas['salteadas']} ya estaban, "
+          f"{metricas['errores']} con error en {metricas['duracion']:.1f} s")
+    if metricas["latencias"]:
+        p50, p95 = np.percentile(metricas["latencias"], [50, 95])
+        print(f"   Latencia por pregunta: p50 {p50 * 1e3:.0f} ms | p95 {p95 * 1e3:.0f} ms")
+    if metricas["errores"]:
+        print("   Las preguntas con error se reintentan al volver a correr el comando")
+    if agregador is not None and agregador.trazas:
+        print(agregador.resumen())
+    print()
+
+
+if __name__ == "__main__":
+    main()
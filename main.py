@@ -7,75 +7,114 @@ El modelo ahora puede responder sobre datos internos que no están en su entrena
 """
 
 import os
+from functools import partial
 # Configurar tokenizers para evitar warnings de paralelismo después de fork
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+
+# Solo módulos livianos al importar: langchain_openai, torch y ChromaDB se cargan en
+# segundo plano dentro de configurar_rag mientras se muestra el prompt
+from cerebro.arranque import CargaEnSegundoPlano
+from cerebro.streaming import ImpresorStream, consumir_stream, streaming_activado
+from cerebro.trazas import SIN_TRAZA, Traza, crear_sumidero
 
 load_dotenv()
 
 # Configuración
 DOCUMENTO = "documentacion_tecnica.md"
+# Corpus a ingestar: archivos y/o directorios separados por ":" (p.ej. CORPUS=documentacion_tecnica.md:docs)
+CORPUS = os.getenv("CORPUS", DOCUMENTO).split(os.pathsep)
 CHROMA_DB_DIR = "./chroma_db"
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
 
-def detectar_modelo():
-    """Detecta qué modelo de OpenAI está disponible en tu cuenta."""
-    for modelo in ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo"]:
-        try:
-            ChatOpenAI(model=modelo, temperature=0, max_tokens=5).invoke("test")
-            return modelo
-        except:
-            continue
-    return None
-
-def configurar_rag():
+def configurar_rag(aviso=print, fabrica_embeddings=None):
     """
     Configura el sistema RAG completo.
     
     Pasos: Carga documento → Divide en chunks → Crea embeddings → Almacena en ChromaDB → 
     Configura cadena de pregunta-respuesta con contexto.
     
+    Args:
+        aviso: Función para los mensajes de progreso (print, o la de CargaEnSegundoPlano)
+        fabrica_embeddings: Función sin argumentos que crea el modelo de embeddings (por
+            defecto HuggingFaceEmbeddings de MODELO_EMBEDDINGS; benchmarks/regresion.py usa uno falso)
+    
     Returns:
-        tuple: (rag_chain, modelo_actual, retriever)
+        tuple: (rag_chain, modelo_actual, recuperador, cache, conversacion)
     """
-    print("\n🔧 Configurando RAG (Retrieval Augmented Generation)...\n")
+    # Módulos pesados: se importan acá para que el prompt aparezca sin esperarlos
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
     
-    # 1. Cargar documento
-    print("📄 Cargando documento:", DOCUMENTO)
-    documentos = TextLoader(DOCUMENTO, encoding="utf-8").load()
-    print(f"   ✅ Documento cargado ({len(documentos)} archivo(s))\n")
+    from cerebro.cache_embeddings import EmbeddingsConCache
+    from cerebro.cache_respuestas import crear_cache
+    from cerebro.cadenas import construir_cadenas
+    from cerebro.cliente_llm import opciones_cliente_llm
+    from cerebro.contexto import crear_empaquetador
+    from cerebro.conversacion import crear_conversacion
+    from cerebro.embedding_paralelo import EmbeddingParalelo, workers_configurados
+    from cerebro.fragmentacion import crear_divisor, sincronizar_indice_secciones
+    from cerebro.indice_vectorial import crear_vectorstore_busqueda
+    from cerebro.ingesta import ingestar_documentos
+    from cerebro.lexico import sincronizar_indice_lexico
+    from cerebro.modelos import resolver_modelo
+    from cerebro.recuperacion import Recuperador
     
-    # 2. Dividir en fragmentos para mejor recuperación
-    print("✂️  Dividiendo documento en fragmentos...")
-    chunks = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len).split_documents(documentos)
-    print(f"   ✅ {len(chunks)} fragmentos creados\n")
+    # 1. Dividir en fragmentos para mejor recuperación (solo se re-dividen los archivos modificados)
+    #    FRAGMENTACION: por secciones y bloques de Markdown (por defecto) o por caracteres
+    splitter = crear_divisor()
     
-    # 3. Crear embeddings y base vectorial (HuggingFace es gratis)
-    print("🧠 Creando embeddings (HuggingFace - 100% GRATIS) y base vectorial...")
-    print("   ⏳ Primera vez puede tomar un momento (descarga modelo ~400MB)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2", model_kwargs={'device': 'cpu'})
-    vectorstore = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=CHROMA_DB_DIR)
-    print("   ✅ Base vectorial creada (sin costo!)\n")
+    # 2. Crear embeddings (HuggingFace es gratis) con caché en disco compartida por ingesta y consultas
+    aviso("🧠 Cargando modelo de embeddings (HuggingFace - 100% GRATIS)...")
+    aviso("   ⏳ Primera vez puede tomar un momento (descarga modelo ~400MB)...")
+    if fabrica_embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        fabrica_embeddings = partial(HuggingFaceEmbeddings, model_name=MODELO_EMBEDDINGS, model_kwargs={'device': 'cpu'})
+    modelo_embeddings = fabrica_embeddings()
+    workers = workers_configurados()
+    if workers > 1:
+        # Ingesta en paralelo: cada worker carga su copia del modelo; las consultas usan la local
+        modelo_embeddings = EmbeddingParalelo(fabrica_embeddings, workers=workers, local=modelo_embeddings)
+    embeddings = EmbeddingsConCache(modelo_embeddings, modelo=MODELO_EMBEDDINGS, consultas_en_lote=True)
+    aviso(f"   ✅ Modelo de embeddings listo ({embeddings.metricas()['vectores']} vectores en caché)\n")
+    
+    # 3. Sincronizar documento con la base vectorial (solo embebe fragmentos nuevos o modificados)
+    aviso("📄 Sincronizando corpus con la base vectorial:", ", ".join(CORPUS))
+    try:
+        vectorstore, ingesta = ingestar_documentos(CORPUS, embeddings, CHROMA_DB_DIR, splitter, modelo_embeddings=MODELO_EMBEDDINGS, en_vuelo=2 * workers if workers > 1 else 0)
+    finally:
+        # También si la ingesta falla; las consultas siguen con el modelo local
+        if workers > 1:
+            modelo_embeddings.cerrar()
+    if ingesta.en_caliente:
+        aviso(f"   ✅ Base vectorial al día: {ingesta.total_fragmentos} fragmentos, nada que embeber\n")
+    else:
+        aviso(f"   ✅ {ingesta.total_fragmentos} fragmentos ({ingesta.nuevos} nuevos, {ingesta.eliminados} eliminados) - sin costo!\n")
     
     # 4. Detectar y configurar modelo de chat
-    print("🔍 Detectando modelo disponible...")
-    modelo = detectar_modelo()
+    aviso("🔍 Detectando modelo disponible...")
+    modelo, origen = resolver_modelo()
     if not modelo:
         raise Exception("No se encontró ningún modelo disponible")
-    print(f"   ✅ Usando modelo: {modelo}\n")
+    aviso(f"   ✅ Usando modelo: {modelo} ({origen})\n")
     # Configuración anti-alucinación: temperatura muy baja para reducir creatividad y alucinaciones
-    llm = ChatOpenAI(model=modelo, temperature=0.1, max_tokens=500)
+    # stream_usage: tokens usados también en streaming, para las trazas
+    # Cliente compartido con límites de tasa, reintentos con Retry-After y coalescencia (cerebro.cliente_llm)
+    llm = ChatOpenAI(model=modelo, temperature=0.1, max_tokens=500, stream_usage=True, **opciones_cliente_llm())
     
-    # 5. Crear retriever (busca los 3 fragmentos más relevantes)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+    # 5. Crear recuperador (BM25 + vectores fusionados con RRF); los candidatos se empaquetan
+    #    en un contexto de CONTEXTO_TOKENS tokens sin texto repetido (0 = los 3 mejores tal cual)
+    indice = sincronizar_indice_lexico(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus)
+    # EXPANDIR_SECCIONES: cada fragmento encontrado se reemplaza por su sección (ruta de encabezados)
+    secciones = sincronizar_indice_secciones(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus, splitter)
+    hibrida = os.getenv("BUSQUEDA_HIBRIDA", "1") != "0"
+    # INDICE_VECTORIAL: consultas en ChromaDB (por defecto) o en una réplica local (exacto, ivf, hnsw)
+    busqueda = crear_vectorstore_busqueda(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus)
+    empaquetador = crear_empaquetador(modelo)
+    recuperador = Recuperador(busqueda, k=empaquetador.candidatos if empaquetador else 3,
+                              indice=indice if hibrida else None, empaquetador=empaquetador, secciones=secciones)
     
     # 6. Crear prompt template para el contexto (más estricto para evitar alucinaciones)
     template = """Eres un asistente útil y preciso que responde preguntas basándote ÚNICAMENTE en la documentación proporcionada.
@@ -92,16 +131,75 @@ INSTRUCCIONES IMPORTANTES:
 - Sé preciso y directo. Si no sabes algo, dilo claramente."""
     prompt = ChatPromptTemplate.from_template(template)
     
-    # 7. Función para formatear documentos recuperados
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # 7. Crear cadena RAG (LangChain Expression Language)
+    # El contexto llega ya recuperado: así la búsqueda se hace una sola vez por pregunta
+    aviso("🔗 Configurando cadena de pregunta-respuesta...")
+    rag_chain = prompt | llm | StrOutputParser()
     
-    # 8. Crear cadena RAG (LangChain Expression Language)
-    print("🔗 Configurando cadena de pregunta-respuesta...")
-    rag_chain = ({"context": retriever | format_docs, "question": RunnablePassthrough()} | prompt | llm | StrOutputParser())
-    print("   ✅ Sistema RAG listo\n")
+    # 8. Caché semántica de respuestas (se invalida si cambia el corpus o el modelo)
+    cache = crear_cache(ingesta.version_corpus, modelo, "rag")
+    if cache is not None:
+        aviso(f"💾 Caché semántica: {len(cache)} respuestas reutilizables")
     
-    return rag_chain, modelo, retriever
+    # 9. Memoria de conversación: reformula las repreguntas con el historial reciente y un resumen
+    conversacion = crear_conversacion(construir_cadenas(llm), empaquetador.contar if empaquetador else None,
+                                      vocabulario=indice.vocabulario)
+    aviso("   ✅ Sistema RAG listo\n")
+    
+    return rag_chain, modelo, recuperador, cache, conversacion
+
+def responder(pregunta, rag_chain, recuperador, cache=None, al_recibir=None, traza=SIN_TRAZA):
+    """
+    Responde una pregunta con RAG, pasando antes por la caché semántica.
+    
+    El embedding de la pregunta se calcula una vez y sirve tanto para la caché como
+    para la búsqueda en la base vectorial.
+    
+    Args:
+        pregunta: Pregunta del usuario
+        rag_chain: Cadena creada en configurar_rag
+        recuperador: Recuperador de documentos
+        cache: CacheSemantico opcional
+        al_recibir: Callback opcional para recibir la respuesta en streaming
+        traza: Traza donde registrar cada etapa (ver cerebro.trazas)
+        
+    Returns:
+        tuple: (respuesta, resultado)
+    """
+    from cerebro.recuperacion import ResultadoRecuperacion
+    
+    with traza.etapa("embedding") as span:
+        vector = recuperador.embeber(pregunta)
+    tiempo_embedding = span.duracion
+    
+    acierto = None
+    if cache is not None:
+        with traza.etapa("cache") as span:
+            acierto = cache.buscar(vector)
+            # Solo respuestas basadas en la documentación: este chat nunca responde con conocimiento propio
+            if acierto is not None and acierto.fuente != "documentación":
+                acierto = None
+            span.atributos["acierto"] = acierto is not None
+    if acierto is not None:
+        if al_recibir is not None:
+            al_recibir(acierto.respuesta)
+        return acierto.respuesta, ResultadoRecuperacion(pregunta, acierto.docs, tiempos={"embedding": tiempo_embedding}, desde_cache=True)
+    
+    resultado = recuperador.recuperar(pregunta, vector)
+    traza.agregar_tiempos(resultado.tiempos)
+    resultado.tiempos["embedding"] = tiempo_embedding
+    with traza.etapa("prompt") as span:
+        entrada = {"context": resultado.contexto, "question": pregunta}
+        span.atributos.update(caracteres_contexto=len(entrada["context"]), fragmentos=len(resultado.docs))
+    with traza.llamada_llm(streaming=al_recibir is not None) as config:
+        if al_recibir is None:
+            respuesta = rag_chain.invoke(entrada, config=config)
+        else:
+            respuesta = consumir_stream(rag_chain.stream(entrada, config=config), al_recibir)
+    
+    if cache is not None:
+        cache.guardar(pregunta, vector, respuesta, "documentación", resultado.docs)
+    return respuesta, resultado
 
 def main():
     """
@@ -109,18 +207,24 @@ def main():
     
     Demuestra cómo el modelo ahora SÍ puede responder sobre datos privados
     porque tiene acceso a la documentación técnica mediante RAG.
+    
+    El prompt aparece enseguida: el sistema RAG se configura en segundo plano mientras
+    el usuario escribe la primera pregunta.
     """
     if not os.getenv("OPENAI_API_KEY"):
         print("❌ Error: Configura OPENAI_API_KEY en el archivo .env")
         return
     
     try:
-        rag_chain, modelo, retriever = configurar_rag()
+        print("\n🔧 Configurando RAG (Retrieval Augmented Generation) en segundo plano...\n")
+        carga = CargaEnSegundoPlano(configurar_rag, "el sistema RAG (modelos + base vectorial)")
+        streaming = streaming_activado()
+        sumidero, agregador = crear_sumidero()
         
         print("="*70)
         print("  💬 Chat con RAG - El modelo AHORA tiene contexto")
         print("="*70)
-        print(f"\n💡 El modelo tiene acceso a {DOCUMENTO}")
+        print(f"\n💡 El modelo tiene acceso a {', '.join(CORPUS)}")
         print("💡 Escribe 'salir' para terminar\n")
         print("🎯 Prueba preguntando: ¿Cómo instalo la librería HenryPy?\n")
         
@@ -128,25 +232,59 @@ def main():
             pregunta = input("🧑 TÚ: ").strip()
             
             if pregunta.lower() in ['salir', 'exit', 'quit']:
+                print()
+                # Si el sistema no terminó de cargar no hay nada que persistir
+                if carga.lista:
+                    _, _, recuperador, cache, conversacion = carga.esperar()
+                    if cache is not None:
+                        cache.persistir()
+                        print(cache.resumen())
+                    print(recuperador.vectorstore.embeddings.resumen())
+                    if len(conversacion):
+                        print(conversacion.resumen_uso())
+                    conversacion.cerrar()
+                if agregador is not None and agregador.trazas:
+                    print(agregador.resumen())
                 print("\n👋 ¡Hasta luego!\n")
                 break
             
             if not pregunta:
                 continue
             
+            # Espera solo lo que falte de la carga; un error de configuración corta el chat como antes
+            rag_chain, modelo, recuperador, cache, conversacion = carga.esperar()
+            
+            traza = Traza(pregunta, script="main", modelo=modelo, streaming=streaming)
             try:
+                # Una repregunta ("¿y el nivel deep?") se busca y se responde reformulada
+                consulta = conversacion.consulta(pregunta, traza)
+                if consulta != pregunta:
+                    print(f"\n🔁 Consulta reformulada: {consulta}")
                 print(f"\n⏳ Buscando en documentación y consultando {modelo}...\n")
-                respuesta = rag_chain.invoke(pregunta)
-                print(f"🤖 {modelo.upper()} (CON CONTEXTO): {respuesta}\n")
-                print(f"📚 Fuentes: {len(retriever.invoke(pregunta))} fragmentos consultados")
+                if streaming:
+                    # Imprimir los tokens a medida que llegan
+                    impresor = ImpresorStream(f"🤖 {modelo.upper()} (CON CONTEXTO): ")
+                    respuesta, resultado = responder(consulta, rag_chain, recuperador, cache, impresor, traza)
+                    impresor.terminar()
+                    print(impresor.resumen())
+                else:
+                    respuesta, resultado = responder(consulta, rag_chain, recuperador, cache, traza=traza)
+                    print(f"🤖 {modelo.upper()} (CON CONTEXTO): {respuesta}\n")
+                if resultado.desde_cache:
+                    print("💾 Respuesta reutilizada de la caché semántica (sin llamar al modelo)")
+                print(f"📚 Fuentes: {len(resultado)} fragmentos consultados ({', '.join(resultado.fuentes)})")
+                print(resultado.resumen_tiempos())
                 print("-" * 70 + "\n")
+                conversacion.registrar(pregunta, respuesta, consulta)
+                traza.cerrar(sumidero, fuente="documentación", desde_cache=resultado.desde_cache)
             except Exception as e:
+                traza.cerrar(sumidero, error=type(e).__name__)
                 print(f"❌ Error: {e}\n")
     
     except Exception as e:
         print(f"❌ Error al configurar RAG: {e}\n")
         print("💡 Asegúrate de que:")
-        print(f"   - El archivo {DOCUMENTO} existe")
+        print(f"   - El corpus {', '.join(CORPUS)} existe")
         print("   - Tu API Key de OpenAI es válida")
         print("   - Tienes las dependencias instaladas (poetry install)\n")
 
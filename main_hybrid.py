@@ -8,302 +8,697 @@ Combina RAG con conocimiento del entrenamiento del modelo:
 3. Si tampoco sabe → Dice "No sé"
 """
 
+import contextlib
 import os
+from functools import partial
 # Configurar tokenizers para evitar warnings de paralelismo después de fork
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import TextLoader
-from langchain_community.vectorstores import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+
+# Solo módulos livianos al importar: langchain_openai, torch y ChromaDB se cargan en
+# segundo plano (ver cargar_en_segundo_plano) o al configurar el sistema
+from cerebro.arranque import CargaEnSegundoPlano
+from cerebro.cadenas import CONOCIMIENTO_PROPIO, DOCUMENTACION, DOCUMENTACION_DIRECTA, stream_cancelable
+from cerebro.conversacion import crear_conversacion
+from cerebro.streaming import ImpresorStream, consumir_stream, consumir_stream_async, streaming_activado
+from cerebro.trazas import SIN_TRAZA, Traza, crear_sumidero
 
 load_dotenv()
 
 # Configuración
 DOCUMENTO = "documentacion_tecnica.md"
+# Corpus a ingestar: archivos y/o directorios separados por ":" (p.ej. CORPUS=documentacion_tecnica.md:docs)
+CORPUS = os.getenv("CORPUS", DOCUMENTO).split(os.pathsep)
 CHROMA_DB_DIR = "./chroma_db"
+MODELO_EMBEDDINGS = "sentence-transformers/all-MiniLM-L6-v2"
 
-def detectar_modelo():
-    """Detecta qué modelo de OpenAI está disponible en tu cuenta."""
-    for modelo in ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo"]:
-        try:
-            ChatOpenAI(model=modelo, temperature=0, max_tokens=5).invoke("test")
-            return modelo
-        except:
-            continue
-    return None
-
-def configurar_sistema_hibrido():
+def configurar_llm(aviso=print, **opciones_llm):
     """
-    Configura el sistema híbrido: RAG + conocimiento del modelo.
+    Detecta el modelo de chat y crea las cadenas de cada estrategia.
+    
+    Es lo único que necesita una pregunta que se responde con conocimiento propio.
+    
+    Args:
+        aviso: Función para los mensajes de progreso (print, o la de CargaEnSegundoPlano)
+        **opciones_llm: Parámetros extra para ChatOpenAI (p.ej. `http_async_client` en el servidor)
     
     Returns:
-        tuple: (retriever, llm, modelo_actual, vectorstore)
+        tuple: (cadenas, modelo_actual)
     """
-    print("\n🔧 Configurando Sistema Híbrido (RAG + Conocimiento del Modelo)...\n")
-    
-    # 1. Cargar documento
-    print("📄 Cargando documento:", DOCUMENTO)
-    documentos = TextLoader(DOCUMENTO, encoding="utf-8").load()
-    print(f"   ✅ Documento cargado ({len(documentos)} archivo(s))\n")
-    
-    # 2. Dividir en fragmentos
-    print("✂️  Dividiendo documento en fragmentos...")
-    chunks = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, length_function=len).split_documents(documentos)
-    print(f"   ✅ {len(chunks)} fragmentos creados\n")
-    
-    # 3. Crear embeddings y base vectorial
-    print("🧠 Creando embeddings (HuggingFace - 100% GRATIS) y base vectorial...")
-    print("   ⏳ Primera vez puede tomar un momento (descarga modelo ~400MB)...")
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2", model_kwargs={'device': 'cpu'})
-    vectorstore = Chroma.from_documents(documents=chunks, embedding=embeddings, persist_directory=CHROMA_DB_DIR)
-    print("   ✅ Base vectorial creada (sin costo!)\n")
-    
-    # 4. Detectar y configurar modelo
-    print("🔍 Detectando modelo disponible...")
-    modelo = detectar_modelo()
+    from langchain_openai import ChatOpenAI
+    from cerebro.cadenas import construir_cadenas
+    from cerebro.cliente_llm import opciones_cliente_llm
+    from cerebro.modelos import resolver_modelo
+    
+    # 1. Detectar y configurar modelo
+    aviso("🔍 Detectando modelo disponible...")
+    modelo, origen = resolver_modelo()
     if not modelo:
         raise Exception("No se encontró ningún modelo disponible")
-    print(f"   ✅ Usando modelo: {modelo}\n")
+    aviso(f"   ✅ Usando modelo: {modelo} ({origen})\n")
+    
+    # Configuración anti-alucinación (stream_usage: tokens usados también en streaming, para las trazas)
+    # Las tres estrategias comparten un cliente con límites de tasa, reintentos y coalescencia
+    llm = ChatOpenAI(model=modelo, temperature=0.1, max_tokens=500, stream_usage=True,
+                     **{**opciones_cliente_llm(), **opciones_llm})
     
-    # Configuración anti-alucinación
-    llm = ChatOpenAI(model=modelo, temperature=0.1, max_tokens=500)
+    # 2. Crear las cadenas de cada estrategia una sola vez (se reutilizan en cada pregunta)
+    return construir_cadenas(llm), modelo
+
+def cargar_documentacion(aviso=print, fabrica_embeddings=None, modelo=None):
+    """
+    Carga el modelo de embeddings, sincroniza el corpus y arma el recuperador.
     
-    # 5. Crear retriever (busca los 3 fragmentos más relevantes)
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+    Args:
+        aviso: Función para los mensajes de progreso (print, o la de CargaEnSegundoPlano)
+        fabrica_embeddings: Función sin argumentos que crea el modelo de embeddings (por
+            defecto HuggingFaceEmbeddings de MODELO_EMBEDDINGS; benchmarks/regresion.py usa uno falso)
+        modelo: Modelo de chat con cuyo tokenizador se cuenta el presupuesto del contexto, o
+            función sin argumentos que lo devuelve (se llama recién al armar el recuperador,
+            así la carga no espera a que se resuelva el modelo)
     
-    print("   ✅ Sistema híbrido listo\n")
+    Returns:
+        tuple: (recuperador, vectorstore, compuerta, version_corpus)
+    """
+    # Módulos pesados (torch, sentence-transformers, ChromaDB): solo se importan al cargar
+    from cerebro.cache_embeddings import EmbeddingsConCache
+    from cerebro.contexto import crear_empaquetador
+    from cerebro.embedding_paralelo import EmbeddingParalelo, workers_configurados
+    from cerebro.fragmentacion import crear_divisor, sincronizar_indice_secciones
+    from cerebro.indice_vectorial import crear_vectorstore_busqueda
+    from cerebro.ingesta import ingestar_documentos
+    from cerebro.lexico import sincronizar_indice_lexico
+    from cerebro.recuperacion import Recuperador
+    from cerebro.relevancia import crear_compuerta
+    
+    # 1. Dividir en fragmentos para mejor recuperación (solo se re-dividen los archivos modificados)
+    #    FRAGMENTACION: por secciones y bloques de Markdown (por defecto) o por caracteres
+    splitter = crear_divisor()
+    
+    # 2. Crear embeddings (HuggingFace es gratis) con caché en disco compartida por ingesta y consultas
+    aviso("🧠 Cargando modelo de embeddings (HuggingFace - 100% GRATIS)...")
+    aviso("   ⏳ Primera vez puede tomar un momento (descarga modelo ~400MB)...")
+    if fabrica_embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        fabrica_embeddings = partial(HuggingFaceEmbeddings, model_name=MODELO_EMBEDDINGS, model_kwargs={'device': 'cpu'})
+    modelo_embeddings = fabrica_embeddings()
+    workers = workers_configurados()
+    if workers > 1:
+        # Ingesta en paralelo: cada worker carga su copia del modelo; las consultas usan la local
+        modelo_embeddings = EmbeddingParalelo(fabrica_embeddings, workers=workers, local=modelo_embeddings)
+    embeddings = EmbeddingsConCache(modelo_embeddings, modelo=MODELO_EMBEDDINGS, consultas_en_lote=True)
+    aviso(f"   ✅ Modelo de embeddings listo ({embeddings.metricas()['vectores']} vectores en caché)\n")
+    
+    # 3. Sincronizar documento con la base vectorial (solo embebe fragmentos nuevos o modificados)
+    aviso("📄 Sincronizando corpus con la base vectorial:", ", ".join(CORPUS))
+    try:
+        vectorstore, ingesta = ingestar_documentos(CORPUS, embeddings, CHROMA_DB_DIR, splitter, modelo_embeddings=MODELO_EMBEDDINGS, en_vuelo=2 * workers if workers > 1 else 0)
+    finally:
+        # También si la ingesta falla; las consultas siguen con el modelo local
+        if workers > 1:
+            modelo_embeddings.cerrar()
+    if ingesta.en_caliente:
+        aviso(f"   ✅ Base vectorial al día: {ingesta.total_fragmentos} fragmentos, nada que embeber\n")
+    else:
+        aviso(f"   ✅ {ingesta.total_fragmentos} fragmentos ({ingesta.nuevos} nuevos, {ingesta.eliminados} eliminados) - sin costo!\n")
+    
+    # 4. Crear recuperador (BM25 + vectores fusionados con RRF); los candidatos se empaquetan
+    #    en un contexto de CONTEXTO_TOKENS tokens sin texto repetido (0 = los 3 mejores tal cual)
+    indice = sincronizar_indice_lexico(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus)
+    # EXPANDIR_SECCIONES: cada fragmento encontrado se reemplaza por su sección (ruta de encabezados)
+    secciones = sincronizar_indice_secciones(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus, splitter)
+    hibrida = os.getenv("BUSQUEDA_HIBRIDA", "1") != "0"
+    # INDICE_VECTORIAL: consultas en ChromaDB (por defecto) o en una réplica local (exacto, ivf, hnsw)
+    busqueda = crear_vectorstore_busqueda(vectorstore, CHROMA_DB_DIR, ingesta.version_corpus)
+    empaquetador = crear_empaquetador(modelo() if callable(modelo) else modelo)
+    recuperador = Recuperador(busqueda, k=empaquetador.candidatos if empaquetador else 3,
+                              indice=indice if hibrida else None, empaquetador=empaquetador, secciones=secciones)
+    
+    # 5. Compuerta de relevancia: distancias de la búsqueda + índice invertido del corpus
+    compuerta = crear_compuerta(indice)
+    
+    return recuperador, vectorstore, compuerta, ingesta.version_corpus
+
+def sincronizar_documentacion(aviso=print, fabrica_embeddings=None):
+    """
+    Sincroniza el corpus, sus índices y la réplica local de los vectores (sin armar el recuperador).
+    
+    Es el proceso escritor de `servidor.py --workers`: el único que abre ChromaDB y escribe
+    la caché de embeddings; los workers después abren todo en solo lectura (abrir_documentacion).
+    
+    Returns:
+        str: Versión del corpus sincronizada
+    """
+    from cerebro.indice_vectorial import indice_local_configurado, sincronizar_indice_vectorial
     
-    return retriever, llm, modelo, vectorstore
+    _, vectorstore, _, version_corpus = cargar_documentacion(aviso, fabrica_embeddings)
+    sincronizar_indice_vectorial(vectorstore, CHROMA_DB_DIR, version_corpus, indice_local_configurado())
+    return version_corpus
 
-def evaluar_relevancia_documentos(docs, pregunta):
+def abrir_documentacion(version_corpus, aviso=print, fabrica_embeddings=None, modelo=None):
     """
-    Evalúa si los documentos recuperados son relevantes para la pregunta.
+    Arma el recuperador y la compuerta sobre lo que dejó `sincronizar_documentacion`, sin ChromaDB.
     
-    Estrategia mejorada: Verifica si hay coincidencias significativas de palabras clave
-    específicas del tema. Si encuentra documentos con contenido sustancial, los considera relevantes.
+    Todo queda en solo lectura (réplica local con mmap, índices léxico y de secciones,
+    caché de embeddings sin escritura), así que se puede cargar una vez y compartir con
+    procesos hijos creados con fork.
     
     Args:
-        docs: Lista de documentos recuperados
-        pregunta: Pregunta original del usuario
-        
+        version_corpus: Versión que devolvió sincronizar_documentacion
+        aviso: Función para los mensajes de progreso
+        fabrica_embeddings: Función que crea el modelo de embeddings (ver cargar_documentacion)
+        modelo: Modelo de chat (elige el tokenizador del presupuesto del contexto)
+    
     Returns:
-        bool: True si hay información relevante, False si no
+        tuple: (recuperador, compuerta)
     """
-    if not docs or len(docs) == 0:
-        return False
+    from cerebro.cache_embeddings import EmbeddingsConCache
+    from cerebro.contexto import crear_empaquetador
+    from cerebro.fragmentacion import IndiceSecciones
+    from cerebro.indice_vectorial import cargar_indice_vectorial, indice_local_configurado
+    from cerebro.lexico import IndiceInvertido
+    from cerebro.recuperacion import Recuperador
+    from cerebro.relevancia import crear_compuerta
+    
+    aviso("🧠 Cargando modelo de embeddings (una vez, compartido con los workers)...")
+    if fabrica_embeddings is None:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        fabrica_embeddings = partial(HuggingFaceEmbeddings, model_name=MODELO_EMBEDDINGS, model_kwargs={'device': 'cpu'})
+    embeddings = EmbeddingsConCache(fabrica_embeddings(), modelo=MODELO_EMBEDDINGS, consultas_en_lote=True, solo_lectura=True)
+    busqueda = cargar_indice_vectorial(CHROMA_DB_DIR, version_corpus, embeddings, indice_local_configurado())
+    indice = IndiceInvertido.cargar(CHROMA_DB_DIR, version_corpus)
+    if busqueda is None or indice is None:
+        raise RuntimeError(f"Faltan los índices de la versión {version_corpus}: correr antes sincronizar_documentacion")
+    secciones = IndiceSecciones.cargar(CHROMA_DB_DIR, version_corpus) if os.getenv("EXPANDIR_SECCIONES", "1") != "0" else None
+    hibrida = os.getenv("BUSQUEDA_HIBRIDA", "1") != "0"
+    empaquetador = crear_empaquetador(modelo)
+    recuperador = Recuperador(busqueda, k=empaquetador.candidatos if empaquetador else 3,
+                              indice=indice if hibrida else None, empaquetador=empaquetador, secciones=secciones)
+    aviso(f"   ✅ {len(busqueda)} fragmentos en la réplica local ({type(busqueda.indice).nombre})\n")
+    return recuperador, crear_compuerta(indice)
+
+def _crear_cache(version_corpus, modelo, aviso=print):
+    """Caché semántica de respuestas (se invalida si cambia el corpus o el modelo)."""
+    from cerebro.cache_respuestas import crear_cache
+    
+    cache = crear_cache(version_corpus, modelo, "hibrido")
+    if cache is not None:
+        aviso(f"💾 Caché semántica: {len(cache)} respuestas reutilizables")
+    return cache
+
+def configurar_sistema_hibrido(fabrica_embeddings=None, **opciones_llm):
+    """
+    Configura el sistema híbrido: RAG + conocimiento del modelo.
     
-    # Verificar contenido de documentos
-    contenido_texto = " ".join(doc.page_content.lower() for doc in docs)
-    contenido_total = len(contenido_texto)
+    Carga todo antes de volver (servidor.py, lote.py); el chat de terminal usa
+    `cargar_en_segundo_plano` para mostrar el prompt sin esperar.
     
-    # Si el contenido total es muy pequeño, no es relevante
-    if contenido_total < 50:
-        return False
+    Args:
+        fabrica_embeddings: Función que crea el modelo de embeddings (ver cargar_documentacion)
+        **opciones_llm: Parámetros extra para ChatOpenAI (p.ej. `http_async_client` en el servidor)
     
-    # Extraer palabras clave de la pregunta (palabras significativas)
-    pregunta_lower = pregunta.lower()
-    palabras_pregunta = set(pregunta_lower.split())
-    
-    # Palabras comunes a ignorar (stopwords en español)
-    palabras_ignorar = {
-        'qué', 'cómo', 'cuándo', 'dónde', 'por', 'para', 'con', 'de', 'la', 'el', 'un', 'una',
-        'es', 'son', 'está', 'están', 'sobre', 'el', 'la', 'los', 'las', 'un', 'una',
-        'y', 'o', 'pero', 'si', 'no', 'en', 'a', 'de', 'que', 'se', 'le', 'te', 'me', 'nos', 'les',
-        'puedes', 'puede', 'puedo', 'pueden', 'pueda', 'puedan', 'para', 'que', 'sirve', 'sirven',
-        'consultar', 'fuera', 'fuentes', 'tus', 'sus', 'mis', 'nuestros', 'vuestros',
-        'trata', 'se', 'trata', 'como', 'instala', 'instalar'
-    }
-    
-    palabras_clave = palabras_pregunta - palabras_ignorar
-    
-    # Si hay contenido sustancial (más de 200 caracteres), considerar relevante por defecto
-    # El retriever ya hizo el trabajo de encontrar documentos similares
-    if contenido_total > 200:
-        # Verificar si hay al menos una palabra clave importante en el contenido
-        # Esto evita casos donde el contenido es grande pero no relacionado
-        palabras_importantes = [p for p in palabras_clave if len(p) > 3]  # Palabras de más de 3 caracteres
-        if len(palabras_importantes) == 0:
-            # Si no hay palabras importantes, pero el contenido es sustancial, confiar en el retriever
-            return True
-        
-        # Verificar si alguna palabra importante aparece
-        tiene_coincidencias = any(palabra in contenido_texto for palabra in palabras_importantes)
-        if tiene_coincidencias:
-            return True
+    Returns:
+        tuple: (recuperador, cadenas, modelo_actual, vectorstore, cache, compuerta)
+    """
+    print("\n🔧 Configurando Sistema Híbrido (RAG + Conocimiento del Modelo)...\n")
+    # El modelo de chat primero: el presupuesto del contexto se cuenta con su tokenizador, como en main.py
+    cadenas, modelo = configurar_llm(**opciones_llm)
+    recuperador, vectorstore, compuerta, version_corpus = cargar_documentacion(fabrica_embeddings=fabrica_embeddings, modelo=modelo)
+    cache = _crear_cache(version_corpus, modelo)
+    print("   ✅ Sistema híbrido listo\n")
+    
+    return recuperador, cadenas, modelo, vectorstore, cache, compuerta
+
+def cargar_en_segundo_plano():
+    """
+    Arranca en hilos la configuración del LLM y la carga de la documentación.
+    
+    Returns:
+        tuple: (carga_llm, carga_documentacion) - CargaEnSegundoPlano que devuelven
+            (cadenas, modelo) y (recuperador, vectorstore, cache, compuerta)
+    """
+    carga_llm = CargaEnSegundoPlano(configurar_llm, "el modelo de chat")
     
-    # Si el contenido es menor pero hay coincidencias significativas
-    if contenido_total >= 50:
-        coincidencias = sum(1 for palabra in palabras_clave if len(palabra) > 2 and palabra in contenido_texto)
-        if coincidencias > 0:
-            return True
+    def cargar(aviso):
+        # El contexto se cuenta con el tokenizador del modelo de chat y la caché depende del
+        # modelo: para cuando se arma el recuperador el otro hilo ya terminó
+        def modelo_chat():
+            return carga_llm.resultado()[1]
+        
+        recuperador, vectorstore, compuerta, version_corpus = cargar_documentacion(aviso, modelo=modelo_chat)
+        modelo = modelo_chat()
+        cache = _crear_cache(version_corpus, modelo, aviso)
+        return recuperador, vectorstore, cache, compuerta
     
-    return False
+    return carga_llm, CargaEnSegundoPlano(cargar, "la documentación (embeddings + base vectorial)")
+
+# Una respuesta de RAG más corta que esto que diga "no sé" se considera insuficiente
+LARGO_RESPUESTA_MINIMA = 50
+# Modo especulativo: las respuestas candidatas corren en paralelo (ver cerebro.especulacion)
+ESPECULAR = os.getenv("ESPECULAR", "0") == "1"
+
+def _generar(cadena, entrada, al_recibir=None, retener=0, traza=SIN_TRAZA, etapa="llm", estrategia=None):
+    """Invoca la cadena; con `al_recibir` la consume en streaming (ver consumir_stream). La llamada es un span de `traza`."""
+    with traza.llamada_llm(etapa, estrategia=estrategia, streaming=al_recibir is not None) as config:
+        if al_recibir is None:
+            return cadena.invoke(entrada, config=config)
+        return consumir_stream(stream_cancelable(cadena, entrada, config), al_recibir, retener)
 
-def responder_con_rag(pregunta, retriever, llm):
+def _entrada_rag(pregunta, resultado, traza=SIN_TRAZA):
+    """Arma la entrada de las cadenas de documentación (span "prompt" con el tamaño del contexto)."""
+    with traza.etapa("prompt") as span:
+        contexto = resultado.contexto
+        span.atributos.update(caracteres_contexto=len(contexto), fragmentos=len(resultado.docs))
+    return {"context": contexto, "question": pregunta}
+
+def responder_con_rag(pregunta, resultado, cadenas, al_recibir=None, retener=0, traza=SIN_TRAZA):
     """
     Responde usando RAG cuando hay información en la documentación.
     
     Args:
         pregunta: Pregunta del usuario
-        retriever: Retriever de documentos
-        llm: Modelo de lenguaje
+        resultado: ResultadoRecuperacion con los documentos ya recuperados
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        al_recibir: Callback opcional para recibir la respuesta en streaming
+        retener: Caracteres a retener antes de emitir (solo en streaming)
+        traza: Traza donde registrar el armado del prompt y la llamada al LLM
         
     Returns:
         str: Respuesta generada con RAG
     """
-    template_rag = """Eres un asistente útil que responde preguntas basándote ÚNICAMENTE en la documentación proporcionada.
-
-Contexto de la documentación:
-{context}
+    entrada = _entrada_rag(pregunta, resultado, traza)
+    return _generar(cadenas[DOCUMENTACION], entrada, al_recibir, retener, traza, "llm", DOCUMENTACION)
 
-Pregunta del usuario: {question}
-
-INSTRUCCIONES CRÍTICAS:
-- DEBES responder usando la información del contexto proporcionado
-- Si el contexto contiene información sobre el tema, úsala para responder de manera completa
-- Extrae TODA la información relevante del contexto y preséntala de forma clara
-- NO uses conocimiento fuera del contexto proporcionado
-- Si el contexto NO contiene información sobre la pregunta, entonces di "No tengo información sobre esto en la documentación"
-- Sé exhaustivo: si hay información en el contexto, úsala toda"""
-    
-    prompt_rag = ChatPromptTemplate.from_template(template_rag)
-    
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-    
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt_rag
-        | llm
-        | StrOutputParser()
-    )
-    
-    return rag_chain.invoke(pregunta)
-
-def responder_con_rag_directo(pregunta, docs, llm):
+def responder_con_rag_directo(pregunta, resultado, cadenas, al_recibir=None, retener=0, traza=SIN_TRAZA):
     """
     Responde usando RAG con documentos ya recuperados (fallback cuando el prompt normal falla).
     
     Args:
         pregunta: Pregunta del usuario
-        docs: Documentos ya recuperados
-        llm: Modelo de lenguaje
+        resultado: ResultadoRecuperacion con los documentos ya recuperados
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        al_recibir: Callback opcional para recibir la respuesta en streaming
+        retener: Caracteres a retener antes de emitir (solo en streaming)
+        traza: Traza donde registrar el armado del prompt y el reintento
         
     Returns:
         str: Respuesta generada con RAG
     """
-    template_directo = """Responde la siguiente pregunta usando la información proporcionada en la documentación.
-
-Documentación:
-{context}
+    entrada = _entrada_rag(pregunta, resultado, traza)
+    return _generar(cadenas[DOCUMENTACION_DIRECTA], entrada, al_recibir, retener, traza, "reintento", DOCUMENTACION_DIRECTA)
 
-Pregunta: {question}
-
-Responde usando SOLO la información de la documentación. Si hay información relevante, úsala para responder completamente."""
-    
-    prompt_directo = ChatPromptTemplate.from_template(template_directo)
-    
-    contexto = "\n\n".join(doc.page_content for doc in docs)
-    
-    # Crear mensaje directamente
-    mensaje = prompt_directo.format(context=contexto, question=pregunta)
-    respuesta = llm.invoke(mensaje)
-    
-    return respuesta.content if hasattr(respuesta, 'content') else str(respuesta)
-
-def responder_con_conocimiento_propio(pregunta, llm):
+def responder_con_conocimiento_propio(pregunta, cadenas, al_recibir=None, traza=SIN_TRAZA):
     """
     Responde usando el conocimiento del entrenamiento del modelo.
     
     Args:
         pregunta: Pregunta del usuario
-        llm: Modelo de lenguaje
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        al_recibir: Callback opcional para recibir la respuesta en streaming
+        traza: Traza donde registrar la llamada al LLM
         
     Returns:
         str: Respuesta generada con conocimiento del modelo
     """
-    template_propio = """Eres un asistente útil y honesto. Responde la pregunta usando tu conocimiento de entrenamiento.
+    return _generar(cadenas[CONOCIMIENTO_PROPIO], {"question": pregunta}, al_recibir, traza=traza, estrategia=CONOCIMIENTO_PROPIO)
 
-Pregunta: {question}
+def _emisor(al_recibir):
+    """Crea, para cada fuente, el callback de streaming que la acompaña (o None sin streaming)."""
+    def emisor(fuente):
+        if al_recibir is None:
+            return None
+        
+        def emitir(fragmento):
+            al_recibir(fragmento, fuente)
+        
+        # El TTFT se mide al llegar el primer token, aunque la respuesta se retenga (ver cerebro.streaming)
+        if hasattr(al_recibir, "al_llegar"):
+            emitir.al_llegar = al_recibir.al_llegar
+        return emitir
+    return emisor
 
-INSTRUCCIONES:
-- Responde usando tu conocimiento general si lo tienes
-- Si NO sabes la respuesta, di claramente "No sé sobre..." o "No tengo información sobre..."
-- NO inventes información. Sé honesto y directo."""
-    
-    prompt_propio = ChatPromptTemplate.from_template(template_propio)
+def _pedido_fuera_de_fuentes(pregunta):
+    """
+    Detecta si el usuario explícitamente pide usar conocimiento fuera de las fuentes.
     
-    chain_propio = (
-        {"question": RunnablePassthrough()}
-        | prompt_propio
-        | llm
-        | StrOutputParser()
+    Returns:
+        str | None: La pregunta sin las palabras de "fuera", o None si no lo pidió
+    """
+    pregunta_lower = pregunta.lower()
+    palabras_fuera = {'fuera', 'fuentes', 'consultar', 'por fuera', 'sin documentación', 'conocimiento propio', 'entrenamiento'}
+    if not any(palabra in pregunta_lower for palabra in palabras_fuera):
+        return None
+    # Limpiar la pregunta removiendo las palabras de "fuera"
+    pregunta_limpia = pregunta
+    for palabra in palabras_fuera:
+        pregunta_limpia = pregunta_limpia.replace(palabra, "").strip()
+    return pregunta_limpia if pregunta_limpia else pregunta
+
+def _informacion_insuficiente(respuesta):
+    """Una respuesta de RAG muy corta que dice no tener información."""
+    respuesta_lower = respuesta.lower()
+    return (
+        ("no tengo información" in respuesta_lower or "no sé" in respuesta_lower) 
+        and len(respuesta) < LARGO_RESPUESTA_MINIMA  # Respuesta muy corta
     )
-    
-    return chain_propio.invoke(pregunta)
 
-def responder_hibrido(pregunta, retriever, llm):
+def responder_hibrido(pregunta, recuperador, cadenas, al_recibir=None, cache=None, compuerta=None, traza=SIN_TRAZA, especular=ESPECULAR):
     """
     Responde usando estrategia híbrida: primero RAG, luego conocimiento propio.
     
+    La base vectorial se consulta una sola vez: el mismo ResultadoRecuperacion se usa
+    para evaluar relevancia, armar el prompt, el fallback y mostrar las fuentes.
+    
+    En streaming (`al_recibir(fragmento, fuente)`), la respuesta de RAG retiene sus primeros
+    caracteres: si termina antes siendo un "no sé" corto, no se muestra y se reintenta con
+    el prompt directo, igual que sin streaming.
+    
+    Con `cache`, el embedding de la pregunta se calcula primero y se busca una pregunta
+    anterior equivalente; si la hay, se devuelve su respuesta sin buscar ni llamar al LLM.
+    
+    Con `especular`, la respuesta con conocimiento propio arranca junto con la búsqueda y
+    la respuesta con documentación junto con su reintento; las que no se usan se cancelan.
+    Responde lo mismo con menos latencia, a cambio de los tokens de las ramas descartadas.
+    
     Args:
         pregunta: Pregunta del usuario
-        retriever: Retriever de documentos
-        llm: Modelo de lenguaje
+        recuperador: Recuperador de documentos
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        al_recibir: Callback opcional que recibe (fragmento, fuente) a medida que se genera
+        cache: CacheSemantico opcional
+        compuerta: CompuertaRelevancia (por defecto, solo por distancia)
+        traza: Traza donde registrar cada etapa (ver cerebro.trazas)
+        especular: Correr las respuestas candidatas en paralelo (por defecto, ESPECULAR=1)
         
     Returns:
-        tuple: (respuesta, fuente_usada)
+        tuple: (respuesta, fuente_usada, resultado) - resultado es None si no se consultó la documentación
     """
-    # Detectar si el usuario explícitamente pide usar conocimiento fuera de las fuentes
-    pregunta_lower = pregunta.lower()
-    palabras_fuera = {'fuera', 'fuentes', 'consultar', 'por fuera', 'sin documentación', 'conocimiento propio', 'entrenamiento'}
-    pedir_fuera = any(palabra in pregunta_lower for palabra in palabras_fuera)
-    
+    from cerebro.recuperacion import ResultadoRecuperacion
+    from cerebro.relevancia import CompuertaRelevancia
+    
+    if compuerta is None:
+        compuerta = CompuertaRelevancia()
+    emisor = _emisor(al_recibir)
+    
+    # 0. Caché semántica: el mismo vector se reutiliza luego para la búsqueda
+    vector = None
+    if cache is not None:
+        with traza.etapa("embedding") as span:
+            vector = recuperador.embeber(pregunta)
+        tiempo_embedding = span.duracion
+        with traza.etapa("cache") as span:
+            acierto = cache.buscar(vector)
+            span.atributos["acierto"] = acierto is not None
+        if acierto is not None:
+            if al_recibir is not None:
+                al_recibir(acierto.respuesta, acierto.fuente)
+            resultado = ResultadoRecuperacion(pregunta, acierto.docs, tiempos={"embedding": tiempo_embedding}, desde_cache=True)
+            return acierto.respuesta, acierto.fuente, resultado
+        respuesta, fuente, resultado = _responder_hibrido(pregunta, recuperador, cadenas, compuerta, emisor, vector, traza, especular)
+        if resultado is not None:
+            resultado.tiempos["embedding"] = tiempo_embedding
+        cache.guardar(pregunta, vector, respuesta, fuente, resultado.docs if resultado else None)
+        return respuesta, fuente, resultado
+    
+    return _responder_hibrido(pregunta, recuperador, cadenas, compuerta, emisor, vector, traza, especular)
+
+def _evaluar_compuerta(compuerta, resultado, traza):
+    """Decide la relevancia como span "compuerta", con la distancia mínima de la búsqueda."""
+    with traza.etapa("compuerta") as span:
+        relevante = compuerta.evaluar(resultado)
+        span.atributos["relevante"] = relevante
+        if resultado.scores:
+            span.atributos["distancia"] = round(float(min(resultado.scores)), 6)
+    return relevante
+
+def _responder_hibrido(pregunta, recuperador, cadenas, compuerta, emisor, vector=None, traza=SIN_TRAZA, especular=False):
+    """Estrategia híbrida sin caché (ver responder_hibrido)."""
     # Si el usuario explícitamente pide usar conocimiento fuera, hacerlo directamente
-    if pedir_fuera:
-        # Limpiar la pregunta removiendo las palabras de "fuera"
-        pregunta_limpia = pregunta
-        for palabra in palabras_fuera:
-            pregunta_limpia = pregunta_limpia.replace(palabra, "").strip()
-        respuesta = responder_con_conocimiento_propio(pregunta_limpia if pregunta_limpia else pregunta, llm)
-        return respuesta, "conocimiento del modelo"
-    
-    # 1. Buscar en documentación
-    docs = retriever.invoke(pregunta)
-    
-    # 2. Evaluar si hay información relevante
-    if evaluar_relevancia_documentos(docs, pregunta):
+    pregunta_fuera = _pedido_fuera_de_fuentes(pregunta)
+    if pregunta_fuera is not None:
+        respuesta = responder_con_conocimiento_propio(pregunta_fuera, cadenas, emisor("conocimiento del modelo"), traza)
+        return respuesta, "conocimiento del modelo", None
+    
+    if especular:
+        return _responder_especulativo(pregunta, recuperador, cadenas, compuerta, emisor, vector, traza)
+    
+    # 1. Buscar en documentación (única consulta a la base vectorial)
+    resultado = recuperador.recuperar(pregunta, vector)
+    traza.agregar_tiempos(resultado.tiempos)
+    
+    # 2. Evaluar si hay información relevante (distancias ya calculadas + cobertura léxica)
+    if _evaluar_compuerta(compuerta, resultado, traza):
         # Usar RAG con documentación - confiar en los documentos encontrados
-        respuesta = responder_con_rag(pregunta, retriever, llm)
-        
-        # Si encontramos documentos relevantes, confiar en RAG
-        # Solo cambiar a conocimiento propio si la respuesta es muy corta o claramente indica falta de info
-        respuesta_lower = respuesta.lower()
-        tiene_info_insuficiente = (
-            ("no tengo información" in respuesta_lower or "no sé" in respuesta_lower) 
-            and len(respuesta) < 50  # Respuesta muy corta
-        )
+        # En streaming se retienen los primeros caracteres: solo una respuesta corta puede ser insuficiente
+        emitir = emisor("documentación")
+        respuesta = responder_con_rag(pregunta, resultado, cadenas, emitir, retener=LARGO_RESPUESTA_MINIMA, traza=traza)
         
         # Si RAG dice que no tiene info pero encontramos documentos relevantes, 
         # es probable que el prompt no esté funcionando bien, pero aún así confiar en RAG
         # porque los documentos SÍ tienen información
-        if tiene_info_insuficiente:
-            # Intentar una vez más con un prompt más directo
-            respuesta_directa = responder_con_rag_directo(pregunta, docs, llm)
-            if len(respuesta_directa) > 50:  # Si la respuesta directa tiene contenido
-                return respuesta_directa, "documentación"
+        if _informacion_insuficiente(respuesta):
+            # Intentar una vez más con un prompt más directo (en streaming se emite solo si supera el mínimo)
+            respuesta_directa = responder_con_rag_directo(pregunta, resultado, cadenas, emitir, retener=LARGO_RESPUESTA_MINIMA + 1, traza=traza)
+            if len(respuesta_directa) > LARGO_RESPUESTA_MINIMA:  # Si la respuesta directa tiene contenido
+                return respuesta_directa, "documentación", resultado
         
-        return respuesta, "documentación"
+        # Una respuesta corta quedó retenida sin emitir: mostrarla ahora
+        if emitir and len(respuesta) < LARGO_RESPUESTA_MINIMA:
+            emitir(respuesta)
+        return respuesta, "documentación", resultado
     else:
         # Usar conocimiento propio del modelo
-        respuesta = responder_con_conocimiento_propio(pregunta, llm)
-        return respuesta, "conocimiento del modelo"
+        respuesta = responder_con_conocimiento_propio(pregunta, cadenas, emisor("conocimiento del modelo"), traza)
+        return respuesta, "conocimiento del modelo", resultado
+
+def _responder_especulativo(pregunta, recuperador, cadenas, compuerta, emisor, vector=None, traza=SIN_TRAZA):
+    """Estrategia híbrida con las respuestas candidatas en paralelo (ver responder_hibrido)."""
+    from cerebro.especulacion import RamaEspeculativa
+    
+    def rama(estrategia, entrada, etapa="llm", umbral=0):
+        return RamaEspeculativa(partial(_generar, cadenas[estrategia], entrada, traza=traza, etapa=etapa, estrategia=estrategia), umbral)
+    
+    def seguir(rama, emitir):
+        rama.seguir(emitir)
+        return rama.resultado()
+    
+    ramas = []
+    try:
+        # 1. Conocimiento propio mientras se busca en la documentación
+        propia = rama(CONOCIMIENTO_PROPIO, {"question": pregunta})
+        ramas.append(propia)
+        resultado = recuperador.recuperar(pregunta, vector)
+        traza.agregar_tiempos(resultado.tiempos)
+        if not _evaluar_compuerta(compuerta, resultado, traza):
+            return seguir(propia, emisor("conocimiento del modelo")), "conocimiento del modelo", resultado
+        propia.cancelar()
+        
+        # 2. Respuesta con documentación y reintento con prompt directo a la vez
+        entrada = _entrada_rag(pregunta, resultado, traza)
+        rag = rama(DOCUMENTACION, entrada, umbral=LARGO_RESPUESTA_MINIMA)
+        directa = rama(DOCUMENTACION_DIRECTA, entrada, "reintento", LARGO_RESPUESTA_MINIMA + 1)
+        ramas.extend((rag, directa))
+        emitir = emisor("documentación")
+        if rag.esperar():
+            # Superó el largo mínimo: ya no puede ser "información insuficiente"
+            directa.cancelar()
+            return seguir(rag, emitir), "documentación", resultado
+        respuesta = rag.resultado()
+        if _informacion_insuficiente(respuesta) and directa.esperar():
+            return seguir(directa, emitir), "documentación", resultado
+        # Una respuesta corta quedó sin emitir: mostrarla ahora
+        if emitir:
+            emitir(respuesta)
+        return respuesta, "documentación", resultado
+    finally:
+        # Ya se usó lo que hacía falta (o hubo un error): cortar lo que siga generando
+        for descartada in ramas:
+            descartada.cancelar()
+
+async def _generar_async(cadena, entrada, al_recibir=None, retener=0, limite=None, traza=SIN_TRAZA, etapa="llm", estrategia=None):
+    """Como _generar con `ainvoke`/`astream`; con `limite` (asyncio.Semaphore) acota las llamadas simultáneas."""
+    async with limite or contextlib.nullcontext():
+        with traza.llamada_llm(etapa, estrategia=estrategia, streaming=al_recibir is not None) as config:
+            if al_recibir is None:
+                return await cadena.ainvoke(entrada, config=config)
+            return await consumir_stream_async(cadena.astream(entrada, config=config), al_recibir, retener)
+
+async def responder_hibrido_async(pregunta, recuperador, cadenas, al_recibir=None, cache=None, compuerta=None, ejecutor=None, limite_llm=None, vector=None, traza=SIN_TRAZA, especular=ESPECULAR):
+    """
+    Versión asíncrona de responder_hibrido para atender muchas preguntas a la vez (servidor.py).
+    
+    El embedding y la búsqueda corren en `ejecutor` (pool de hilos) para no bloquear el
+    event loop; las llamadas al LLM usan `ainvoke`/`astream` y esperan lugar en `limite_llm`.
+    La estrategia (caché, compuerta, reintento con prompt directo, modo especulativo) es la
+    misma; las ramas especulativas descartadas se cancelan junto con su petición HTTP.
+    
+    Args:
+        pregunta: Pregunta del usuario
+        recuperador: Recuperador de documentos
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        al_recibir: Callback opcional que recibe (fragmento, fuente) a medida que se genera
+        cache: CacheSemantico opcional
+        compuerta: CompuertaRelevancia (por defecto, solo por distancia)
+        ejecutor: ThreadPoolExecutor para embedding y búsqueda (None = el del event loop)
+        limite_llm: asyncio.Semaphore que acota las llamadas simultáneas al LLM
+        vector: Embedding de la pregunta si ya se calculó (p.ej. en lote, ver lote.py)
+        traza: Traza donde registrar cada etapa (ver cerebro.trazas)
+        especular: Correr las respuestas candidatas en paralelo (por defecto, ESPECULAR=1)
+        
+    Returns:
+        tuple: (respuesta, fuente_usada, resultado) - resultado es None si no se consultó la documentación
+    """
+    import asyncio
+    from cerebro.recuperacion import ResultadoRecuperacion
+    from cerebro.relevancia import CompuertaRelevancia
+    
+    loop = asyncio.get_running_loop()
+    if compuerta is None:
+        compuerta = CompuertaRelevancia()
+    emisor = _emisor(al_recibir)
+    
+    tiempo_embedding = None
+    if cache is not None:
+        if vector is None:
+            with traza.etapa("embedding") as span:
+                vector = await loop.run_in_executor(ejecutor, recuperador.embeber, pregunta)
+            tiempo_embedding = span.duracion
+        with traza.etapa("cache") as span:
+            acierto = cache.buscar(vector)
+            span.atributos["acierto"] = acierto is not None
+        if acierto is not None:
+            if al_recibir is not None:
+                al_recibir(acierto.respuesta, acierto.fuente)
+            tiempos = {"embedding": tiempo_embedding} if tiempo_embedding is not None else {}
+            resultado = ResultadoRecuperacion(pregunta, acierto.docs, tiempos=tiempos, desde_cache=True)
+            return acierto.respuesta, acierto.fuente, resultado
+    
+    async def generar(estrategia, entrada, fuente, retener=0, etapa="llm"):
+        return await _generar_async(cadenas[estrategia], entrada, emisor(fuente), retener, limite_llm, traza, etapa, estrategia)
+    
+    resultado = None
+    pregunta_fuera = _pedido_fuera_de_fuentes(pregunta)
+    if pregunta_fuera is not None:
+        fuente = "conocimiento del modelo"
+        respuesta = await generar(CONOCIMIENTO_PROPIO, {"question": pregunta_fuera}, fuente)
+    else:
+        busqueda = loop.run_in_executor(ejecutor, recuperador.recuperar, pregunta, vector)
+        if especular:
+            respuesta, fuente, resultado = await _responder_especulativo_async(pregunta, busqueda, cadenas, compuerta, emisor, limite_llm, traza)
+        else:
+            resultado = await busqueda
+            traza.agregar_tiempos(resultado.tiempos)
+            if _evaluar_compuerta(compuerta, resultado, traza):
+                entrada = _entrada_rag(pregunta, resultado, traza)
+                fuente = "documentación"
+                respuesta = await generar(DOCUMENTACION, entrada, fuente, LARGO_RESPUESTA_MINIMA)
+                respuesta_directa = ""
+                if _informacion_insuficiente(respuesta):
+                    respuesta_directa = await generar(DOCUMENTACION_DIRECTA, entrada, fuente, LARGO_RESPUESTA_MINIMA + 1, "reintento")
+                if len(respuesta_directa) > LARGO_RESPUESTA_MINIMA:
+                    respuesta = respuesta_directa
+                elif al_recibir is not None and len(respuesta) < LARGO_RESPUESTA_MINIMA:
+                    # Una respuesta corta quedó retenida sin emitir: emitirla ahora
+                    emisor(fuente)(respuesta)
+            else:
+                fuente = "conocimiento del modelo"
+                respuesta = await generar(CONOCIMIENTO_PROPIO, {"question": pregunta}, fuente)
+        if tiempo_embedding is not None:
+            resultado.tiempos["embedding"] = tiempo_embedding
+    
+    if cache is not None:
+        cache.guardar(pregunta, vector, respuesta, fuente, resultado.docs if resultado else None)
+    return respuesta, fuente, resultado
+
+async def _responder_especulativo_async(pregunta, busqueda, cadenas, compuerta, emisor, limite_llm=None, traza=SIN_TRAZA):
+    """Como _responder_especulativo sobre tareas; `busqueda` es la búsqueda ya lanzada en el pool de hilos."""
+    from cerebro.especulacion import RamaEspeculativaAsync
+    
+    def rama(estrategia, entrada, etapa="llm", umbral=0):
+        return RamaEspeculativaAsync(partial(_generar_async, cadenas[estrategia], entrada, limite=limite_llm, traza=traza, etapa=etapa, estrategia=estrategia), umbral)
+    
+    async def seguir(rama, emitir):
+        rama.seguir(emitir)
+        return await rama.resultado()
+    
+    ramas = []
+    try:
+        propia = rama(CONOCIMIENTO_PROPIO, {"question": pregunta})
+        ramas.append(propia)
+        resultado = await busqueda
+        traza.agregar_tiempos(resultado.tiempos)
+        if not _evaluar_compuerta(compuerta, resultado, traza):
+            return await seguir(propia, emisor("conocimiento del modelo")), "conocimiento del modelo", resultado
+        propia.cancelar()
+        
+        entrada = _entrada_rag(pregunta, resultado, traza)
+        rag = rama(DOCUMENTACION, entrada, umbral=LARGO_RESPUESTA_MINIMA)
+        directa = rama(DOCUMENTACION_DIRECTA, entrada, "reintento", LARGO_RESPUESTA_MINIMA + 1)
+        ramas.extend((rag, directa))
+        emitir = emisor("documentación")
+        if await rag.esperar():
+            directa.cancelar()
+            return await seguir(rag, emitir), "documentación", resultado
+        respuesta = await rag.resultado()
+        if _informacion_insuficiente(respuesta) and await directa.esperar():
+            return await seguir(directa, emitir), "documentación", resultado
+        if emitir:
+            emitir(respuesta)
+        return respuesta, "documentación", resultado
+    finally:
+        for descartada in ramas:
+            descartada.cancelar()
+
+def encabezado_fuente(fuente):
+    """Indicador de fuente que acompaña a cada respuesta."""
+    if fuente == "documentación":
+        return "📚 DOCUMENTACIÓN"
+    return "🧠 CONOCIMIENTO PROPIO"
+
+def responder_sin_esperar(pregunta, carga_llm, carga_documentacion, al_recibir=None, traza=SIN_TRAZA):
+    """
+    Responde sin esperar la carga de la documentación cuando la pregunta no la necesita.
+    
+    Un pedido explícito de usar conocimiento propio se responde apenas está el modelo de
+    chat, aunque el modelo de embeddings y la base vectorial sigan cargándose. El resto
+    de las preguntas espera lo que falte y sigue la estrategia de responder_hibrido.
+    
+    Args:
+        pregunta: Pregunta del usuario
+        carga_llm: CargaEnSegundoPlano de configurar_llm
+        carga_documentacion: CargaEnSegundoPlano de la documentación
+        al_recibir: Callback opcional que recibe (fragmento, fuente) a medida que se genera
+        traza: Traza donde registrar cada etapa (ver cerebro.trazas)
+        
+    Returns:
+        tuple: (respuesta, fuente_usada, resultado) - resultado es None si no se consultó la documentación
+    """
+    cadenas, _ = carga_llm.esperar()
+    pregunta_fuera = _pedido_fuera_de_fuentes(pregunta)
+    if pregunta_fuera is not None and not carga_documentacion.lista:
+        fuente = "conocimiento del modelo"
+        respuesta = responder_con_conocimiento_propio(pregunta_fuera, cadenas, _emisor(al_recibir)(fuente), traza)
+        return respuesta, fuente, None
+    recuperador, _, cache, compuerta = carga_documentacion.esperar()
+    return responder_hibrido(pregunta, recuperador, cadenas, al_recibir, cache, compuerta, traza)
+
+def vocabulario_cargado(carga_documentacion):
+    """
+    Vocabulario del corpus para la memoria de conversación, sin esperar la documentación.
+    
+    Args:
+        carga_documentacion: CargaEnSegundoPlano de la documentación
+        
+    Returns:
+        callable: Devuelve los términos del índice léxico, o None mientras se carga
+    """
+    def vocabulario():
+        if not carga_documentacion.lista:
+            return None
+        compuerta = carga_documentacion.resultado()[3]
+        return compuerta.indice.vocabulario if compuerta.indice is not None else None
+    return vocabulario
 
 def main():
     """
@@ -313,18 +708,26 @@ def main():
     1. Busca primero en la documentación (RAG)
     2. Si no encuentra información relevante, usa conocimiento del modelo
     3. Si tampoco sabe, el modelo dice "No sé"
+    
+    El prompt aparece enseguida: el modelo de chat, el de embeddings y la base vectorial
+    se cargan en segundo plano mientras el usuario escribe.
     """
     if not os.getenv("OPENAI_API_KEY"):
         print("❌ Error: Configura OPENAI_API_KEY en el archivo .env")
         return
     
     try:
-        retriever, llm, modelo, vectorstore = configurar_sistema_hibrido()
+        print("\n🔧 Configurando Sistema Híbrido (RAG + Conocimiento del Modelo) en segundo plano...\n")
+        carga_llm, carga_documentacion = cargar_en_segundo_plano()
+        streaming = streaming_activado()
+        sumidero, agregador = crear_sumidero()
+        # Memoria de conversación (repreguntas, ventana y resumen): se crea con el modelo de chat
+        conversacion = None
         
         print("="*70)
         print("  💬 Chat HÍBRIDO - RAG + Conocimiento del Modelo")
         print("="*70)
-        print(f"\n💡 El modelo busca primero en {DOCUMENTO}")
+        print(f"\n💡 El modelo busca primero en {', '.join(CORPUS)}")
         print("💡 Si no encuentra información, usa su conocimiento de entrenamiento")
         print("💡 Escribe 'salir' para terminar\n")
         print("🎯 Prueba preguntando:")
@@ -335,38 +738,71 @@ def main():
             pregunta = input("🧑 TÚ: ").strip()
             
             if pregunta.lower() in ['salir', 'exit', 'quit']:
+                print()
+                # Si la documentación no terminó de cargar no hay nada que persistir
+                if carga_documentacion.lista:
+                    recuperador, _, cache, _ = carga_documentacion.esperar()
+                    if cache is not None:
+                        cache.persistir()
+                        print(cache.resumen())
+                    print(recuperador.vectorstore.embeddings.resumen())
+                if conversacion is not None and len(conversacion):
+                    print(conversacion.resumen_uso())
+                    conversacion.cerrar()
+                if agregador is not None and agregador.trazas:
+                    print(agregador.resumen())
                 print("\n👋 ¡Hasta luego!\n")
                 break
             
             if not pregunta:
                 continue
             
+            # Un error al configurar el modelo de chat (API key) corta el chat como antes
+            cadenas, modelo = carga_llm.esperar()
+            if conversacion is None:
+                conversacion = crear_conversacion(cadenas, vocabulario=vocabulario_cargado(carga_documentacion))
+            
+            traza = Traza(pregunta, script="main_hybrid", modelo=modelo, streaming=streaming)
             try:
+                # Una repregunta ("¿y el nivel deep?") se busca y se responde reformulada
+                consulta = conversacion.consulta(pregunta, traza)
+                if consulta != pregunta:
+                    print(f"\n🔁 Consulta reformulada: {consulta}")
                 print(f"\n⏳ Analizando pregunta y consultando {modelo}...\n")
                 
-                # Responder con estrategia híbrida
-                respuesta, fuente = responder_hibrido(pregunta, retriever, llm)
-                
-                # Mostrar respuesta con indicador de fuente
-                fuente_emoji = "📚" if fuente == "documentación" else "🧠"
-                fuente_texto = "DOCUMENTACIÓN" if fuente == "documentación" else "CONOCIMIENTO PROPIO"
+                if streaming:
+                    # Mostrar la respuesta a medida que se genera, con indicador de fuente
+                    impresor = ImpresorStream(lambda fuente: f"🤖 {modelo.upper()} ({encabezado_fuente(fuente)}): ")
+                    respuesta, fuente, resultado = responder_sin_esperar(consulta, carga_llm, carga_documentacion, impresor, traza)
+                    impresor.terminar()
+                    print(impresor.resumen())
+                else:
+                    # Responder con estrategia híbrida
+                    respuesta, fuente, resultado = responder_sin_esperar(consulta, carga_llm, carga_documentacion, traza=traza)
+                    
+                    # Mostrar respuesta con indicador de fuente
+                    print(f"🤖 {modelo.upper()} ({encabezado_fuente(fuente)}): {respuesta}\n")
                 
-                print(f"🤖 {modelo.upper()} ({fuente_emoji} {fuente_texto}): {respuesta}\n")
+                if resultado is not None and resultado.desde_cache:
+                    print("💾 Respuesta reutilizada de la caché semántica (sin llamar al modelo)")
                 
-                # Mostrar documentos consultados si usó RAG
+                # Mostrar documentos consultados si usó RAG (sin volver a buscar)
                 if fuente == "documentación":
-                    docs = retriever.invoke(pregunta)
-                    print(f"📚 Fuentes: {len(docs)} fragmentos consultados de la documentación")
+                    print(f"📚 Fuentes: {len(resultado)} fragmentos consultados de la documentación ({', '.join(resultado.fuentes)})")
+                    print(resultado.resumen_tiempos())
                 
                 print("-" * 70 + "\n")
+                conversacion.registrar(pregunta, respuesta, consulta)
+                traza.cerrar(sumidero, fuente=fuente, desde_cache=bool(resultado is not None and resultado.desde_cache))
                 
             except Exception as e:
+                traza.cerrar(sumidero, error=type(e).__name__)
                 print(f"❌ Error: {e}\n")
     
     except Exception as e:
         print(f"❌ Error al configurar sistema híbrido: {e}\n")
         print("💡 Asegúrate de que:")
-        print(f"   - El archivo {DOCUMENTO} existe")
+        print(f"   - El corpus {', '.join(CORPUS)} existe")
         print("   - Tu API Key de OpenAI es válida")
         print("   - Tienes las dependencias instaladas (poetry install)\n")
 
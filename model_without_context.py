@@ -10,17 +10,13 @@ import os
 from openai import OpenAI
 from dotenv import load_dotenv
 
-load_dotenv()  # Cargar API Key desde archivo .env
+from cerebro.cadenas import TEMPLATE_RESUMEN
+from cerebro.cliente_llm import opciones_cliente_llm
+from cerebro.conversacion import crear_conversacion
+from cerebro.modelos import resolver_modelo
+from cerebro.streaming import ImpresorStream, fragmentos_openai, streaming_activado
 
-def detectar_modelo(client):
-    """Detecta qué modelo de OpenAI está disponible en tu cuenta."""
-    for modelo in ["gpt-4o", "gpt-4o-mini", "gpt-4-turbo", "gpt-3.5-turbo"]:
-        try:
-            client.chat.completions.create(model=modelo, messages=[{"role": "user", "content": "test"}], max_tokens=5)
-            return modelo
-        except:
-            continue
-    return None
+load_dotenv()  # Cargar API Key desde archivo .env
 
 def main():
     """Chat interactivo con GPT sin contexto - Demuestra la falta de conocimiento sobre datos privados."""
@@ -30,16 +26,18 @@ def main():
         print("❌ Error: Configura OPENAI_API_KEY en el archivo .env")
         return
     
-    # Inicializar cliente y detectar modelo
-    client = OpenAI()
+    # Inicializar cliente (límites de tasa, reintentos con Retry-After y coalescencia, ver
+    # cerebro.cliente_llm; el SDK no reintenta por su cuenta) y detectar modelo
+    opciones = opciones_cliente_llm()
+    client = OpenAI(http_client=opciones["http_client"], max_retries=opciones["max_retries"])
     print("\n🔍 Detectando modelo disponible...")
-    modelo = detectar_modelo(client)
+    modelo, origen = resolver_modelo(client)
     
     if not modelo:
         print("❌ No se encontró ningún modelo disponible")
         return
     
-    print(f"✅ Usando modelo: {modelo}\n")
+    print(f"✅ Usando modelo: {modelo} ({origen})\n")
     print("="*60)
     print("  💬 Chat SIN Contexto - El modelo NO conoce datos privados")
     print("="*60)
@@ -50,11 +48,30 @@ def main():
 debes decir claramente "No sé sobre..." o "No tengo información sobre..." en lugar de inventar o suponer.
 Sé preciso y no inventes detalles que no conoces."""
     
+    streaming = streaming_activado()
+    
+    def resumir(entrada):
+        """Actualiza el resumen de la conversación con el mismo modelo (ver cerebro.conversacion)."""
+        completado = client.chat.completions.create(
+            model=modelo,
+            messages=[{"role": "user", "content": TEMPLATE_RESUMEN.format(**entrada)}],
+            temperature=0.1,
+            max_tokens=500,
+        )
+        return completado.choices[0].message.content or ""
+    
+    # Historial acotado: los últimos turnos completos y un resumen de los anteriores
+    # (sin búsqueda en documentación, las repreguntas no hace falta reformularlas)
+    conversacion = crear_conversacion(resumir=resumir)
+    
     # Loop de conversación
     while True:
         pregunta = input("🧑 TÚ: ").strip()
         
         if pregunta.lower() in ['salir', 'exit', 'quit']:
+            if len(conversacion):
+                print(f"\n{conversacion.resumen_uso()}")
+            conversacion.cerrar()
             print("\n👋 ¡Hasta luego!\n")
             break
         
@@ -64,18 +81,33 @@ Sé preciso y no inventes detalles que no conoces."""
         # Consultar a GPT con configuración anti-alucinación
         try:
             print(f"\n⏳ Consultando {modelo}...\n")
-            respuesta = client.chat.completions.create(
+            impresor = ImpresorStream(f"🤖 {modelo.upper()}: ")
+            completado = client.chat.completions.create(
                 model=modelo,
                 messages=[
                     {"role": "system", "content": system_prompt},
+                    *conversacion.mensajes(),
                     {"role": "user", "content": pregunta}
                 ],
                 temperature=0.1,  # Temperatura muy baja para reducir creatividad y alucinaciones
                 max_tokens=500,
-                top_p=0.9  # Nucleus sampling más restrictivo
-            ).choices[0].message.content
+                top_p=0.9,  # Nucleus sampling más restrictivo
+                stream=streaming
+            )
             
-            print(f"🤖 {modelo.upper()}: {respuesta}\n")
+            partes = []
+            if streaming:
+                # Imprimir los tokens a medida que llegan
+                for fragmento in fragmentos_openai(completado):
+                    partes.append(fragmento)
+                    impresor(fragmento)
+            else:
+                partes.append(completado.choices[0].message.content or "")
+                impresor(partes[0])
+            impresor.terminar()
+            conversacion.registrar(pregunta, "".join(partes))
+            if streaming:
+                print(impresor.resumen())
             print("-" * 60 + "\n")
         except Exception as e:
             print(f"❌ Error: {e}\n")
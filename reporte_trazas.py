@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Reporte de trazas: latencia por etapa y tokens usados a partir del JSONL de `TRAZAS`.
+
+    TRAZAS=trazas.jsonl python main_hybrid.py      # o servidor.py / lote.py
+    python reporte_trazas.py trazas.jsonl
+    python reporte_trazas.py trazas.jsonl --script servidor --fuente documentación --histogramas
+    python reporte_trazas.py trazas.jsonl --lentas 5
+"""
+
+import argparse
+import json
+
+from cerebro.trazas import ETAPAS_LLM, AgregadorTrazas, leer_trazas
+
+
+def _tokens(traza):
+    """Tokens de prompt y de respuesta de todas las llamadas al LLM de una traza."""
+    prompt = respuesta = 0
+    for span in traza["spans"]:
+        if span["etapa"] in ETAPAS_LLM:
+            prompt += span.get("tokens_prompt", 0)
+            respuesta += span.get("tokens_respuesta", 0)
+    return prompt, respuesta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resumen de las trazas por etapa de los chats, el servidor y el modo lote")
+    parser.add_argument("archivos", nargs="+", help="JSONL de trazas (ver TRAZAS en .env.example)")
+    parser.add_argument("--script", help="Solo trazas de este script (main, main_hybrid, servidor, lote)")
+    parser.add_argument("--fuente", help="Solo trazas respondidas con esta fuente")
+    parser.add_argument("--histogramas", action="store_true", help="Mostrar el histograma de cada etapa")
+    parser.add_argument("--lentas", type=int, default=0, help="Listar las N preguntas más lentas")
+    parser.add_argument("--json", action="store_true", help="Imprimir el resumen como JSON")
+    args = parser.parse_args()
+
+    agregador = AgregadorTrazas()
+    fuentes, lentas = {}, []
+    tokens_prompt = tokens_respuesta = 0
+    for ruta in args.archivos:
+        for traza in leer_trazas(ruta):
+            if args.script and traza.get("script") != args.script:
+                continue
+            if args.fuente and traza.get("fuente") != args.fuente:
+                continue
+            agregador.registrar(traza)
+            if "error" not in traza:
+                fuente = traza.get("fuente", "?") + (" (caché)" if traza.get("desde_cache") else "")
+                fuentes[fuente] = fuentes.get(fuente, 0) + 1
+            prompt, respuesta = _tokens(traza)
+            tokens_prompt += prompt
+            tokens_respuesta += respuesta
+            lentas.append((traza["duracion"], traza))
+
+    if args.json:
+        print(json.dumps({**agregador.como_dict(), "fuentes": fuentes,
+                          "tokens_prompt": tokens_prompt, "tokens_respuesta": tokens_respuesta}, ensure_ascii=False, indent=2))
+        return
+
+    print()
+    print(agregador.resumen(histogramas=args.histogramas))
+    if agregador.trazas:
+        print(f"\n   Fuentes: {', '.join(f'{fuente} {n}' for fuente, n in sorted(fuentes.items(), key=lambda par: -par[1]))}")
+        print(f"   Tokens: {tokens_prompt} de prompt + {tokens_respuesta} de respuesta "
+              f"({(tokens_prompt + tokens_respuesta) / agregador.trazas:.0f} por pregunta)")
+    if args.lentas:
+        print(f"\n🐢 Las {args.lentas} preguntas más lentas:")
+        for duracion, traza in sorted(lentas, key=lambda par: -par[0])[:args.lentas]:
+            etapas = ", ".join(f"{span['etapa']} {span['duracion'] * 1e3:.0f}" for span in traza["spans"])
+            print(f"   {duracion * 1e3:>8.0f} ms  {traza['pregunta'][:60]!r}  ({etapas} ms)")
+    print()
+
+
+if __name__ == "__main__":
+    main()
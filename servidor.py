@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+"""
+Servidor HTTP/JSON asíncrono del sistema híbrido (RAG + conocimiento del modelo).
+
+A diferencia de los chats de terminal, que atienden una pregunta a la vez, atiende muchos
+usuarios concurrentes en un solo proceso:
+- el embedding y la búsqueda corren en un pool de hilos (SERVIDOR_HILOS),
+- las llamadas al LLM usan ainvoke/astream sobre un cliente HTTP con pool de conexiones
+  y un máximo de llamadas simultáneas a la API (LLM_CONCURRENCIA),
+- por encima de SERVIDOR_MAX_EN_CURSO preguntas en curso responde 503 en lugar de encolar.
+
+Con `--workers N` (SERVIDOR_WORKERS) usa N procesos pre-fork (ver cerebro.prefork): un
+proceso escritor (spawn) sincroniza el corpus y los índices, el padre carga una vez el
+modelo de embeddings y la réplica local de los vectores en solo lectura, y los workers la
+heredan copy-on-write y aceptan del mismo socket. ChromaDB queda solo en el escritor (su
+cliente no es seguro tras un fork), así que las consultas van a la réplica de
+INDICE_VECTORIAL ("auto" si es "chroma"). Cada worker usa SERVIDOR_HILOS_MODELO hilos
+intra-op para el modelo (por defecto, núcleos / workers). `kill -HUP <padre>` vuelve a
+ingestar y, si el corpus cambió, reemplaza los workers sin cortar las preguntas en curso.
+
+Endpoints:
+    POST /preguntar   {"pregunta": "...", "stream": false}
+    GET  /salud
+    GET  /trazas      latencia por etapa (p50/p95/p99) y tokens promedio, ver cerebro.trazas
+
+    python servidor.py --puerto 8000
+    python servidor.py --puerto 8000 --workers 4 --hilos-modelo 1
+    curl -s localhost:8000/preguntar -d '{"pregunta": "¿Cómo instalo HenryPy?"}'
+    curl -sN localhost:8000/preguntar -d '{"pregunta": "¿Qué es Python?", "stream": true}'
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from cerebro.cliente_llm import (LLM_RPM, LLM_TPM, LimitadorTasa, PoliticaLLM, crear_clientes_llm,
+                                 opciones_cliente_llm)
+from cerebro.servidor_http import ErrorHTTP, ServidorHTTP
+from cerebro.trazas import Traza, crear_sumidero
+from main_hybrid import (abrir_documentacion, configurar_llm, configurar_sistema_hibrido, responder_hibrido_async,
+                         sincronizar_documentacion)
+
+HILOS = int(os.getenv("SERVIDOR_HILOS", "8"))
+LLM_CONCURRENCIA = int(os.getenv("LLM_CONCURRENCIA", "16"))
+MAX_EN_CURSO = int(os.getenv("SERVIDOR_MAX_EN_CURSO", "256"))
+WORKERS = int(os.getenv("SERVIDOR_WORKERS", "1"))
+# Segundos que un worker espera a que terminen sus preguntas en curso al recibir SIGTERM
+ESPERA_DRENAR = 30.0
+
+
+def crear_cliente_http(limite=LLM_CONCURRENCIA, politica=None):
+    """
+    Cliente HTTP asíncrono para la API del LLM, con conexiones reutilizadas (keep-alive).
+
+    Pasa por la capa de cerebro.cliente_llm: límites de tasa, reintentos con Retry-After y
+    coalescencia de preguntas idénticas simultáneas (por defecto, la política del proceso).
+    """
+    return crear_clientes_llm(politica, limite)[1]
+
+
+class AplicacionHibrida:
+    """
+    Rutas HTTP del asistente híbrido sobre `responder_hibrido_async`.
+
+    Args:
+        recuperador: Recuperador de documentos
+        cadenas: Registro de cadenas creado en configurar_sistema_hibrido
+        modelo: Nombre del modelo de chat (informativo)
+        cache: CacheSemantico opcional
+        compuerta: CompuertaRelevancia opcional
+        hilos: Hilos para embedding y búsqueda
+        limite_llm: Llamadas simultáneas al LLM
+        max_en_curso: Preguntas en curso antes de responder 503
+        sumidero: Destino de la traza de cada pregunta (ver cerebro.trazas.crear_sumidero)
+        agregador: AgregadorTrazas que se expone en GET /trazas
+    """
+
+    def __init__(self, recuperador, cadenas, modelo, cache=None, compuerta=None,
+                 hilos=HILOS, limite_llm=LLM_CONCURRENCIA, max_en_curso=MAX_EN_CURSO,
+                 sumidero=None, agregador=None):
+        self.recuperador = recuperador
+        self.cadenas = cadenas
+        self.modelo = modelo
+        self.cache = cache
+        self.compuerta = compuerta
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="recuperacion")
+        self.limite_llm = asyncio.Semaphore(limite_llm)
+        self.max_en_curso = max_en_curso
+        self.sumidero = sumidero
+        self.agregador = agregador
+        self.en_curso = 0
+        self.atendidas = 0
+        self.rechazadas = 0
+        self.inicio = time.time()
+
+    def rutas(self):
+        return {("POST", "/preguntar"): self.preguntar, ("GET", "/salud"): self.salud, ("GET", "/trazas"): self.trazas}
+
+    async def salud(self, peticion):
+        return {
+            "estado": "ok",
+            "pid": os.getpid(),
+            "modelo": self.modelo,
+            "en_curso": self.en_curso,
+            "atendidas": self.atendidas,
+            "rechazadas": self.rechazadas,
+            "activo_desde": self.inicio,
+        }
+
+    async def trazas(self, peticion):
+        if self.agregador is None:
+            raise ErrorHTTP(404, "Trazas desactivadas (TRAZAS=0)")
+        return self.agregador.como_dict()
+
+    async def _responder(self, pregunta, al_recibir=None):
+        traza = Traza(pregunta, script="servidor", modelo=self.modelo, streaming=al_recibir is not None)
+        try:
+            respuesta, fuente, resultado = await responder_hibrido_async(
+                pregunta, self.recuperador, self.cadenas, al_recibir, self.cache, self.compuerta,
+                ejecutor=self.ejecutor, limite_llm=self.limite_llm, traza=traza,
+            )
+        except BaseException as e:
+            traza.cerrar(self.sumidero, error=type(e).__name__)
+            raise
+        traza.cerrar(self.sumidero, fuente=fuente, desde_cache=bool(resultado is not None and resultado.desde_cache))
+        return respuesta, fuente, resultado
+
+    @staticmethod
+    def _cuerpo(respuesta, fuente, resultado, inicio):
+        return {
+            "respuesta": respuesta,
+            "fuente": fuente,
+            "fuentes": resultado.fuentes if resultado is not None else [],
+            "desde_cache": bool(resultado is not None and resultado.desde_cache),
+            "tiempos": {
+                **({etapa: round(s, 6) for etapa, s in resultado.tiempos.items()} if resultado is not None else {}),
+                "total": round(time.perf_counter() - inicio, 6),
+            },
+        }
+
+    async def preguntar(self, peticion):
+        datos = peticion.json()
+        if not isinstance(datos, dict):
+            raise ErrorHTTP(400, "El cuerpo debe ser un objeto JSON")
+        pregunta = str(datos.get("pregunta", "")).strip()
+        if not pregunta:
+            raise ErrorHTTP(400, "Falta el campo 'pregunta'")
+        if self.en_curso >= self.max_en_curso:
+            self.rechazadas += 1
+            raise ErrorHTTP(503, "Servidor saturado, reintentar más tarde", {"Retry-After": "1"})
+        if datos.get("stream"):
+            return self._preguntar_stream(pregunta)
+
+        self.en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            respuesta, fuente, resultado = await self._responder(pregunta)
+        finally:
+            self.en_curso -= 1
+        self.atendidas += 1
+        return self._cuerpo(respuesta, fuente, resultado, inicio)
+
+    async def _preguntar_stream(self, pregunta):
+        """Eventos NDJSON: {"fuente", "fragmento"} por fragmento y un evento final con las fuentes."""
+        cola = asyncio.Queue()
+        inicio = time.perf_counter()
+        self.en_curso += 1
+        # El callback corre en el event loop (astream es asíncrono): basta con put_nowait
+        tarea = asyncio.create_task(self._responder(pregunta, lambda fragmento, fuente: cola.put_nowait({"fuente": fuente, "fragmento": fragmento})))
+        tarea.add_done_callback(lambda _: cola.put_nowait(None))
+        try:
+            while (evento := await cola.get()) is not None:
+                yield evento
+            respuesta, fuente, resultado = tarea.result()
+            self.atendidas += 1
+            yield {"fin": True, **self._cuerpo(respuesta, fuente, resultado, inicio)}
+        except Exception as e:
+            yield {"fin": True, "error": str(e)}
+        finally:
+            self.en_curso -= 1
+            # El cliente se fue a mitad de la respuesta: no seguir generando tokens
+            tarea.cancel()
+
+    async def drenar(self, espera=ESPERA_DRENAR):
+        """Espera (hasta `espera` segundos) a que terminen las preguntas en curso."""
+        limite = time.monotonic() + espera
+        while self.en_curso and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+
+    def cerrar(self, persistir=True):
+        self.ejecutor.shutdown(wait=False, cancel_futures=True)
+        if self.cache is not None and persistir:
+            self.cache.persistir()
+
+
+async def servir(aplicacion, host="127.0.0.1", puerto=8000, sock=None, anunciar=True):
+    """
+    Atiende peticiones hasta Ctrl+C o SIGTERM.
+
+    Con SIGTERM deja de aceptar conexiones y termina las preguntas en curso antes de volver.
+    `sock` es un socket de escucha ya abierto (workers pre-fork).
+    """
+    servidor = await ServidorHTTP(aplicacion.rutas()).iniciar(host, puerto, sock=sock)
+    if anunciar:
+        direccion = servidor.sockets[0].getsockname()
+        print(f"🌐 Servidor escuchando en http://{direccion[0]}:{direccion[1]}")
+        print(f"   POST /preguntar  |  GET /salud  |  GET /trazas  (hilos={aplicacion.ejecutor._max_workers}, LLM concurrente={LLM_CONCURRENCIA})\n")
+    terminar = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, terminar.set)
+    async with servidor:
+        await terminar.wait()
+        servidor.close()
+        await aplicacion.drenar()
+
+
+def servir_un_proceso(host="127.0.0.1", puerto=8000, fabrica_embeddings=None):
+    """Servidor de un solo proceso: carga todo y atiende con asyncio + pool de hilos."""
+    recuperador, cadenas, modelo, _, cache, compuerta = configurar_sistema_hibrido(
+        fabrica_embeddings=fabrica_embeddings, http_async_client=crear_cliente_http())
+    sumidero, agregador = crear_sumidero()
+    aplicacion = AplicacionHibrida(recuperador, cadenas, modelo, cache, compuerta, sumidero=sumidero, agregador=agregador)
+    try:
+        asyncio.run(servir(aplicacion, host, puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        aplicacion.cerrar()
+        if cache is not None:
+            print(cache.resumen())
+        if agregador is not None and agregador.trazas:
+            print(agregador.resumen())
+        print("\n👋 Servidor detenido\n")
+
+
+# --- modo pre-fork ------------------------------------------------------------------------
+
+
+def _escribir(fabrica_embeddings):
+    """Proceso escritor: ingesta, índices y réplica local; resuelve el modelo de chat una vez."""
+    from cerebro.modelos import resolver_modelo
+
+    version_corpus = sincronizar_documentacion(fabrica_embeddings=fabrica_embeddings)
+    modelo, _ = resolver_modelo()
+    return version_corpus, modelo
+
+
+def ingestar_en_escritor(fabrica_embeddings=None):
+    """
+    Corre la ingesta en un proceso nuevo (spawn) y espera a que termine.
+
+    Es el único proceso que abre ChromaDB y escribe la caché de embeddings; el padre del
+    pool no llega a usar el modelo ni a crear hilos, así que puede hacer fork con seguridad.
+
+    Returns:
+        tuple: (version_corpus, modelo)
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as escritor:
+        return escritor.submit(_escribir, fabrica_embeddings).result()
+
+
+def _atender_worker(sock, numero, compartido, hilos_modelo, workers):
+    """Cuerpo de cada worker: hilos del modelo, cliente del LLM propio y event loop sobre el socket heredado."""
+    from cerebro.cache_respuestas import crear_cache
+    from cerebro.embedding_paralelo import limitar_hilos
+
+    limitar_hilos(hilos_modelo)
+    # El cliente HTTP (y su pool de conexiones) se crea después del fork: no se comparte.
+    # Los límites de la API son de la cuenta: cada worker usa su parte
+    politica = PoliticaLLM(LimitadorTasa(LLM_RPM / workers, LLM_TPM / workers))
+    cadenas, modelo = configurar_llm(aviso=lambda *_, **__: None, **opciones_cliente_llm(politica, LLM_CONCURRENCIA))
+    # La caché semántica de cada worker arranca de lo persistido y no se vuelve a escribir
+    cache = crear_cache(compartido["version_corpus"], modelo, "hibrido")
+    sumidero, agregador = crear_sumidero()
+    aplicacion = AplicacionHibrida(compartido["recuperador"], cadenas, modelo, cache, compartido["compuerta"],
+                                   sumidero=sumidero, agregador=agregador)
+    try:
+        asyncio.run(servir(aplicacion, sock=sock, anunciar=False))
+    finally:
+        aplicacion.cerrar(persistir=False)
+
+
+def servir_prefork(host="127.0.0.1", puerto=8000, workers=WORKERS, hilos_modelo=None, fabrica_embeddings=None):
+    """
+    Servidor pre-fork: escritor de ingesta, estado de solo lectura cargado una vez y `workers` procesos.
+
+    Args:
+        host: Interfaz de escucha
+        puerto: Puerto (0 = uno libre)
+        workers: Procesos worker
+        hilos_modelo: Hilos intra-op del modelo por worker (SERVIDOR_HILOS_MODELO; por defecto núcleos / workers)
+        fabrica_embeddings: Función serializable que crea el modelo de embeddings (ver cargar_documentacion)
+    """
+    from cerebro.prefork import PoolPrefork
+
+    hilos_modelo = hilos_modelo or int(os.getenv("SERVIDOR_HILOS_MODELO", "0")) or max(1, (os.cpu_count() or 1) // workers)
+    print(f"\n🔧 Servidor pre-fork: {workers} workers, {hilos_modelo} hilo(s) de modelo por worker\n")
+    version_corpus, modelo = ingestar_en_escritor(fabrica_embeddings)
+    if not modelo:
+        raise Exception("No se encontró ningún modelo disponible")
+    # Los workers reciben el modelo resuelto: no vuelven a sondear la API
+    os.environ["OPENAI_MODEL"] = modelo
+    compartido = {"version_corpus": version_corpus}
+    compartido["recuperador"], compartido["compuerta"] = abrir_documentacion(version_corpus, fabrica_embeddings=fabrica_embeddings, modelo=modelo)
+
+    def recargar():
+        version, modelo = ingestar_en_escritor(fabrica_embeddings)
+        if not modelo:
+            # PoolPrefork avisa y mantiene los workers actuales
+            raise Exception("No se encontró ningún modelo disponible")
+        if version == compartido["version_corpus"]:
+            return False
+        compartido["recuperador"], compartido["compuerta"] = abrir_documentacion(version, fabrica_embeddings=fabrica_embeddings, modelo=modelo)
+        compartido["version_corpus"] = version
+        return True
+
+    sock = socket.create_server((host, puerto), backlog=1024)
+    direccion = sock.getsockname()
+    print(f"🌐 Servidor escuchando en http://{direccion[0]}:{direccion[1]}")
+    print(f"   POST /preguntar  |  GET /salud  |  GET /trazas  (por worker: hilos={HILOS}, LLM concurrente={LLM_CONCURRENCIA})")
+    print(f"   kill -HUP {os.getpid()} reingesta el corpus y renueva los workers\n")
+    try:
+        PoolPrefork(workers, lambda sock, numero: _atender_worker(sock, numero, compartido, hilos_modelo, workers), recargar).correr(sock)
+    finally:
+        sock.close()
+        print("\n👋 Servidor detenido\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP del sistema híbrido")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Procesos pre-fork (1 = un solo proceso)")
+    parser.add_argument("--hilos-modelo", type=int, default=None, help="Hilos intra-op del modelo por worker")
+    args = parser.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("❌ Error: Configura OPENAI_API_KEY en el archivo .env")
+        return
+
+    if args.workers > 1:
+        servir_prefork(args.host, args.puerto, args.workers, args.hilos_modelo)
+    else:
+        servir_un_proceso(args.host, args.puerto)
+
+
+if __name__ == "__main__":
+    main()